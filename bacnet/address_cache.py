@@ -0,0 +1,140 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from bacnet.parser import BACnetParser
+
+
+class BACnetAddressCache:
+    """
+    Devices of address_cache file (bacwi table) reloaded when file is changed,
+    change of file is detected by modification time and size checked at most once per interval
+    """
+
+    def __init__(self, path, interval: float = 0):
+        """
+        :param path: address_cache file
+        :param interval: min interval between checks of file (sec)
+        """
+        self.path = Path(path)
+        self.interval = interval
+        self.logger = logging.getLogger('bacnet.address_cache')
+        self.lock = threading.Lock()
+        # key - device id, value - bacwi table device (id, host, port, apdu)
+        self.devices = {}
+        self.stat = None
+        self.last_check = None
+
+    def get_devices(self):
+        """
+        :return: dict of device id -> bacwi table device, reloaded if file is changed
+        """
+        if self.last_check is None or time.monotonic() - self.last_check >= self.interval:
+            self.check()
+        return self.devices
+
+    def get(self, device_id: int):
+        return self.get_devices().get(device_id)
+
+    def check(self):
+        """
+        Reload devices if file is changed, not readable file keeps previously loaded devices
+        :return: tuple of previous and current devices if reloaded or None
+        """
+        with self.lock:
+            self.last_check = time.monotonic()
+            try:
+                stat = os.stat(str(self.path))
+            except OSError:
+                return None
+            stat = (stat.st_mtime_ns, stat.st_size)
+            if stat == self.stat:
+                return None
+            try:
+                devices = {device["id"]: device for device in BACnetParser.parse_bacwi(self.path.read_text())}
+            except Exception:
+                self.logger.exception("Failed load address_cache: {}".format(self.path))
+                return None
+            previous = self.devices
+            self.devices = devices
+            self.stat = stat
+            return previous, devices
+
+    @staticmethod
+    def diff(previous: dict, current: dict):
+        """
+        :return: tuple of lists of added devices, removed devices, devices with changed host, port or apdu
+        """
+        added = [device for device_id, device in current.items() if device_id not in previous]
+        removed = [device for device_id, device in previous.items() if device_id not in current]
+        changed = [device for device_id, device in current.items()
+                   if device_id in previous and previous[device_id] != device]
+        return added, removed, changed
+
+
+class BACnetAddressCacheWatcher:
+    """
+    Watch address_cache file and notify listeners about added, removed and changed devices
+    so devices are collected without restart of collector
+    """
+
+    def __init__(self, config: dict):
+        """
+        :param config: visiobas_slicer config, key "address_cache_watch" holds settings of watcher:
+        interval - interval of file checks (sec)
+        """
+        settings = config.get("address_cache_watch", {})
+        self.interval = settings.get("interval", 5)
+        self.cache = BACnetAddressCache(config["address_cache"])
+        self.cache.check()
+        self.logger = logging.getLogger('bacnet.address_cache')
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def add_listener(self, listener):
+        """
+        :param listener: callable(added, removed, changed) where each argument is list of bacwi table devices,
+        called from thread of watcher
+        """
+        self.listeners.append(listener)
+
+    def get_devices(self):
+        return self.cache.devices
+
+    def check(self):
+        """
+        Check address_cache file and notify listeners if devices are changed
+        :return: tuple of added, removed and changed devices or None if file is not changed
+        """
+        reloaded = self.cache.check()
+        if reloaded is None:
+            return None
+        added, removed, changed = BACnetAddressCache.diff(*reloaded)
+        if len(added) + len(removed) + len(changed) == 0:
+            return None
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("address_cache changed devices added: {} removed: {} changed: {}".format(
+                [d["id"] for d in added], [d["id"] for d in removed], [d["id"] for d in changed]))
+        for listener in self.listeners:
+            try:
+                listener(added, removed, changed)
+            except Exception:
+                self.logger.exception("Failed apply address_cache changes")
+        return added, removed, changed
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="address-cache-watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.check()
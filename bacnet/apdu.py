@@ -0,0 +1,1146 @@
+import datetime
+import enum
+import struct
+from collections import namedtuple
+
+from bacnet.bacnet import ObjectType
+
+BVLC_TYPE = 0x81
+BVLC_ORIGINAL_UNICAST_NPDU = 0x0A
+BVLC_ORIGINAL_BROADCAST_NPDU = 0x0B
+BVLC_FORWARDED_NPDU = 0x04
+
+NPDU_VERSION = 0x01
+NPDU_EXPECTING_REPLY = 0x04
+
+# max-apdu-length-accepted encoding of confirmed request header
+MAX_APDU_CODES = [50, 128, 206, 480, 1024, 1476]
+
+
+class PduType(enum.Enum):
+    CONFIRMED_REQUEST = 0
+    UNCONFIRMED_REQUEST = 1
+    SIMPLE_ACK = 2
+    COMPLEX_ACK = 3
+    SEGMENT_ACK = 4
+    ERROR = 5
+    REJECT = 6
+    ABORT = 7
+
+    def id(self):
+        return self.value
+
+
+class ConfirmedService(enum.Enum):
+    CONFIRMED_COV_NOTIFICATION = 1
+    SUBSCRIBE_COV = 5
+    READ_PROPERTY = 12
+    READ_PROPERTY_MULTIPLE = 14
+    WRITE_PROPERTY = 15
+    WRITE_PROPERTY_MULTIPLE = 16
+    READ_RANGE = 26
+
+    def id(self):
+        return self.value
+
+
+class UnconfirmedService(enum.Enum):
+    I_AM = 0
+    UNCONFIRMED_COV_NOTIFICATION = 2
+    WHO_IS = 8
+
+    def id(self):
+        return self.value
+
+
+class ApplicationTag(enum.Enum):
+    NULL = 0
+    BOOLEAN = 1
+    UNSIGNED = 2
+    SIGNED = 3
+    REAL = 4
+    DOUBLE = 5
+    OCTET_STRING = 6
+    CHARACTER_STRING = 7
+    BIT_STRING = 8
+    ENUMERATED = 9
+    DATE = 10
+    TIME = 11
+    OBJECT_IDENTIFIER = 12
+
+    def id(self):
+        return self.value
+
+
+ObjectIdentifier = namedtuple("ObjectIdentifier", ["type", "instance"])
+Date = namedtuple("Date", ["year", "month", "day", "day_of_week"])
+Time = namedtuple("Time", ["hour", "minute", "second", "hundredths"])
+Tag = namedtuple("Tag", ["number", "context", "length", "opening", "closing"])
+# BACnetDeviceObjectPropertyReference (log-device-object-property of trend-log), device_id None - local device
+ObjectPropertyReference = namedtuple("ObjectPropertyReference", ["object_type", "object_id", "property_id",
+                                                                 "device_id"])
+# record of trend-log log-buffer, datum is choice number of logDatum (see LOG_DATUM_* values)
+LogRecord = namedtuple("LogRecord", ["timestamp", "datum", "value", "status_flags"])
+
+
+class Enumerated(int):
+    """
+    Enumerated value decoded from APDU, keep it apart from unsigned integers
+    to be able to convert value into BACnet enumeration name
+    """
+    pass
+
+
+class BitString(list):
+    """
+    List of bool flags decoded from APDU bit string (status-flags, event-enable ...)
+    """
+    pass
+
+
+class BACnetError(Exception):
+    """
+    Error received from remote device (Error, Reject or Abort PDU)
+    """
+    def __init__(self, pdu_type: PduType, error_class=None, error_code=None, reason=None):
+        self.pdu_type = pdu_type
+        self.error_class = error_class
+        self.error_code = error_code
+        self.reason = reason
+        if pdu_type == PduType.ERROR:
+            message = "BACnet Error: {}: {}".format(error_class_name(error_class), error_code_name(error_code))
+        elif pdu_type == PduType.REJECT:
+            message = "BACnet Reject: {}".format(reject_reason_name(reason))
+        else:
+            message = "BACnet Abort: {}".format(abort_reason_name(reason))
+        super().__init__(message)
+
+
+__error_classes = ["device", "object", "property", "resources", "security", "services", "vt", "communication"]
+
+__error_codes = {
+    0: "other",
+    2: "configuration-in-progress",
+    3: "device-busy",
+    9: "invalid-data-type",
+    27: "read-access-denied",
+    31: "unknown-object",
+    32: "unknown-property",
+    37: "value-out-of-range",
+    40: "write-access-denied",
+    42: "invalid-array-index"
+}
+
+__reject_reasons = ["other", "buffer-overflow", "inconsistent-parameters", "invalid-parameter-data-type",
+                    "invalid-tag", "missing-required-parameter", "parameter-out-of-range", "too-many-arguments",
+                    "undefined-enumeration", "unrecognized-service"]
+
+__abort_reasons = ["other", "buffer-overflow", "invalid-apdu-in-this-state", "preempted-by-higher-priority-task",
+                   "segmentation-not-supported", "security-error", "insufficient-security",
+                   "window-size-out-of-range", "application-exceeded-reply-time", "out-of-resources",
+                   "tsm-timeout", "apdu-too-long"]
+
+REJECT_UNRECOGNIZED_SERVICE = 9
+ABORT_SEGMENTATION_NOT_SUPPORTED = 4
+ABORT_APDU_TOO_LONG = 11
+
+# segmentation supported of I-Am
+SEGMENTATION_BOTH = 0
+SEGMENTATION_TRANSMIT = 1
+SEGMENTATION_RECEIVE = 2
+SEGMENTATION_NONE = 3
+
+# logDatum choice of BACnetLogRecord, records of status, failure and time change do not carry sampled value
+LOG_DATUM_STATUS = 0
+LOG_DATUM_BOOLEAN = 1
+LOG_DATUM_REAL = 2
+LOG_DATUM_ENUMERATED = 3
+LOG_DATUM_UNSIGNED = 4
+LOG_DATUM_SIGNED = 5
+LOG_DATUM_BIT_STRING = 6
+LOG_DATUM_NULL = 7
+LOG_DATUM_FAILURE = 8
+LOG_DATUM_TIME_CHANGE = 9
+LOG_DATUM_ANY = 10
+
+# application tag of primitive logDatum choice
+__log_datum_tags = {
+    LOG_DATUM_STATUS: ApplicationTag.BIT_STRING,
+    LOG_DATUM_BOOLEAN: ApplicationTag.BOOLEAN,
+    LOG_DATUM_REAL: ApplicationTag.REAL,
+    LOG_DATUM_ENUMERATED: ApplicationTag.ENUMERATED,
+    LOG_DATUM_UNSIGNED: ApplicationTag.UNSIGNED,
+    LOG_DATUM_SIGNED: ApplicationTag.SIGNED,
+    LOG_DATUM_BIT_STRING: ApplicationTag.BIT_STRING,
+    LOG_DATUM_NULL: ApplicationTag.NULL,
+    LOG_DATUM_TIME_CHANGE: ApplicationTag.REAL
+}
+
+# bits of resultFlags of ReadRange-ACK
+RESULT_FIRST_ITEM = 0
+RESULT_LAST_ITEM = 1
+RESULT_MORE_ITEMS = 2
+
+
+def error_class_name(error_class):
+    if error_class is not None and 0 <= error_class < len(__error_classes):
+        return __error_classes[error_class]
+    return "error-class-{}".format(error_class)
+
+
+def error_code_name(error_code):
+    return __error_codes.get(error_code, "error-code-{}".format(error_code))
+
+
+def reject_reason_name(reason):
+    if reason is not None and 0 <= reason < len(__reject_reasons):
+        return __reject_reasons[reason]
+    return "reject-reason-{}".format(reason)
+
+
+def abort_reason_name(reason):
+    if reason is not None and 0 <= reason < len(__abort_reasons):
+        return __abort_reasons[reason]
+    return "abort-reason-{}".format(reason)
+
+
+def log_datum_tag(datum: int):
+    return __log_datum_tags.get(datum)
+
+
+def log_datum(value):
+    """
+    :return: logDatum choice of sampled value
+    """
+    if value is None:
+        return LOG_DATUM_NULL
+    if type(value) == bool:
+        return LOG_DATUM_BOOLEAN
+    if isinstance(value, Enumerated):
+        return LOG_DATUM_ENUMERATED
+    if isinstance(value, int):
+        return LOG_DATUM_UNSIGNED if value >= 0 else LOG_DATUM_SIGNED
+    if isinstance(value, BitString):
+        return LOG_DATUM_BIT_STRING
+    return LOG_DATUM_REAL
+
+
+def max_apdu_code(max_apdu: int):
+    """
+    :return: code of the biggest max-apdu-length-accepted value not exceeding max_apdu
+    """
+    code = 0
+    for i in range(len(MAX_APDU_CODES)):
+        if MAX_APDU_CODES[i] <= max_apdu:
+            code = i
+    return code
+
+
+class BACnetEncoder:
+    """
+    Encoding of BACnet/IP frames and tagged values (ASHRAE 135 clause 20)
+    """
+
+    @staticmethod
+    def tag(number: int, context: bool, length: int):
+        extended_number = number >= 15
+        b = (0xF0 if extended_number else number << 4) | (0x08 if context else 0)
+        if length < 5:
+            data = bytearray([b | length])
+        else:
+            data = bytearray([b | 5])
+        if extended_number:
+            data.append(number)
+        if length >= 5:
+            if length < 254:
+                data.append(length)
+            elif length < 65536:
+                data.append(254)
+                data += struct.pack(">H", length)
+            else:
+                data.append(255)
+                data += struct.pack(">I", length)
+        return bytes(data)
+
+    @staticmethod
+    def opening_tag(number: int):
+        return bytes([(number << 4) | 0x0E]) if number < 15 else bytes([0xFE, number])
+
+    @staticmethod
+    def closing_tag(number: int):
+        return bytes([(number << 4) | 0x0F]) if number < 15 else bytes([0xFF, number])
+
+    @staticmethod
+    def unsigned_bytes(value: int):
+        length = 1
+        while value >= (1 << (8 * length)):
+            length += 1
+        return value.to_bytes(length, "big")
+
+    @staticmethod
+    def signed_bytes(value: int):
+        length = 1
+        while not -(1 << (8 * length - 1)) <= value < (1 << (8 * length - 1)):
+            length += 1
+        return value.to_bytes(length, "big", signed=True)
+
+    @staticmethod
+    def object_identifier_bytes(object_type, object_id: int):
+        object_type = object_type.code() if type(object_type) == ObjectType else object_type
+        return struct.pack(">I", ((int(object_type) & 0x3FF) << 22) | (int(object_id) & 0x3FFFFF))
+
+    @staticmethod
+    def context_unsigned(number: int, value: int):
+        data = BACnetEncoder.unsigned_bytes(int(value))
+        return BACnetEncoder.tag(number, True, len(data)) + data
+
+    @staticmethod
+    def context_object_identifier(number: int, object_type, object_id: int):
+        return BACnetEncoder.tag(number, True, 4) + BACnetEncoder.object_identifier_bytes(object_type, object_id)
+
+    @staticmethod
+    def context_boolean(number: int, value: bool):
+        return BACnetEncoder.tag(number, True, 1) + bytes([1 if value else 0])
+
+    @staticmethod
+    def application_value(value):
+        """
+        Encode python value as application tagged BACnet value
+        None - null, bool - boolean, Enumerated - enumerated, int - unsigned or signed, float - real,
+        str - character string, bytes - octet string, BitString - bit string,
+        ObjectIdentifier - object identifier, Date, Time
+        """
+        if value is None:
+            return bytes([0x00])
+        if type(value) == bool:
+            return bytes([0x10 | (1 if value else 0)])
+        if isinstance(value, Enumerated):
+            data = BACnetEncoder.unsigned_bytes(int(value))
+            return BACnetEncoder.tag(ApplicationTag.ENUMERATED.id(), False, len(data)) + data
+        if isinstance(value, int):
+            if value >= 0:
+                data = BACnetEncoder.unsigned_bytes(value)
+                return BACnetEncoder.tag(ApplicationTag.UNSIGNED.id(), False, len(data)) + data
+            data = BACnetEncoder.signed_bytes(value)
+            return BACnetEncoder.tag(ApplicationTag.SIGNED.id(), False, len(data)) + data
+        if isinstance(value, float):
+            return BACnetEncoder.tag(ApplicationTag.REAL.id(), False, 4) + struct.pack(">f", value)
+        if isinstance(value, str):
+            data = b"\x00" + value.encode("utf-8")
+            return BACnetEncoder.tag(ApplicationTag.CHARACTER_STRING.id(), False, len(data)) + data
+        if isinstance(value, bytes):
+            return BACnetEncoder.tag(ApplicationTag.OCTET_STRING.id(), False, len(value)) + value
+        if isinstance(value, BitString):
+            unused = (8 - len(value) % 8) % 8
+            data = bytearray([unused])
+            for i in range(0, len(value), 8):
+                b = 0
+                for j, flag in enumerate(value[i:i + 8]):
+                    if flag:
+                        b |= 0x80 >> j
+                data.append(b)
+            return BACnetEncoder.tag(ApplicationTag.BIT_STRING.id(), False, len(data)) + bytes(data)
+        if isinstance(value, ObjectIdentifier):
+            return BACnetEncoder.tag(ApplicationTag.OBJECT_IDENTIFIER.id(), False, 4) + \
+                BACnetEncoder.object_identifier_bytes(value.type, value.instance)
+        if isinstance(value, Date):
+            return BACnetEncoder.tag(ApplicationTag.DATE.id(), False, 4) + \
+                bytes([value.year - 1900 if value.year != 255 else 255, value.month, value.day, value.day_of_week])
+        if isinstance(value, Time):
+            return BACnetEncoder.tag(ApplicationTag.TIME.id(), False, 4) + \
+                bytes([value.hour, value.minute, value.second, value.hundredths])
+        raise ValueError("Unsupported BACnet application value: {}".format(repr(value)))
+
+    @staticmethod
+    def property_value(value):
+        """
+        Encode property value, list is encoded as sequence of application values (BACnetARRAY)
+        """
+        if isinstance(value, ObjectPropertyReference):
+            return BACnetEncoder.context_object_identifier(0, value.object_type, value.object_id) + \
+                BACnetEncoder.context_unsigned(1, int(value.property_id)) + \
+                (BACnetEncoder.context_object_identifier(3, ObjectType.DEVICE, value.device_id)
+                 if value.device_id is not None else b"")
+        if isinstance(value, list) and not isinstance(value, BitString):
+            return b"".join([BACnetEncoder.application_value(v) for v in value])
+        return BACnetEncoder.application_value(value)
+
+    @staticmethod
+    def bvlc(npdu: bytes, broadcast=False):
+        function = BVLC_ORIGINAL_BROADCAST_NPDU if broadcast else BVLC_ORIGINAL_UNICAST_NPDU
+        return struct.pack(">BBH", BVLC_TYPE, function, len(npdu) + 4) + npdu
+
+    @staticmethod
+    def npdu(apdu: bytes, expecting_reply=False):
+        return bytes([NPDU_VERSION, NPDU_EXPECTING_REPLY if expecting_reply else 0x00]) + apdu
+
+    @staticmethod
+    def confirmed_request(invoke_id: int, service: ConfirmedService, payload: bytes, max_apdu=1476):
+        header = bytes([PduType.CONFIRMED_REQUEST.id() << 4, max_apdu_code(max_apdu), invoke_id, service.id()])
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(header + payload, expecting_reply=True))
+
+    @staticmethod
+    def unconfirmed_request(service: UnconfirmedService, payload: bytes, broadcast=False):
+        header = bytes([PduType.UNCONFIRMED_REQUEST.id() << 4, service.id()])
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(header + payload), broadcast=broadcast)
+
+    @staticmethod
+    def simple_ack(invoke_id: int, service: ConfirmedService):
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(bytes([PduType.SIMPLE_ACK.id() << 4, invoke_id, service.id()])))
+
+    @staticmethod
+    def complex_ack(invoke_id: int, service: ConfirmedService, payload: bytes):
+        header = bytes([PduType.COMPLEX_ACK.id() << 4, invoke_id, service.id()])
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(header + payload))
+
+    @staticmethod
+    def error(invoke_id: int, service: ConfirmedService, error_class: int, error_code: int):
+        payload = BACnetEncoder.application_value(Enumerated(error_class)) + \
+            BACnetEncoder.application_value(Enumerated(error_code))
+        header = bytes([PduType.ERROR.id() << 4, invoke_id, service.id()])
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(header + payload))
+
+    @staticmethod
+    def reject(invoke_id: int, reason: int):
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(bytes([PduType.REJECT.id() << 4, invoke_id, reason])))
+
+    @staticmethod
+    def abort(invoke_id: int, reason: int, server=True):
+        header = (PduType.ABORT.id() << 4) | (1 if server else 0)
+        return BACnetEncoder.bvlc(BACnetEncoder.npdu(bytes([header, invoke_id, reason])))
+
+    @staticmethod
+    def read_property(object_type, object_id: int, property_id, index=None):
+        payload = BACnetEncoder.context_object_identifier(0, object_type, object_id) + \
+            BACnetEncoder.context_unsigned(1, int(property_id))
+        if index is not None:
+            payload += BACnetEncoder.context_unsigned(2, index)
+        return payload
+
+    @staticmethod
+    def write_property(object_type, object_id: int, property_id, value, priority=None, index=None):
+        payload = BACnetEncoder.context_object_identifier(0, object_type, object_id) + \
+            BACnetEncoder.context_unsigned(1, int(property_id))
+        if index is not None:
+            payload += BACnetEncoder.context_unsigned(2, index)
+        payload += BACnetEncoder.opening_tag(3) + BACnetEncoder.property_value(value) + BACnetEncoder.closing_tag(3)
+        if priority is not None:
+            payload += BACnetEncoder.context_unsigned(4, priority)
+        return payload
+
+    @staticmethod
+    def write_property_multiple(objects: list):
+        """
+        :param objects: list of (object_type, object_id, [(property_id, value, priority or None), ...])
+        """
+        payload = bytearray()
+        for object_type, object_id, properties in objects:
+            payload += BACnetEncoder.context_object_identifier(0, object_type, object_id)
+            payload += BACnetEncoder.opening_tag(1)
+            for property_id, value, priority in properties:
+                payload += BACnetEncoder.context_unsigned(0, int(property_id))
+                payload += BACnetEncoder.opening_tag(2)
+                payload += BACnetEncoder.property_value(value)
+                payload += BACnetEncoder.closing_tag(2)
+                if priority is not None:
+                    payload += BACnetEncoder.context_unsigned(3, priority)
+            payload += BACnetEncoder.closing_tag(1)
+        return bytes(payload)
+
+    @staticmethod
+    def read_property_multiple(objects: list):
+        """
+        :param objects: list of (object_type, object_id, [property_id, ...])
+        """
+        payload = bytearray()
+        for object_type, object_id, properties in objects:
+            payload += BACnetEncoder.context_object_identifier(0, object_type, object_id)
+            payload += BACnetEncoder.opening_tag(1)
+            for property_id in properties:
+                payload += BACnetEncoder.context_unsigned(0, int(property_id))
+            payload += BACnetEncoder.closing_tag(1)
+        return bytes(payload)
+
+    @staticmethod
+    def subscribe_cov(process_id: int, object_type, object_id: int, confirmed: bool = None, lifetime: int = None):
+        """
+        SubscribeCOV request, without confirmed and lifetime it is cancellation of subscription
+        """
+        payload = BACnetEncoder.context_unsigned(0, process_id) + \
+            BACnetEncoder.context_object_identifier(1, object_type, object_id)
+        if confirmed is not None:
+            payload += BACnetEncoder.context_boolean(2, confirmed)
+        if lifetime is not None:
+            payload += BACnetEncoder.context_unsigned(3, lifetime)
+        return payload
+
+    @staticmethod
+    def cov_notification(process_id: int, device_id: int, object_type, object_id: int, time_remaining: int,
+                         values: list):
+        """
+        :param values: list of (property_id, value)
+        """
+        payload = bytearray()
+        payload += BACnetEncoder.context_unsigned(0, process_id)
+        payload += BACnetEncoder.context_object_identifier(1, ObjectType.DEVICE, device_id)
+        payload += BACnetEncoder.context_object_identifier(2, object_type, object_id)
+        payload += BACnetEncoder.context_unsigned(3, time_remaining)
+        payload += BACnetEncoder.opening_tag(4)
+        for property_id, value in values:
+            payload += BACnetEncoder.context_unsigned(0, int(property_id))
+            payload += BACnetEncoder.opening_tag(2)
+            payload += BACnetEncoder.property_value(value)
+            payload += BACnetEncoder.closing_tag(2)
+        payload += BACnetEncoder.closing_tag(4)
+        return bytes(payload)
+
+    @staticmethod
+    def who_is(low: int = None, high: int = None):
+        """
+        Who-Is request, without limits all devices are requested
+        """
+        if low is None or high is None:
+            return b""
+        return BACnetEncoder.context_unsigned(0, low) + BACnetEncoder.context_unsigned(1, high)
+
+    @staticmethod
+    def i_am(device_id: int, max_apdu: int, segmentation: int = SEGMENTATION_NONE, vendor_id: int = 0):
+        return BACnetEncoder.application_value(ObjectIdentifier(ObjectType.DEVICE.code(), device_id)) + \
+            BACnetEncoder.application_value(max_apdu) + \
+            BACnetEncoder.application_value(Enumerated(segmentation)) + \
+            BACnetEncoder.application_value(vendor_id)
+
+    @staticmethod
+    def read_property_ack(object_type, object_id: int, property_id, value, index=None):
+        return BACnetEncoder.context_object_identifier(0, object_type, object_id) + \
+            BACnetEncoder.context_unsigned(1, int(property_id)) + \
+            (BACnetEncoder.context_unsigned(2, index) if index is not None else b"") + \
+            BACnetEncoder.opening_tag(3) + BACnetEncoder.property_value(value) + BACnetEncoder.closing_tag(3)
+
+    @staticmethod
+    def context_value(number: int, value):
+        """
+        Encode primitive value with context tag in place of application tag
+        """
+        if type(value) == bool:
+            return BACnetEncoder.context_boolean(number, value)
+        data = BACnetEncoder.application_value(value)
+        tag, content = BACnetDecoder.tag(data, 0)
+        return BACnetEncoder.tag(number, True, tag.length) + data[content:]
+
+    @staticmethod
+    def date_time(timestamp: float):
+        """
+        :return: BACnetDateTime (local time) as tuple of (Date, Time)
+        """
+        t = datetime.datetime.fromtimestamp(timestamp)
+        return Date(t.year, t.month, t.day, t.isoweekday()), Time(t.hour, t.minute, t.second, t.microsecond // 10000)
+
+    @staticmethod
+    def read_range(object_type, object_id: int, property_id, reference, count: int, by_time: bool = False):
+        """
+        ReadRange request of list property (trend-log log-buffer)
+        :param reference: first sequence number or timestamp if by_time
+        :param count: count of items after reference (negative - before reference)
+        """
+        payload = BACnetEncoder.context_object_identifier(0, object_type, object_id) + \
+            BACnetEncoder.context_unsigned(1, int(property_id))
+        if by_time:
+            date, time = BACnetEncoder.date_time(reference)
+            payload += BACnetEncoder.opening_tag(7) + BACnetEncoder.application_value(date) + \
+                BACnetEncoder.application_value(time) + BACnetEncoder.application_value(count) + \
+                BACnetEncoder.closing_tag(7)
+        else:
+            payload += BACnetEncoder.opening_tag(6) + BACnetEncoder.application_value(int(reference)) + \
+                BACnetEncoder.application_value(count) + BACnetEncoder.closing_tag(6)
+        return payload
+
+    @staticmethod
+    def log_record(timestamp: float, value, status_flags: BitString = None):
+        date, time = BACnetEncoder.date_time(timestamp)
+        payload = BACnetEncoder.opening_tag(0) + BACnetEncoder.application_value(date) + \
+            BACnetEncoder.application_value(time) + BACnetEncoder.closing_tag(0) + \
+            BACnetEncoder.opening_tag(1) + BACnetEncoder.context_value(log_datum(value), value) + \
+            BACnetEncoder.closing_tag(1)
+        if status_flags is not None:
+            payload += BACnetEncoder.context_value(2, status_flags)
+        return payload
+
+    @staticmethod
+    def read_range_ack(object_type, object_id: int, property_id, result_flags: BitString, records: list,
+                       first_sequence: int = None):
+        """
+        :param records: list of (timestamp, value, status flags or None)
+        """
+        payload = bytearray()
+        payload += BACnetEncoder.context_object_identifier(0, object_type, object_id)
+        payload += BACnetEncoder.context_unsigned(1, int(property_id))
+        payload += BACnetEncoder.context_value(3, result_flags)
+        payload += BACnetEncoder.context_unsigned(4, len(records))
+        payload += BACnetEncoder.opening_tag(5)
+        for timestamp, value, status_flags in records:
+            payload += BACnetEncoder.log_record(timestamp, value, status_flags)
+        payload += BACnetEncoder.closing_tag(5)
+        if first_sequence is not None:
+            payload += BACnetEncoder.context_unsigned(6, first_sequence)
+        return bytes(payload)
+
+    @staticmethod
+    def read_property_multiple_ack(results: list):
+        """
+        :param results: list of (object_type, object_id, [(property_id, value or BACnetError), ...])
+        """
+        payload = bytearray()
+        for object_type, object_id, properties in results:
+            payload += BACnetEncoder.context_object_identifier(0, object_type, object_id)
+            payload += BACnetEncoder.opening_tag(1)
+            for property_id, value in properties:
+                payload += BACnetEncoder.context_unsigned(2, int(property_id))
+                if isinstance(value, BACnetError):
+                    payload += BACnetEncoder.opening_tag(5)
+                    payload += BACnetEncoder.application_value(Enumerated(value.error_class))
+                    payload += BACnetEncoder.application_value(Enumerated(value.error_code))
+                    payload += BACnetEncoder.closing_tag(5)
+                else:
+                    payload += BACnetEncoder.opening_tag(4)
+                    payload += BACnetEncoder.property_value(value)
+                    payload += BACnetEncoder.closing_tag(4)
+            payload += BACnetEncoder.closing_tag(1)
+        return bytes(payload)
+
+
+Apdu = namedtuple("Apdu", ["pdu_type", "service", "invoke_id", "payload", "segmented", "more_follows",
+                           "error_class", "error_code", "reason"])
+
+
+class BACnetDecoder:
+    """
+    Decoding of BACnet/IP frames and tagged values (ASHRAE 135 clause 20)
+    """
+
+    @staticmethod
+    def tag(data: bytes, offset: int):
+        """
+        :return: tuple of (Tag, offset of tag content)
+        """
+        b = data[offset]
+        offset += 1
+        number = b >> 4
+        context = bool(b & 0x08)
+        length = b & 0x07
+        if number == 15:
+            number = data[offset]
+            offset += 1
+        opening = context and length == 6
+        closing = context and length == 7
+        if length == 5:
+            length = data[offset]
+            offset += 1
+            if length == 254:
+                length = struct.unpack_from(">H", data, offset)[0]
+                offset += 2
+            elif length == 255:
+                length = struct.unpack_from(">I", data, offset)[0]
+                offset += 4
+        return Tag(number, context, length, opening, closing), offset
+
+    @staticmethod
+    def unsigned(data: bytes):
+        return int.from_bytes(data, "big")
+
+    @staticmethod
+    def object_identifier(data: bytes):
+        value = struct.unpack(">I", data)[0]
+        return ObjectIdentifier(value >> 22, value & 0x3FFFFF)
+
+    @staticmethod
+    def application_value(tag: Tag, data: bytes):
+        tag_type = tag.number
+        if tag_type == ApplicationTag.NULL.id():
+            return None
+        if tag_type == ApplicationTag.BOOLEAN.id():
+            return tag.length == 1
+        if tag_type == ApplicationTag.UNSIGNED.id():
+            return int.from_bytes(data, "big")
+        if tag_type == ApplicationTag.SIGNED.id():
+            return int.from_bytes(data, "big", signed=True)
+        if tag_type == ApplicationTag.REAL.id():
+            return struct.unpack(">f", data)[0]
+        if tag_type == ApplicationTag.DOUBLE.id():
+            return struct.unpack(">d", data)[0]
+        if tag_type == ApplicationTag.OCTET_STRING.id():
+            return bytes(data)
+        if tag_type == ApplicationTag.CHARACTER_STRING.id():
+            if len(data) == 0:
+                return ""
+            if data[0] == 0:
+                return bytes(data[1:]).decode("utf-8", errors="replace")
+            return bytes(data[1:]).decode("latin-1")
+        if tag_type == ApplicationTag.BIT_STRING.id():
+            if len(data) == 0:
+                return BitString()
+            unused = data[0]
+            flags = BitString()
+            for b in data[1:]:
+                for j in range(8):
+                    flags.append(bool(b & (0x80 >> j)))
+            return BitString(flags[:len(flags) - unused])
+        if tag_type == ApplicationTag.ENUMERATED.id():
+            return Enumerated(int.from_bytes(data, "big"))
+        if tag_type == ApplicationTag.DATE.id():
+            return Date(data[0] + 1900 if data[0] != 255 else 255, data[1], data[2], data[3])
+        if tag_type == ApplicationTag.TIME.id():
+            return Time(data[0], data[1], data[2], data[3])
+        if tag_type == ApplicationTag.OBJECT_IDENTIFIER.id():
+            return BACnetDecoder.object_identifier(data)
+        return bytes(data)
+
+    @staticmethod
+    def values(data: bytes, offset: int, closing_number: int = None):
+        """
+        Decode sequence of values until closing tag (or end of data if closing_number is None)
+        context tagged primitive values returned as raw bytes, constructed values as lists
+        :return: tuple of (list of values, offset after closing tag)
+        """
+        values = []
+        while offset < len(data):
+            tag, content = BACnetDecoder.tag(data, offset)
+            if tag.closing:
+                if tag.number == closing_number:
+                    return values, content
+                raise ValueError("Unexpected closing tag {} at {}".format(tag.number, offset))
+            if tag.opening:
+                nested, offset = BACnetDecoder.values(data, content, tag.number)
+                values.append(nested)
+                continue
+            if not tag.context and tag.number == ApplicationTag.BOOLEAN.id():
+                values.append(tag.length == 1)
+                offset = content
+                continue
+            raw = data[content:content + tag.length]
+            values.append(bytes(raw) if tag.context else BACnetDecoder.application_value(tag, raw))
+            offset = content + tag.length
+        if closing_number is not None:
+            raise ValueError("Closing tag {} not found".format(closing_number))
+        return values, offset
+
+    @staticmethod
+    def property_value(values: list):
+        """
+        Property with single value returned as is, array or list of values returned as list
+        """
+        return values[0] if len(values) == 1 else values
+
+    @staticmethod
+    def context_unsigned(data: bytes, offset: int, number: int):
+        """
+        :return: tuple of (value or None if tag is absent, offset)
+        """
+        if offset >= len(data):
+            return None, offset
+        tag, content = BACnetDecoder.tag(data, offset)
+        if not tag.context or tag.opening or tag.closing or tag.number != number:
+            return None, offset
+        return BACnetDecoder.unsigned(data[content:content + tag.length]), content + tag.length
+
+    @staticmethod
+    def context_object_identifier(data: bytes, offset: int, number: int):
+        tag, content = BACnetDecoder.tag(data, offset)
+        if not tag.context or tag.number != number or tag.length != 4:
+            raise ValueError("Expected object identifier context tag {} at {}".format(number, offset))
+        return BACnetDecoder.object_identifier(data[content:content + 4]), content + 4
+
+    @staticmethod
+    def bvlc(data: bytes, source):
+        """
+        :return: tuple of (source address, npdu) or None if frame is not BACnet/IP
+        """
+        if len(data) < 4 or data[0] != BVLC_TYPE:
+            return None
+        function = data[1]
+        if function == BVLC_FORWARDED_NPDU and len(data) >= 10:
+            host = "{}.{}.{}.{}".format(data[4], data[5], data[6], data[7])
+            port = struct.unpack_from(">H", data, 8)[0]
+            return (host, port), data[10:]
+        if function in (BVLC_ORIGINAL_UNICAST_NPDU, BVLC_ORIGINAL_BROADCAST_NPDU):
+            return source, data[4:]
+        return None
+
+    @staticmethod
+    def npdu(data: bytes):
+        """
+        :return: apdu bytes or None if npdu is network layer message
+        """
+        if len(data) < 2 or data[0] != NPDU_VERSION:
+            return None
+        control = data[1]
+        offset = 2
+        if control & 0x20:
+            dlen = data[offset + 2]
+            offset += 3 + dlen
+        if control & 0x08:
+            slen = data[offset + 2]
+            offset += 3 + slen
+        if control & 0x20:
+            # hop count
+            offset += 1
+        if control & 0x80:
+            return None
+        return data[offset:]
+
+    @staticmethod
+    def apdu(data: bytes):
+        pdu_type = PduType(data[0] >> 4)
+        segmented = bool(data[0] & 0x08)
+        more_follows = bool(data[0] & 0x04)
+        if pdu_type == PduType.CONFIRMED_REQUEST:
+            offset = 6 if segmented else 4
+            return Apdu(pdu_type, data[offset - 1], data[2], data[offset:], segmented, more_follows,
+                        None, None, None)
+        if pdu_type == PduType.UNCONFIRMED_REQUEST:
+            return Apdu(pdu_type, data[1], None, data[2:], False, False, None, None, None)
+        if pdu_type == PduType.SIMPLE_ACK:
+            return Apdu(pdu_type, data[2], data[1], b"", False, False, None, None, None)
+        if pdu_type == PduType.COMPLEX_ACK:
+            offset = 5 if segmented else 3
+            return Apdu(pdu_type, data[offset - 1], data[1], data[offset:], segmented, more_follows,
+                        None, None, None)
+        if pdu_type == PduType.ERROR:
+            values, _ = BACnetDecoder.values(data, 3)
+            if len(values) > 0 and isinstance(values[0], list):
+                # WritePropertyMultiple error carries error in opening tag 0 and first failed write attempt
+                values = values[0]
+            error_class = int(values[0]) if len(values) > 0 else None
+            error_code = int(values[1]) if len(values) > 1 else None
+            return Apdu(pdu_type, data[2], data[1], data[3:], False, False, error_class, error_code, None)
+        if pdu_type == PduType.REJECT or pdu_type == PduType.ABORT:
+            return Apdu(pdu_type, None, data[1], b"", False, False, None, None, data[2])
+        return Apdu(pdu_type, None, data[1] if len(data) > 1 else None, b"", False, False, None, None, None)
+
+    @staticmethod
+    def frame(data: bytes, source):
+        """
+        Decode BACnet/IP datagram
+        :return: tuple of (source address, Apdu) or None if datagram does not carry APDU
+        """
+        bvlc = BACnetDecoder.bvlc(data, source)
+        if bvlc is None:
+            return None
+        source, npdu = bvlc
+        apdu = BACnetDecoder.npdu(npdu)
+        if apdu is None or len(apdu) == 0:
+            return None
+        return source, BACnetDecoder.apdu(apdu)
+
+    @staticmethod
+    def read_property_request(data: bytes):
+        """
+        :return: tuple of (ObjectIdentifier, property_id, index or None)
+        """
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, 0, 0)
+        property_id, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        index, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        return object_identifier, property_id, index
+
+    @staticmethod
+    def read_property_ack(data: bytes):
+        """
+        :return: tuple of (ObjectIdentifier, property_id, value)
+        """
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, 0, 0)
+        property_id, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        _, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 3:
+            raise ValueError("Expected property value opening tag")
+        values, offset = BACnetDecoder.values(data, offset, 3)
+        return object_identifier, property_id, BACnetDecoder.property_value(values)
+
+    @staticmethod
+    def object_property_reference_ack(data: bytes):
+        """
+        ReadProperty-ACK of BACnetDeviceObjectPropertyReference property (context tagged sequence)
+        :return: ObjectPropertyReference
+        """
+        _, offset = BACnetDecoder.context_object_identifier(data, 0, 0)
+        _, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        _, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 3:
+            raise ValueError("Expected property value opening tag")
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 0)
+        property_id, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        _, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        device_id = None
+        tag, content = BACnetDecoder.tag(data, offset)
+        if tag.context and tag.number == 3 and not tag.closing:
+            device_id = BACnetDecoder.object_identifier(data[content:content + 4]).instance
+        return ObjectPropertyReference(object_identifier.type, object_identifier.instance, property_id, device_id)
+
+    @staticmethod
+    def read_property_multiple_request(data: bytes):
+        """
+        :return: list of (ObjectIdentifier, [(property_id, index or None), ...])
+        """
+        objects = []
+        offset = 0
+        while offset < len(data):
+            object_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 0)
+            tag, offset = BACnetDecoder.tag(data, offset)
+            if not tag.opening or tag.number != 1:
+                raise ValueError("Expected list of property references")
+            properties = []
+            while True:
+                tag, content = BACnetDecoder.tag(data, offset)
+                if tag.closing and tag.number == 1:
+                    offset = content
+                    break
+                property_id, offset = BACnetDecoder.context_unsigned(data, offset, 0)
+                if property_id is None:
+                    raise ValueError("Expected property identifier at {}".format(offset))
+                index, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+                properties.append((property_id, index))
+            objects.append((object_identifier, properties))
+        return objects
+
+    @staticmethod
+    def read_property_multiple_ack(data: bytes):
+        """
+        :return: list of (ObjectIdentifier, [(property_id, index or None, value or BACnetError), ...])
+        """
+        objects = []
+        offset = 0
+        while offset < len(data):
+            object_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 0)
+            tag, offset = BACnetDecoder.tag(data, offset)
+            if not tag.opening or tag.number != 1:
+                raise ValueError("Expected list of results")
+            results = []
+            while True:
+                tag, content = BACnetDecoder.tag(data, offset)
+                if tag.closing and tag.number == 1:
+                    offset = content
+                    break
+                property_id, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+                if property_id is None:
+                    raise ValueError("Expected property identifier at {}".format(offset))
+                index, offset = BACnetDecoder.context_unsigned(data, offset, 3)
+                tag, offset = BACnetDecoder.tag(data, offset)
+                if tag.opening and tag.number == 4:
+                    values, offset = BACnetDecoder.values(data, offset, 4)
+                    results.append((property_id, index, BACnetDecoder.property_value(values)))
+                elif tag.opening and tag.number == 5:
+                    values, offset = BACnetDecoder.values(data, offset, 5)
+                    error_class = int(values[0]) if len(values) > 0 else None
+                    error_code = int(values[1]) if len(values) > 1 else None
+                    results.append((property_id, index, BACnetError(PduType.ERROR, error_class, error_code)))
+                else:
+                    raise ValueError("Expected property value or access error at {}".format(offset))
+            objects.append((object_identifier, results))
+        return objects
+
+    @staticmethod
+    def write_property_request(data: bytes):
+        """
+        :return: tuple of (ObjectIdentifier, property_id, index or None, value, priority or None)
+        """
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, 0, 0)
+        property_id, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        index, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 3:
+            raise ValueError("Expected property value opening tag")
+        values, offset = BACnetDecoder.values(data, offset, 3)
+        priority, offset = BACnetDecoder.context_unsigned(data, offset, 4)
+        return object_identifier, property_id, index, BACnetDecoder.property_value(values), priority
+
+    @staticmethod
+    def write_property_multiple_request(data: bytes):
+        """
+        :return: list of (ObjectIdentifier, [(property_id, index or None, value, priority or None), ...])
+        """
+        objects = []
+        offset = 0
+        while offset < len(data):
+            object_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 0)
+            tag, offset = BACnetDecoder.tag(data, offset)
+            if not tag.opening or tag.number != 1:
+                raise ValueError("Expected list of property values")
+            properties = []
+            while True:
+                tag, content = BACnetDecoder.tag(data, offset)
+                if tag.closing and tag.number == 1:
+                    offset = content
+                    break
+                property_id, offset = BACnetDecoder.context_unsigned(data, offset, 0)
+                if property_id is None:
+                    raise ValueError("Expected property identifier at {}".format(offset))
+                index, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+                tag, offset = BACnetDecoder.tag(data, offset)
+                if not tag.opening or tag.number != 2:
+                    raise ValueError("Expected property value at {}".format(offset))
+                values, offset = BACnetDecoder.values(data, offset, 2)
+                priority, offset = BACnetDecoder.context_unsigned(data, offset, 3)
+                properties.append((property_id, index, BACnetDecoder.property_value(values), priority))
+            objects.append((object_identifier, properties))
+        return objects
+
+    @staticmethod
+    def timestamp(date: Date, time: Time):
+        """
+        :return: POSIX timestamp of BACnetDateTime (local time)
+        """
+        return datetime.datetime(date.year, date.month, date.day, time.hour, time.minute, time.second,
+                                 time.hundredths * 10000).timestamp()
+
+    @staticmethod
+    def read_range_request(data: bytes):
+        """
+        :return: tuple of (ObjectIdentifier, property_id, reference (sequence number or timestamp), count, by_time),
+        reference and count are None if whole list is requested
+        """
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, 0, 0)
+        property_id, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        _, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        if offset >= len(data):
+            return object_identifier, property_id, None, None, False
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number not in (6, 7):
+            raise ValueError("Expected range by sequence number or by time")
+        values, offset = BACnetDecoder.values(data, offset, tag.number)
+        if tag.number == 7:
+            return object_identifier, property_id, BACnetDecoder.timestamp(values[0], values[1]), values[2], True
+        return object_identifier, property_id, values[0], values[1], False
+
+    @staticmethod
+    def log_record(data: bytes, offset: int):
+        """
+        :return: tuple of (LogRecord, offset after record)
+        """
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 0:
+            raise ValueError("Expected log record timestamp at {}".format(offset))
+        values, offset = BACnetDecoder.values(data, offset, 0)
+        timestamp = BACnetDecoder.timestamp(values[0], values[1])
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 1:
+            raise ValueError("Expected log datum at {}".format(offset))
+        tag, content = BACnetDecoder.tag(data, offset)
+        datum = tag.number
+        if tag.opening:
+            # failure or any value
+            value, offset = BACnetDecoder.values(data, content, tag.number)
+        elif datum == LOG_DATUM_BOOLEAN:
+            value = data[content] == 1
+            offset = content + tag.length
+        else:
+            application_tag = log_datum_tag(datum)
+            raw = data[content:content + tag.length]
+            value = BACnetDecoder.application_value(Tag(application_tag.id(), False, tag.length, False, False), raw) \
+                if application_tag is not None else bytes(raw)
+            offset = content + tag.length
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.closing or tag.number != 1:
+            raise ValueError("Expected end of log datum at {}".format(offset))
+        status_flags = None
+        if offset < len(data):
+            tag, content = BACnetDecoder.tag(data, offset)
+            if tag.context and tag.number == 2 and not tag.opening and not tag.closing:
+                status_flags = BACnetDecoder.application_value(
+                    Tag(ApplicationTag.BIT_STRING.id(), False, tag.length, False, False),
+                    data[content:content + tag.length])
+                offset = content + tag.length
+        return LogRecord(timestamp, datum, value, status_flags), offset
+
+    @staticmethod
+    def read_range_ack(data: bytes):
+        """
+        :return: tuple of (ObjectIdentifier, property_id, result flags BitString, [LogRecord, ...],
+        first sequence number or None)
+        """
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, 0, 0)
+        property_id, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        _, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        tag, content = BACnetDecoder.tag(data, offset)
+        if not tag.context or tag.number != 3:
+            raise ValueError("Expected result flags at {}".format(offset))
+        result_flags = BACnetDecoder.application_value(
+            Tag(ApplicationTag.BIT_STRING.id(), False, tag.length, False, False), data[content:content + tag.length])
+        offset = content + tag.length
+        item_count, offset = BACnetDecoder.context_unsigned(data, offset, 4)
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 5:
+            raise ValueError("Expected item data at {}".format(offset))
+        records = []
+        while True:
+            tag, content = BACnetDecoder.tag(data, offset)
+            if tag.closing and tag.number == 5:
+                offset = content
+                break
+            record, offset = BACnetDecoder.log_record(data, offset)
+            records.append(record)
+        if len(records) != item_count:
+            raise ValueError("Item count {} does not match count of records {}".format(item_count, len(records)))
+        first_sequence, offset = BACnetDecoder.context_unsigned(data, offset, 6)
+        return object_identifier, property_id, result_flags, records, first_sequence
+
+    @staticmethod
+    def who_is_request(data: bytes):
+        """
+        :return: tuple of (low limit, high limit), (None, None) if all devices are requested
+        """
+        low, offset = BACnetDecoder.context_unsigned(data, 0, 0)
+        high, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+        return low, high
+
+    @staticmethod
+    def i_am(data: bytes):
+        """
+        :return: tuple of (device ObjectIdentifier, max APDU, segmentation, vendor id)
+        """
+        values, _ = BACnetDecoder.values(data, 0)
+        if len(values) < 4 or not isinstance(values[0], ObjectIdentifier):
+            raise ValueError("Expected I-Am device identifier, max APDU, segmentation and vendor id")
+        return values[0], int(values[1]), int(values[2]), int(values[3])
+
+    @staticmethod
+    def subscribe_cov_request(data: bytes):
+        """
+        :return: tuple of (process id, ObjectIdentifier, confirmed or None, lifetime or None)
+        """
+        process_id, offset = BACnetDecoder.context_unsigned(data, 0, 0)
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 1)
+        confirmed, offset = BACnetDecoder.context_unsigned(data, offset, 2)
+        lifetime, offset = BACnetDecoder.context_unsigned(data, offset, 3)
+        return process_id, object_identifier, bool(confirmed) if confirmed is not None else None, lifetime
+
+    @staticmethod
+    def cov_notification(data: bytes):
+        """
+        :return: tuple of (process id, device ObjectIdentifier, monitored ObjectIdentifier, time remaining,
+        [(property_id, index or None, value), ...])
+        """
+        process_id, offset = BACnetDecoder.context_unsigned(data, 0, 0)
+        device_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 1)
+        object_identifier, offset = BACnetDecoder.context_object_identifier(data, offset, 2)
+        time_remaining, offset = BACnetDecoder.context_unsigned(data, offset, 3)
+        tag, offset = BACnetDecoder.tag(data, offset)
+        if not tag.opening or tag.number != 4:
+            raise ValueError("Expected list of values")
+        values = []
+        while True:
+            tag, content = BACnetDecoder.tag(data, offset)
+            if tag.closing and tag.number == 4:
+                break
+            property_id, offset = BACnetDecoder.context_unsigned(data, offset, 0)
+            if property_id is None:
+                raise ValueError("Expected property identifier at {}".format(offset))
+            index, offset = BACnetDecoder.context_unsigned(data, offset, 1)
+            tag, offset = BACnetDecoder.tag(data, offset)
+            if not tag.opening or tag.number != 2:
+                raise ValueError("Expected property value at {}".format(offset))
+            property_values, offset = BACnetDecoder.values(data, offset, 2)
+            # optional priority
+            _, offset = BACnetDecoder.context_unsigned(data, offset, 3)
+            values.append((property_id, index, BACnetDecoder.property_value(property_values)))
+        return process_id, device_identifier, object_identifier, time_remaining, values
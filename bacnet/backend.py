@@ -0,0 +1,147 @@
+import importlib
+import logging
+from pathlib import Path
+
+
+class ReadBackend:
+    """
+    Device read app (read key of device configuration files) and its capabilities:
+    batch_size - max count of objects per request (0 - as many as fit into device APDU, 1 - object per request),
+    concurrency - max count of concurrent requests to one device,
+    cov - backend supports COV subscriptions,
+    cost - relative cost of one read, the cheapest available backend is selected from candidates,
+    streaming - read_batch takes on_object callback and calls it with each object as soon as it is read
+    """
+    name = None
+    batch_size = 1
+    concurrency = 1
+    cov = False
+    cost = 1.0
+    streaming = False
+
+    def is_available(self, config: dict):
+        """
+        :param config: visiobas_slicer config
+        :return: True if backend can be used in current installation
+        """
+        return True
+
+    def read(self, slicer, device_id: int, object_type: int, object_id: int, fields: list, timeout):
+        """
+        :return: dict of collected data in parse_bacrpm representation or typed values (empty if object failed),
+        values are typed by BACnetSlicer.execute_batch (see BACnetTypedValues)
+        """
+        raise NotImplementedError()
+
+    def read_batch(self, slicer, device_id: int, objects: list, timeout):
+        """
+        :param objects: list of (object type code, object id, fields) fitting batch_size and device APDU
+        :return: dict key - (object type code, object id), value - dict of collected data
+        """
+        result = {}
+        for object_type, object_id, fields in objects:
+            result[(object_type, object_id)] = self.read(slicer, device_id, object_type, object_id, fields, timeout)
+        return result
+
+
+class BacrpBackend(ReadBackend):
+    name = "bacrp"
+    cost = 5.0
+
+    def is_available(self, config: dict):
+        return "bacrp" in config and Path(config["bacrp"]).is_file()
+
+    def read(self, slicer, device_id: int, object_type: int, object_id: int, fields: list, timeout):
+        return slicer.execute_barp(device_id, object_type, object_id, fields, timeout)
+
+
+class BacrpmBackend(ReadBackend):
+    name = "bacrpm"
+    batch_size = 0
+    cost = 2.0
+    streaming = True
+
+    def is_available(self, config: dict):
+        return "bacrpm" in config and Path(config["bacrpm"]).is_file()
+
+    def read(self, slicer, device_id: int, object_type: int, object_id: int, fields: list, timeout):
+        data = {}
+        if slicer.get_capabilities().is_rpm_supported(device_id) or not slicer.execute_bacrp_on_fail_bacrpm:
+            data = slicer.execute_bacrpm(device_id, object_type, object_id, fields, timeout)
+        if len(data) == 0 and slicer.execute_bacrp_on_fail_bacrpm:
+            data = slicer.execute_barp(device_id, object_type, object_id, fields, timeout)
+        return data
+
+    def read_batch(self, slicer, device_id: int, objects: list, timeout, on_object=None):
+        return slicer.execute_bacrpm_batch(device_id, objects, timeout, on_object)
+
+
+class NativeBackend(ReadBackend):
+    name = "native"
+    batch_size = 0
+    concurrency = 4
+    cov = True
+    cost = 1.0
+
+    def read(self, slicer, device_id: int, object_type: int, object_id: int, fields: list, timeout):
+        return slicer.execute_native(device_id, object_type, object_id, fields, timeout)
+
+    def read_batch(self, slicer, device_id: int, objects: list, timeout):
+        return slicer.execute_native_batch(device_id, objects, timeout)
+
+
+class ReadBackendRegistry:
+    """
+    Registered read backends by name
+    """
+
+    def __init__(self):
+        self.backends = {}
+        self.logger = logging.getLogger('bacnet.backend')
+
+    def register(self, backend: ReadBackend):
+        self.backends[backend.name] = backend
+
+    def unregister(self, name: str):
+        self.backends.pop(name, None)
+
+    def get(self, name: str) -> ReadBackend:
+        return self.backends.get(name)
+
+    def load(self, config: dict):
+        """
+        Register backends of config key "read_backends": dict of name -> "module:ClassName"
+        so new backend is plugged in without code change
+        """
+        for name, path in config.get("read_backends", {}).items():
+            try:
+                module_name, class_name = path.split(":")
+                backend = getattr(importlib.import_module(module_name), class_name)()
+                backend.name = name
+                self.register(backend)
+            except Exception:
+                self.logger.exception("Failed load read backend: {} {}".format(name, path))
+
+    def select(self, read_app: str, config: dict):
+        """
+        :param read_app: read key of device configuration files, name of backend
+        or comma separated list of candidates (the cheapest available one is selected)
+        :return: name of selected backend or None if no candidate is registered and available
+        """
+        names = [name.strip() for name in read_app.split(",")]
+        if len(names) == 1:
+            return names[0] if self.get(names[0]) is not None else None
+        candidates = []
+        for name in names:
+            backend = self.get(name)
+            if backend is not None and backend.is_available(config):
+                candidates.append(backend)
+        if len(candidates) == 0:
+            return None
+        return min(candidates, key=lambda b: b.cost).name
+
+
+read_backends = ReadBackendRegistry()
+read_backends.register(BacrpBackend())
+read_backends.register(BacrpmBackend())
+read_backends.register(NativeBackend())
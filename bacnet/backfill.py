@@ -0,0 +1,394 @@
+import datetime
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from bacnet.apdu import BACnetError, PduType, REJECT_UNRECOGNIZED_SERVICE, RESULT_MORE_ITEMS, LOG_DATUM_BOOLEAN, \
+    LOG_DATUM_REAL, LOG_DATUM_ENUMERATED, LOG_DATUM_UNSIGNED, LOG_DATUM_SIGNED
+from bacnet.bacnet import ObjectType, ObjectProperty
+from bacnet.native import BACnetNativeClient
+
+analog_object_types = [ObjectType.ANALOG_INPUT.code(), ObjectType.ANALOG_OUTPUT.code(),
+                       ObjectType.ANALOG_VALUE.code()]
+
+binary_object_types = [ObjectType.BINARY_INPUT.code(), ObjectType.BINARY_OUTPUT.code(),
+                       ObjectType.BINARY_VALUE.code()]
+
+# log records carrying sampled value, records of log status, failure and time change are skipped
+sampled_datums = [LOG_DATUM_BOOLEAN, LOG_DATUM_REAL, LOG_DATUM_ENUMERATED, LOG_DATUM_UNSIGNED, LOG_DATUM_SIGNED]
+
+# key of sample time in historic data pushed to server
+TIMESTAMP = "timestamp"
+
+# approximate size of log record of real value with status flags in ReadRange-ACK
+LOG_RECORD_SIZE = 24
+
+
+class RateLimiter:
+    """
+    Token bucket: rate tokens per second, at most burst tokens saved up
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, stop_event: threading.Event = None):
+        """
+        Wait for token
+        :return: False if stop_event is set while waiting
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+
+class BACnetBackfill:
+    """
+    Backfill of values missed while device or gateway was down:
+    trend-log objects of device logging present value of collected objects are read by ReadRange
+    in pages sized to APDU of device over missed window and historic samples are pushed to server in bulk,
+    ReadRange requests are sent one by one from own thread and rate limited so backfill never starves polling
+    """
+
+    def __init__(self, client: BACnetNativeClient, gate_client, config: dict, capabilities=None):
+        """
+        :param gate_client: VisiobasGateClient receiving historic samples (rq_put_history)
+        :param config: visiobas_slicer config, key "backfill" holds settings of backfill:
+        rate - max count of ReadRange requests per second, burst - max count of requests sent at once,
+        page_size - max count of records per ReadRange request (reduced to APDU of device without segmentation),
+        min_window - shorter outages are not backfilled (sec), max_window - max backfilled time before recovery (sec),
+        put_size - max count of samples per put request,
+        retries - count of repeated backfill of failed window, retry_interval - delay of first repeat (sec)
+        doubled on each next one,
+        heartbeat_interval - interval of saving heartbeat of gateway (sec), state - file of saved heartbeat
+        (default backfill_state.json next to address_cache), gateway outage is window from saved heartbeat
+        to start of backfill
+        :param capabilities: BACnetCapabilityCache learning devices not supporting ReadRange
+        """
+        settings = config.get("backfill", {})
+        self.client = client
+        self.gate_client = gate_client
+        self.capabilities = capabilities
+        self.page_size = settings.get("page_size", 200)
+        self.min_window = settings.get("min_window", 0)
+        self.max_window = settings.get("max_window", 86400)
+        self.put_size = settings.get("put_size", 1000)
+        self.heartbeat_interval = settings.get("heartbeat_interval", 60)
+        self.timeout = settings.get("timeout", config.get("read_timeout", 5))
+        self.retries = settings.get("retries", 3)
+        self.retry_interval = settings.get("retry_interval", 30)
+        state = settings.get("state")
+        if state is None and "address_cache" in config:
+            state = Path(config["address_cache"]).parent / "backfill_state.json"
+        self.state_path = Path(state) if state is not None else None
+        self.limiter = RateLimiter(settings.get("rate", 2), settings.get("burst", 1))
+        self.logger = logging.getLogger('bacnet.backfill')
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.running = False
+        # key - device id, value - max APDU of device
+        self.devices = {}
+        # key - device id, value - sorted list of [start, end] missed windows
+        self.windows = {}
+        # key - device id, value - dict of (object type code, object id) -> trend-log id
+        self.trend_logs = {}
+        # failed windows sorted by retry time: [retry time, device id, start, end, attempts,
+        # set of (object type code, object id) of trend-logs backfilled already]
+        self.failed = []
+        self.statistic = {"windows": 0, "requests": 0, "samples": 0, "failed": 0}
+
+    def add_device(self, device_id: int, host: str, port: int, apdu: int = 480):
+        """
+        Backfill missed windows of device
+        """
+        self.devices[device_id] = apdu
+        if self.client.get_device_address(device_id) is None:
+            self.client.set_device_address(device_id, host, port)
+
+    def remove_device(self, device_id: int):
+        with self.condition:
+            self.devices.pop(device_id, None)
+            self.windows.pop(device_id, None)
+            self.trend_logs.pop(device_id, None)
+            self.failed = [window for window in self.failed if window[1] != device_id]
+
+    def schedule(self, device_id: int, start: float, end: float):
+        """
+        Schedule backfill of values of device missed between start and end,
+        signature matches recovery listener of DeviceHealthRegistry
+        """
+        if device_id not in self.devices or end - start < self.min_window:
+            return
+        if self.capabilities is not None and self.capabilities.get(device_id, "read_range") is False:
+            return
+        start = max(start, end - self.max_window)
+        with self.condition:
+            windows = self.windows.setdefault(device_id, [])
+            windows.append([start, end])
+            windows.sort()
+            merged = [windows[0]]
+            for window in windows[1:]:
+                if window[0] <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], window[1])
+                else:
+                    merged.append(window)
+            self.windows[device_id] = merged
+            self.condition.notify_all()
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Device: {} backfill scheduled: {} - {}".format(
+                device_id, datetime.datetime.fromtimestamp(start), datetime.datetime.fromtimestamp(end)))
+
+    def start(self):
+        """
+        Start backfill thread, values missed by all devices since saved heartbeat of gateway are backfilled
+        """
+        heartbeat = self.load_heartbeat()
+        now = time.time()
+        if heartbeat is not None:
+            for device_id in self.devices:
+                self.schedule(device_id, heartbeat, now)
+        self.save_heartbeat(now)
+        self.thread = threading.Thread(target=self.run, name="bacnet-backfill", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def join(self, timeout: float = None):
+        """
+        Wait until all scheduled windows are backfilled
+        :return: True if nothing is scheduled
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.condition:
+            while len(self.windows) > 0 or len(self.failed) > 0 or self.running:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def load_heartbeat(self):
+        if self.state_path is None or not self.state_path.is_file():
+            return None
+        try:
+            return json.loads(self.state_path.read_text()).get("heartbeat")
+        except Exception:
+            self.logger.exception("Failed load backfill state: {}".format(self.state_path))
+            return None
+
+    def save_heartbeat(self, heartbeat: float):
+        if self.state_path is None:
+            return
+        try:
+            tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+            tmp_path.write_text(json.dumps({"heartbeat": heartbeat}))
+            tmp_path.replace(self.state_path)
+        except Exception:
+            self.logger.exception("Failed save backfill state: {}".format(self.state_path))
+
+    def run(self):
+        last_heartbeat = time.time()
+        while not self.stop_event.is_set():
+            window = None
+            with self.condition:
+                now = time.time()
+                if len(self.windows) > 0:
+                    device_id = next(iter(self.windows))
+                    start, end = self.windows[device_id].pop(0)
+                    if len(self.windows[device_id]) == 0:
+                        del self.windows[device_id]
+                    window = [device_id, start, end, 0, set()]
+                elif len(self.failed) > 0 and self.failed[0][0] <= now:
+                    window = self.failed.pop(0)[1:]
+                else:
+                    timeout = self.heartbeat_interval
+                    if len(self.failed) > 0:
+                        timeout = min(timeout, self.failed[0][0] - now)
+                    self.condition.wait(timeout)
+                if window is not None:
+                    self.running = True
+            if time.time() - last_heartbeat >= self.heartbeat_interval:
+                last_heartbeat = time.time()
+                self.save_heartbeat(last_heartbeat)
+            if window is None:
+                continue
+            device_id, start, end, attempts, done = window
+            try:
+                count = self.backfill(device_id, start, end, done)
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Device: {} backfilled samples: {}".format(device_id, count))
+            except Exception as e:
+                self.statistic["failed"] += 1
+                self.retry(device_id, start, end, attempts + 1, done, e)
+            finally:
+                with self.condition:
+                    self.running = False
+                    self.condition.notify_all()
+
+    def retry(self, device_id: int, start: float, end: float, attempts: int, done: set, error: Exception):
+        """
+        Schedule failed window again with doubled delay, trend-logs pushed already are not read again,
+        window is dropped after retries attempts
+        """
+        error = error if str(error) else type(error).__name__
+        with self.condition:
+            retry = attempts <= self.retries and device_id in self.devices and \
+                    (self.capabilities is None or self.capabilities.get(device_id, "read_range") is not False)
+            if retry:
+                delay = self.retry_interval * 2 ** (attempts - 1)
+                self.failed.append([time.time() + delay, device_id, start, end, attempts, done])
+                self.failed.sort(key=lambda window: window[0])
+        if retry:
+            self.logger.warning("Failed backfill device: {} {}, repeat in {} sec".format(device_id, error, delay))
+        else:
+            self.logger.warning("Failed backfill device: {} {}, window dropped: {} - {}".format(
+                device_id, error, datetime.datetime.fromtimestamp(start), datetime.datetime.fromtimestamp(end)))
+
+    def backfill(self, device_id: int, start: float, end: float, done: set = None):
+        """
+        Read trend-log records of device between start and end and push them to server,
+        samples read before failure are pushed too
+        :param done: (object type code, object id) of trend-logs pushed already, updated by pushed trend-logs
+        :return: count of pushed samples
+        """
+        self.statistic["windows"] += 1
+        done = done if done is not None else set()
+        samples = []
+        # trend-logs of samples
+        read = []
+        count = 0
+        try:
+            for (object_type, object_id), log_id in self.get_trend_logs(device_id).items():
+                if self.stop_event.is_set():
+                    break
+                if (object_type, object_id) in done:
+                    continue
+                samples += self.read_window(device_id, log_id, object_type, object_id, start, end)
+                read.append((object_type, object_id))
+                while len(samples) >= self.put_size:
+                    count += self.push(device_id, samples[:self.put_size])
+                    samples = samples[self.put_size:]
+        finally:
+            if len(samples) > 0:
+                count += self.push(device_id, samples)
+            done.update(read)
+        return count
+
+    def get_trend_logs(self, device_id: int):
+        """
+        :return: dict of (object type code, object id) -> id of trend-log logging present value of object
+        """
+        if device_id in self.trend_logs:
+            return self.trend_logs[device_id]
+        self.__acquire()
+        object_list = self.client.run(self.client.read_object_list_async(device_id, self.timeout))
+        trend_logs = {}
+        for object_identifier in object_list:
+            if object_identifier.type != ObjectType.TREND_LOG.code():
+                continue
+            self.__acquire()
+            reference = self.client.run(self.client.read_object_property_reference_async(
+                device_id, ObjectType.TREND_LOG, object_identifier.instance,
+                ObjectProperty.LOG_DEVICE_OBJECT_PROPERTY.id(), self.timeout))
+            if str(reference.property_id) == ObjectProperty.PRESENT_VALUE.id() and \
+                    reference.device_id in (None, device_id):
+                trend_logs[(reference.object_type, reference.object_id)] = object_identifier.instance
+        self.trend_logs[device_id] = trend_logs
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Device: {} trend-logs of present value: {}".format(device_id, len(trend_logs)))
+        return trend_logs
+
+    def get_page_size(self, device_id: int):
+        if self.capabilities is not None and self.capabilities.get(device_id, "segmentation"):
+            return self.page_size
+        return max(1, min(self.page_size, (self.devices.get(device_id, 480) - 32) // LOG_RECORD_SIZE))
+
+    def read_window(self, device_id: int, log_id: int, object_type: int, object_id: int, start: float,
+                    end: float):
+        """
+        Read records of trend-log logged after start up to end, first page by time, next pages by sequence number
+        :return: list of samples in server format
+        """
+        page_size = self.get_page_size(device_id)
+        reference, by_time = start, True
+        samples = []
+        while not self.stop_event.is_set():
+            self.__acquire()
+            try:
+                result_flags, records, first_sequence = self.client.run(self.client.read_range_async(
+                    device_id, ObjectType.TREND_LOG, log_id, reference, page_size, self.timeout, by_time))
+            except BACnetError as e:
+                if e.pdu_type == PduType.ABORT and page_size > 1:
+                    page_size //= 2
+                    continue
+                if e.pdu_type == PduType.REJECT and e.reason == REJECT_UNRECOGNIZED_SERVICE and \
+                        self.capabilities is not None:
+                    self.capabilities.set(device_id, "read_range", False)
+                raise
+            self.statistic["requests"] += 1
+            samples += [self.sample(object_type, object_id, r) for r in records
+                        if start < r.timestamp <= end and r.datum in sampled_datums]
+            if len(records) == 0 or not result_flags[RESULT_MORE_ITEMS] or records[-1].timestamp > end or \
+                    first_sequence is None:
+                break
+            reference, by_time = first_sequence + len(records), False
+        return samples
+
+    @staticmethod
+    def sample(object_type: int, object_id: int, record):
+        """
+        :return: log record as historic sample in format of put request
+        """
+        if object_type in analog_object_types:
+            value = float(record.value)
+        elif object_type in binary_object_types:
+            value = "active" if record.value else "inactive"
+        else:
+            value = int(record.value)
+        sample = {
+            ObjectProperty.OBJECT_TYPE.id(): ObjectType.code_to_name(object_type),
+            ObjectProperty.OBJECT_IDENTIFIER.id(): object_id,
+            ObjectProperty.PRESENT_VALUE.id(): value,
+            TIMESTAMP: datetime.datetime.fromtimestamp(record.timestamp, datetime.timezone.utc).isoformat()
+        }
+        if record.status_flags is not None:
+            sample[ObjectProperty.STATUS_FLAGS.id()] = list(record.status_flags)
+        return sample
+
+    def push(self, device_id: int, samples: list):
+        """
+        :return: count of samples accepted by server
+        """
+        rejected = self.gate_client.rq_put_history(device_id, samples)
+        for o in rejected:
+            self.logger.error("Rejected: {}".format(o))
+        count = len(samples) - len(rejected)
+        self.statistic["samples"] += count
+        return count
+
+    def __acquire(self):
+        if not self.limiter.acquire(self.stop_event):
+            raise InterruptedError("Backfill stopped")
@@ -781,6 +781,66 @@ class ObjectType(enum.Enum):
         return None
 
 
+class BinaryPV(str, enum.Enum):
+    """
+    Present value of binary object, compares and serializes as its name ("active" / "inactive")
+    """
+    INACTIVE = "inactive"
+    ACTIVE = "active"
+
+    def __str__(self):
+        return self.value
+
+    def code(self):
+        return 1 if self is BinaryPV.ACTIVE else 0
+
+    @staticmethod
+    def from_value(value):
+        """
+        :param value: name, bool or number 0 / 1
+        :raise ValueError: value is not binary present value
+        """
+        if isinstance(value, BinaryPV):
+            return value
+        if type(value) == bool:
+            return BinaryPV.ACTIVE if value else BinaryPV.INACTIVE
+        if type(value) == str and not value[:1].isdigit():
+            return BinaryPV(value)
+        code = float(value)
+        if code not in (0, 1):
+            raise ValueError("Not binary present value: {}".format(value))
+        return BinaryPV.ACTIVE if code == 1 else BinaryPV.INACTIVE
+
+
+class Reliability(enum.IntEnum):
+    NO_FAULT_DETECTED = 0
+    NO_SENSOR = 1
+    OVER_RANGE = 2
+    UNDER_RANGE = 3
+    OPEN_LOOP = 4
+    SHORTED_LOOP = 5
+    NO_OUTPUT = 6
+    UNRELIABLE_OTHER = 7
+    PROCESS_ERROR = 8
+    MULTI_STATE_FAULT = 9
+    CONFIGURATION_ERROR = 10
+    MEMBER_FAULT = 11
+    COMMUNICATION_FAILURE = 12
+
+    @staticmethod
+    def from_value(value):
+        """
+        :param value: name (no-fault-detected ...) or code
+        :return: Reliability, code of proprietary reliability or UNRELIABLE_OTHER if name is unknown
+        """
+        if isinstance(value, Reliability):
+            return value
+        if type(value) == str and not value[:1].isdigit():
+            return Reliability.__members__.get(value.upper().replace("-", "_"), Reliability.UNRELIABLE_OTHER)
+        code = int(float(value))
+        return Reliability(code) if code in Reliability._value2member_map_ else code
+
+
 class StatusFlags:
     def __init__(self, status_flags: list = None) -> None:
         self.in_alarm = False
@@ -788,7 +848,7 @@ class StatusFlags:
         self.overridden = False
         self.out_of_service = False
 
-        if status_flags is not None and type(status_flags) is list:
+        if status_flags is not None and type(status_flags) in (list, tuple):
             try:
                 self.in_alarm = status_flags[0]
                 self.fault = status_flags[1]
@@ -0,0 +1,104 @@
+import json
+import logging
+import threading
+from pathlib import Path
+
+
+class BACnetCapabilityCache:
+    """
+    Services supported by devices learned at runtime:
+    rpm - device supports ReadPropertyMultiple (None - unknown),
+    max_apdu - largest response device sends without abort (None - unknown),
+    segmentation - device supports segmented response (None - unknown),
+    persisted into JSON file next to address_cache so read strategy is right on the first read after restart
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: file of cache, None - cache is not persisted
+        """
+        self.path = Path(path) if path is not None else None
+        self.logger = logging.getLogger('bacnet.capability')
+        self.lock = threading.Lock()
+        # key - device id, value - dict of capabilities
+        self.devices = {}
+        self.load()
+
+    def load(self):
+        if self.path is None or not self.path.is_file():
+            return
+        try:
+            devices = json.loads(self.path.read_text())
+            self.devices = {int(device_id): capabilities for device_id, capabilities in devices.items()}
+        except Exception:
+            self.logger.exception("Failed load capability cache: {}".format(self.path))
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(json.dumps({str(k): v for k, v in self.devices.items()}, indent=2, sort_keys=True))
+            tmp_path.replace(self.path)
+        except Exception:
+            self.logger.exception("Failed save capability cache: {}".format(self.path))
+
+    def get(self, device_id: int, capability: str):
+        with self.lock:
+            return self.devices.get(device_id, {}).get(capability)
+
+    def set(self, device_id: int, capability: str, value):
+        with self.lock:
+            capabilities = self.devices.setdefault(device_id, {})
+            if capabilities.get(capability) == value:
+                return
+            capabilities[capability] = value
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Device: {} {}: {}".format(device_id, capability, value))
+            self.save()
+
+    def is_rpm_supported(self, device_id: int):
+        """
+        :return: False only if device is known to reject ReadPropertyMultiple
+        """
+        return self.get(device_id, "rpm") is not False
+
+    def set_rpm_supported(self, device_id: int, supported: bool):
+        self.set(device_id, "rpm", supported)
+
+    def get_max_apdu(self, device_id: int):
+        return self.get(device_id, "max_apdu")
+
+    def reduce_max_apdu(self, device_id: int, apdu: int):
+        """
+        Response of apdu length is aborted by device, keep max apdu below it
+        """
+        max_apdu = self.get_max_apdu(device_id)
+        if max_apdu is None or apdu < max_apdu:
+            self.set(device_id, "max_apdu", apdu)
+
+    def set_segmentation_supported(self, device_id: int, supported: bool):
+        self.set(device_id, "segmentation", supported)
+
+
+__shared_caches = {}
+__shared_lock = threading.Lock()
+
+
+def shared_cache(config: dict):
+    """
+    Single capability cache per file shared between all collectors
+    :param config: visiobas_slicer config, key "capability_cache" - path of cache file
+    (default capability_cache.json next to address_cache)
+    """
+    path = config.get("capability_cache")
+    if path is None and "address_cache" in config:
+        path = Path(config["address_cache"]).parent / "capability_cache.json"
+    if path is None:
+        return BACnetCapabilityCache()
+    with __shared_lock:
+        cache = __shared_caches.get(str(path))
+        if cache is None:
+            cache = BACnetCapabilityCache(path)
+            __shared_caches[str(path)] = cache
+        return cache
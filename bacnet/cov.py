@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+import time
+
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, BACnetError, ConfirmedService, UnconfirmedService, PduType, \
+    REJECT_UNRECOGNIZED_SERVICE
+from bacnet.native import BACnetNativeClient, BACnetValueFormatter
+
+
+class BACnetCOVSubscriber:
+    """
+    COV subscriptions of objects served by in process BACnet/IP client
+    subscription is renewed renew_margin seconds before its lifetime expires,
+    values of COV notifications are passed to subscription callback in parse_bacrpm representation
+    """
+
+    def __init__(self, client: BACnetNativeClient, config: dict, capabilities=None):
+        """
+        :param config: visiobas_slicer config, key "cov" holds settings of subscriptions:
+        process_id - subscriber process identifier,
+        lifetime - default subscription lifetime (sec),
+        renew_margin - seconds before subscription expiration to renew it,
+        confirmed - request confirmed COV notifications,
+        concurrency - max count of concurrent SubscribeCOV requests to one device
+        :param capabilities: BACnetCapabilityCache learning devices not supporting SubscribeCOV
+        """
+        settings = config.get("cov", {})
+        self.client = client
+        self.capabilities = capabilities
+        self.concurrency = settings.get("concurrency", 16)
+        self.process_id = settings.get("process_id", 1)
+        self.lifetime = settings.get("lifetime", 300)
+        self.renew_margin = settings.get("renew_margin", 30)
+        self.confirmed = settings.get("confirmed", False)
+        self.timeout = config.get("read_timeout", 5)
+        self.logger = logging.getLogger('bacnet.cov')
+        self.lock = threading.Lock()
+        # key - (device id, object type code, object id), value - dict of callback, lifetime, expires
+        self.subscriptions = {}
+        self.client.add_request_handler(self.handle_request)
+
+    def subscribe_many(self, device_id: int, objects: list, callback, lifetime: int = None):
+        """
+        Subscribe COV notifications of objects of one device concurrently
+        :param objects: list of (object type code, object id)
+        :param callback: callable(object_type_code, object_id, data) called on each COV notification
+        :param lifetime: subscription lifetime (sec), default from config
+        :return: list of bool - object is subscribed
+        """
+        lifetime = lifetime if lifetime is not None else self.lifetime
+        # registered before request as device sends initial notification right after acknowledge
+        with self.lock:
+            for object_type, object_id in objects:
+                self.subscriptions[(device_id, object_type, object_id)] = {
+                    "callback": callback,
+                    "lifetime": lifetime,
+                    "expires": time.time() + lifetime
+                }
+
+        async def subscribe_all():
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def subscribe_one(object_type, object_id):
+                async with semaphore:
+                    await self.client.subscribe_cov_async(device_id, self.process_id, object_type, object_id,
+                                                          self.confirmed, lifetime, self.timeout)
+
+            requests = [subscribe_one(object_type, object_id) for object_type, object_id in objects]
+            return await asyncio.gather(*requests, return_exceptions=True)
+
+        subscribed = []
+        for (object_type, object_id), result in zip(objects, self.client.run(subscribe_all())):
+            if isinstance(result, BACnetError) and result.pdu_type == PduType.REJECT and \
+                    result.reason == REJECT_UNRECOGNIZED_SERVICE and self.capabilities is not None:
+                self.capabilities.set(device_id, "cov", False)
+            if isinstance(result, Exception):
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("Device: {} object: ({}, {}) COV subscription failed: {}".format(
+                        device_id, object_type, object_id, result if str(result) else type(result).__name__))
+                with self.lock:
+                    self.subscriptions.pop((device_id, object_type, object_id), None)
+                subscribed.append(False)
+                continue
+            subscribed.append(True)
+        return subscribed
+
+    def subscribe(self, device_id: int, object_type: int, object_id: int, callback, lifetime: int = None):
+        return self.subscribe_many(device_id, [(object_type, object_id)], callback, lifetime)[0]
+
+    def unsubscribe(self, device_id: int, object_type: int, object_id: int):
+        with self.lock:
+            subscription = self.subscriptions.pop((device_id, object_type, object_id), None)
+        if subscription is None:
+            return
+        try:
+            self.client.subscribe_cov(device_id, self.process_id, object_type, object_id, self.confirmed, None,
+                                      self.timeout)
+        except (BACnetError, asyncio.TimeoutError) as e:
+            self.logger.warning("Device: {} object: ({}, {}) failed cancel COV subscription: {}".format(
+                device_id, object_type, object_id, e))
+
+    def is_subscribed(self, device_id: int, object_type: int, object_id: int):
+        return (device_id, object_type, object_id) in self.subscriptions
+
+    def is_cov_supported(self, device_id: int):
+        """
+        :return: False only if device is known to reject SubscribeCOV
+        """
+        return self.capabilities is None or self.capabilities.get(device_id, "cov") is not False
+
+    def renew(self, device_ids=None):
+        """
+        Renew subscriptions expiring in renew_margin
+        :param device_ids: renew subscriptions of these devices only (None - all devices)
+        :return: list of (device id, object type code, object id) of subscriptions failed to renew (removed)
+        """
+        now = time.time()
+        with self.lock:
+            expiring = [(key, s) for key, s in self.subscriptions.items()
+                        if s["expires"] - now <= self.renew_margin and (device_ids is None or key[0] in device_ids)]
+        # key - (device id, callback, lifetime), value - list of objects
+        groups = {}
+        for (device_id, object_type, object_id), subscription in expiring:
+            groups.setdefault((device_id, subscription["callback"], subscription["lifetime"]), []).append(
+                (object_type, object_id))
+        failed = []
+        for (device_id, callback, lifetime), objects in groups.items():
+            for (object_type, object_id), subscribed in zip(objects, self.subscribe_many(device_id, objects, callback,
+                                                                                       lifetime)):
+                if not subscribed:
+                    failed.append((device_id, object_type, object_id))
+        if len(failed) > 0:
+            self.logger.warning("Failed renew {} COV subscriptions".format(len(failed)))
+        return failed
+
+    def handle_request(self, source, apdu):
+        if apdu.pdu_type == PduType.CONFIRMED_REQUEST and \
+                apdu.service == ConfirmedService.CONFIRMED_COV_NOTIFICATION.id():
+            self.client.send(BACnetEncoder.simple_ack(apdu.invoke_id, ConfirmedService.CONFIRMED_COV_NOTIFICATION),
+                             source)
+        elif not (apdu.pdu_type == PduType.UNCONFIRMED_REQUEST and
+                  apdu.service == UnconfirmedService.UNCONFIRMED_COV_NOTIFICATION.id()):
+            return
+        process_id, device_identifier, object_identifier, time_remaining, values = \
+            BACnetDecoder.cov_notification(apdu.payload)
+        if process_id != self.process_id:
+            return
+        subscription = self.subscriptions.get((device_identifier.instance, object_identifier.type,
+                                               object_identifier.instance))
+        if subscription is None:
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("COV notification of not subscribed object: {} {}".format(
+                    device_identifier, object_identifier))
+            return
+        data = BACnetValueFormatter.format(object_identifier.type, values)
+        subscription["callback"](object_identifier.type, object_identifier.instance, data)
+
+
+__shared_subscriber = None
+__shared_lock = threading.Lock()
+
+
+def shared_subscriber(client: BACnetNativeClient, config: dict, capabilities=None):
+    """
+    Single COV subscriber per process, notifications are received by shared native client socket
+    """
+    global __shared_subscriber
+    with __shared_lock:
+        if __shared_subscriber is None:
+            __shared_subscriber = BACnetCOVSubscriber(client, config, capabilities)
+        return __shared_subscriber
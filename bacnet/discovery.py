@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import socket
+
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, UnconfirmedService, PduType, SEGMENTATION_BOTH, \
+    SEGMENTATION_TRANSMIT
+from bacnet.native import BACnetNativeClient
+from bacnet.writer import BACnetWriter
+
+MAX_DEVICE_ID = 4194303
+
+
+class BACnetDiscoveryState:
+    """
+    Devices answered and ranges requested by one discover call, concurrent discover calls do not share them
+    """
+
+    def __init__(self):
+        # key - device id, value - dict of id, host, port, apdu, segmentation, vendor_id
+        self.devices = {}
+        # list of [low, high, count of answered devices, time of last I-Am] of requested ranges
+        self.ranges = []
+
+
+class BACnetDiscovery:
+    """
+    Discovery of devices by Who-Is broadcast of in process BACnet/IP client
+    Who-Is ranges are requested concurrently, range is done when all its devices answered,
+    no I-Am is received for quiet seconds or timeout expires,
+    expected devices not answered broadcast are requested again by directed Who-Is
+    """
+
+    def __init__(self, client: BACnetNativeClient, config: dict, capabilities=None):
+        """
+        :param config: visiobas_slicer config, key "discovery" holds settings of discovery:
+        host, port - Who-Is destination (broadcast address of BACnet/IP network),
+        range_size - max count of device ids per Who-Is request (0 - range is not split),
+        concurrency - max count of concurrently requested ranges,
+        timeout - max wait of I-Am replies per range (sec),
+        quiet - range is done if no I-Am is received during quiet seconds,
+        retries - count of repeated Who-Is for expected devices not answered,
+        receive_buffer - size of socket receive buffer holding burst of I-Am replies
+        :param capabilities: BACnetCapabilityCache learning segmentation support of devices
+        """
+        settings = config.get("discovery", {})
+        self.client = client
+        self.capabilities = capabilities
+        self.address = (settings.get("host", "255.255.255.255"), settings.get("port", 47808))
+        self.range_size = settings.get("range_size", 0)
+        self.concurrency = settings.get("concurrency", 4)
+        self.timeout = settings.get("timeout", 5)
+        self.quiet = settings.get("quiet", 1)
+        self.retries = settings.get("retries", 2)
+        self.receive_buffer = settings.get("receive_buffer", 4 * 1024 * 1024)
+        self.logger = logging.getLogger('bacnet.discovery')
+
+    def split(self, ranges: list):
+        """
+        :param ranges: list of (low, high) device id ranges
+        :return: ranges split by range_size
+        """
+        if self.range_size <= 0:
+            return list(ranges)
+        result = []
+        for low, high in ranges:
+            for start in range(low, high + 1, self.range_size):
+                result.append((start, min(start + self.range_size - 1, high)))
+        return result
+
+    @staticmethod
+    def contiguous(device_ids: list):
+        """
+        :return: list of (low, high) ranges covering sorted device ids
+        """
+        ranges = []
+        for device_id in sorted(device_ids):
+            if len(ranges) > 0 and ranges[-1][1] + 1 == device_id:
+                ranges[-1] = (ranges[-1][0], device_id)
+            else:
+                ranges.append((device_id, device_id))
+        return ranges
+
+    def discover(self, ranges: list = None, expected: list = None):
+        """
+        :param ranges: list of (low, high) device id ranges (None - all devices)
+        :param expected: device ids known to exist (server devices), requested again if not answered
+        :return: list of discovered devices dict of id, host, port, apdu, segmentation, vendor_id sorted by id
+        """
+        self.__set_receive_buffer()
+        ranges = ranges if ranges is not None else [(0, MAX_DEVICE_ID)]
+        state = BACnetDiscoveryState()
+
+        def handle_request(source, apdu):
+            self.handle_request(state, source, apdu)
+
+        self.client.add_request_handler(handle_request)
+        try:
+            self.client.run(self.__who_is_all(state, self.split(ranges)))
+            for _ in range(self.retries):
+                missing = [device_id for device_id in (expected or []) if device_id not in state.devices]
+                if len(missing) == 0:
+                    break
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Repeat Who-Is of {} not answered devices".format(len(missing)))
+                self.client.run(self.__who_is_all(state, self.contiguous(missing)))
+        finally:
+            self.client.remove_request_handler(handle_request)
+        devices = [state.devices[device_id] for device_id in sorted(state.devices)
+                   if any(low <= device_id <= high for low, high in ranges)]
+        if self.capabilities is not None:
+            for device in devices:
+                self.capabilities.set_segmentation_supported(
+                    device["id"], device["segmentation"] in (SEGMENTATION_BOTH, SEGMENTATION_TRANSMIT))
+        return devices
+
+    @staticmethod
+    def write(devices: list, path):
+        BACnetWriter.write_bacwi(devices, str(path))
+
+    async def __who_is_all(self, state: BACnetDiscoveryState, ranges: list):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def who_is_one(low, high):
+            async with semaphore:
+                await self.__who_is(state, low, high)
+
+        await asyncio.gather(*[who_is_one(low, high) for low, high in ranges])
+
+    async def __who_is(self, state: BACnetDiscoveryState, low: int, high: int):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        requested = [low, high, sum(1 for device_id in state.devices if low <= device_id <= high), start]
+        state.ranges.append(requested)
+        try:
+            frame = BACnetEncoder.unconfirmed_request(UnconfirmedService.WHO_IS, BACnetEncoder.who_is(low, high),
+                                                      broadcast=True)
+            self.client.send(frame, self.address)
+            while requested[2] < high - low + 1:
+                now = loop.time()
+                if now - start >= self.timeout or now - requested[3] >= self.quiet:
+                    break
+                await asyncio.sleep(min(0.05, self.quiet))
+        finally:
+            state.ranges.remove(requested)
+
+    def handle_request(self, state: BACnetDiscoveryState, source, apdu):
+        if apdu.pdu_type != PduType.UNCONFIRMED_REQUEST or apdu.service != UnconfirmedService.I_AM.id():
+            return
+        device_identifier, max_apdu, segmentation, vendor_id = BACnetDecoder.i_am(apdu.payload)
+        device_id = device_identifier.instance
+        self.client.set_device_address(device_id, source[0], source[1])
+        if device_id in state.devices:
+            return
+        state.devices[device_id] = {
+            "id": device_id,
+            "host": source[0],
+            "port": source[1],
+            "apdu": max_apdu,
+            "segmentation": segmentation,
+            "vendor_id": vendor_id
+        }
+        now = asyncio.get_event_loop().time()
+        for requested in state.ranges:
+            if requested[0] <= device_id <= requested[1]:
+                requested[2] += 1
+                requested[3] = now
+
+    def __set_receive_buffer(self):
+        sock = self.client.transport.get_extra_info("socket") if self.client.transport is not None else None
+        if sock is None:
+            return
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        except OSError:
+            self.logger.warning("Failed set receive buffer of BACnet/IP socket")
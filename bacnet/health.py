@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class DeviceHealth:
+    """
+    Read timeout and circuit breaker of one device
+    timeout is derived from smoothed round trip time and its variance (RFC 6298 estimator),
+    breaker is opened after failure_threshold failed reads in a row,
+    opened breaker lets one probe read after backoff, backoff is doubled on each failed probe
+    """
+
+    def __init__(self, device_id: int, settings: dict, on_recovered=None):
+        """
+        :param on_recovered: callable(device_id, last success time, recovery time) called when device
+        responds again after breaker was opened
+        """
+        self.device_id = device_id
+        self.on_recovered = on_recovered
+        self.min_timeout = settings.get("min_timeout", 0.5)
+        self.max_timeout = settings.get("max_timeout", 5)
+        self.failure_threshold = settings.get("failure_threshold", 1)
+        self.backoff_initial = settings.get("backoff_initial", 10)
+        self.backoff_max = settings.get("backoff_max", 300)
+        self.srtt = None
+        self.rttvar = None
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = self.backoff_initial
+        self.open_until = 0
+        self.last_success = None
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger('bacnet.health')
+
+    def timeout(self):
+        """
+        :return: timeout of next read (sec)
+        """
+        if self.srtt is None:
+            return self.max_timeout
+        return min(max(self.srtt + 4 * self.rttvar, self.min_timeout), self.max_timeout)
+
+    def allow_request(self):
+        """
+        :return: True if device can be read now (half-open breaker allows one probe read)
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() >= self.open_until:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def next_request(self):
+        """
+        :return: time after which device can be read (probe read of opened breaker)
+        """
+        return self.open_until if self.state == OPEN else 0
+
+    def is_probe(self):
+        return self.state == HALF_OPEN
+
+    def is_responding(self):
+        return self.state == CLOSED
+
+    def record_success(self, rtt: float):
+        now = time.time()
+        with self.lock:
+            recovered = self.state != CLOSED
+            last_success = self.last_success
+            self.last_success = now
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+                self.srtt = 0.875 * self.srtt + 0.125 * rtt
+            if self.state != CLOSED and self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Device: {} responds again, breaker closed".format(self.device_id))
+            self.state = CLOSED
+            self.failures = 0
+            self.backoff = self.backoff_initial
+        if recovered and last_success is not None and self.on_recovered is not None:
+            try:
+                self.on_recovered(self.device_id, last_success, now)
+            except Exception:
+                self.logger.exception("Failed handle recovery of device: {}".format(self.device_id))
+
+    def record_failure(self):
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.backoff = min(self.backoff * 2, self.backoff_max)
+                self.__open()
+                return
+            self.failures += 1
+            if self.state == CLOSED and self.failures >= self.failure_threshold:
+                self.backoff = self.backoff_initial
+                self.__open()
+
+    def __open(self):
+        self.state = OPEN
+        self.open_until = time.time() + self.backoff
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Device: {} does not respond, breaker opened for {} sec".format(
+                self.device_id, self.backoff))
+
+
+class DeviceHealthRegistry:
+    """
+    DeviceHealth of each read device
+    """
+
+    def __init__(self, config: dict):
+        """
+        :param config: visiobas_slicer config, key "health" holds settings of DeviceHealth:
+        min_timeout, max_timeout (default read_timeout) - bounds of adaptive read timeout,
+        failure_threshold - count of failed reads in a row opening breaker,
+        backoff_initial, backoff_max - seconds between probe reads of not responding device
+        """
+        self.settings = dict(config.get("health", {}))
+        self.settings.setdefault("max_timeout", config.get("read_timeout", 5))
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.recovery_listeners = []
+
+    def add_recovery_listener(self, listener):
+        """
+        :param listener: callable(device_id, last success time, recovery time) called when device
+        responds again after outage
+        """
+        self.recovery_listeners.append(listener)
+
+    def __recovered(self, device_id: int, last_success: float, now: float):
+        for listener in self.recovery_listeners:
+            listener(device_id, last_success, now)
+
+    def get(self, device_id: int) -> DeviceHealth:
+        with self.lock:
+            health = self.devices.get(device_id)
+            if health is None:
+                health = DeviceHealth(device_id, self.settings, self.__recovered)
+                self.devices[device_id] = health
+            return health
+
+    def not_responding_devices(self):
+        with self.lock:
+            return set([device_id for device_id, health in self.devices.items() if not health.is_responding()])
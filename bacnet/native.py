@@ -0,0 +1,405 @@
+import asyncio
+import logging
+import threading
+
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, BACnetError, ConfirmedService, PduType, \
+    Enumerated, ObjectIdentifier, Date, Time
+from bacnet.bacnet import ObjectType, ObjectProperty, bacnet_name_map
+
+reliability_names = ["no-fault-detected", "no-sensor", "over-range", "under-range", "open-loop", "shorted-loop",
+                     "no-output", "unreliable-other", "process-error", "multi-state-fault", "configuration-error",
+                     "member-fault", "communication-failure"]
+
+event_state_names = ["normal", "fault", "offnormal", "high-limit", "low-limit", "life-safety-alarm"]
+
+binary_pv_names = ["inactive", "active"]
+
+binary_object_types = [ObjectType.BINARY_INPUT.code(), ObjectType.BINARY_OUTPUT.code(),
+                       ObjectType.BINARY_VALUE.code()]
+
+binary_pv_properties = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.RELINQUISH_DEFAULT.id(),
+                        ObjectProperty.ALARM_VALUE.id(), ObjectProperty.PRIORITY_ARRAY.id()]
+
+known_property_codes = set(bacnet_name_map.values())
+
+
+class BACnetValueFormatter:
+    """
+    Convert decoded APDU values into the same representation parse_bacrpm builds from bacrpm output
+    so collected data of native read app is indistinguishable from bacrpm read app
+    """
+
+    @staticmethod
+    def enumeration_name(object_type_code: int, property_code: str, value: int):
+        """
+        :return: name of enumerated property value or None if name is unknown
+        """
+        names = None
+        if property_code == ObjectProperty.RELIABILITY.id():
+            names = reliability_names
+        elif property_code == ObjectProperty.EVENT_STATE.id():
+            names = event_state_names
+        elif property_code == ObjectProperty.OBJECT_TYPE.id():
+            return ObjectType.code_to_name(value)
+        elif property_code in binary_pv_properties and object_type_code in binary_object_types:
+            names = binary_pv_names
+        if names is not None and 0 <= value < len(names):
+            return names[value]
+        return None
+
+    @staticmethod
+    def enumeration(object_type_code: int, property_code: str, value: int):
+        name = BACnetValueFormatter.enumeration_name(object_type_code, property_code, value)
+        return name if name is not None else str(float(value))
+
+    @staticmethod
+    def number(value):
+        # bacrpm prints REAL values with %f format
+        return float("{:f}".format(value))
+
+    @staticmethod
+    def scalar(object_type_code: int, property_code: str, value):
+        if value is None:
+            return None
+        if type(value) == bool:
+            return str(value)
+        if isinstance(value, Enumerated):
+            return BACnetValueFormatter.enumeration(object_type_code, property_code, int(value))
+        if isinstance(value, (int, float)):
+            return str(BACnetValueFormatter.number(value))
+        if isinstance(value, str):
+            return '"{}"'.format(value)
+        if isinstance(value, ObjectIdentifier):
+            return "({}, {})".format(ObjectType.code_to_name(value.type), value.instance)
+        if isinstance(value, Date):
+            return "{}/{}/{}".format(value.year, value.month, value.day)
+        if isinstance(value, Time):
+            return "{:02d}:{:02d}:{:02d}.{:02d}".format(value.hour, value.minute, value.second, value.hundredths)
+        return str(value)
+
+    @staticmethod
+    def item(object_type_code: int, property_code: str, value):
+        if value is None or type(value) == bool:
+            return value
+        if isinstance(value, Enumerated):
+            return BACnetValueFormatter.enumeration(object_type_code, property_code, int(value))
+        if isinstance(value, (int, float)):
+            return BACnetValueFormatter.number(value)
+        if isinstance(value, list):
+            return [BACnetValueFormatter.item(object_type_code, property_code, v) for v in value]
+        return BACnetValueFormatter.scalar(object_type_code, property_code, value)
+
+    @staticmethod
+    def format(object_type_code: int, results: list):
+        """
+        :param object_type_code: type of requested object
+        :param results: list of (property_id, index, value or BACnetError)
+        :return: dict of property code -> value in parse_bacrpm representation
+        """
+        data = {}
+        for property_id, index, value in results:
+            property_code = str(property_id)
+            if isinstance(value, BACnetError) or property_code not in known_property_codes:
+                continue
+            if property_code == ObjectProperty.OBJECT_IDENTIFIER.id() and isinstance(value, ObjectIdentifier):
+                data[ObjectProperty.OBJECT_TYPE.id()] = ObjectType.code_to_name(value.type)
+                data[property_code] = float(value.instance)
+            elif isinstance(value, list):
+                data[property_code] = BACnetValueFormatter.item(object_type_code, property_code, value)
+            else:
+                data[property_code] = BACnetValueFormatter.scalar(object_type_code, property_code, value)
+        return data
+
+
+class BACnetDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+        self.logger = logging.getLogger('bacnet.native')
+
+    def datagram_received(self, data, addr):
+        self.client.datagram_received(data, addr)
+
+    def error_received(self, exc):
+        self.logger.warning("BACnet/IP socket error: {}".format(exc))
+
+
+class BACnetNativeClient:
+    """
+    In process BACnet/IP client
+    all requests share one UDP socket served by asyncio event loop running in background thread,
+    confirmed requests are multiplexed by invoke id per device address and repeated on APDU timeout
+    """
+
+    def __init__(self, local_host="0.0.0.0", local_port=0, retries=2, max_apdu=1476):
+        """
+        :param local_host: local interface address
+        :param local_port: local UDP port (0 - any free port)
+        :param retries: number of request retries on APDU timeout
+        :param max_apdu: max APDU length accepted by client
+        """
+        self.local_host = local_host
+        self.local_port = local_port
+        self.retries = retries
+        self.max_apdu = max_apdu
+        self.logger = logging.getLogger('bacnet.native')
+        self.loop = None
+        self.transport = None
+        self.thread = None
+        # key - (address, invoke id), value - future waiting APDU
+        self.pending = {}
+        # key - address, value - next invoke id
+        self.invoke_ids = {}
+        # key - device id, value - (host, port)
+        self.devices = {}
+        self.request_handlers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is not None:
+                return self
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, name="bacnet-native", daemon=True)
+            self.thread.start()
+            self.run(self.__create_endpoint())
+        return self
+
+    def stop(self):
+        with self.lock:
+            if self.loop is None:
+                return
+            if self.transport is not None:
+                self.loop.call_soon_threadsafe(self.transport.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+            self.loop = None
+            self.transport = None
+
+    async def __create_endpoint(self):
+        self.transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: BACnetDatagramProtocol(self),
+            local_addr=(self.local_host, self.local_port),
+            allow_broadcast=True)
+        self.local_port = self.transport.get_extra_info("sockname")[1]
+
+    def run(self, coroutine, timeout=None):
+        """
+        Execute coroutine in client event loop and wait result from caller thread
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def set_device_address(self, device_id: int, host: str, port: int):
+        self.devices[device_id] = (host, port)
+
+    def get_device_address(self, device_id: int):
+        return self.devices.get(device_id)
+
+    def add_request_handler(self, handler):
+        """
+        :param handler: callable(address, Apdu) called from event loop on each request received from devices (I-Am, COV notifications ...)
+        """
+        # handlers are iterated by event loop, list is replaced instead of changed
+        self.request_handlers = self.request_handlers + [handler]
+
+    def remove_request_handler(self, handler):
+        self.request_handlers = [h for h in self.request_handlers if h is not handler]
+
+    def datagram_received(self, data, addr):
+        try:
+            frame = BACnetDecoder.frame(data, addr)
+        except Exception:
+            self.logger.exception("Failed decode datagram from {}".format(addr))
+            return
+        if frame is None:
+            return
+        source, apdu = frame
+        if apdu.pdu_type == PduType.UNCONFIRMED_REQUEST or apdu.pdu_type == PduType.CONFIRMED_REQUEST:
+            for handler in self.request_handlers:
+                try:
+                    handler(source, apdu)
+                except Exception:
+                    self.logger.exception("Failed handle request from {}".format(source))
+            return
+        future = self.pending.get((source, apdu.invoke_id))
+        if future is None:
+            future = self.pending.get((addr, apdu.invoke_id))
+        if future is not None and not future.done():
+            future.set_result(apdu)
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Unexpected APDU from {}: {}".format(source, apdu))
+
+    def __allocate_invoke_id(self, address):
+        start = self.invoke_ids.get(address, 0)
+        for i in range(256):
+            invoke_id = (start + i) % 256
+            if (address, invoke_id) not in self.pending:
+                self.invoke_ids[address] = (invoke_id + 1) % 256
+                return invoke_id
+        raise Exception("No free invoke id for address: {}".format(address))
+
+    def send(self, frame: bytes, address):
+        self.transport.sendto(frame, address)
+
+    async def request(self, address, service: ConfirmedService, payload: bytes, timeout: float):
+        """
+        Send confirmed request and wait acknowledge
+        :return: Apdu of SimpleACK or ComplexACK
+        :raise BACnetError: device respond Error, Reject or Abort
+        :raise asyncio.TimeoutError: device not respond after all retries
+        """
+        invoke_id = self.__allocate_invoke_id(address)
+        key = (address, invoke_id)
+        frame = BACnetEncoder.confirmed_request(invoke_id, service, payload, self.max_apdu)
+        apdu_timeout = timeout / (self.retries + 1)
+        try:
+            for attempt in range(self.retries + 1):
+                future = self.loop.create_future()
+                self.pending[key] = future
+                self.send(frame, address)
+                try:
+                    apdu = await asyncio.wait_for(future, apdu_timeout)
+                except asyncio.TimeoutError:
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug("APDU timeout {} invoke id: {} attempt: {}".format(
+                            address, invoke_id, attempt))
+                    continue
+                if apdu.pdu_type in (PduType.ERROR, PduType.REJECT, PduType.ABORT):
+                    raise BACnetError(apdu.pdu_type, apdu.error_class, apdu.error_code, apdu.reason)
+                if apdu.segmented:
+                    raise BACnetError(PduType.ABORT, reason=4)
+                return apdu
+            raise asyncio.TimeoutError("APDU timeout: {}".format(address))
+        finally:
+            self.pending.pop(key, None)
+
+    def __resolve(self, device_id):
+        address = self.get_device_address(device_id)
+        if address is None:
+            raise Exception("Unknown address of device: {}".format(device_id))
+        return address
+
+    async def read_property_async(self, device_id: int, object_type, object_id: int, property_id, timeout: float,
+                                  index: int = None):
+        payload = BACnetEncoder.read_property(object_type, object_id, property_id, index)
+        apdu = await self.request(self.__resolve(device_id), ConfirmedService.READ_PROPERTY, payload, timeout)
+        return BACnetDecoder.read_property_ack(apdu.payload)[2]
+
+    async def read_object_property_reference_async(self, device_id: int, object_type, object_id: int, property_id,
+                                                   timeout: float):
+        """
+        Read BACnetDeviceObjectPropertyReference property (log-device-object-property of trend-log)
+        :return: ObjectPropertyReference
+        """
+        payload = BACnetEncoder.read_property(object_type, object_id, property_id)
+        apdu = await self.request(self.__resolve(device_id), ConfirmedService.READ_PROPERTY, payload, timeout)
+        return BACnetDecoder.object_property_reference_ack(apdu.payload)
+
+    async def read_range_async(self, device_id: int, object_type, object_id: int, reference, count: int,
+                               timeout: float, by_time: bool = False,
+                               property_id=ObjectProperty.LOG_BUFFER.id()):
+        """
+        Read records of trend-log buffer by ReadRange
+        :param reference: first sequence number or timestamp if by_time
+        :param count: count of records after reference (negative - before reference)
+        :return: tuple of (result flags BitString, [LogRecord, ...], first sequence number or None)
+        """
+        payload = BACnetEncoder.read_range(object_type, object_id, property_id, reference, count, by_time)
+        apdu = await self.request(self.__resolve(device_id), ConfirmedService.READ_RANGE, payload, timeout)
+        _, _, result_flags, records, first_sequence = BACnetDecoder.read_range_ack(apdu.payload)
+        return result_flags, records, first_sequence
+
+    async def read_object_list_async(self, device_id: int, timeout: float, concurrency: int = 8):
+        """
+        Read object-list of device, if whole list does not fit into APDU of device (segmentation is not supported)
+        list length and elements are read by array index, up to concurrency elements at once
+        :return: list of ObjectIdentifier
+        """
+        object_list = ObjectProperty.OBJECT_LIST.id()
+        try:
+            value = await self.read_property_async(device_id, ObjectType.DEVICE, device_id, object_list, timeout)
+            return value if isinstance(value, list) else [value]
+        except BACnetError as e:
+            if e.pdu_type != PduType.ABORT:
+                raise
+        count = await self.read_property_async(device_id, ObjectType.DEVICE, device_id, object_list, timeout, 0)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def read_element(index):
+            async with semaphore:
+                return await self.read_property_async(device_id, ObjectType.DEVICE, device_id, object_list, timeout,
+                                                      index)
+
+        return list(await asyncio.gather(*[read_element(i) for i in range(1, count + 1)]))
+
+    async def read_property_multiple_async(self, device_id: int, objects: list, timeout: float):
+        """
+        :param objects: list of (object_type, object_id, [property_id, ...])
+        :return: list of (ObjectIdentifier, [(property_id, index, value or BACnetError), ...])
+        """
+        payload = BACnetEncoder.read_property_multiple(objects)
+        apdu = await self.request(self.__resolve(device_id), ConfirmedService.READ_PROPERTY_MULTIPLE, payload,
+                                  timeout)
+        return BACnetDecoder.read_property_multiple_ack(apdu.payload)
+
+    async def write_property_async(self, device_id: int, object_type, object_id: int, property_id, value,
+                                   priority: int, timeout: float, index: int = None):
+        """
+        :param value: application value (None - relinquish command of priority)
+        :raise BACnetError: device refuses write
+        """
+        payload = BACnetEncoder.write_property(object_type, object_id, property_id, value, priority, index)
+        await self.request(self.__resolve(device_id), ConfirmedService.WRITE_PROPERTY, payload, timeout)
+
+    async def write_property_multiple_async(self, device_id: int, objects: list, timeout: float):
+        """
+        :param objects: list of (object_type, object_id, [(property_id, value, priority or None), ...])
+        :raise BACnetError: device refuses request or any of writes
+        """
+        payload = BACnetEncoder.write_property_multiple(objects)
+        await self.request(self.__resolve(device_id), ConfirmedService.WRITE_PROPERTY_MULTIPLE, payload, timeout)
+
+    async def subscribe_cov_async(self, device_id: int, process_id: int, object_type, object_id: int,
+                                  confirmed: bool, lifetime: int, timeout: float):
+        """
+        Subscribe (or cancel subscription if lifetime is None) COV notifications of object
+        :raise BACnetError: device refuses subscription
+        """
+        payload = BACnetEncoder.subscribe_cov(process_id, object_type, object_id,
+                                              confirmed if lifetime is not None else None, lifetime)
+        await self.request(self.__resolve(device_id), ConfirmedService.SUBSCRIBE_COV, payload, timeout)
+
+    def read_property(self, device_id: int, object_type, object_id: int, property_id, timeout: float,
+                      index: int = None):
+        return self.run(self.read_property_async(device_id, object_type, object_id, property_id, timeout, index))
+
+    def read_property_multiple(self, device_id: int, objects: list, timeout: float):
+        return self.run(self.read_property_multiple_async(device_id, objects, timeout))
+
+    def write_property(self, device_id: int, object_type, object_id: int, property_id, value, priority: int,
+                       timeout: float, index: int = None):
+        return self.run(self.write_property_async(device_id, object_type, object_id, property_id, value, priority,
+                                                  timeout, index))
+
+    def subscribe_cov(self, device_id: int, process_id: int, object_type, object_id: int, confirmed: bool,
+                      lifetime: int, timeout: float):
+        return self.run(self.subscribe_cov_async(device_id, process_id, object_type, object_id, confirmed, lifetime,
+                                                 timeout))
+
+
+__shared_client = None
+__shared_lock = threading.Lock()
+
+
+def shared_client(config: dict):
+    """
+    Single native client per process shared between all collectors
+    :param config: visiobas_slicer config, optional key "native" with client settings
+    """
+    global __shared_client
+    with __shared_lock:
+        if __shared_client is None:
+            settings = config.get("native", {})
+            __shared_client = BACnetNativeClient(local_host=settings.get("local_host", "0.0.0.0"),
+                                                 local_port=settings.get("local_port", 0),
+                                                 retries=settings.get("retries", 2)).start()
+        return __shared_client
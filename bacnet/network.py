@@ -1,59 +1,359 @@
 from bacnet.bacnet import ObjectType
 from bacnet.bacnet import ObjectProperty
+import itertools
 import logging
+import threading
+from bacnet.store import BACnetValueStore
 from visiobas.object.bacnet_object import BACnetObject
 from visiobas.object.bacnet_object import Device
 from visiobas.object.bacnet_object import NotificationClass
 
 
+# bits of count of buckets of objects and types indexes
+OBJECT_BITS = 10
+# bits of count of buckets of devices, notification classes and their groups
+GROUP_BITS = 6
+# bucket of map without keys, shared by maps and copied before change
+EMPTY_BUCKET = {}
+
+
+class BACnetIndexMap:
+    """
+    Dict of index split into buckets by hash of key. Copy of map shares buckets with map it is copied from and
+    copies bucket on its first change, so change of copy costs count of buckets and size of bucket instead
+    of size of map. Keys are iterated in order of buckets
+    """
+    __slots__ = ('buckets', 'mask', 'length', 'copied')
+
+    def __init__(self, bits: int = GROUP_BITS):
+        self.buckets = [EMPTY_BUCKET] * (1 << bits)
+        self.mask = (1 << bits) - 1
+        self.length = 0
+        # buckets copied by this map, None - map is published and is not changed
+        self.copied = set()
+
+    def copy(self):
+        other = BACnetIndexMap.__new__(BACnetIndexMap)
+        other.buckets = list(self.buckets)
+        other.mask = self.mask
+        other.length = self.length
+        other.copied = set()
+        return other
+
+    def __len__(self):
+        return self.length
+
+    def __contains__(self, key):
+        return key in self.buckets[hash(key) & self.mask]
+
+    def __getitem__(self, key):
+        return self.buckets[hash(key) & self.mask][key]
+
+    def get(self, key, default=None):
+        return self.buckets[hash(key) & self.mask].get(key, default)
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.buckets)
+
+    def keys(self):
+        return iter(self)
+
+    def values(self):
+        return itertools.chain.from_iterable(bucket.values() for bucket in self.buckets)
+
+    def items(self):
+        return itertools.chain.from_iterable(bucket.items() for bucket in self.buckets)
+
+    def __setitem__(self, key, value):
+        bucket = self.__bucket(key)
+        if key not in bucket:
+            self.length += 1
+        bucket[key] = value
+
+    def __delitem__(self, key):
+        del self.__bucket(key)[key]
+        self.length -= 1
+
+    def pop(self, key, default=None):
+        if key not in self:
+            return default
+        value = self.__bucket(key).pop(key)
+        self.length -= 1
+        return value
+
+    def __bucket(self, key):
+        idx = hash(key) & self.mask
+        if idx not in self.copied:
+            self.buckets[idx] = dict(self.buckets[idx])
+            self.copied.add(idx)
+        return self.buckets[idx]
+
+
+class BACnetNetworkIndex:
+    """
+    Version of indexes of BACnetNetwork. Published version is never changed: writer changes copy of it and
+    publishes copy by one assignment, so readers use indexes without lock. Copy shares buckets and groups
+    of indexes with published version and copies only buckets and groups it changes (see BACnetIndexMap)
+    """
+    __slots__ = ('objects', 'map_reference', 'types', 'devices', 'notification_classes', 'copied')
+    # groups of notification classes may hold most of objects, groups of devices are dicts keeping append order
+    bucketed = ('map_reference', 'notification_classes')
+
+    def __init__(self, index=None):
+        if index is None:
+            self.objects = BACnetIndexMap(OBJECT_BITS)
+            self.map_reference = {
+                ObjectType.DEVICE.code(): BACnetIndexMap()
+            }
+            self.types = BACnetIndexMap(OBJECT_BITS)
+            self.devices = BACnetIndexMap()
+            self.notification_classes = BACnetIndexMap()
+        else:
+            self.objects = index.objects.copy()
+            self.map_reference = dict(index.map_reference)
+            self.types = index.types.copy()
+            self.devices = index.devices.copy()
+            self.notification_classes = index.notification_classes.copy()
+        # (index name, key) of groups copied by this version, they are changed in place until version is published
+        self.copied = set()
+
+    def group(self, name: str, key):
+        """
+        :return: group of key of map_reference, devices or notification_classes index writable by this version
+        """
+        index = getattr(self, name)
+        group = index.get(key)
+        if group is None or (name, key) not in self.copied:
+            group = index[key] = group.copy() if group is not None else \
+                BACnetIndexMap() if name in self.bucketed else {}
+            self.copied.add((name, key))
+        return group
+
+    def publish(self):
+        """
+        Mark version and groups it changed as not changed any more
+        """
+        for name, key in self.copied:
+            group = getattr(self, name).get(key)
+            if isinstance(group, BACnetIndexMap):
+                group.copied = None
+        for index in (self.objects, self.types, self.devices, self.notification_classes):
+            index.copied = None
+        self.copied = None
+
+
 class BACnetNetwork:
     """
-    Storage of BACnet objects
+    Storage of BACnet objects indexed by reference, (type, id), device and notification class,
+    runtime state of objects (present value, status flags, priority array, limits) is kept in columnar store.
+    Reads are lock free: writers are serialized by lock and publish new version of indexes (copy on write),
+    so reader sees either all or nothing of append_many / remove_many
     """
     def __init__(self) -> None:
         super().__init__()
-        self.objects = {}
-        self.map_reference = {
-            ObjectType.DEVICE.code(): {}
-        }
+        self.index = BACnetNetworkIndex()
+        self.lock = threading.Lock()
+        self.store = BACnetValueStore()
         self.logger = logging.getLogger('bacnet.network')
 
+    @property
+    def objects(self):
+        return self.index.objects
+
+    @property
+    def map_reference(self):
+        return self.index.map_reference
+
+    @property
+    def types(self):
+        """
+        key - (object type code, object id), value - tuple of objects in append order
+        """
+        return self.index.types
+
+    @property
+    def devices(self):
+        """
+        key - device id, value - dict of reference -> object of device (device itself excluded)
+        """
+        return self.index.devices
+
+    @property
+    def notification_classes(self):
+        """
+        key - notification class id, value - dict of reference -> object notified by notification class
+        """
+        return self.index.notification_classes
+
     def find(self, reference: str, ):
-        key = self.__create_key(reference)
-        if key in self.objects:
-            return self.objects[key]
-        return None
+        return self.index.objects.get(self.__create_key(reference))
 
     def find_by_type(self, object_type, object_id):
+        index = self.index
         object_type_code = object_type.code() if type(object_type) == ObjectType else object_type
         if object_type_code == ObjectType.DEVICE.code():
-            devices = self.map_reference[ObjectType.DEVICE.code()]
-            if object_id in devices:
-                return self.find(devices[object_id])
-        for k in self.objects:
-            bacnet_object = self.objects[k]
-            if bacnet_object.get_object_type_code() == object_type_code and bacnet_object.get_id() == object_id:
-                return bacnet_object
-        return None
+            reference = index.map_reference[ObjectType.DEVICE.code()].get(object_id)
+            if reference is not None:
+                return index.objects.get(self.__create_key(reference))
+        objects = index.types.get((object_type_code, object_id))
+        return objects[0] if objects else None
+
+    def find_by_device(self, device_id):
+        """
+        :return: list of objects of device except device itself
+        """
+        group = self.index.devices.get(device_id)
+        return list(group.values()) if group is not None else []
+
+    def find_by_notification_class(self, notification_class_id: int):
+        """
+        :return: list of objects notified by notification class
+        """
+        group = self.index.notification_classes.get(notification_class_id)
+        return list(group.values()) if group is not None else []
 
     def append(self, o):
-        if type(o) == dict:
-            object_type = o[ObjectProperty.OBJECT_TYPE.id()]
-            if object_type == ObjectType.DEVICE.name():
-                self.append(Device(o))
-            elif object_type == ObjectType.NOTIFICATION_CLASS.name():
-                self.append(NotificationClass(o))
+        self.append_many([o])
+
+    def append_many(self, objects):
+        """
+        Append objects keeping all indexes, object replaces appended object of the same reference
+        :param objects: iterable of BACnetObject or server objects (dict)
+        :return: count of appended objects
+        """
+        count = 0
+        replaced = []
+        with self.lock:
+            index = BACnetNetworkIndex(self.index)
+            for o in objects:
+                if type(o) == dict:
+                    object_type = o[ObjectProperty.OBJECT_TYPE.id()]
+                    if object_type == ObjectType.DEVICE.name():
+                        o = Device(o)
+                    elif object_type == ObjectType.NOTIFICATION_CLASS.name():
+                        o = NotificationClass(o)
+                    else:
+                        o = BACnetObject(o)
+                elif not isinstance(o, BACnetObject):
+                    continue
+                key = self.__create_key(o.get_object_reference())
+                if key in index.objects:
+                    replaced.append(self.__remove(index, key))
+                self.__index(index, key, o)
+                count += 1
+            self.__publish(index)
+        for bacnet_object in replaced:
+            if bacnet_object.is_attached(self.store) and index.objects.get(
+                    self.__create_key(bacnet_object.get_object_reference())) is not bacnet_object:
+                bacnet_object.detach()
+        if len(replaced) > 0:
+            self.logger.warning("Multiply backnet network reference key? `PEREMES` detected? count: {}".format(
+                len(replaced)))
+        return count
+
+    def update_many(self, updates):
+        """
+        Replace configuration of objects in place (see BACnetObject.update): object is unindexed by configuration
+        before update and indexed by configuration after it, so changed device or notification class is seen whole
+        :param updates: iterable of (BACnetObject, server object)
+        :return: count of updated objects of network
+        """
+        count = 0
+        with self.lock:
+            index = BACnetNetworkIndex(self.index)
+            for o, data in updates:
+                key = self.__create_key(o.get_object_reference())
+                if index.objects.get(key) is not o:
+                    o.update(data)
+                    continue
+                object_type = (o.get_object_type_code(), o.get_id())
+                position = next(i for i, x in enumerate(index.types[object_type]) if x is o)
+                self.__remove(index, key)
+                o.update(data)
+                self.__index(index, self.__create_key(o.get_object_reference()), o)
+                if object_type == (o.get_object_type_code(), o.get_id()):
+                    # object keeps its place among objects of the same (type, id)
+                    objects = index.types[object_type]
+                    index.types[object_type] = objects[:position] + (o,) + objects[position:-1]
+                count += 1
+            self.__publish(index)
+        return count
+
+    def remove(self, o):
+        """
+        :param o: BACnetObject or its reference
+        :return: removed object or None
+        """
+        removed = self.remove_many([o])
+        return removed[0] if len(removed) > 0 else None
+
+    def remove_many(self, objects):
+        """
+        :param objects: iterable of BACnetObject or their references
+        :return: list of removed objects
+        """
+        removed = []
+        with self.lock:
+            index = BACnetNetworkIndex(self.index)
+            for o in objects:
+                reference = o if type(o) == str else o.get_object_reference()
+                bacnet_object = self.__remove(index, self.__create_key(reference))
+                if bacnet_object is not None:
+                    removed.append(bacnet_object)
+            self.__publish(index)
+        # removed objects keep their state, readers of previous version still may use them
+        for bacnet_object in removed:
+            bacnet_object.detach()
+        return removed
+
+    def __publish(self, index: BACnetNetworkIndex):
+        index.publish()
+        self.index = index
+
+    def __remove(self, index: BACnetNetworkIndex, key):
+        bacnet_object = index.objects.pop(key, None)
+        if bacnet_object is None:
+            return None
+        object_type_code = bacnet_object.get_object_type_code()
+        object_id = bacnet_object.get_id()
+        if object_type_code == ObjectType.DEVICE.code():
+            if index.map_reference[ObjectType.DEVICE.code()].get(object_id) == bacnet_object.get_object_reference():
+                del index.group('map_reference', ObjectType.DEVICE.code())[object_id]
+        else:
+            self.__unindex(index, 'devices', bacnet_object.get_device_id(), key)
+        self.__unindex(index, 'notification_classes', bacnet_object.get_notification_class(), key)
+        objects = index.types.get((object_type_code, object_id))
+        if objects is not None:
+            objects = tuple(x for x in objects if x is not bacnet_object)
+            if len(objects) > 0:
+                index.types[(object_type_code, object_id)] = objects
             else:
-                self.append(BACnetObject(o))
-        elif type(o) == BACnetObject or BACnetObject in type(o).__bases__:
-            object_type_code = o.get_object_type_code()
-            # group some object for improve searching
-            if object_type_code == ObjectType.DEVICE.code():
-                self.map_reference[ObjectType.DEVICE.code()][o.get_id()] = o.get_object_reference()
-            key = self.__create_key(o.get_object_reference())
-            if key in self.objects:
-                self.logger.warning("Multiply backnet network reference key? `PEREMES` detected?")
-            self.objects[key] = o
+                del index.types[(object_type_code, object_id)]
+        return bacnet_object
+
+    def __index(self, index: BACnetNetworkIndex, key, o):
+        object_type_code = o.get_object_type_code()
+        # group some object for improve searching
+        if object_type_code == ObjectType.DEVICE.code():
+            index.group('map_reference', ObjectType.DEVICE.code())[o.get_id()] = o.get_object_reference()
+        else:
+            index.group('devices', o.get_device_id())[key] = o
+        notification_class_id = o.get_notification_class()
+        if notification_class_id != 0:
+            index.group('notification_classes', notification_class_id)[key] = o
+        index.types[(object_type_code, o.get_id())] = index.types.get((object_type_code, o.get_id()), ()) + (o,)
+        if not o.is_attached(self.store):
+            o.attach(self.store, self.store.allocate())
+        index.objects[key] = o
+
+    @staticmethod
+    def __unindex(index: BACnetNetworkIndex, name: str, value, key):
+        if value not in getattr(index, name):
+            return
+        objects = index.group(name, value)
+        objects.pop(key, None)
+        if len(objects) == 0:
+            del getattr(index, name)[value]
 
     def __create_key(self, reference):
         return reference
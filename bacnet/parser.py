@@ -1,8 +1,13 @@
 import enum
+import functools
 import math
 import logging
+import re
 from bacnet.bacnet import bacnet_name_map
+from bacnet.bacnet import BinaryPV
 from bacnet.bacnet import ObjectProperty
+from bacnet.bacnet import ObjectType
+from bacnet.bacnet import Reliability
 
 
 class TokenType(enum.Enum):
@@ -378,6 +383,163 @@ class TokensExtractor:
         return self.tokens
 
 
+# whitespace as str.isspace() matches it in ASCII text, without and with end of line
+_HS = r'[\t\x0b\x0c\r\x1c-\x1f ]'
+_WS = r'[\t\n\x0b\x0c\r\x1c-\x1f ]'
+_WORD = r'[A-Za-z0-9-][A-Za-z0-9.-]*'
+# one alternative per parser of TokensExtractor chain in the same order, each consumes whitespace as parser does
+_TOKEN_PATTERN = _HS + r'*(?:(\n)' + _HS + r'*' \
+                 r'|([:,{}\[\]()])' + _WS + r'*' \
+                 r'|#' + _WS + r'*(' + _WORD + r')' \
+                 r'|(' + _WORD + r')' \
+                 r'|(")' + _WS + r'*([^"\\]*\\?)[\s\S]?' \
+                 r'|(#)(?!' + _WS + r'*\Z)' \
+                 r'|([\x21-\x7e][\x20-\x7e]*)' \
+                 r'|([\s\S]))'
+# the same alternatives as one group, match is token text (mark with whitespace after it),
+# hash without integer is not matched (see _IRREGULAR_HASH_PATTERN)
+_TOKEN_TEXT_PATTERN = _HS + r'*([:,{}\[\]()]' + _WS + r'*' \
+                      r'|\n' \
+                      r'|#' + _WS + r'*' + _WORD + \
+                      r'|' + _WORD + \
+                      r'|"' + _WS + r'*[^"\\]*\\?[\s\S]?' \
+                      r'|[\x21-\x7e][\x20-\x7e]*' \
+                      r'|[\s\S])'
+_QUOTED_PATTERN = r'"' + _WS + r'*([^"\\]*\\?)'
+# hash not followed by integer is tokenized by _TOKEN_PATTERN
+_IRREGULAR_HASH_PATTERN = r'#(?!' + _WS + r'*-?[0-9]+(?![A-Za-z0-9.-]))'
+
+
+class FastTokensExtractor:
+    """
+    Single pass tokenizer of bacrp / bacrpm output (str or ASCII bytes of subprocess output)
+    by one precompiled pattern, produces the same tokens as TokensExtractor.
+    Input TokensExtractor handles in its own way (non ASCII text, hash without integer) is passed to TokensExtractor
+    """
+    # bytes are decoded once, ASCII decode is cheaper than decode of each matched word
+    pattern = re.compile(_TOKEN_PATTERN)
+    text_pattern = re.compile(_TOKEN_TEXT_PATTERN)
+    quoted_pattern = re.compile(_QUOTED_PATTERN)
+    irregular_hash = re.compile(_IRREGULAR_HASH_PATTERN)
+    punctuation = {c: Token(t, c) for c, t in [
+        (':', TokenType.SEMICOLON), (',', TokenType.COMMA),
+        ('{', TokenType.OPEN_GROUP), ('}', TokenType.CLOSE_GROUP),
+        ('[', TokenType.OPEN_BRACE), (']', TokenType.CLOSE_BRACE),
+        ('(', TokenType.OPEN_TUPLE), (')', TokenType.CLOSE_TUPLE)
+    ]}
+    keywords = {
+        "null": Token(TokenType.NULL, None),
+        "true": Token(TokenType.TRUE, True),
+        "false": Token(TokenType.FALSE, False),
+        "inf": Token(TokenType.NUMBER, math.inf),
+        "-inf": Token(TokenType.NUMBER, -math.inf)
+    }
+    eol = Token(TokenType.EOL, None)
+
+    class Unsupported(Exception):
+        pass
+
+    def __init__(self, text):
+        """
+        :param text: str or bytes
+        """
+        self.text = bytes(text) if type(text) == bytearray else text
+        self.tokens = []
+
+    def extract_tokens(self):
+        try:
+            self.tokens = self.__extract_tokens(self.text)
+        except FastTokensExtractor.Unsupported:
+            text = self.text.decode('ascii') if type(self.text) == bytes else self.text
+            self.tokens = TokensExtractor(CharReader(text)).extract_tokens()
+        return self.tokens
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def word_token(word):
+        """
+        Tokens of words are shared between parses of all threads (property names, enumerations, repeated values),
+        least recently used words are evicted
+        """
+        token = FastTokensExtractor.keywords.get(word.lower())
+        if token is None:
+            token = Token(TokenType.STRING, word)
+            if word[0].isdigit() or word[0] == '-':
+                try:
+                    token = Token(TokenType.NUMBER, float(word))
+                except ValueError:
+                    pass
+        return token
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def text_token(text):
+        """
+        :param text: match of _TOKEN_TEXT_PATTERN
+        :return: token of text, None if no token parser accepts character
+        """
+        c = text[0]
+        if c == '\n':
+            return FastTokensExtractor.eol
+        if c in FastTokensExtractor.punctuation:
+            return FastTokensExtractor.punctuation[c]
+        if c == '#':
+            return Token(TokenType.HASH, int(text[1:]))
+        if c.isalnum() or c == '-':
+            return FastTokensExtractor.word_token(text)
+        if c == '"':
+            return Token(TokenType.STRING, '"' + FastTokensExtractor.quoted_pattern.match(text).group(1) + '"')
+        if '\x21' <= c <= '\x7e':
+            return Token(TokenType.STRING, text)
+        return None
+
+    def __extract_tokens(self, text):
+        if type(text) == bytes:
+            try:
+                text = text.decode('ascii')
+            except UnicodeDecodeError:
+                raise FastTokensExtractor.Unsupported()
+        elif not text.isascii():
+            raise FastTokensExtractor.Unsupported()
+        if len(text) == 0:
+            raise FastTokensExtractor.Unsupported()
+        if self.irregular_hash.search(text) is None:
+            # token per match by cached tokens of token texts
+            tokens = list(map(self.text_token, self.text_pattern.findall(text)))
+            if None in tokens:
+                # rest of text is not tokenized
+                del tokens[tokens.index(None):]
+            return tokens
+        punctuation = self.punctuation
+        word_token = self.word_token
+        eol = self.eol
+        tokens = []
+        append = tokens.append
+        for end_of_line, mark, hash_value, word, quote, quoted, unsupported, printable, stop in \
+                self.pattern.findall(text):
+            if word:
+                append(word_token(word))
+            elif mark:
+                append(punctuation[mark])
+            elif end_of_line:
+                append(eol)
+            elif quote:
+                append(Token(TokenType.STRING, '"' + quoted + '"'))
+            elif hash_value:
+                try:
+                    append(Token(TokenType.HASH, int(hash_value)))
+                except ValueError:
+                    raise FastTokensExtractor.Unsupported()
+            elif printable:
+                append(Token(TokenType.STRING, printable))
+            elif unsupported:
+                raise FastTokensExtractor.Unsupported()
+            else:
+                # no token parser accepts character, rest of text is not tokenized
+                break
+        return tokens
+
+
 class TokenReader:
     def __init__(self, tokens) -> None:
         super().__init__()
@@ -559,19 +721,230 @@ class PairsExtractor:
         return self._entities
 
 
+class BACnetTypedValues:
+    """
+    Typed value model of collected data by type of object it was read from:
+    present-value (and priority-array slots) of analog object float, of multi-state object int,
+    of binary object BinaryPV, reliability Reliability code, status-flags tuple of 4 bool, out-of-service bool
+    """
+    analog_object_types = {ObjectType.ANALOG_INPUT.code(), ObjectType.ANALOG_OUTPUT.code(),
+                           ObjectType.ANALOG_VALUE.code()}
+    multistate_object_types = {ObjectType.MULTI_STATE_INPUT.code(), ObjectType.MULTI_STATE_OUTPUT.code(),
+                               ObjectType.MULTI_STATE_VALUE.code()}
+    binary_object_types = {ObjectType.BINARY_INPUT.code(), ObjectType.BINARY_OUTPUT.code(),
+                           ObjectType.BINARY_VALUE.code()}
+
+    @staticmethod
+    def present_value(object_type_code: int, value):
+        """
+        :raise ValueError: value does not fit object type
+        """
+        if object_type_code in BACnetTypedValues.analog_object_types:
+            return float(value)
+        if object_type_code in BACnetTypedValues.multistate_object_types:
+            return int(float(value))
+        if object_type_code in BACnetTypedValues.binary_object_types:
+            return BinaryPV.from_value(value)
+        return value
+
+    @staticmethod
+    def priority_array(object_type_code: int, value):
+        if type(value) not in (list, tuple):
+            raise ValueError("Not priority array: {}".format(value))
+        return [None if v is None else BACnetTypedValues.present_value(object_type_code, v) for v in value]
+
+    @staticmethod
+    def typed(object_type_code: int, data: dict):
+        """
+        :param data: collected data in parse_bacrpm representation or already typed
+        :return: collected data of typed values, value which does not fit object type is dropped
+        """
+        result = {}
+        for code, value in data.items():
+            try:
+                if code == ObjectProperty.PRESENT_VALUE.id():
+                    value = BACnetTypedValues.present_value(object_type_code, value)
+                elif code == ObjectProperty.PRIORITY_ARRAY.id():
+                    value = BACnetTypedValues.priority_array(object_type_code, value)
+                elif code == ObjectProperty.RELIABILITY.id():
+                    value = Reliability.from_value(value)
+                elif code == ObjectProperty.STATUS_FLAGS.id() and type(value) == list:
+                    value = tuple(value)
+                elif code == ObjectProperty.OUT_OF_SERVICE.id() and type(value) == str:
+                    value = value.lower() == "true"
+            except (ValueError, TypeError):
+                continue
+            result[code] = value
+        return result
+
+
+class BACnetFieldsExtractor:
+    """
+    Extractor of fixed set of properties (pooling fields) from bacrpm output block compiled from requested fields,
+    values are typed: present-value float or enumeration name, status-flags tuple of 4 bool,
+    priority-array list of 16 slots (None, float or enumeration name), reliability enumeration name,
+    out-of-service bool, with object type present-value, priority-array and reliability are typed
+    as BACnetTypedValues model.
+    Output with any line it does not know is not extracted (None) and left to generic parser
+    """
+    # compiled extractors, key - (object type code, tuple of requested fields)
+    extractors = {}
+    names = {code: name for name, code in bacnet_name_map.items()}
+    word = re.compile(r'[A-Za-z][A-Za-z0-9-]*\Z')
+    header = re.compile(r'\s*[a-z-]+ #\d+\s*\Z')
+    # number as tokenizer reads it: word starting by digit or minus
+    number = re.compile(r'[0-9-][A-Za-z0-9.-]*\Z')
+
+    def __init__(self, fields: list, object_type_code: int = None):
+        """
+        :param fields: property codes, each of them has to have converter
+        :param object_type_code: type of read object, values are typed by it if specified
+        """
+        self.converters = {self.names[code]: (code, self.converter(code, object_type_code)) for code in fields}
+        names = "|".join(re.escape(name) for name in sorted(self.converters, key=len, reverse=True))
+        # one property per line, value is rest of line or group of several lines (priority-array)
+        self.pattern = re.compile(r'\s*(' + names + r'):[ \t]*(\{[^{}]*\}|[^{}\s](?:[^{}\n]*[^{}\s])?)[ \t\r]*')
+
+    @staticmethod
+    def compile(fields: list, object_type_code: int = None):
+        """
+        :return: extractor of fields or None if any of fields has no converter
+        """
+        key = (object_type_code, tuple(fields))
+        extractor = BACnetFieldsExtractor.extractors.get(key)
+        if extractor is None and key not in BACnetFieldsExtractor.extractors:
+            if all(BACnetFieldsExtractor.converter(code) is not None for code in fields):
+                extractor = BACnetFieldsExtractor(fields, object_type_code)
+            BACnetFieldsExtractor.extractors[key] = extractor
+        return extractor
+
+    @staticmethod
+    def converter(code: str, object_type_code: int = None):
+        if object_type_code is not None:
+            if code == ObjectProperty.PRESENT_VALUE.id():
+                return lambda value: BACnetTypedValues.present_value(
+                    object_type_code, BACnetFieldsExtractor.present_value(value))
+            if code == ObjectProperty.PRIORITY_ARRAY.id():
+                return lambda value: BACnetTypedValues.priority_array(
+                    object_type_code, BACnetFieldsExtractor.priority_array(value))
+            if code == ObjectProperty.RELIABILITY.id():
+                return lambda value: Reliability.from_value(BACnetFieldsExtractor.enumeration(value))
+        return {
+            ObjectProperty.PRESENT_VALUE.id(): BACnetFieldsExtractor.present_value,
+            ObjectProperty.STATUS_FLAGS.id(): BACnetFieldsExtractor.status_flags,
+            ObjectProperty.PRIORITY_ARRAY.id(): BACnetFieldsExtractor.priority_array,
+            ObjectProperty.RELIABILITY.id(): BACnetFieldsExtractor.enumeration,
+            ObjectProperty.OUT_OF_SERVICE.id(): BACnetFieldsExtractor.boolean
+        }.get(code)
+
+    class Unknown(Exception):
+        pass
+
+    @staticmethod
+    def present_value(value: str):
+        if BACnetFieldsExtractor.number.match(value) is not None:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+        return BACnetFieldsExtractor.enumeration(value)
+
+    @staticmethod
+    def enumeration(value: str):
+        if BACnetFieldsExtractor.word.match(value) is None or value.lower() in ("null", "true", "false", "inf"):
+            raise BACnetFieldsExtractor.Unknown()
+        return value
+
+    @staticmethod
+    def boolean(value: str):
+        value = value.lower()
+        if value == "true":
+            return True
+        if value == "false":
+            return False
+        raise BACnetFieldsExtractor.Unknown()
+
+    @staticmethod
+    def items(value: str):
+        if not value.startswith("{"):
+            raise BACnetFieldsExtractor.Unknown()
+        return [item.strip() for item in value[1:-1].split(",")]
+
+    @staticmethod
+    def status_flags(value: str):
+        flags = tuple(BACnetFieldsExtractor.boolean(item) for item in BACnetFieldsExtractor.items(value))
+        if len(flags) != 4:
+            raise BACnetFieldsExtractor.Unknown()
+        return flags
+
+    @staticmethod
+    def priority_array(value: str):
+        slots = [None if item.lower() == "null" else BACnetFieldsExtractor.present_value(item)
+                 for item in BACnetFieldsExtractor.items(value)]
+        if len(slots) != 16:
+            raise BACnetFieldsExtractor.Unknown()
+        return slots
+
+    def extract(self, text):
+        """
+        :param text: bacrpm output of one object as str or bytes
+        :return: dict of property code -> typed value or None if output is not known
+        """
+        if type(text) != str:
+            text = bytes(text).decode('ascii')
+        open_idx = text.find("{")
+        close_idx = text.rfind("}")
+        if open_idx == -1 or close_idx < open_idx or len(text[close_idx + 1:].strip()) > 0 or \
+                self.header.match(text, 0, open_idx) is None:
+            return None
+        body = text[open_idx + 1:close_idx].rstrip()
+        data = {}
+        pos = 0
+        try:
+            for match in self.pattern.finditer(body):
+                if match.start() != pos:
+                    return None
+                pos = match.end()
+                code, converter = self.converters[match.group(1)]
+                data[code] = converter(match.group(2))
+        except (BACnetFieldsExtractor.Unknown, ValueError):
+            return None
+        if pos != len(body) or len(data) == 0:
+            return None
+        return data
+
+
 class BACnetParser:
+    # first line of object block in bacrpm output of several objects
+    header_pattern = re.compile(r"\s*([a-z-]+) #(\d+)\s*\Z")
+
     def __init__(self):
         self.logger = logging.getLogger('bacnet.parser')
 
+    def tokenize(self, text):
+        """
+        :param text: output of app as str or bytes
+        :return: list of tokens
+        """
+        return FastTokensExtractor(text).extract_tokens()
+
+    @staticmethod
+    def contains(text, marker: str):
+        """
+        :param text: output of app as str or bytes
+        """
+        return (marker if type(text) == str else marker.encode('ascii')) in text
+
     def parse_bacrp(self, text, property_id, object: dict = None):
-        if "BACnet Error:" in text:
+        """
+        :param text: bacrp output as str or bytes
+        """
+        if self.contains(text, "BACnet Error:"):
             return None
         if type(property_id) == ObjectProperty:
             property_id = property_id.id()
 
-        char_reader = CharReader(text)
-        tokens_extractor = TokensExtractor(char_reader)
-        tokens = tokens_extractor.extract_tokens()
+        tokens = self.tokenize(text)
         result = None
         value_writen = None
         for token in tokens:
@@ -618,12 +991,13 @@ class BACnetParser:
         return result
 
     def parse_bacrpm(self, text):
-        if "BACnet Reject: Unrecognized Service" in text:
+        """
+        :param text: bacrpm output as str or bytes
+        """
+        if self.contains(text, "BACnet Reject: Unrecognized Service"):
             return {}
 
-        char_reader = CharReader(text)
-        tokens_extractor = TokensExtractor(char_reader)
-        tokens = tokens_extractor.extract_tokens()
+        tokens = self.tokenize(text)
 
         if self.logger.isEnabledFor(logging.DEBUG):
             idx = 0
@@ -640,6 +1014,89 @@ class BACnetParser:
                 bacnet_object[bacnet_name_map[name]] = value
         return bacnet_object
 
+    def parse_bacrpm_fields(self, text, fields: list, object_type_code: int = None):
+        """
+        Extract requested fields from bacrpm output of one object by compiled extractor (see BACnetFieldsExtractor)
+        output extractor does not know is parsed by parse_bacrpm
+        :param fields: requested property codes
+        :param object_type_code: type of read object, values are typed by BACnetTypedValues model if specified
+        """
+        extractor = BACnetFieldsExtractor.compile(fields, object_type_code)
+        data = extractor.extract(text) if extractor is not None else None
+        if data is None:
+            if extractor is not None and self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("fields extractor fallback, output:\n{}".format(text))
+            data = self.parse_bacrpm(text)
+            if object_type_code is not None:
+                data = BACnetTypedValues.typed(object_type_code, data)
+        return data
+
+    def parse_bacrpm_objects(self, text, fields: list = None):
+        """
+        Parse bacrpm output of several objects, each object block starts with "<object-type> #<object-id>" line
+        :param fields: requested property codes, extracted by parse_bacrpm_fields as typed values if specified
+        :return: dict key - (object type code, object id), value - parsed object as parse_bacrpm returns
+        """
+        result = {}
+        if type(text) != str:
+            text = bytes(text).decode('ascii')
+        if "BACnet Reject: Unrecognized Service" in text:
+            return result
+        for object_type, object_id, bacnet_object in self.iter_bacrpm_objects(text.splitlines(True), fields):
+            result[(object_type, object_id)] = bacnet_object
+        return result
+
+    def iter_bacrpm_objects(self, lines, fields: list = None):
+        """
+        Streaming parse of bacrpm output of several objects: object is yielded as soon as its block is read
+        (closing "}" line or header of next object), only lines of one block are held
+        :param lines: iterable of output lines as str or bytes (file, stdout of bacrpm process)
+        :param fields: requested property codes, extracted by parse_bacrpm_fields as typed values if specified
+        :return: generator of (object type code, object id, parsed object as parse_bacrpm returns)
+        """
+        header = None
+        block = []
+        for line in lines:
+            if type(line) != str:
+                line = bytes(line).decode('ascii')
+            if "BACnet Reject: Unrecognized Service" in line:
+                return
+            match = self.header_pattern.match(line)
+            if match is not None or (header is not None and line.rstrip() == "}"):
+                if match is None:
+                    block.append(line)
+                if header is not None:
+                    parsed = self.__parse_block(header, block, fields)
+                    if parsed is not None:
+                        yield parsed
+                header = match
+                block = [line] if match is not None else []
+            elif header is not None:
+                block.append(line)
+        if header is not None:
+            parsed = self.__parse_block(header, block, fields)
+            if parsed is not None:
+                yield parsed
+
+    def __parse_block(self, header, lines: list, fields: list = None):
+        """
+        :return: (object type code, object id, parsed object) or None if object type is unknown
+        """
+        object_type = ObjectType.name_to_code(header.group(1))
+        if object_type is None:
+            return None
+        block = "".join(lines)
+        if "{" not in block:
+            bacnet_object = {}
+        elif fields is not None:
+            bacnet_object = self.parse_bacrpm_fields(block, fields, object_type)
+        else:
+            bacnet_object = self.parse_bacrpm(block)
+        # drop properties failed by access error, failed object should not look as collected
+        for code in [k for k, v in bacnet_object.items() if type(v) == str and v.startswith("BACnetError")]:
+            del bacnet_object[code]
+        return object_type, int(header.group(2)), bacnet_object
+
     @staticmethod
     def parse_bacwi(text):
         try:
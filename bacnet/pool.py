@@ -0,0 +1,181 @@
+import json
+import logging
+import queue
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from subprocess import PIPE, DEVNULL, TimeoutExpired
+
+from bacnet.worker import END_OF_OUTPUT
+
+
+class BACnetCoprocess:
+    """
+    Handle of one long-lived worker process (see bacnet.worker for stdin / stdout protocol)
+    """
+
+    def __init__(self, command: list, cwd, hang_margin: float = 1):
+        """
+        :param hang_margin: seconds to wait command output over read timeout before worker is considered hang
+        """
+        self.command = command
+        self.hang_margin = hang_margin
+        self.cwd = cwd
+        self.process = None
+        self.outputs = None
+        self.last_health_check = 0
+        self.logger = logging.getLogger('bacnet.pool')
+
+    def start(self):
+        self.outputs = queue.Queue()
+        self.process = subprocess.Popen(self.command, stdin=PIPE, stdout=PIPE, stderr=DEVNULL, cwd=str(self.cwd),
+                                        universal_newlines=True, bufsize=1)
+        reader = threading.Thread(target=self.__read_outputs, args=(self.process, self.outputs), daemon=True)
+        reader.start()
+        self.last_health_check = time.time()
+
+    @staticmethod
+    def __read_outputs(process, outputs):
+        # lines are passed as they are written, END_OF_OUTPUT line ends output of command
+        for line in process.stdout:
+            outputs.put(END_OF_OUTPUT if line.rstrip("\n") == END_OF_OUTPUT else line)
+        # worker process exited
+        outputs.put(None)
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.process.kill()
+            self.process.wait(5)
+        except Exception:
+            self.logger.exception("Failed stop worker: {}".format(self.process.pid))
+        self.process = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def execute(self, app: str, args: list, timeout: float):
+        """
+        :return: output of command
+        :raise TimeoutExpired: worker does not answer in timeout
+        """
+        return "".join(self.execute_lines(app, args, timeout))
+
+    def execute_lines(self, app: str, args: list, timeout: float):
+        """
+        :return: generator of output lines of command as worker writes them, output not read to the end
+        leaves worker to be restarted
+        :raise TimeoutExpired: worker does not end output in timeout
+        """
+        command = {"app": app, "args": [str(arg) for arg in args], "timeout": timeout}
+        self.process.stdin.write(json.dumps(command) + "\n")
+        self.process.stdin.flush()
+        deadline = time.time() + timeout + self.hang_margin
+        while True:
+            try:
+                line = self.outputs.get(True, max(deadline - time.time(), 0))
+            except queue.Empty:
+                raise TimeoutExpired(self.command, timeout)
+            if line is None:
+                raise BrokenPipeError("Worker process exited: {}".format(self.command))
+            if line == END_OF_OUTPUT:
+                return
+            yield line
+
+    def ping(self, timeout: float):
+        try:
+            self.last_health_check = time.time()
+            return self.execute("ping", [], timeout).strip() == "pong"
+        except Exception:
+            return False
+
+
+class BACnetCoprocessPool:
+    """
+    Pool of long-lived read worker processes replacing process spawn per read
+    worker hanging over read timeout is killed and restarted,
+    idle workers are checked by ping before use once per health_check_interval
+    """
+
+    def __init__(self, config: dict):
+        """
+        :param config: visiobas_slicer config, key "pool" holds settings of pool:
+        size - count of worker processes,
+        command - worker command line (default python bacnet.worker served by in process BACnet/IP client),
+        health_check_interval - seconds between worker ping,
+        hang_margin - seconds to wait output over read timeout before worker is restarted
+        """
+        settings = config.get("pool", {})
+        self.size = settings.get("size", 1)
+        self.health_check_interval = settings.get("health_check_interval", 30)
+        self.hang_margin = settings.get("hang_margin", 1)
+        self.command = settings.get("command")
+        if self.command is None:
+            self.command = [sys.executable, "-m", "bacnet.worker",
+                            "--address_cache", str(config["address_cache"]),
+                            "--timeout", str(config.get("read_timeout", 5)),
+                            "--address_cache_interval", str(config.get("address_cache_watch", {}).get("interval", 5))]
+        self.cwd = Path(__file__).absolute().parent.parent
+        self.logger = logging.getLogger('bacnet.pool')
+        self.idle = queue.Queue()
+        self.workers = []
+        for i in range(self.size):
+            worker = BACnetCoprocess(self.command, self.cwd, self.hang_margin)
+            worker.start()
+            self.workers.append(worker)
+            self.idle.put(worker)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def __check_health(self, worker: BACnetCoprocess, timeout: float):
+        if not worker.is_alive():
+            self.logger.warning("Worker process is not alive, restart: {}".format(self.command))
+            worker.restart()
+        elif time.time() - worker.last_health_check > self.health_check_interval and not worker.ping(timeout):
+            self.logger.warning("Worker process does not answer ping, restart: {}".format(self.command))
+            worker.restart()
+
+    def execute(self, app: str, args: list, timeout: float):
+        """
+        Execute read command by one of idle workers
+        :return: output of command
+        :raise TimeoutExpired: no idle worker or worker hang and was restarted (as read by spawned process)
+        """
+        return "".join(self.execute_lines(app, args, timeout))
+
+    def execute_lines(self, app: str, args: list, timeout: float):
+        """
+        Execute read command by one of idle workers, worker is held until output is read to the end
+        or generator is closed
+        :return: generator of output lines of command as worker writes them
+        :raise TimeoutExpired: no idle worker or worker hang and was restarted (as read by spawned process)
+        """
+        try:
+            worker = self.idle.get(True, timeout)
+        except queue.Empty:
+            self.logger.error("No idle worker during {} sec".format(timeout))
+            raise TimeoutExpired(app, timeout)
+        completed = False
+        try:
+            self.__check_health(worker, timeout)
+            yield from worker.execute_lines(app, args, timeout)
+            completed = True
+        except (TimeoutExpired, BrokenPipeError, OSError) as e:
+            self.logger.error("Worker failed ({}), restart: {} {}".format(e, app, " ".join([str(a) for a in args])))
+            worker.restart()
+            completed = True
+            raise
+        finally:
+            if not completed:
+                # rest of output is not read, it must not be taken as output of next command
+                worker.restart()
+            self.idle.put(worker)
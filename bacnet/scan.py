@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bacnet.apdu import BACnetError, PduType
+from bacnet.bacnet import ObjectType, ObjectProperty
+from bacnet.discovery import BACnetDiscovery, MAX_DEVICE_ID
+from bacnet.native import BACnetNativeClient
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# basic properties of scanned objects, object-name is VisioBAS object reference
+scan_properties = [int(ObjectProperty.OBJECT_PROPERTY_REFERENCE.id()), int(ObjectProperty.DESCRIPTION.id())]
+
+
+class BACnetScanCancelled(Exception):
+    pass
+
+
+class BACnetScanJob:
+    """
+    Background scan of BACnet network, found objects are appended as soon as device is scanned
+    so progress is polled by pages while scan is running
+    """
+
+    def __init__(self, job_id: str, ranges: list, expected: list = None):
+        self.job_id = job_id
+        self.ranges = ranges
+        self.expected = expected
+        self.status = RUNNING
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.devices_total = 0
+        self.devices_scanned = 0
+        self.devices_failed = 0
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        # list of dict of scanned object properties
+        self.data = []
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise BACnetScanCancelled()
+
+    def append(self, objects: list, failed=False):
+        with self.lock:
+            self.data += objects
+            self.devices_scanned += 1
+            if failed:
+                self.devices_failed += 1
+
+    def finish(self, status: str, error: str = None):
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+
+    def page(self, offset: int = 0, limit: int = 1000):
+        """
+        :return: progress of scan and objects found from offset (at most limit)
+        """
+        with self.lock:
+            data = self.data[offset:offset + limit]
+            count = len(self.data)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "devices_total": self.devices_total,
+            "devices_scanned": self.devices_scanned,
+            "devices_failed": self.devices_failed,
+            "objects_found": count,
+            "offset": offset,
+            "next_offset": offset + len(data),
+            "data": data
+        }
+
+
+class BACnetScanner:
+    """
+    Scan of BACnet network by in process BACnet/IP client:
+    Who-Is discovery of devices, object-list enumeration and basic properties of objects,
+    devices are scanned concurrently and properties are read by ReadPropertyMultiple sized to APDU of device
+    """
+
+    def __init__(self, client: BACnetNativeClient, config: dict, capabilities=None):
+        """
+        :param config: visiobas_slicer config, key "discovery" holds settings of Who-Is discovery,
+        key "scan" holds settings of scan:
+        concurrency - max count of concurrently scanned devices,
+        object_list_concurrency - max count of concurrently read object-list elements of one device,
+        timeout - read timeout (sec),
+        jobs - max count of concurrently running scan jobs,
+        retention - finished job is kept for polling for retention seconds
+        """
+        settings = config.get("scan", {})
+        self.client = client
+        self.discovery = BACnetDiscovery(client, config, capabilities)
+        self.concurrency = settings.get("concurrency", 16)
+        self.object_list_concurrency = settings.get("object_list_concurrency", 8)
+        self.timeout = settings.get("timeout", config.get("read_timeout", 5))
+        self.retention = settings.get("retention", 3600)
+        self.executor = ThreadPoolExecutor(max_workers=settings.get("jobs", 2), thread_name_prefix="bacnet-scan")
+        self.logger = logging.getLogger('bacnet.scan')
+        self.lock = threading.Lock()
+        # key - job id, value - BACnetScanJob
+        self.jobs = {}
+
+    def start(self, device_ids: list = None, ranges: list = None):
+        """
+        Start background scan
+        :param device_ids: scan only these devices
+        :param ranges: list of (low, high) device id ranges (default all devices)
+        :return: BACnetScanJob
+        """
+        if ranges is None:
+            ranges = BACnetDiscovery.contiguous(device_ids) if device_ids else [(0, MAX_DEVICE_ID)]
+        job = BACnetScanJob(uuid.uuid4().hex, ranges, device_ids)
+        with self.lock:
+            self.__remove_expired()
+            self.jobs[job.job_id] = job
+        self.executor.submit(self.run, job)
+        return job
+
+    def get(self, job_id: str):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def run(self, job: BACnetScanJob):
+        try:
+            devices = self.discovery.discover(job.ranges, job.expected)
+            if job.expected:
+                devices = [d for d in devices if d["id"] in job.expected]
+            job.devices_total = len(devices)
+            job.check_cancelled()
+            self.client.run(self.__scan_devices(job, devices))
+            job.finish(CANCELLED if job.is_cancelled() else DONE)
+        except BACnetScanCancelled:
+            job.finish(CANCELLED)
+        except Exception as e:
+            self.logger.exception("Failed scan job: {}".format(job.job_id))
+            job.finish(FAILED, str(e))
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Scan job: {} {} devices: {} objects: {} duration: {:.2f} sec".format(
+                job.job_id, job.status, job.devices_scanned, len(job.data), job.finished - job.started))
+
+    async def __scan_devices(self, job: BACnetScanJob, devices: list):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def scan_one(device):
+            async with semaphore:
+                if job.is_cancelled():
+                    return
+                try:
+                    job.append(await self.scan_device(job, device["id"], device["apdu"]))
+                except (BACnetError, asyncio.TimeoutError) as e:
+                    self.logger.warning("Failed scan device: {} {}".format(
+                        device["id"], e if str(e) else type(e).__name__))
+                    job.append([], failed=True)
+
+        await asyncio.gather(*[scan_one(device) for device in devices])
+
+    async def scan_device(self, job: BACnetScanJob, device_id: int, apdu: int):
+        """
+        :return: list of dict of object properties of device objects
+        """
+        object_list = await self.client.read_object_list_async(device_id, self.timeout,
+                                                               self.object_list_concurrency)
+        # approximate size of object in ReadPropertyMultiple response with names of 64 characters
+        batch_size = max(1, (apdu - 16) // 160)
+        batches = [object_list[i:i + batch_size] for i in range(0, len(object_list), batch_size)]
+        properties = {}
+        for batch in batches:
+            job.check_cancelled()
+            properties.update(await self.__read_properties(device_id, batch))
+        objects = []
+        for object_identifier in object_list:
+            values = properties.get((object_identifier.type, object_identifier.instance), {})
+            data = {
+                ObjectProperty.DEVICE_ID.id(): device_id,
+                ObjectProperty.OBJECT_IDENTIFIER.id(): object_identifier.instance,
+                ObjectProperty.OBJECT_TYPE.id(): ObjectType.code_to_name(object_identifier.type)
+            }
+            for property_id, value in values.items():
+                data[str(property_id)] = value
+            objects.append(data)
+        return objects
+
+    async def __read_properties(self, device_id: int, objects: list):
+        """
+        :return: dict key - (object type code, object id), value - dict of property id -> value
+        """
+        try:
+            results = await self.client.read_property_multiple_async(
+                device_id, [(o.type, o.instance, scan_properties) for o in objects], self.timeout)
+            return {(o.type, o.instance): {p: v for p, _, v in values if not isinstance(v, BACnetError)}
+                    for o, values in results}
+        except BACnetError as e:
+            if e.pdu_type == PduType.ABORT and len(objects) > 1:
+                middle = len(objects) // 2
+                result = await self.__read_properties(device_id, objects[:middle])
+                result.update(await self.__read_properties(device_id, objects[middle:]))
+                return result
+            if e.pdu_type not in (PduType.ABORT, PduType.REJECT):
+                raise
+        # ReadPropertyMultiple is not supported
+        result = {}
+        for o in objects:
+            values = await asyncio.gather(*[self.client.read_property_async(device_id, o.type, o.instance, p,
+                                                                            self.timeout)
+                                            for p in scan_properties], return_exceptions=True)
+            result[(o.type, o.instance)] = {p: v for p, v in zip(scan_properties, values)
+                                            if not isinstance(v, Exception)}
+        return result
+
+    def __remove_expired(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job.finished is not None and now - job.finished > self.retention]:
+            del self.jobs[job_id]
+
+
+__shared_scanner = None
+__shared_lock = threading.Lock()
+
+
+def shared_scanner(client: BACnetNativeClient, config: dict, capabilities=None):
+    """
+    Single scanner per process holding scan jobs polled by gateway server requests
+    """
+    global __shared_scanner
+    with __shared_lock:
+        if __shared_scanner is None:
+            __shared_scanner = BACnetScanner(client, config, capabilities)
+        return __shared_scanner
@@ -0,0 +1,83 @@
+import heapq
+import itertools
+import threading
+
+
+class BACnetReadScheduler:
+    """
+    Deadline heap of data points of collector: data point (pooling entry, dict) is scheduled by time of its next
+    read, due data points are taken grouped by device. Schedule and take of data point cost O(log n), collector
+    sleeps until next deadline instead of scanning all data points.
+    Data point keeps time it is scheduled at in key "due", heap entries of rescheduled or removed data points
+    are stale and dropped when taken
+    """
+
+    def __init__(self):
+        self.heap = []
+        # order of data points scheduled at the same time, data points are not compared
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        # set when data point is scheduled earlier than collector sleeps until
+        self.wakeup = threading.Event()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, device_id: int, pooling: dict, due: float):
+        """
+        Schedule data point to be read after due time, data point scheduled already is moved, removed one is not
+        scheduled
+        """
+        with self.lock:
+            if pooling.get("removed", False):
+                return
+            pooling["due"] = due
+            heapq.heappush(self.heap, (due, next(self.counter), device_id, pooling))
+            if self.heap[0][3] is pooling:
+                self.wakeup.set()
+
+    def remove(self, pooling: dict):
+        with self.lock:
+            pooling["due"] = None
+            pooling["removed"] = True
+
+    def pop_due(self, now: float):
+        """
+        :return: dict device id -> list of data points due before now in order of due time, taken data points
+        are not scheduled until they are scheduled again
+        """
+        due_points = {}
+        with self.lock:
+            heap = self.heap
+            while len(heap) > 0 and heap[0][0] < now:
+                due, _, device_id, pooling = heapq.heappop(heap)
+                if pooling.get("due") != due:
+                    continue
+                pooling["due"] = None
+                points = due_points.get(device_id)
+                if points is None:
+                    due_points[device_id] = [pooling]
+                else:
+                    points.append(pooling)
+        return due_points
+
+    def next_due(self):
+        """
+        :return: time of next due data point or None
+        """
+        with self.lock:
+            heap = self.heap
+            while len(heap) > 0 and heap[0][3].get("due") != heap[0][0]:
+                heapq.heappop(heap)
+            return heap[0][0] if len(heap) > 0 else None
+
+    def wait(self, now: float, min_timeout: float, max_timeout: float):
+        """
+        Sleep until next due data point, data point scheduled earlier wakes up
+        :param min_timeout: data points due within it are taken together
+        :param max_timeout: longest sleep (heart beat of collector)
+        """
+        self.wakeup.clear()
+        due = self.next_due()
+        timeout = max_timeout if due is None else min(max(due - now, min_timeout), max_timeout)
+        self.wakeup.wait(timeout)
@@ -0,0 +1,668 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, BACnetError, ConfirmedService, UnconfirmedService, PduType, \
+    Enumerated, BitString, ObjectIdentifier, ObjectPropertyReference, REJECT_UNRECOGNIZED_SERVICE, \
+    ABORT_SEGMENTATION_NOT_SUPPORTED
+from bacnet.bacnet import ObjectType, ObjectProperty
+from bacnet.writer import BACnetWriter
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+analog_object_types = [ObjectType.ANALOG_INPUT.code(), ObjectType.ANALOG_OUTPUT.code(),
+                       ObjectType.ANALOG_VALUE.code()]
+
+binary_object_types = [ObjectType.BINARY_INPUT.code(), ObjectType.BINARY_OUTPUT.code(),
+                       ObjectType.BINARY_VALUE.code()]
+
+commandable_object_types = [ObjectType.ANALOG_OUTPUT.code(), ObjectType.ANALOG_VALUE.code(),
+                            ObjectType.BINARY_OUTPUT.code(), ObjectType.BINARY_VALUE.code(),
+                            ObjectType.MULTI_STATE_OUTPUT.code(), ObjectType.MULTI_STATE_VALUE.code()]
+
+# error class object / property, error code unknown-object / unknown-property / invalid-array-index /
+# write-access-denied / read-access-denied
+UNKNOWN_OBJECT = (1, 31)
+UNKNOWN_PROPERTY = (2, 32)
+INVALID_ARRAY_INDEX = (2, 42)
+WRITE_ACCESS_DENIED = (2, 40)
+READ_ACCESS_DENIED = (2, 27)
+
+
+class BACnetDeviceFarm:
+    """
+    Virtual BACnet devices for load and benchmark runs without real controllers
+    present values follow waveform of time so repeated reads see changing values,
+    all values are function of farm spec and time so every farm process (UDP endpoint, fake bacrp / bacrpm)
+    answers the same
+    """
+
+    def __init__(self, spec: dict):
+        """
+        :param spec: farm description:
+        seed - seed of generated values,
+        devices - count of devices, first_device_id - id of first device,
+        host, base_port - UDP address of first device (device n listens base_port + n),
+        objects - count of objects per device by object type name ({"analog-input": 100, ...}),
+        latency, jitter - response delay (sec), drop_rate - share of requests left without response,
+        rpm_ratio - share of devices supporting ReadPropertyMultiple and WritePropertyMultiple,
+        max_apdu - APDU of devices,
+        waveform - sine | ramp | square | random | constant, period - waveform period (sec),
+        fault_ratio - share of objects reporting fault, update_interval - pooling interval of objects (sec),
+        who_is_port - UDP port answering Who-Is by all devices (stand-in of broadcast address),
+        trend-log objects ("trend-log" in objects) log present value of n-th other object of device
+        every log_interval sec into buffer of log_buffer_size records,
+        database_revision - database-revision of devices
+        """
+        self.spec = spec
+        self.seed = spec.get("seed", 1)
+        self.device_count = spec.get("devices", 10)
+        self.first_device_id = spec.get("first_device_id", 1000)
+        self.host = spec.get("host", "127.0.0.1")
+        self.base_port = spec.get("base_port", 47900)
+        self.object_counts = spec.get("objects", {"analog-input": 10, "binary-input": 10})
+        self.latency = spec.get("latency", 0)
+        self.jitter = spec.get("jitter", 0)
+        self.drop_rate = spec.get("drop_rate", 0)
+        self.rpm_ratio = spec.get("rpm_ratio", 1.0)
+        self.max_apdu = spec.get("max_apdu", 480)
+        self.waveform = spec.get("waveform", "sine")
+        self.period = spec.get("period", 600)
+        self.fault_ratio = spec.get("fault_ratio", 0)
+        self.update_interval = spec.get("update_interval", 60)
+        self.who_is_port = spec.get("who_is_port")
+        self.log_interval = spec.get("log_interval", 60)
+        self.log_buffer_size = spec.get("log_buffer_size", 1000)
+        self.database_revision = spec.get("database_revision", 1)
+        self.random = random.Random(self.seed)
+        # key - (device id, object type code, object id), value - priority array of written commands
+        self.commands = {}
+
+    @staticmethod
+    def load(path):
+        return BACnetDeviceFarm(json.loads(Path(path).read_text()))
+
+    def __hash(self, *values):
+        return zlib.crc32(" ".join([str(self.seed)] + [str(v) for v in values]).encode()) / 0xFFFFFFFF
+
+    def device_ids(self):
+        return list(range(self.first_device_id, self.first_device_id + self.device_count))
+
+    def has_device(self, device_id: int):
+        return self.first_device_id <= device_id < self.first_device_id + self.device_count
+
+    def get_port(self, device_id: int):
+        return self.base_port + device_id - self.first_device_id
+
+    def devices(self):
+        """
+        :return: list of devices in bacwi table format (id, host, port, apdu)
+        """
+        return [{"id": device_id, "host": self.host, "port": self.get_port(device_id), "apdu": self.max_apdu}
+                for device_id in self.device_ids()]
+
+    def supports_rpm(self, device_id: int):
+        return self.__hash("rpm", device_id) < self.rpm_ratio
+
+    def objects(self, device_id: int):
+        """
+        :return: list of (object type code, object id) of device
+        """
+        objects = []
+        for object_type_name, count in self.object_counts.items():
+            object_type_code = ObjectType.name_to_code(object_type_name)
+            objects += [(object_type_code, object_id) for object_id in range(1, count + 1)]
+        return objects
+
+    def has_object(self, device_id: int, object_type: int, object_id: int):
+        if object_type == ObjectType.DEVICE.code():
+            return object_id == device_id
+        count = self.object_counts.get(ObjectType.code_to_name(object_type), 0)
+        return self.has_device(device_id) and 1 <= object_id <= count
+
+    def is_fault(self, device_id: int, object_type: int, object_id: int):
+        return self.__hash("fault", device_id, object_type, object_id) < self.fault_ratio
+
+    def wave(self, device_id: int, object_type: int, object_id: int, now: float):
+        """
+        :return: waveform value in range [0, 1]
+        """
+        phase = self.__hash("phase", device_id, object_type, object_id)
+        x = now / self.period + phase
+        if self.waveform == "sine":
+            return (math.sin(2 * math.pi * x) + 1) / 2
+        if self.waveform == "ramp":
+            return x - math.floor(x)
+        if self.waveform == "square":
+            return 1.0 if x - math.floor(x) < 0.5 else 0.0
+        if self.waveform == "random":
+            return self.__hash("random", device_id, object_type, object_id, int(now))
+        return phase
+
+    def present_value(self, device_id: int, object_type: int, object_id: int, now: float):
+        commands = self.commands.get((device_id, object_type, object_id), [])
+        command = next((c for c in commands if c is not None), None)
+        if command is not None:
+            return command
+        return self.sampled_value(device_id, object_type, object_id, now)
+
+    def sampled_value(self, device_id: int, object_type: int, object_id: int, now: float):
+        """
+        :return: waveform value of object (present value without commands)
+        """
+        wave = self.wave(device_id, object_type, object_id, now)
+        if object_type in analog_object_types:
+            return round(wave * 100, 1)
+        if object_type in binary_object_types:
+            return Enumerated(1 if wave >= 0.5 else 0)
+        return min(int(wave * 4), 3) + 1
+
+    def value(self, device_id: int, object_type: int, object_id: int, property_id: int, now: float = None):
+        """
+        :return: decoded property value or BACnetError
+        """
+        now = now if now is not None else time.time()
+        if not self.has_object(device_id, object_type, object_id):
+            return BACnetError(PduType.ERROR, *UNKNOWN_OBJECT)
+        property_code = str(property_id)
+        fault = self.is_fault(device_id, object_type, object_id)
+        if property_code == ObjectProperty.OBJECT_IDENTIFIER.id():
+            return ObjectIdentifier(object_type, object_id)
+        if property_code == ObjectProperty.OBJECT_TYPE.id():
+            return Enumerated(object_type)
+        if property_code == ObjectProperty.DESCRIPTION.id():
+            return "{} {} of device {}".format(ObjectType.code_to_name(object_type), object_id, device_id)
+        if property_code == ObjectProperty.OBJECT_PROPERTY_REFERENCE.id():
+            # object-name
+            return self.reference(device_id, object_type, object_id)
+        if object_type == ObjectType.DEVICE.code():
+            if property_code == ObjectProperty.OBJECT_LIST.id():
+                return [ObjectIdentifier(ObjectType.DEVICE.code(), device_id)] + \
+                       [ObjectIdentifier(t, i) for t, i in self.objects(device_id)]
+            if property_code == ObjectProperty.DATABASE_REVISION.id():
+                return self.database_revision
+            return BACnetError(PduType.ERROR, *UNKNOWN_PROPERTY)
+        if property_code == ObjectProperty.PRESENT_VALUE.id():
+            return self.present_value(device_id, object_type, object_id, now)
+        if property_code == ObjectProperty.STATUS_FLAGS.id():
+            return BitString([False, fault, False, False])
+        if property_code == ObjectProperty.OUT_OF_SERVICE.id():
+            return False
+        if property_code == ObjectProperty.RELIABILITY.id():
+            # no-fault-detected / unreliable-other
+            return Enumerated(7 if fault else 0)
+        if property_code == ObjectProperty.EVENT_STATE.id():
+            return Enumerated(1 if fault else 0)
+        if property_code == ObjectProperty.PRIORITY_ARRAY.id() and object_type in commandable_object_types:
+            return list(self.commands.get((device_id, object_type, object_id), [None] * 16))
+        if object_type == ObjectType.TREND_LOG.code():
+            return self.log_value(device_id, object_id, property_code, now)
+        return BACnetError(PduType.ERROR, *UNKNOWN_PROPERTY)
+
+    def logged_object(self, device_id: int, log_id: int):
+        """
+        :return: (object type code, object id) logged by trend-log or None
+        """
+        logged = [o for o in self.objects(device_id) if o[0] != ObjectType.TREND_LOG.code()]
+        return logged[log_id - 1] if log_id <= len(logged) else None
+
+    def last_sequence(self, now: float):
+        """
+        :return: sequence number of last record of trend-log buffers, record n is logged at n * log_interval
+        """
+        return int(now // self.log_interval)
+
+    def log_value(self, device_id: int, log_id: int, property_code: str, now: float):
+        logged = self.logged_object(device_id, log_id)
+        if property_code == ObjectProperty.LOG_DEVICE_OBJECT_PROPERTY.id() and logged is not None:
+            return ObjectPropertyReference(logged[0], logged[1], int(ObjectProperty.PRESENT_VALUE.id()), None)
+        if property_code == ObjectProperty.LOG_INTERVAL.id():
+            # hundredths of second
+            return int(self.log_interval * 100)
+        if property_code == ObjectProperty.BUFFER_SIZE.id():
+            return self.log_buffer_size
+        if property_code == ObjectProperty.RECORD_COUNT.id():
+            return min(self.log_buffer_size, self.last_sequence(now)) if logged is not None else 0
+        if property_code == ObjectProperty.TOTAL_RECORD_COUNT.id():
+            return self.last_sequence(now) if logged is not None else 0
+        if property_code == ObjectProperty.LOG_BUFFER.id():
+            # log-buffer is read by ReadRange only
+            return BACnetError(PduType.ERROR, *READ_ACCESS_DENIED)
+        return BACnetError(PduType.ERROR, *UNKNOWN_PROPERTY)
+
+    def log_records(self, device_id: int, log_id: int, reference, count: int, by_time: bool, now: float = None):
+        """
+        Records of trend-log buffer answering ReadRange
+        :param reference: sequence number or timestamp if by_time (None - whole buffer)
+        :return: tuple of (result flags, [(timestamp, value, status flags), ...], first sequence number)
+        or BACnetError
+        """
+        now = now if now is not None else time.time()
+        if not self.has_object(device_id, ObjectType.TREND_LOG.code(), log_id):
+            return BACnetError(PduType.ERROR, *UNKNOWN_OBJECT)
+        logged = self.logged_object(device_id, log_id)
+        last = self.last_sequence(now) if logged is not None else 0
+        first = max(1, last - self.log_buffer_size + 1)
+        if reference is None:
+            low, high = first, last
+        elif by_time:
+            # records strictly after (count > 0) or before (count < 0) reference time
+            after = int(reference // self.log_interval) + 1
+            low, high = (after, after + count - 1) if count > 0 else \
+                (math.ceil(reference / self.log_interval) + count, math.ceil(reference / self.log_interval) - 1)
+        else:
+            low, high = (reference, reference + count - 1) if count > 0 else (reference + count + 1, reference)
+        matched_low, matched_high = max(low, first), min(high, last)
+        if matched_low > matched_high:
+            return BitString([False, False, False]), [], None
+        more = matched_high < last if count is None or count > 0 else matched_low > first
+        fault = self.is_fault(device_id, logged[0], logged[1])
+        records = [(n * self.log_interval, self.sampled_value(device_id, logged[0], logged[1], n * self.log_interval),
+                    BitString([False, fault, False, False])) for n in range(matched_low, matched_high + 1)]
+        return BitString([matched_low == first, matched_high == last, more]), records, matched_low
+
+    def write(self, device_id: int, object_type: int, object_id: int, property_id: int, value, priority: int = None):
+        """
+        Command present value of commandable object (None relinquishes command of priority)
+        :return: None or BACnetError
+        """
+        if not self.has_object(device_id, object_type, object_id):
+            return BACnetError(PduType.ERROR, *UNKNOWN_OBJECT)
+        if str(property_id) != ObjectProperty.PRESENT_VALUE.id() or object_type not in commandable_object_types:
+            return BACnetError(PduType.ERROR, *WRITE_ACCESS_DENIED)
+        commands = self.commands.setdefault((device_id, object_type, object_id), [None] * 16)
+        commands[(priority or 16) - 1] = value
+        return None
+
+    def read_multiple(self, device_id: int, objects: list, now: float = None):
+        """
+        :param objects: list of (object type code, object id, [property id, ...])
+        :return: list of (object type code, object id, [(property id, value or BACnetError), ...])
+        """
+        now = now if now is not None else time.time()
+        return [(object_type, object_id,
+                 [(int(p), self.value(device_id, object_type, object_id, int(p), now)) for p in properties])
+                for object_type, object_id, properties in objects]
+
+    def reference(self, device_id: int, object_type: int, object_id: int):
+        if object_type == ObjectType.DEVICE.code():
+            return "Site:Farm/Device.{}".format(device_id)
+        return "Site:Farm/Device.{}/{}.{}".format(device_id, ObjectType.code_to_name(object_type), object_id)
+
+    def delay(self):
+        return max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0)
+
+    def is_dropped(self):
+        return self.random.random() < self.drop_rate
+
+    def server_devices(self, read_app: str = "native"):
+        """
+        :return: devices in VisioBAS server format (rq_devices)
+        """
+        return [{
+            ObjectProperty.OBJECT_IDENTIFIER.id(): device["id"],
+            ObjectProperty.OBJECT_TYPE.id(): ObjectType.DEVICE.name(),
+            ObjectProperty.DEVICE_ID.id(): device["id"],
+            ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): self.reference(device["id"], ObjectType.DEVICE.code(),
+                                                                          device["id"]),
+            ObjectProperty.CONFIGURATION_FILES.id(): json.dumps({
+                "host": device["host"], "port": device["port"], "read": read_app})
+        } for device in self.devices()]
+
+    def server_objects(self, device_id: int, object_type: ObjectType):
+        """
+        :return: objects in VisioBAS server format (rq_device_object)
+        """
+        if not self.has_device(device_id):
+            return []
+        count = self.object_counts.get(object_type.name(), 0)
+        return [{
+            ObjectProperty.OBJECT_IDENTIFIER.id(): object_id,
+            ObjectProperty.OBJECT_TYPE.id(): object_type.name(),
+            ObjectProperty.DEVICE_ID.id(): device_id,
+            ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): self.reference(device_id, object_type.code(), object_id),
+            ObjectProperty.DESCRIPTION.id(): "{} {} of device {}".format(object_type.name(), object_id, device_id),
+            ObjectProperty.PROPERTY_LIST.id(): json.dumps({"update_interval": self.update_interval})
+        } for object_id in range(1, count + 1)]
+
+
+class BACnetFarmClient:
+    """
+    Client interface of BACnetNativeClient answered by farm directly (no network),
+    used by fake bacrp / bacrpm executables and farm read workers
+    """
+
+    def __init__(self, farm: BACnetDeviceFarm):
+        self.farm = farm
+
+    def __answer(self, device_id: int, timeout: float):
+        if not self.farm.has_device(device_id) or self.farm.is_dropped():
+            time.sleep(timeout)
+            raise asyncio.TimeoutError()
+        time.sleep(self.farm.delay())
+
+    def read_property(self, device_id: int, object_type, object_id: int, property_id, timeout: float):
+        self.__answer(device_id, timeout)
+        object_type = object_type.code() if type(object_type) == ObjectType else object_type
+        value = self.farm.value(device_id, object_type, object_id, int(property_id))
+        if isinstance(value, BACnetError):
+            raise value
+        return value
+
+    def read_property_multiple(self, device_id: int, objects: list, timeout: float):
+        self.__answer(device_id, timeout)
+        if not self.farm.supports_rpm(device_id):
+            raise BACnetError(PduType.REJECT, reason=REJECT_UNRECOGNIZED_SERVICE)
+        results = []
+        for object_type, object_id, properties in self.farm.read_multiple(device_id, objects):
+            results.append((ObjectIdentifier(object_type, object_id), [(p, None, v) for p, v in properties]))
+        return results
+
+
+class BACnetFarmProtocol(asyncio.DatagramProtocol):
+    """
+    UDP endpoint of one virtual device answering ReadProperty, ReadPropertyMultiple, ReadRange and writes
+    """
+
+    def __init__(self, farm: BACnetDeviceFarm, device_id: int, loop):
+        self.farm = farm
+        self.device_id = device_id
+        self.loop = loop
+        self.transport = None
+        self.logger = logging.getLogger('bacnet.simulator')
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            frame = BACnetDecoder.frame(data, addr)
+            if frame is None:
+                return
+            _, apdu = frame
+            if apdu.pdu_type == PduType.UNCONFIRMED_REQUEST and apdu.service == UnconfirmedService.WHO_IS.id():
+                self.answer_who_is(apdu.payload, addr)
+                return
+            if apdu.pdu_type != PduType.CONFIRMED_REQUEST or self.farm.is_dropped():
+                return
+            response = self.handle(apdu)
+        except Exception:
+            self.logger.exception("Failed handle request of device: {}".format(self.device_id))
+            return
+        delay = self.farm.delay()
+        if delay > 0:
+            self.loop.call_later(delay, self.transport.sendto, response, addr)
+        else:
+            self.transport.sendto(response, addr)
+
+    def answer_who_is(self, payload: bytes, addr):
+        low, high = BACnetDecoder.who_is_request(payload)
+        if low is not None and not low <= self.device_id <= high or self.farm.is_dropped():
+            return
+        response = BACnetEncoder.unconfirmed_request(UnconfirmedService.I_AM,
+                                                     BACnetEncoder.i_am(self.device_id, self.farm.max_apdu))
+        self.loop.call_later(self.farm.delay(), self.transport.sendto, response, addr)
+
+    def handle(self, apdu):
+        if apdu.service == ConfirmedService.READ_PROPERTY.id():
+            object_identifier, property_id, index = BACnetDecoder.read_property_request(apdu.payload)
+            value = self.farm.value(self.device_id, object_identifier.type, object_identifier.instance, property_id)
+            if index is not None and isinstance(value, list):
+                value = len(value) if index == 0 else value[index - 1] if index <= len(value) else \
+                    BACnetError(PduType.ERROR, *INVALID_ARRAY_INDEX)
+            if isinstance(value, BACnetError):
+                return BACnetEncoder.error(apdu.invoke_id, ConfirmedService.READ_PROPERTY,
+                                           value.error_class, value.error_code)
+            payload = BACnetEncoder.read_property_ack(object_identifier.type, object_identifier.instance,
+                                                      property_id, value, index)
+            return self.__ack(apdu, ConfirmedService.READ_PROPERTY, payload)
+        if apdu.service == ConfirmedService.WRITE_PROPERTY.id():
+            object_identifier, property_id, _, value, priority = BACnetDecoder.write_property_request(apdu.payload)
+            error = self.farm.write(self.device_id, object_identifier.type, object_identifier.instance, property_id,
+                                    value, priority)
+            if error is not None:
+                return BACnetEncoder.error(apdu.invoke_id, ConfirmedService.WRITE_PROPERTY,
+                                           error.error_class, error.error_code)
+            return BACnetEncoder.simple_ack(apdu.invoke_id, ConfirmedService.WRITE_PROPERTY)
+        if apdu.service == ConfirmedService.WRITE_PROPERTY_MULTIPLE.id() and self.farm.supports_rpm(self.device_id):
+            for object_identifier, properties in BACnetDecoder.write_property_multiple_request(apdu.payload):
+                for property_id, _, value, priority in properties:
+                    error = self.farm.write(self.device_id, object_identifier.type, object_identifier.instance,
+                                            property_id, value, priority)
+                    if error is not None:
+                        return BACnetEncoder.error(apdu.invoke_id, ConfirmedService.WRITE_PROPERTY_MULTIPLE,
+                                                   error.error_class, error.error_code)
+            return BACnetEncoder.simple_ack(apdu.invoke_id, ConfirmedService.WRITE_PROPERTY_MULTIPLE)
+        if apdu.service == ConfirmedService.READ_RANGE.id():
+            object_identifier, property_id, reference, count, by_time = BACnetDecoder.read_range_request(apdu.payload)
+            result = self.farm.log_records(self.device_id, object_identifier.instance, reference, count, by_time) \
+                if object_identifier.type == ObjectType.TREND_LOG.code() and \
+                str(property_id) == ObjectProperty.LOG_BUFFER.id() else BACnetError(PduType.ERROR, *UNKNOWN_PROPERTY)
+            if isinstance(result, BACnetError):
+                return BACnetEncoder.error(apdu.invoke_id, ConfirmedService.READ_RANGE,
+                                           result.error_class, result.error_code)
+            result_flags, records, first_sequence = result
+            payload = BACnetEncoder.read_range_ack(object_identifier.type, object_identifier.instance, property_id,
+                                                   result_flags, records, first_sequence)
+            return self.__ack(apdu, ConfirmedService.READ_RANGE, payload)
+        if apdu.service == ConfirmedService.READ_PROPERTY_MULTIPLE.id() and self.farm.supports_rpm(self.device_id):
+            objects = [(o.type, o.instance, [p for p, _ in properties])
+                       for o, properties in BACnetDecoder.read_property_multiple_request(apdu.payload)]
+            payload = BACnetEncoder.read_property_multiple_ack(self.farm.read_multiple(self.device_id, objects))
+            return self.__ack(apdu, ConfirmedService.READ_PROPERTY_MULTIPLE, payload)
+        return BACnetEncoder.reject(apdu.invoke_id, REJECT_UNRECOGNIZED_SERVICE)
+
+    def __ack(self, apdu, service: ConfirmedService, payload: bytes):
+        if len(payload) + 3 > self.farm.max_apdu:
+            return BACnetEncoder.abort(apdu.invoke_id, ABORT_SEGMENTATION_NOT_SUPPORTED)
+        return BACnetEncoder.complex_ack(apdu.invoke_id, service, payload)
+
+
+class BACnetFarmWhoIsProtocol(asyncio.DatagramProtocol):
+    """
+    UDP endpoint standing in for broadcast address of farm network,
+    Who-Is received is answered by I-Am of each requested device from its own endpoint
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        frame = BACnetDecoder.frame(data, addr)
+        if frame is None:
+            return
+        _, apdu = frame
+        if apdu.pdu_type != PduType.UNCONFIRMED_REQUEST or apdu.service != UnconfirmedService.WHO_IS.id():
+            return
+        low, high = BACnetDecoder.who_is_request(apdu.payload)
+        farm = self.server.farm
+        low = max(low, farm.first_device_id) if low is not None else farm.first_device_id
+        high = min(high, farm.first_device_id + farm.device_count - 1) if high is not None else \
+            farm.first_device_id + farm.device_count - 1
+        for device_id in range(low, high + 1):
+            self.server.protocols[device_id].answer_who_is(apdu.payload, addr)
+
+
+class BACnetFarmServer:
+    """
+    UDP endpoints of all farm devices served by one asyncio event loop running in background thread,
+    with farm spec key who_is_port Who-Is sent to this port is answered by all devices
+    """
+
+    def __init__(self, farm: BACnetDeviceFarm):
+        self.farm = farm
+        self.loop = None
+        self.thread = None
+        self.transports = []
+        # key - device id, value - BACnetFarmProtocol
+        self.protocols = {}
+        self.logger = logging.getLogger('bacnet.simulator')
+
+    def start(self):
+        self.__raise_open_files_limit(self.farm.device_count + 256)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="bacnet-farm", daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.__create_endpoints(), self.loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.__close_endpoints(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.transports = []
+        self.protocols = {}
+
+    async def __create_endpoints(self):
+        for device_id in self.farm.device_ids():
+            transport, protocol = await self.loop.create_datagram_endpoint(
+                lambda d=device_id: BACnetFarmProtocol(self.farm, d, self.loop),
+                local_addr=(self.farm.host, self.farm.get_port(device_id)))
+            self.transports.append(transport)
+            self.protocols[device_id] = protocol
+        if self.farm.who_is_port is not None:
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: BACnetFarmWhoIsProtocol(self), local_addr=(self.farm.host, self.farm.who_is_port))
+            self.transports.append(transport)
+
+    async def __close_endpoints(self):
+        for transport in self.transports:
+            transport.close()
+        # sockets are closed by connection_lost callbacks
+        await asyncio.sleep(0)
+
+    def __raise_open_files_limit(self, count: int):
+        if resource is None:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < count:
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (min(count, hard), hard))
+            except (ValueError, OSError):
+                self.logger.warning("Failed raise open files limit to {}".format(count))
+
+
+class BACnetFarmGateClient:
+    """
+    VisioBAS server stand-in serving farm devices and objects (data_collector --simulator)
+    """
+
+    def __init__(self, farm: BACnetDeviceFarm, read_app: str = "native"):
+        self.farm = farm
+        self.read_app = read_app
+        self.put_count = 0
+        self.history_count = 0
+        self.object_request_count = 0
+        self.topic_count = 0
+
+    def rq_login(self, *args, **kwargs):
+        pass
+
+    def rq_logout(self, *args, **kwargs):
+        pass
+
+    def rq_devices(self):
+        return self.farm.server_devices(self.read_app)
+
+    def rq_device_object(self, device_id: int, object_type: ObjectType):
+        self.object_request_count += 1
+        return self.farm.server_objects(device_id, object_type)
+
+    def rq_put(self, device_id, data):
+        self.put_count += len(data)
+        return []
+
+    def rq_put_history(self, device_id, data):
+        self.history_count += len(data)
+        return []
+
+    @staticmethod
+    def reference_as_list(reference: str):
+        return re.split("[:.]", reference)
+
+    def rq_vbas_get_object(self, reference: str):
+        return {ObjectProperty.DESCRIPTION.id(): reference}
+
+    def rq_vdesk_get_groups(self):
+        return []
+
+    def rq_vdesk_get_topic_by_user(self):
+        return []
+
+    def rq_vdesk_get_topic_by_id(self, topic_id):
+        return {"id": topic_id, "items": []}
+
+    def rq_vdesk_add_topic(self, data):
+        self.topic_count += 1
+        return {"id": self.topic_count}
+
+    def rq_vdesk_add_topic_items(self, items):
+        return items
+
+
+def install(farm_path: Path, target: Path):
+    """
+    Write fake bacrp / bacrpm executables answered by farm and address_cache of farm devices into target directory
+    """
+    target.mkdir(parents=True, exist_ok=True)
+    root = Path(__file__).absolute().parent.parent
+    for app in ("bacrp", "bacrpm"):
+        path = target / app
+        path.write_text("#!{}\nimport sys\nsys.path.insert(0, {!r})\nfrom bacnet.simulator import main\n"
+                        "main([{!r}, '--farm', {!r}] + sys.argv[1:])\n".format(
+                            sys.executable, str(root), app, str(farm_path.absolute())))
+        path.chmod(0o755)
+    farm = BACnetDeviceFarm.load(farm_path)
+    BACnetWriter.write_bacwi(farm.devices(), str(target / "address_cache"))
+
+
+def main(argv=None):
+    from bacnet.worker import BACnetWorker
+
+    argparser = argparse.ArgumentParser(description="BACnet device farm simulator")
+    argparser.add_argument("command", choices=["serve", "install", "worker", "bacrp", "bacrpm"],
+                           help="serve - UDP endpoints of farm devices, install - write fake bacrp / bacrpm "
+                                "and address_cache into --target, worker - read worker of BACnetCoprocessPool, "
+                                "bacrp / bacrpm - fake bacnet-stack app")
+    argparser.add_argument("--farm", type=str, required=True, help="farm spec JSON file")
+    argparser.add_argument("--target", type=str, default="bacnet-stack", help="install directory")
+    argparser.add_argument("--address_cache", type=str, help="write address_cache of farm devices (serve)")
+    argparser.add_argument("--timeout", type=float, default=5, help="read timeout (sec)")
+    args, app_args = argparser.parse_known_args(argv)
+
+    farm_path = Path(args.farm)
+    if args.command == "install":
+        install(farm_path, Path(args.target))
+        return
+    farm = BACnetDeviceFarm.load(farm_path)
+    if args.command == "serve":
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+        if args.address_cache is not None:
+            BACnetWriter.write_bacwi(farm.devices(), args.address_cache)
+        BACnetFarmServer(farm).start()
+        logging.getLogger('bacnet.simulator').info("Farm of {} devices is served on {}:{}-{}".format(
+            farm.device_count, farm.host, farm.base_port, farm.base_port + farm.device_count - 1))
+        while True:
+            time.sleep(3600)
+    worker = BACnetWorker(BACnetFarmClient(farm), args.timeout)
+    if args.command == "worker":
+        worker.serve(sys.stdin, sys.stdout)
+    else:
+        sys.stdout.write(worker.execute({"app": args.command, "args": app_args}))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,33 @@
+import asyncio
 import logging
 import subprocess
-from subprocess import PIPE
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from subprocess import PIPE, DEVNULL, TimeoutExpired
 
-from bacnet.parser import BACnetParser
-from bacnet.bacnet import ObjectType
+from bacnet import native, capability, cov
+from bacnet.address_cache import BACnetAddressCache
+from bacnet.backend import ReadBackend, read_backends
+from bacnet.apdu import BACnetError, PduType, REJECT_UNRECOGNIZED_SERVICE, ABORT_SEGMENTATION_NOT_SUPPORTED, \
+    ABORT_APDU_TOO_LONG
+from bacnet.native import BACnetValueFormatter
+from bacnet.parser import BACnetParser, BACnetTypedValues
+from bacnet.pool import BACnetCoprocessPool
+from bacnet.bacnet import ObjectType, ObjectProperty
+
+# expected size in bytes of encoded property value in ReadPropertyMultiple-ACK,
+# used for packing objects of batch into device APDU
+property_value_size = {
+    ObjectProperty.PRIORITY_ARRAY.id(): 80,
+    ObjectProperty.STATUS_FLAGS.id(): 3,
+    ObjectProperty.OUT_OF_SERVICE.id(): 1,
+    ObjectProperty.RELIABILITY.id(): 2,
+    ObjectProperty.PRESENT_VALUE.id(): 5
+}
+default_property_value_size = 8
+default_apdu = 480
 
 
 class BACnetSlicer:
@@ -15,46 +39,129 @@ class BACnetSlicer:
         self.parser = BACnetParser()
         self.logger = logging.getLogger('bacnet.slicer')
         self.execute_bacrp_on_fail_bacrpm = True
+        # bacwi table devices of address_cache file
+        self.address_cache = None
+        self.pool = None
+        # bounded pool of concurrent per field bacrp reads
+        self.bacrp_executor = None
+        # key - read backend name, value - pool of concurrent batch reads
+        self.batch_executors = {}
+        self.capabilities = None
+
+    def get_capabilities(self) -> capability.BACnetCapabilityCache:
+        if self.capabilities is None:
+            self.capabilities = capability.shared_cache(self.config)
+        return self.capabilities
+
+    def get_pool(self):
+        """
+        :return: pool of persistent read workers or None if read app is spawned per read (pool size 0)
+        """
+        if self.pool is None and self.config.get("pool", {}).get("size", 0) > 0:
+            self.pool = BACnetCoprocessPool(self.config)
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.stop()
+            self.pool = None
+        if self.bacrp_executor is not None:
+            self.bacrp_executor.shutdown(wait=False)
+            self.bacrp_executor = None
+        for executor in self.batch_executors.values():
+            executor.shutdown(wait=False)
+        self.batch_executors = {}
 
     def __execute_app(self, args, cwd, timeout):
-        cp = subprocess.run(args, stdout=PIPE, stderr=PIPE, cwd=str(cwd), timeout=timeout)
-        output = cp.stdout.decode('ascii')
+        pool = self.get_pool()
+        if pool is not None:
+            # bacrpm.exe on Windows is bacrpm app of worker
+            output = pool.execute(Path(args[0]).stem, args[1:], timeout)
+        else:
+            cp = subprocess.run(args, stdout=PIPE, stderr=PIPE, cwd=str(cwd), timeout=timeout)
+            output = cp.stdout.decode('ascii')
         if self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug("execute: {} cwd: {}".format(" ".join(args), cwd))
         if self.logger.isEnabledFor(logging.DEBUG):
             self.logger.debug("bacrp output: {}".format(output))
         return output
 
-    def execute(self, read_app: str, **kwargs):
-        if read_app == "bacrp":
-            return self.execute_barp(device_id=kwargs.get("device_id"),
-                                     object_type=kwargs.get("object_type"),
-                                     object_id=kwargs.get("object_id"),
-                                     fields=kwargs.get("fields"),
-                                     timeout=kwargs.get("timeout"))
-        elif read_app == "bacrpm":
-            data = self.execute_bacrpm(device_id=kwargs.get("device_id"),
-                                       object_type=kwargs.get("object_type"),
-                                       object_id=kwargs.get("object_id"),
-                                       fields=kwargs.get("fields"),
-                                       timeout=kwargs.get("timeout"))
-            if len(data) == 0 and self.execute_bacrp_on_fail_bacrpm:
-                data = self.execute_barp(device_id=kwargs.get("device_id"),
-                                         object_type=kwargs.get("object_type"),
-                                         object_id=kwargs.get("object_id"),
-                                         fields=kwargs.get("fields"),
-                                         timeout=kwargs.get("timeout"))
-            return data
-        else:
+    def __execute_app_lines(self, args, cwd, timeout):
+        """
+        :return: generator of output lines of read app as app writes them, app is killed if generator is closed
+        :raise TimeoutExpired: app does not end output in timeout
+        """
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("execute: {} cwd: {}".format(" ".join(args), cwd))
+        pool = self.get_pool()
+        if pool is not None:
+            yield from pool.execute_lines(Path(args[0]).stem, args[1:], timeout)
+            return
+        process = subprocess.Popen(args, stdout=PIPE, stderr=DEVNULL, cwd=str(cwd))
+        expired = threading.Event()
+
+        def kill():
+            expired.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in process.stdout:
+                yield line.decode('ascii')
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+        if expired.is_set():
+            raise TimeoutExpired(args, timeout)
+
+    def get_backend(self, read_app: str) -> ReadBackend:
+        """
+        :raise Exception: read app is not registered backend
+        """
+        backend = read_backends.get(read_app)
+        if backend is None:
             raise Exception("Unsupported read app: {}".format(read_app))
+        return backend
+
+    def execute(self, read_app: str, **kwargs):
+        object_type = kwargs.get("object_type")
+        if type(object_type) == ObjectType:
+            object_type = object_type.code()
+        return self.get_backend(read_app).read(self,
+                                               kwargs.get("device_id"),
+                                               object_type,
+                                               kwargs.get("object_id"),
+                                               kwargs.get("fields"),
+                                               kwargs.get("timeout"))
+
+    def __get_bacrp_executor(self):
+        if self.bacrp_executor is None:
+            self.bacrp_executor = ThreadPoolExecutor(max_workers=self.config.get("bacrp_concurrency", 4),
+                                                     thread_name_prefix="bacrp")
+        return self.bacrp_executor
+
+    def __execute_bacrp_field(self, args, cwd, deadline):
+        # field waiting in executor queue gets only rest of object deadline
+        return self.__execute_app(args, cwd, max(deadline - time.time(), 0.1))
 
     def execute_barp(self, device_id: int, object_type, object_id: int, fields: list, timeout: int):
+        """
+        Read fields by bacrp one process per field,
+        fields are read concurrently (config "bacrp_concurrency") in one overall timeout of object
+        :raise TimeoutExpired: no field was read and at least one read is timed out
+        """
         if type(object_type) == ObjectType:
             object_type = object_type.code()
         assert (type(object_type) == int)
 
         path = self.config["bacrp"]
-        data = {}
+        deadline = time.time() + timeout
+        executor = self.__get_bacrp_executor()
+        futures = {}
         for field in fields:
             args = [
                 str(path),
@@ -63,13 +170,31 @@ class BACnetSlicer:
                 str(object_id),
                 str(field)
             ]
-            output = self.__execute_app(args, path.parent, timeout)
+            futures[executor.submit(self.__execute_bacrp_field, args, path.parent, deadline)] = (field, args)
+        done, not_done = wait(futures, max(deadline - time.time(), 0))
+        for future in not_done:
+            future.cancel()
+
+        data = {}
+        timeout_expired = len(not_done) > 0
+        for future in done:
+            field, args = futures[future]
+            try:
+                output = future.result()
+            except TimeoutExpired:
+                timeout_expired = True
+                continue
+            except:
+                self.logger.exception("Failed execute: {}".format(" ".join(args)))
+                continue
             if output is not None and not len(output) == 0:
                 try:
                     self.parser.parse_bacrp(output, field, data)
                 except:
                     self.logger.error("bacrpm {}".format(" ".join(args)))
                     self.logger.exception("Failed parse bacrp output:\n{}".format(output))
+        if len(data) == 0 and timeout_expired:
+            raise TimeoutExpired(str(path), timeout)
         return data
 
     def execute_bacrpm(self, device_id: int, object_type, object_id: int, fields: list, timeout):
@@ -86,8 +211,312 @@ class BACnetSlicer:
             ",".join(fields)
         ]
         output = self.__execute_app(args, cwd, timeout)
+        if "BACnet Reject: Unrecognized Service" in output:
+            self.get_capabilities().set_rpm_supported(device_id, False)
+            return {}
         try:
-            return self.parser.parse_bacrpm(output)
+            data = self.parser.parse_bacrpm_fields(output, fields, object_type)
+            if len(data) > 0:
+                self.get_capabilities().set_rpm_supported(device_id, True)
+            return data
         except Exception as e:
             self.logger.error("bacrpm {}".format(" ".join(args)))
             self.logger.exception("Failed parse bacrpm, output:\n{}".format(output))
+
+    def get_address_cache_device(self, device_id: int):
+        """
+        :return: bacwi table device (id, host, port, apdu) from config address_cache file or None
+        """
+        if "address_cache" not in self.config:
+            return None
+        if self.address_cache is None:
+            self.address_cache = BACnetAddressCache(self.config["address_cache"],
+                                                    self.config.get("address_cache_watch", {}).get("interval", 5))
+        return self.address_cache.get(device_id)
+
+    def get_apdu(self, device_id: int):
+        """
+        :return: max APDU of device from address_cache reduced by learned max APDU of device
+        """
+        device = self.get_address_cache_device(device_id)
+        apdu = device["apdu"] if device is not None else default_apdu
+        max_apdu = self.get_capabilities().get_max_apdu(device_id)
+        return min(apdu, max_apdu) if max_apdu is not None else apdu
+
+    def __native_client(self, device_id: int):
+        client = native.shared_client(self.config)
+        device = self.get_address_cache_device(device_id)
+        if device is not None:
+            # host and port of device changed in address_cache are applied without restart
+            if client.get_device_address(device_id) != (device["host"], device["port"]):
+                client.set_device_address(device_id, device["host"], device["port"])
+        return client
+
+    def get_cov_subscriber(self, device_id: int):
+        """
+        :return: COV subscriber sharing socket of in process BACnet/IP client with address of device resolved
+        """
+        return cov.shared_subscriber(self.__native_client(device_id), self.config, self.get_capabilities())
+
+    def execute_native(self, device_id: int, object_type, object_id: int, fields: list, timeout):
+        """
+        Read object properties by in process BACnet/IP client (ReadPropertyMultiple),
+        if device does not support ReadPropertyMultiple read each property by ReadProperty
+        :return: dict in the same format as parse_bacrpm returns
+        """
+        if type(object_type) == ObjectType:
+            object_type = object_type.code()
+        assert (type(object_type) == int)
+        client = self.__native_client(device_id)
+        capabilities = self.get_capabilities()
+        try:
+            if capabilities.is_rpm_supported(device_id) or not self.execute_bacrp_on_fail_bacrpm:
+                results = client.read_property_multiple(device_id, [(object_type, object_id, fields)], timeout)
+                capabilities.set_rpm_supported(device_id, True)
+                data = {}
+                for object_identifier, properties in results:
+                    data.update(BACnetValueFormatter.format(object_type, properties))
+                return data
+        except BACnetError as e:
+            if e.pdu_type == PduType.REJECT and e.reason == REJECT_UNRECOGNIZED_SERVICE:
+                capabilities.set_rpm_supported(device_id, False)
+            if e.pdu_type == PduType.ABORT and e.reason == ABORT_SEGMENTATION_NOT_SUPPORTED:
+                capabilities.set_segmentation_supported(device_id, False)
+            if not (e.pdu_type == PduType.REJECT and e.reason == REJECT_UNRECOGNIZED_SERVICE) \
+                    or not self.execute_bacrp_on_fail_bacrpm:
+                self.logger.error("native device: {} object: ({}, {}) {}".format(device_id, object_type, object_id, e))
+                return {}
+        except asyncio.TimeoutError:
+            self.logger.error("native device: {} object: ({}, {}) APDU timeout".format(device_id, object_type, object_id))
+            return {}
+
+        properties = []
+        for field in fields:
+            try:
+                properties.append((field, None, client.read_property(device_id, object_type, object_id, field, timeout)))
+            except BACnetError as e:
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("native device: {} object: ({}, {}) property: {} {}".format(
+                        device_id, object_type, object_id, field, e))
+            except asyncio.TimeoutError:
+                self.logger.error("native device: {} object: ({}, {}) property: {} APDU timeout".format(
+                    device_id, object_type, object_id, field))
+                break
+        return BACnetValueFormatter.format(object_type, properties)
+
+    @staticmethod
+    def estimate_size(fields: list):
+        """
+        :return: estimated length of object results in ReadPropertyMultiple-ACK
+        """
+        # object identifier and list of results opening / closing tags
+        size = 7
+        for field in fields:
+            # property identifier, value opening / closing tags and value
+            size += 4 + property_value_size.get(field, default_property_value_size)
+        return size
+
+    def __reduce_apdu(self, device_id: int, objects: list):
+        """
+        Response of batch is aborted by device, keep next batches smaller than it
+        """
+        size = 3 + sum([self.estimate_size(fields) for object_type, object_id, fields in objects])
+        self.get_capabilities().reduce_max_apdu(device_id, size - 1)
+
+    @staticmethod
+    def split_batch(objects: list, apdu: int, batch_size: int = 0):
+        """
+        Split list of objects into batches which ReadPropertyMultiple-ACK fit into device APDU
+        :param objects: list of (object_type, object_id, fields)
+        :param apdu: max APDU length accepted by device
+        :param batch_size: max count of objects in batch (0 - unlimited)
+        :return: list of batches
+        """
+        # complex ack header
+        available = apdu - 3
+        batches = []
+        batch = []
+        size = 0
+        for o in objects:
+            object_size = BACnetSlicer.estimate_size(o[2])
+            if len(batch) > 0 and (size + object_size > available or len(batch) == batch_size):
+                batches.append(batch)
+                batch = []
+                size = 0
+            batch.append(o)
+            size += object_size
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    def execute_batch(self, read_app: str, device_id: int, objects: list, timeout, apdu: int = None,
+                      on_object=None):
+        """
+        Read list of objects of one device packing as many objects into one request
+        as read backend batch size and device APDU (from address_cache) allow,
+        batches are read concurrently up to read backend concurrency
+        :param objects: list of (object_type, object_id, fields)
+        :param on_object: callable(key, typed values) called by reading thread with each object read successfully
+        as soon as it is read, streaming read backend calls it before whole batch is read
+        :return: dict key - (object type code, object id), value - dict of collected typed values
+        (see BACnetTypedValues, empty if object failed)
+        """
+        objects = [(o[0].code() if type(o[0]) == ObjectType else o[0], o[1], o[2]) for o in objects]
+        backend = self.get_backend(read_app)
+        if backend.batch_size == 1 or not self.get_capabilities().is_rpm_supported(device_id):
+            batches = [[o] for o in objects]
+        else:
+            apdu = apdu if apdu is not None else self.get_apdu(device_id)
+            batches = self.split_batch(objects, apdu, backend.batch_size)
+        # objects typed as they are read
+        typed = {}
+
+        def hand_on(key, data):
+            typed[key] = BACnetTypedValues.typed(key[0], data)
+            if on_object is not None and len(data) > 0:
+                on_object(key, typed[key])
+
+        result = {}
+        if backend.concurrency > 1 and len(batches) > 1:
+            executor = self.__get_batch_executor(backend)
+            futures = [executor.submit(self.__read_batch, backend, device_id, batch, timeout, hand_on)
+                       for batch in batches]
+            for future in futures:
+                result.update(future.result())
+        else:
+            for batch in batches:
+                result.update(self.__read_batch(backend, device_id, batch, timeout, hand_on))
+        return {key: typed[key] if key in typed else BACnetTypedValues.typed(key[0], data)
+                for key, data in result.items()}
+
+    def __get_batch_executor(self, backend: ReadBackend):
+        executor = self.batch_executors.get(backend.name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=backend.concurrency, thread_name_prefix=backend.name)
+            self.batch_executors[backend.name] = executor
+        return executor
+
+    def __read_batch(self, backend: ReadBackend, device_id: int, batch: list, timeout, on_object=None):
+        if len(batch) == 1:
+            object_type, object_id, fields = batch[0]
+            result = {(object_type, object_id): backend.read(self, device_id, object_type, object_id, fields,
+                                                             timeout)}
+        elif backend.streaming:
+            return backend.read_batch(self, device_id, batch, timeout, on_object)
+        else:
+            result = backend.read_batch(self, device_id, batch, timeout)
+        if on_object is not None:
+            for key, data in result.items():
+                on_object(key, data)
+        return result
+
+    def __execute_batch_one_by_one(self, read_app: str, device_id: int, objects: list, timeout, on_object=None):
+        result = {}
+        for object_type, object_id, fields in objects:
+            result[(object_type, object_id)] = self.execute(read_app, device_id=device_id,
+                                                            object_type=object_type, object_id=object_id,
+                                                            fields=fields, timeout=timeout)
+            if on_object is not None:
+                on_object((object_type, object_id), result[(object_type, object_id)])
+        return result
+
+    def __split_in_half(self, read_app: str, device_id: int, objects: list, timeout, on_object=None):
+        middle = len(objects) // 2
+        backend = self.get_backend(read_app)
+        result = {}
+        for half in (objects[:middle], objects[middle:]):
+            result.update(self.__read_batch(backend, device_id, half, timeout, on_object))
+        return result
+
+    def execute_bacrpm_batch(self, device_id: int, objects: list, timeout, on_object=None):
+        """
+        Read objects of device by one bacrpm request, objects are parsed as bacrpm writes output
+        (see BACnetParser.iter_bacrpm_objects)
+        :param on_object: callable(key, data) called with each object as soon as it is parsed
+        :raise TimeoutExpired: bacrpm does not end output in timeout and no object is read
+        """
+        if len(objects) == 1:
+            return self.__execute_batch_one_by_one("bacrpm", device_id, objects, timeout, on_object)
+        path = self.config["bacrpm"]
+        args = [str(path), str(device_id)]
+        for object_type, object_id, fields in objects:
+            args += [str(object_type), str(object_id), ",".join(fields)]
+        fields = []
+        for _, _, object_fields in objects:
+            fields += [field for field in object_fields if field not in fields]
+        # lines of reject or abort instead of objects
+        errors = []
+
+        def check_errors(lines):
+            for line in lines:
+                if "BACnet Reject: Unrecognized Service" in line or "BACnet Abort" in line:
+                    errors.append(line)
+                yield line
+
+        output = self.__execute_app_lines(args, path.parent, timeout)
+        lines = check_errors(output)
+        result = {}
+        try:
+            for object_type, object_id, data in self.parser.iter_bacrpm_objects(lines, fields):
+                result[(object_type, object_id)] = data
+                if on_object is not None:
+                    on_object((object_type, object_id), data)
+            # parser stops on reject, rest of output is read so worker of pool is not restarted
+            for _ in lines:
+                pass
+        except TimeoutExpired:
+            if len(result) == 0:
+                raise
+            self.logger.warning("bacrpm {} timeout, read {} of {} objects".format(" ".join(args), len(result),
+                                                                                 len(objects)))
+        except Exception:
+            self.logger.exception("Failed parse bacrpm {}".format(" ".join(args)))
+        finally:
+            lines.close()
+            output.close()
+        error = "".join(errors)
+        if "BACnet Reject: Unrecognized Service" in error:
+            self.get_capabilities().set_rpm_supported(device_id, False)
+            return self.__execute_batch_one_by_one("bacrpm", device_id, objects, timeout, on_object)
+        if "BACnet Abort" in error:
+            # response does not fit device APDU
+            if "segmentation not supported" in error.lower().replace("-", " "):
+                self.get_capabilities().set_segmentation_supported(device_id, False)
+            self.__reduce_apdu(device_id, objects)
+            return self.__split_in_half("bacrpm", device_id, objects, timeout, on_object)
+        if len(result) > 0:
+            self.get_capabilities().set_rpm_supported(device_id, True)
+        for object_type, object_id, fields in objects:
+            if (object_type, object_id) not in result:
+                result[(object_type, object_id)] = {}
+        return result
+
+    def execute_native_batch(self, device_id: int, objects: list, timeout):
+        if len(objects) == 1:
+            object_type, object_id, fields = objects[0]
+            return {(object_type, object_id): self.execute_native(device_id, object_type, object_id, fields, timeout)}
+        client = self.__native_client(device_id)
+        result = {}
+        try:
+            for object_identifier, properties in client.read_property_multiple(device_id, objects, timeout):
+                key = (object_identifier.type, object_identifier.instance)
+                result[key] = BACnetValueFormatter.format(object_identifier.type, properties)
+            self.get_capabilities().set_rpm_supported(device_id, True)
+        except BACnetError as e:
+            if e.pdu_type == PduType.REJECT and e.reason == REJECT_UNRECOGNIZED_SERVICE:
+                self.get_capabilities().set_rpm_supported(device_id, False)
+                return self.__execute_batch_one_by_one("native", device_id, objects, timeout)
+            if e.pdu_type == PduType.ABORT and e.reason in (ABORT_SEGMENTATION_NOT_SUPPORTED, ABORT_APDU_TOO_LONG):
+                if e.reason == ABORT_SEGMENTATION_NOT_SUPPORTED:
+                    self.get_capabilities().set_segmentation_supported(device_id, False)
+                self.__reduce_apdu(device_id, objects)
+                return self.__split_in_half("native", device_id, objects, timeout)
+            # error of whole request (unknown object in batch for instance)
+            self.logger.error("native device: {} batch of {} objects: {}".format(device_id, len(objects), e))
+            return self.__execute_batch_one_by_one("native", device_id, objects, timeout)
+        except asyncio.TimeoutError:
+            self.logger.error("native device: {} batch of {} objects: APDU timeout".format(device_id, len(objects)))
+        for object_type, object_id, fields in objects:
+            if (object_type, object_id) not in result:
+                result[(object_type, object_id)] = {}
+        return result
@@ -0,0 +1,176 @@
+import json
+import logging
+import mmap
+import struct
+import sys
+import threading
+from pathlib import Path
+
+from bacnet.bacnet import ObjectType
+from bacnet.network import BACnetNetwork
+from bacnet.store import BACnetValueStore, PRIORITIES
+from visiobas.object.bacnet_object import BACnetObject, Device, NotificationClass
+
+MAGIC = b"VBNS"
+# version of snapshot layout, snapshot of other version is not loaded
+VERSION = 1
+# magic, version, byte order (0 - little, 1 - big), count of slots
+HEADER = struct.Struct("<4sHHQ")
+# length of blob following header
+LENGTH = struct.Struct("<Q")
+
+# class of object record
+OBJECT = 0
+DEVICE = 1
+NOTIFICATION_CLASS = 2
+
+
+class BACnetSnapshot:
+    """
+    Versioned binary snapshot of BACnetNetwork: configuration of objects (server objects, configuration files)
+    and runtime state of value store (columns as raw arrays), so restarted collector starts by objects and status
+    flags of previous run without server requests.
+    Layout: header, then length prefixed blobs: JSON of object records, arrays of value store in fixed order,
+    JSON of values kept as objects
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.logger = logging.getLogger('bacnet.snapshot')
+
+    @staticmethod
+    def __arrays(store: BACnetValueStore):
+        columns = [store.columns[code] for code in sorted(store.columns)] + [store.priorities]
+        return [a for column in columns for a in (column.values, column.kinds)] + \
+               [store.flags, store.timestamps, store.priority_blocks]
+
+    def save(self, network: BACnetNetwork):
+        """
+        Write snapshot of network atomically (temporary file replaces snapshot)
+        :return: count of saved objects
+        """
+        store = network.store
+        # slots of objects and blocks of priority arrays are not allocated or released while records and arrays
+        # are taken
+        with network.lock, store.lock:
+            # objects of the same (type, id) are loaded in append order
+            objects = [o for objects in network.types.values() for o in objects]
+            records = []
+            for o in objects:
+                kind = DEVICE if isinstance(o, Device) else NOTIFICATION_CLASS if isinstance(o, NotificationClass) \
+                    else OBJECT
+                records.append([kind, int(o._location), dict(o._data), o.configuration_files])
+            arrays = [a.tobytes() for a in self.__arrays(store)]
+            slots = len(store.flags)
+            columns = [[code, list(column.objects.items())] for code, column in store.columns.items()] + \
+                      [[None, list(store.priorities.objects.items())]]
+            values = {"columns": columns,
+                      "objects": [[slot, code, v] for (slot, code), v in list(store.objects.items())]}
+        blobs = [json.dumps(records, default=str).encode()] + arrays + [json.dumps(values, default=str).encode()]
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(str(tmp_path), "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0 if sys.byteorder == "little" else 1, slots))
+            for blob in blobs:
+                f.write(LENGTH.pack(len(blob)))
+                f.write(blob)
+        tmp_path.replace(self.path)
+        return len(records)
+
+    def load(self, network: BACnetNetwork):
+        """
+        Append objects of snapshot with their runtime state into empty network
+        :return: list of loaded objects or None if there is no snapshot of current version
+        """
+        if not self.path.is_file() or self.path.stat().st_size < HEADER.size:
+            return None
+        if len(network.objects) > 0:
+            raise ValueError("Snapshot is loaded into not empty network")
+        try:
+            with open(str(self.path), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                magic, version, byte_order, slots = HEADER.unpack_from(m, 0)
+                if magic != MAGIC or version != VERSION or byte_order != (0 if sys.byteorder == "little" else 1):
+                    self.logger.warning("Snapshot is not compatible: {}".format(self.path))
+                    return None
+                offset = HEADER.size
+                view = memoryview(m)
+                blobs = []
+                try:
+                    while offset < len(m):
+                        length, = LENGTH.unpack_from(m, offset)
+                        offset += LENGTH.size
+                        blobs.append(view[offset:offset + length])
+                        offset += length
+                    return self.__load(network, blobs, slots)
+                finally:
+                    for blob in blobs:
+                        blob.release()
+                    view.release()
+        except Exception:
+            self.logger.exception("Failed load snapshot: {}".format(self.path))
+            return None
+
+    def __load(self, network: BACnetNetwork, blobs: list, slots: int):
+        store = BACnetValueStore()
+        arrays = self.__arrays(store)
+        if len(blobs) != len(arrays) + 2:
+            raise ValueError("Unexpected count of snapshot blobs: {}".format(len(blobs)))
+        for a, blob in zip(arrays, blobs[1:]):
+            a.frombytes(blob)
+        if any(len(a) != slots for a in [store.flags, store.timestamps, store.priority_blocks]):
+            raise ValueError("Unexpected count of snapshot slots")
+        values = json.loads(bytes(blobs[-1]))
+        for code, items in values["columns"]:
+            column = store.columns[code] if code is not None else store.priorities
+            column.objects = {idx: v for idx, v in items}
+        store.objects = {(slot, code): v for slot, code, v in values["objects"]}
+
+        objects = []
+        used = set()
+        for kind, slot, data, configuration_files in json.loads(bytes(blobs[0])):
+            o = Device(data) if kind == DEVICE else NotificationClass(data) if kind == NOTIFICATION_CLASS \
+                else BACnetObject(data)
+            o.configuration_files = configuration_files
+            o._location = store.location(slot)
+            used.add(slot)
+            objects.append(o)
+        store.free_slots = [slot for slot in range(slots) if slot not in used]
+        blocks = set(store.priority_blocks)
+        store.free_blocks = [block for block in range(len(store.priorities) // PRIORITIES) if block not in blocks]
+        network.store = store
+        network.append_many(objects)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Snapshot loaded objects: {} devices: {}".format(
+                len(objects), sum(1 for o in objects if o.get_object_type_code() == ObjectType.DEVICE.code())))
+        return objects
+
+
+class BACnetSnapshotWriter:
+    """
+    Write snapshot of network periodically
+    """
+
+    def __init__(self, network: BACnetNetwork, snapshot: BACnetSnapshot, interval: float = 60):
+        self.network = network
+        self.snapshot = snapshot
+        self.interval = interval
+        self.logger = logging.getLogger('bacnet.snapshot')
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="bacnet-snapshot", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.snapshot.save(self.network)
+            except Exception:
+                self.logger.exception("Failed save snapshot: {}".format(self.snapshot.path))
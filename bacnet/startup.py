@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from bacnet.bacnet import ObjectType, ObjectProperty
+from bacnet.native import BACnetNativeClient
+
+
+class BACnetStartupPlanner:
+    """
+    Objects of devices requested from server at startup:
+    database-revision of devices is read concurrently by in process BACnet/IP client,
+    objects of device with unchanged database-revision are taken from disk cache without any server request,
+    object-list of other devices is enumerated so only object types present on device are requested from server,
+    server requests run concurrently
+    """
+
+    def __init__(self, client: BACnetNativeClient, gate_client, config: dict):
+        """
+        :param gate_client: VisiobasGateClient serving objects of devices (rq_device_object)
+        :param config: visiobas_slicer config, key "startup" holds settings of planner:
+        concurrency - max count of concurrently read devices,
+        server_concurrency - max count of concurrent server requests,
+        timeout - read timeout (sec),
+        object_cache - file of cached objects (default object_cache.json next to address_cache)
+        """
+        settings = config.get("startup", {})
+        self.client = client
+        self.gate_client = gate_client
+        self.concurrency = settings.get("concurrency", 16)
+        self.server_concurrency = settings.get("server_concurrency", 8)
+        self.timeout = settings.get("timeout", config.get("read_timeout", 5))
+        path = settings.get("object_cache")
+        if path is None and "address_cache" in config:
+            path = Path(config["address_cache"]).parent / "object_cache.json"
+        self.path = Path(path) if path is not None else None
+        self.logger = logging.getLogger('bacnet.startup')
+        # key - device id, value - {"database_revision": int, "objects": {object type name: [objects]}}
+        self.cache = {}
+        self.statistic = {"cached": 0, "enumerated": 0, "requests": 0}
+        self.load()
+
+    def load(self):
+        if self.path is None or not self.path.is_file():
+            return
+        try:
+            devices = json.loads(self.path.read_text())
+            self.cache = {int(device_id): device for device_id, device in devices.items()}
+        except Exception:
+            self.logger.exception("Failed load object cache: {}".format(self.path))
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(json.dumps({str(k): v for k, v in self.cache.items()}))
+            tmp_path.replace(self.path)
+        except Exception:
+            self.logger.exception("Failed save object cache: {}".format(self.path))
+
+    def plan(self, devices: list, object_types: list):
+        """
+        :param devices: list of address_cache devices (id, host, port)
+        :param object_types: list of ObjectType collected
+        :return: dict key - device id, value - dict of ObjectType -> list of server objects
+        """
+        t0 = time.time()
+        for device in devices:
+            if self.client.get_device_address(device["id"]) is None:
+                self.client.set_device_address(device["id"], device["host"], device["port"])
+        device_ids = [device["id"] for device in devices]
+        revisions = self.client.run(self.__gather(self.__read_revision, device_ids))
+
+        result = {}
+        changed = []
+        for device_id, revision in zip(device_ids, revisions):
+            cached = self.cache.get(device_id)
+            if revision is not None and cached is not None and cached["database_revision"] == revision and \
+                    all(t.name() in cached["objects"] for t in object_types):
+                result[device_id] = {t: cached["objects"][t.name()] for t in object_types}
+                self.statistic["cached"] += 1
+            else:
+                changed.append((device_id, revision))
+
+        # object-list of not responding device is not read
+        responding = [d for d, revision in changed if revision is not None]
+        present_types = dict(zip(responding, self.client.run(self.__gather(self.__read_object_types, responding))))
+        requests = []
+        for device_id, _ in changed:
+            present = present_types.get(device_id)
+            result[device_id] = {}
+            for object_type in object_types:
+                if present is None or object_type.code() in present:
+                    requests.append((device_id, object_type))
+                else:
+                    result[device_id][object_type] = []
+            if present is not None:
+                self.statistic["enumerated"] += 1
+
+        with ThreadPoolExecutor(max_workers=self.server_concurrency, thread_name_prefix="startup") as executor:
+            responses = list(executor.map(lambda r: self.gate_client.rq_device_object(r[0], r[1]), requests))
+        self.statistic["requests"] += len(requests)
+        for (device_id, object_type), objects in zip(requests, responses):
+            result[device_id][object_type] = objects
+
+        for device_id, revision in changed:
+            if revision is None:
+                continue
+            objects = dict(self.cache.get(device_id, {}).get("objects", {})) \
+                if self.cache.get(device_id, {}).get("database_revision") == revision else {}
+            objects.update({t.name(): o for t, o in result[device_id].items()})
+            self.cache[device_id] = {"database_revision": revision, "objects": objects}
+        if len(responding) > 0:
+            self.save()
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Startup plan devices: {} cached: {} server requests: {} duration: {:.2f} sec".format(
+                len(device_ids), len(device_ids) - len(changed), len(requests), time.time() - t0))
+        return result
+
+    async def __gather(self, read, device_ids: list):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def read_one(device_id):
+            async with semaphore:
+                try:
+                    return await read(device_id)
+                except Exception as e:
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug("Device: {} {} failed: {}".format(
+                            device_id, read.__name__, e if str(e) else type(e).__name__))
+                    return None
+
+        return await asyncio.gather(*[read_one(device_id) for device_id in device_ids])
+
+    async def __read_revision(self, device_id: int):
+        """
+        :return: database-revision of device
+        """
+        return int(await self.client.read_property_async(device_id, ObjectType.DEVICE, device_id,
+                                                         ObjectProperty.DATABASE_REVISION.id(), self.timeout))
+
+    async def __read_object_types(self, device_id: int):
+        """
+        :return: set of object type codes present in object-list of device
+        """
+        object_list = await self.client.read_object_list_async(device_id, self.timeout)
+        return set(o.type for o in object_list)
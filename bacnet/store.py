@@ -0,0 +1,242 @@
+import collections
+import threading
+import time
+from array import array
+
+from bacnet.bacnet import ObjectProperty, BinaryPV
+
+# kind of value kept in column
+NONE = 0
+FLOAT = 1
+INT = 2
+BINARY = 3
+# value kept as object (enumeration name, string ...)
+OBJECT = 4
+
+# status flags byte of slot: bits 0..3 - flags, STATUS_FLAGS_SET - status flags are set
+STATUS_FLAGS_SET = 0x10
+
+# count of priority array slots
+PRIORITIES = 16
+
+# ints beyond are not exact in double
+MAX_EXACT_INT = 2 ** 53
+
+# seconds released slot is not reused, thread which read location of object before it was detached
+# may still get or set value of slot
+RELEASE_DELAY = 5
+
+
+class BACnetValueColumn:
+    """
+    Values of one property indexed by slot: numbers in array of doubles, kind of value in array of bytes,
+    values which are not numbers (enumeration names, strings ...) in dict by slot
+    """
+
+    def __init__(self):
+        self.values = array('d')
+        self.kinds = array('b')
+        self.objects = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def extend(self, count: int):
+        self.values.frombytes(bytes(count * self.values.itemsize))
+        self.kinds.frombytes(bytes(count))
+
+    def get(self, idx: int):
+        kind = self.kinds[idx]
+        if kind == FLOAT:
+            return self.values[idx]
+        if kind == NONE:
+            return None
+        if kind == INT:
+            return int(self.values[idx])
+        if kind == BINARY:
+            return BinaryPV.ACTIVE if self.values[idx] == 1 else BinaryPV.INACTIVE
+        return self.objects[idx]
+
+    def set(self, idx: int, value):
+        if self.kinds[idx] == OBJECT:
+            # value of slot may be set by other thread at the same time (release, reuse)
+            self.objects.pop(idx, None)
+        value_type = type(value)
+        if value_type == float:
+            self.kinds[idx] = FLOAT
+            self.values[idx] = value
+        elif value is None:
+            self.kinds[idx] = NONE
+        elif value_type == int and -MAX_EXACT_INT <= value <= MAX_EXACT_INT:
+            self.kinds[idx] = INT
+            self.values[idx] = value
+        elif value_type == BinaryPV:
+            self.kinds[idx] = BINARY
+            self.values[idx] = value.code()
+        else:
+            self.kinds[idx] = OBJECT
+            self.objects[idx] = value
+
+
+class BACnetSlot(int):
+    """
+    Slot number which carries its store (class of slots of one store), location of object in store is read
+    by one attribute without memory of pair of store and slot per object
+    """
+    __slots__ = ()
+    store = None
+
+
+class BACnetValueStore:
+    """
+    Columnar store of runtime state of objects of BACnetNetwork indexed by dense slot number:
+    present value, low / high limit in typed columns, status flags packed into byte of slot,
+    priority array in block of 16 values allocated only for slots having priority array,
+    time of last present value update
+    """
+    present_value = ObjectProperty.PRESENT_VALUE.id()
+    status_flags = ObjectProperty.STATUS_FLAGS.id()
+    priority_array = ObjectProperty.PRIORITY_ARRAY.id()
+    low_limit = ObjectProperty.LOW_LIMIT.id()
+    high_limit = ObjectProperty.HIGH_LIMIT.id()
+
+    # property codes kept in store, other properties are kept by object
+    codes = frozenset([present_value, status_flags, priority_array, low_limit, high_limit])
+
+    def __init__(self, release_delay: float = RELEASE_DELAY):
+        self.columns = {
+            self.present_value: BACnetValueColumn(),
+            self.low_limit: BACnetValueColumn(),
+            self.high_limit: BACnetValueColumn()
+        }
+        self.flags = array('B')
+        self.timestamps = array('d')
+        # block index of priority array of slot, -1 - slot has no priority array
+        self.priority_blocks = array('i')
+        self.priorities = BACnetValueColumn()
+        self.free_blocks = []
+        # status flags and priority arrays which do not fit into columns, key - (slot, property code)
+        self.objects = {}
+        self.free_slots = []
+        # (time of release, slot) of released slots not reused yet
+        self.released = collections.deque()
+        self.release_delay = release_delay
+        self.slot_type = type("BACnetSlot", (BACnetSlot,), {"__slots__": (), "store": self})
+        # slots and priority array blocks are allocated by network and collector threads setting values
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.flags) - len(self.free_slots) - len(self.released)
+
+    def allocate(self):
+        """
+        :return: slot of new object
+        """
+        with self.lock:
+            released = self.released
+            now = time.time()
+            while len(released) > 0 and now - released[0][0] >= self.release_delay:
+                self.free_slots.append(released.popleft()[1])
+            if len(self.free_slots) == 0:
+                for column in self.columns.values():
+                    column.extend(1)
+                self.flags.append(0)
+                self.timestamps.append(0)
+                self.priority_blocks.append(-1)
+                return len(self.flags) - 1
+            slot = self.free_slots.pop()
+        # value set by thread holding location of released object is dropped
+        self.clear(slot)
+        return slot
+
+    def location(self, slot: int) -> BACnetSlot:
+        """
+        :return: slot carrying this store
+        """
+        return self.slot_type(slot)
+
+    def release(self, slot: int):
+        """
+        Slot is reused after release_delay, until then it keeps values for threads still reading it
+        """
+        with self.lock:
+            self.released.append((time.time(), slot))
+
+    def clear(self, slot: int):
+        for code in self.codes:
+            self.set(slot, code, None)
+        self.timestamps[slot] = 0
+
+    def get_timestamp(self, slot: int):
+        """
+        :return: time of last present value update or None
+        """
+        timestamp = self.timestamps[slot]
+        return timestamp if timestamp > 0 else None
+
+    def get(self, slot: int, code: str):
+        column = self.columns.get(code)
+        if column is not None:
+            return column.get(slot)
+        if code == self.status_flags:
+            flags = self.flags[slot]
+            if flags & STATUS_FLAGS_SET:
+                return [flags & 0x01 != 0, flags & 0x02 != 0, flags & 0x04 != 0, flags & 0x08 != 0]
+        elif code == self.priority_array:
+            block = self.priority_blocks[slot]
+            if block != -1:
+                offset = block * PRIORITIES
+                return [self.priorities.get(idx) for idx in range(offset, offset + PRIORITIES)]
+        return self.objects.get((slot, code))
+
+    def set(self, slot: int, code: str, value):
+        column = self.columns.get(code)
+        if column is not None:
+            column.set(slot, value)
+            if code == self.present_value:
+                self.timestamps[slot] = time.time()
+            return
+        self.objects.pop((slot, code), None)
+        if code == self.status_flags:
+            if type(value) in (list, tuple) and len(value) == 4 and all(type(flag) == bool for flag in value):
+                self.flags[slot] = STATUS_FLAGS_SET | value[0] | value[1] << 1 | value[2] << 2 | value[3] << 3
+                return
+            self.flags[slot] = 0
+        elif code == self.priority_array:
+            if type(value) in (list, tuple) and len(value) == PRIORITIES:
+                offset = self.__priority_block(slot) * PRIORITIES
+                for idx, priority in enumerate(value):
+                    self.priorities.set(offset + idx, priority)
+                return
+            self.__release_block(slot)
+        else:
+            raise KeyError(code)
+        if value is not None:
+            self.objects[(slot, code)] = value
+
+    def __priority_block(self, slot: int):
+        """
+        :return: block of priority array of slot, block is allocated if slot has none, so two writers of slot
+        do not take two blocks
+        """
+        with self.lock:
+            block = self.priority_blocks[slot]
+            if block == -1:
+                if len(self.free_blocks) > 0:
+                    block = self.free_blocks.pop()
+                else:
+                    self.priorities.extend(PRIORITIES)
+                    block = len(self.priorities) // PRIORITIES - 1
+                self.priority_blocks[slot] = block
+            return block
+
+    def __release_block(self, slot: int):
+        with self.lock:
+            block = self.priority_blocks[slot]
+            if block == -1:
+                return
+            offset = block * PRIORITIES
+            for idx in range(offset, offset + PRIORITIES):
+                self.priorities.set(idx, None)
+            self.priority_blocks[slot] = -1
+            self.free_blocks.append(block)
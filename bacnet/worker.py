@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from bacnet.address_cache import BACnetAddressCache
+from bacnet.apdu import BACnetError
+from bacnet.bacnet import bacnet_name_map
+from bacnet.native import BACnetNativeClient
+from bacnet.writer import BACnetWriter
+
+# line written after each command output
+END_OF_OUTPUT = "\x1e"
+
+
+class BACnetWorker:
+    """
+    Long-lived read worker of BACnetCoprocessPool
+    takes one JSON command per stdin line {"app": "bacrpm" | "bacrp" | "ping", "args": [...], "timeout": sec}
+    where args are the same as command line arguments of bacnet-stack app,
+    writes output in the same format as bacnet-stack app prints it and END_OF_OUTPUT line after it,
+    reads are served by in process BACnet/IP client so no process is spawned per read
+    """
+
+    def __init__(self, client: BACnetNativeClient, timeout: float = 5, address_cache: BACnetAddressCache = None):
+        """
+        :param address_cache: devices addresses of client, devices changed in file are applied before command
+        """
+        self.client = client
+        self.timeout = timeout
+        self.address_cache = address_cache
+        self.logger = logging.getLogger('bacnet.worker')
+        self.update_addresses()
+
+    def update_addresses(self):
+        if self.address_cache is None:
+            return
+        for device in self.address_cache.get_devices().values():
+            if self.client.get_device_address(device["id"]) != (device["host"], device["port"]):
+                self.client.set_device_address(device["id"], device["host"], device["port"])
+
+    @staticmethod
+    def __property_id(name: str):
+        name = name.strip()
+        return int(name) if name.isdigit() else int(bacnet_name_map[name])
+
+    def __read(self, device_id: int, objects: list, timeout: float):
+        try:
+            results = self.client.read_property_multiple(device_id, objects, timeout)
+            return BACnetWriter.create_bacrpm(results)
+        except BACnetError as e:
+            return "{}\r\n".format(e)
+        except asyncio.TimeoutError:
+            return "Error: APDU Timeout!\r\n"
+
+    def bacrpm(self, args: list, timeout: float):
+        device_id = int(args[0])
+        objects = []
+        for i in range(1, len(args) - 2, 3):
+            properties = [self.__property_id(p) for p in str(args[i + 2]).split(",")]
+            objects.append((int(args[i]), int(args[i + 1]), properties))
+        return self.__read(device_id, objects, timeout)
+
+    def bacrp(self, args: list, timeout: float):
+        device_id, object_type, object_id = int(args[0]), int(args[1]), int(args[2])
+        property_id = self.__property_id(str(args[3]))
+        try:
+            value = self.client.read_property(device_id, object_type, object_id, property_id, timeout)
+            return "{}\r\n".format(BACnetWriter.create_bacrp_value(object_type, str(property_id), value))
+        except BACnetError as e:
+            return "{}\r\n".format(e)
+        except asyncio.TimeoutError:
+            return "Error: APDU Timeout!\r\n"
+
+    def execute(self, command: dict):
+        app = command.get("app")
+        timeout = float(command.get("timeout", self.timeout))
+        if app == "ping":
+            return "pong\n"
+        if app == "bacrpm":
+            return self.bacrpm(command["args"], timeout)
+        if app == "bacrp":
+            return self.bacrp(command["args"], timeout)
+        return "Error: Unsupported app: {}\n".format(app)
+
+    def serve(self, stdin, stdout):
+        for line in stdin:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                self.update_addresses()
+                output = self.execute(json.loads(line))
+            except Exception as e:
+                self.logger.exception("Failed execute command: {}".format(line))
+                output = "Error: {}\n".format(e)
+            stdout.write(output)
+            if not output.endswith("\n"):
+                stdout.write("\n")
+            stdout.write(END_OF_OUTPUT + "\n")
+            stdout.flush()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
+    argparser = argparse.ArgumentParser(description="BACnet read worker serving commands from stdin")
+    argparser.add_argument("--address_cache", type=str, required=True, help="path to address_cache file")
+    argparser.add_argument("--timeout", type=float, default=5, help="read timeout (sec)")
+    argparser.add_argument("--retries", type=int, default=2, help="count of APDU retries")
+
+    argparser.add_argument("--address_cache_interval", type=float, default=5,
+                           help="interval of address_cache file change checks (sec)")
+    args = argparser.parse_args()
+
+    client = BACnetNativeClient(retries=args.retries).start()
+    address_cache = BACnetAddressCache(args.address_cache, args.address_cache_interval)
+    BACnetWorker(client, args.timeout, address_cache).serve(sys.stdin, sys.stdout)
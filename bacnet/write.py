@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from bacnet.apdu import BACnetError, PduType, Enumerated, REJECT_UNRECOGNIZED_SERVICE
+from bacnet.bacnet import BinaryPV, ObjectType, ObjectProperty
+from bacnet.native import BACnetNativeClient
+
+analog_object_types = [ObjectType.ANALOG_INPUT.code(), ObjectType.ANALOG_OUTPUT.code(),
+                       ObjectType.ANALOG_VALUE.code()]
+
+binary_object_types = [ObjectType.BINARY_INPUT.code(), ObjectType.BINARY_OUTPUT.code(),
+                       ObjectType.BINARY_VALUE.code()]
+
+multi_state_object_types = [ObjectType.MULTI_STATE_INPUT.code(), ObjectType.MULTI_STATE_OUTPUT.code(),
+                            ObjectType.MULTI_STATE_VALUE.code()]
+
+# write apps served by write pipeline
+supported_write_apps = ["native"]
+
+
+class BACnetWriteCommand:
+    """
+    Write of one object property, value None relinquishes command of priority
+    """
+
+    def __init__(self, device_id: int, object_type: int, object_id: int, value, priority: int = None,
+                 property_id: int = int(ObjectProperty.PRESENT_VALUE.id()), callback=None):
+        """
+        :param callback: callable(command, confirmed, error) called when write is done
+        """
+        self.device_id = device_id
+        self.object_type = object_type
+        self.object_id = object_id
+        self.property_id = property_id
+        self.value = value
+        self.priority = priority
+        self.callback = callback
+        self.submitted = time.time()
+
+    def key(self):
+        return self.object_type, self.object_id, self.property_id, self.priority
+
+    def application_value(self):
+        """
+        :return: value as application value of object type (real, enumerated or unsigned)
+        :raise ValueError: value is not present value of object type (binary value is active / inactive, 0 / 1
+        or bool, multi-state value is state number from 1)
+        """
+        if self.value is None or self.property_id != int(ObjectProperty.PRESENT_VALUE.id()):
+            return self.value
+        if self.object_type in analog_object_types:
+            value = float(self.value)
+            if not math.isfinite(value):
+                raise ValueError("Not finite analog value: {}".format(self.value))
+            return value
+        if self.object_type in binary_object_types:
+            return Enumerated(BinaryPV.from_value(self.value).code())
+        if self.object_type in multi_state_object_types:
+            value = float(self.value)
+            if not value.is_integer() or value < 1:
+                raise ValueError("Not multi-state value: {}".format(self.value))
+            return int(value)
+        return self.value
+
+    def validate(self):
+        """
+        :return: error of value of command or None if command may be written
+        """
+        try:
+            self.application_value()
+        except (TypeError, ValueError) as e:
+            return "Invalid value of object type: {} ({})".format(self.object_type, e)
+        return None
+
+    def __str__(self):
+        return "device: {} object: ({}, {}) property: {} priority: {} value: {}".format(
+            self.device_id, self.object_type, self.object_id, self.property_id, self.priority, self.value)
+
+
+class BACnetWritePipeline:
+    """
+    Writes of devices served by own threads so bursts of setpoint writes do not wait behind polling reads,
+    pending command is replaced by later command of the same object property and priority (latest wins),
+    pending commands of one device are written by one WritePropertyMultiple request if device supports it
+    and each write is confirmed by read back of written value
+    """
+
+    def __init__(self, client: BACnetNativeClient, config: dict, capabilities=None):
+        """
+        :param config: visiobas_slicer config, key "write" holds settings of writes:
+        max_pending - max count of pending commands (commands over it are rejected),
+        concurrency - max count of devices written at once,
+        batch_size - max count of commands per WritePropertyMultiple request,
+        confirm - read back written values,
+        tolerance - max relative difference of read back real value
+        :param capabilities: BACnetCapabilityCache learning devices not supporting WritePropertyMultiple
+        """
+        settings = config.get("write", {})
+        self.client = client
+        self.capabilities = capabilities
+        self.max_pending = settings.get("max_pending", 10000)
+        self.concurrency = settings.get("concurrency", 8)
+        self.batch_size = settings.get("batch_size", 16)
+        self.confirm = settings.get("confirm", True)
+        self.tolerance = settings.get("tolerance", 0.0001)
+        self.timeout = settings.get("timeout", config.get("read_timeout", 5))
+        self.logger = logging.getLogger('bacnet.write')
+        self.condition = threading.Condition()
+        # key - device id, value - OrderedDict of command key -> BACnetWriteCommand
+        self.pending = {}
+        self.pending_count = 0
+        self.in_flight = set()
+        # key - device id, value - write app of device
+        self.write_apps = {}
+        self.statistic = {"submitted": 0, "coalesced": 0, "rejected": 0, "written": 0, "confirmed": 0, "failed": 0}
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bacnet-write")
+        self.dispatcher = threading.Thread(target=self.__dispatch, name="bacnet-write-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def set_write_app(self, device_id: int, write_app: str):
+        """
+        :param write_app: write app of device configuration, None - default write app (native)
+        """
+        if write_app is None:
+            self.write_apps.pop(device_id, None)
+        else:
+            self.write_apps[device_id] = write_app
+
+    def submit(self, command: BACnetWriteCommand):
+        """
+        :return: False if command is rejected (value is not valid, pending queue is full or write app of device
+        is not supported)
+        """
+        error = command.validate()
+        if error is not None:
+            with self.condition:
+                self.statistic["rejected"] += 1
+            self.logger.warning("Write rejected, {}: {}".format(error, command))
+            return False
+        write_app = self.write_apps.get(command.device_id, "native")
+        if write_app not in supported_write_apps:
+            self.logger.warning("Device: {} unsupported write app: {}".format(command.device_id, write_app))
+            return False
+        with self.condition:
+            commands = self.pending.setdefault(command.device_id, OrderedDict())
+            if command.key() in commands:
+                commands[command.key()] = command
+                self.statistic["coalesced"] += 1
+            elif self.pending_count >= self.max_pending:
+                self.statistic["rejected"] += 1
+                self.logger.warning("Write rejected, pending queue is full: {}".format(command))
+                return False
+            else:
+                commands[command.key()] = command
+                self.pending_count += 1
+            self.statistic["submitted"] += 1
+            self.condition.notify_all()
+        return True
+
+    def join(self, timeout: float = None):
+        """
+        Wait until all pending commands are written
+        :return: True if nothing is pending
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.condition:
+            while self.pending_count > 0 or len(self.in_flight) > 0:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def __dispatch(self):
+        while True:
+            with self.condition:
+                ready = [device_id for device_id, commands in self.pending.items()
+                         if len(commands) > 0 and device_id not in self.in_flight]
+                if len(ready) == 0:
+                    self.condition.wait()
+                    continue
+                batches = []
+                for device_id in ready:
+                    commands = self.pending[device_id]
+                    batch = [commands.popitem(last=False)[1] for _ in range(min(self.batch_size, len(commands)))]
+                    if len(commands) == 0:
+                        del self.pending[device_id]
+                    self.pending_count -= len(batch)
+                    self.in_flight.add(device_id)
+                    batches.append((device_id, batch))
+            for device_id, batch in batches:
+                self.executor.submit(self.__write_device, device_id, batch)
+
+    def __write_device(self, device_id: int, commands: list):
+        try:
+            results = self.write(device_id, commands)
+        except Exception as e:
+            self.logger.exception("Failed write device: {}".format(device_id))
+            results = [(False, e)] * len(commands)
+        for command, (confirmed, error) in zip(commands, results):
+            with self.condition:
+                self.statistic["confirmed" if confirmed else "failed"] += 1
+            if not confirmed:
+                self.logger.warning("Write failed {}: {}".format(command, error))
+            if command.callback is not None:
+                try:
+                    command.callback(command, confirmed, error)
+                except Exception:
+                    self.logger.exception("Failed write callback: {}".format(command))
+        with self.condition:
+            self.in_flight.discard(device_id)
+            self.condition.notify_all()
+
+    def write(self, device_id: int, commands: list):
+        """
+        Write commands of one device and read back written values
+        :return: list of (confirmed, error or None) in order of commands
+        """
+        return self.client.run(self.__write_async(device_id, commands))
+
+    def is_wpm_supported(self, device_id: int):
+        return self.capabilities is None or self.capabilities.get(device_id, "wpm") is not False
+
+    async def __write_async(self, device_id: int, commands: list):
+        errors = None
+        if len(commands) > 1 and self.is_wpm_supported(device_id):
+            errors = await self.__write_multiple(device_id, commands)
+        if errors is None:
+            errors = await asyncio.gather(*[self.client.write_property_async(
+                device_id, c.object_type, c.object_id, c.property_id, c.application_value(), c.priority,
+                self.timeout) for c in commands], return_exceptions=True)
+        with self.condition:
+            self.statistic["written"] += sum(1 for error in errors if error is None)
+        if not self.confirm:
+            return [(error is None, error) for error in errors]
+        confirmations = await asyncio.gather(*[
+            self.__read_back(device_id, c) if error is None else self.__failed(error)
+            for c, error in zip(commands, errors)], return_exceptions=True)
+        return [(False, c) if isinstance(c, Exception) else c for c in confirmations]
+
+    async def __write_multiple(self, device_id: int, commands: list):
+        """
+        :return: list of None (all written) or None if commands has to be written one by one
+        """
+        # key - (object type code, object id), value - list of (property id, value, priority)
+        objects = OrderedDict()
+        for c in commands:
+            objects.setdefault((c.object_type, c.object_id), []).append(
+                (c.property_id, c.application_value(), c.priority))
+        try:
+            await self.client.write_property_multiple_async(
+                device_id, [(t, i, properties) for (t, i), properties in objects.items()], self.timeout)
+            return [None] * len(commands)
+        except BACnetError as e:
+            if e.pdu_type == PduType.REJECT and e.reason == REJECT_UNRECOGNIZED_SERVICE and \
+                    self.capabilities is not None:
+                self.capabilities.set(device_id, "wpm", False)
+            # failed write of error is not known, each command is written separately
+            return None
+        except asyncio.TimeoutError as e:
+            return [e] * len(commands)
+
+    @staticmethod
+    async def __failed(error):
+        return False, error
+
+    async def __read_back(self, device_id: int, command: BACnetWriteCommand):
+        if command.priority is not None and command.property_id == int(ObjectProperty.PRESENT_VALUE.id()):
+            value = await self.client.read_property_async(device_id, command.object_type, command.object_id,
+                                                          ObjectProperty.PRIORITY_ARRAY.id(), self.timeout,
+                                                          command.priority)
+        else:
+            value = await self.client.read_property_async(device_id, command.object_type, command.object_id,
+                                                          command.property_id, self.timeout)
+        if self.is_equal(command.application_value(), value):
+            return True, None
+        return False, "read back value: {}".format(value)
+
+    def is_equal(self, expected, value):
+        if expected is None or value is None:
+            return expected is None and value is None
+        if isinstance(expected, float) and isinstance(value, (int, float)):
+            return abs(expected - value) <= self.tolerance * max(1.0, abs(expected))
+        return expected == value
+
+
+__shared_pipeline = None
+__shared_lock = threading.Lock()
+
+
+def shared_pipeline(client: BACnetNativeClient, config: dict, capabilities=None):
+    """
+    Single write pipeline per process shared between gateway server and collectors
+    """
+    global __shared_pipeline
+    with __shared_lock:
+        if __shared_pipeline is None:
+            __shared_pipeline = BACnetWritePipeline(client, config, capabilities)
+        return __shared_pipeline
@@ -1,6 +1,16 @@
 import logging
 import traceback
 
+from bacnet.apdu import BACnetError, Enumerated, BitString, ObjectIdentifier, Date, Time
+from bacnet.bacnet import ObjectType, bacnet_name_map
+from bacnet.native import BACnetValueFormatter
+
+# key - property code, value - property name as bacnet-stack prints it
+bacnet_code_name_map = {}
+for _name, _code in bacnet_name_map.items():
+    if _code not in bacnet_code_name_map and " " not in _name:
+        bacnet_code_name_map[_code] = _name
+
 
 class BACnetWriter:
 
@@ -32,8 +42,8 @@ class BACnetWriter:
                 id = device['id']
                 host = device['host'].split(".")
                 port = device['port']
-                mac = "{:02X}:{:02X}:{:02X}:{:02X}:{}:{}".format(int(host[0]), int(host[1]), int(host[2]), int(host[3]),
-                                                                 hex(port)[2:4].upper(), hex(port)[4:6].upper())
+                mac = "{:02X}:{:02X}:{:02X}:{:02X}:{:02X}:{:02X}".format(int(host[0]), int(host[1]), int(host[2]),
+                                                                         int(host[3]), port >> 8, port & 0xFF)
                 apdu = device['apdu']
                 line = "{:<9} {:<20} {:<5} {:<20} {:<4}".format(
                     device['id'],
@@ -57,3 +67,63 @@ class BACnetWriter:
         f = open(path, "+w")
         f.write(text)
         f.close()
+
+    @staticmethod
+    def create_bacrp_value(object_type_code: int, property_code: str, value):
+        """
+        Format decoded property value the same way as bacnet-stack bacrp / bacrpm print it
+        """
+        if isinstance(value, BACnetError):
+            return str(value)
+        if value is None:
+            return "Null"
+        if type(value) == bool:
+            return "TRUE" if value else "FALSE"
+        if isinstance(value, BitString):
+            return "{" + ",".join(["true" if flag else "false" for flag in value]) + "}"
+        if isinstance(value, list):
+            return "{" + ",".join([BACnetWriter.create_bacrp_value(object_type_code, property_code, v)
+                                   for v in value]) + "}"
+        if isinstance(value, Enumerated):
+            name = BACnetValueFormatter.enumeration_name(object_type_code, property_code, int(value))
+            return name if name is not None else str(int(value))
+        if isinstance(value, float):
+            return "{:f}".format(value)
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, str):
+            return '"{}"'.format(value)
+        if isinstance(value, ObjectIdentifier):
+            return "({}, {})".format(ObjectType.code_to_name(value.type), value.instance)
+        if isinstance(value, Date):
+            return "{}/{}/{}".format(value.year, value.month, value.day)
+        if isinstance(value, Time):
+            return "{:02d}:{:02d}:{:02d}.{:02d}".format(value.hour, value.minute, value.second, value.hundredths)
+        return str(value)
+
+    @staticmethod
+    def create_bacrpm(objects):
+        """
+        Create text in format of bacnet-stack bacrpm output
+        example of output
+        analog-input #3000022
+        {
+            present-value: 0.000000
+            status-flags: {false,false,false,false}
+        }
+        :param objects: list of (ObjectIdentifier, [(property_id, index, value or BACnetError), ...])
+        """
+        lines = []
+        for object_identifier, properties in objects:
+            object_type_name = ObjectType.code_to_name(object_identifier.type)
+            if object_type_name is None:
+                object_type_name = "proprietary {}".format(object_identifier.type)
+            lines.append("{} #{}".format(object_type_name, object_identifier.instance))
+            lines.append("{")
+            for property_id, index, value in properties:
+                code = str(property_id)
+                name = bacnet_code_name_map.get(code, "proprietary {}".format(code))
+                lines.append("    {}: {}".format(name, BACnetWriter.create_bacrp_value(object_identifier.type,
+                                                                                       code, value)))
+            lines.append("}")
+        return "\r\n".join(lines) + "\r\n"
@@ -6,6 +6,9 @@ from logging.handlers import RotatingFileHandler
 
 
 def initialize_logging(level=logging.INFO):
+    # handlers are added once per process, repeated calls (tests) do not duplicate records
+    if any(isinstance(handler, RotatingFileHandler) for handler in logging.root.handlers):
+        return
     if not os.path.exists("logs"):
         os.mkdir("logs")
 
@@ -24,6 +27,19 @@ def initialize_logging(level=logging.INFO):
     loggers = {
         'bacnet.parser': logging.getLogger("bacnet.parser"),
         'bacnet.slicer': logging.getLogger('bacnet.slicer'),
+        'bacnet.native': logging.getLogger('bacnet.native'),
+        'bacnet.pool': logging.getLogger('bacnet.pool'),
+        'bacnet.scan': logging.getLogger('bacnet.scan'),
+        'bacnet.health': logging.getLogger('bacnet.health'),
+        'bacnet.capability': logging.getLogger('bacnet.capability'),
+        'bacnet.cov': logging.getLogger('bacnet.cov'),
+        'bacnet.discovery': logging.getLogger('bacnet.discovery'),
+        'bacnet.backend': logging.getLogger('bacnet.backend'),
+        'bacnet.simulator': logging.getLogger('bacnet.simulator'),
+        'bacnet.write': logging.getLogger('bacnet.write'),
+        'bacnet.backfill': logging.getLogger('bacnet.backfill'),
+        'bacnet.startup': logging.getLogger('bacnet.startup'),
+        'bacnet.worker': logging.getLogger('bacnet.worker'),
         'visiobas.data_collector': logging.getLogger('visiobas.data_collector'),
         'visiobas.data_collector.notifier': logging.getLogger('visiobas.data_collector.notifier'),
         'visiobas.data_collector.collector': logging.getLogger('visiobas.data_collector.collector'),
@@ -6,7 +6,106 @@ address_cache_path = bacnet_stack_path / "address_cache"
 visiobas_slicer = {
     "bacrp": (bacnet_stack_path / "bacrp").absolute(),
     "bacrpm": (bacnet_stack_path / "bacrpm").absolute(),
-    "read_timeout": 5
+    "read_timeout": 5,
+    # max count of concurrent bacrp processes reading fields of one object
+    "bacrp_concurrency": 4,
+    "address_cache": address_cache_path.absolute(),
+    # services supported by devices learned at runtime (RPM support, max APDU, segmentation)
+    "capability_cache": (bacnet_stack_path / "capability_cache.json").absolute(),
+    # settings of in process BACnet/IP read app (read: "native")
+    "native": {
+        "local_host": "0.0.0.0",
+        "local_port": 0,
+        "retries": 2
+    },
+    # Who-Is discovery of devices (create_address_cache.py --discover 1), host / port - broadcast address,
+    # range is done when all its devices answered, no I-Am during quiet sec or timeout sec expires
+    "discovery": {
+        "host": "255.255.255.255",
+        "port": 47808,
+        "range_size": 0,
+        "concurrency": 4,
+        "timeout": 5,
+        "quiet": 1,
+        "retries": 2
+    },
+    # scan_bacnet_network background jobs of gateway server: devices scanned concurrently,
+    # finished job is kept for progress polling retention sec
+    "scan": {
+        "concurrency": 16,
+        "object_list_concurrency": 8,
+        "jobs": 2,
+        "retention": 3600
+    },
+    # set point writes of gateway server: pending write of the same object and priority is replaced by latest,
+    # pending writes of device are batched by WritePropertyMultiple and confirmed by read back
+    "write": {
+        "max_pending": 10000,
+        "concurrency": 8,
+        "batch_size": 16,
+        "confirm": True,
+        "tolerance": 0.0001
+    },
+    # devices added, removed or changed in address_cache are applied to running collectors (file checked every
+    # interval sec), read apps and pool workers take host / port of device from changed file without restart
+    "address_cache_watch": {
+        "enabled": False,
+        "interval": 5
+    },
+    # warm start: network with status flags of objects is saved into snapshot every interval sec (default path
+    # network_snapshot.bin next to address_cache), collector starts by snapshot and reconciles with server after
+    "snapshot": {
+        "enabled": False,
+        "interval": 60
+    },
+    # objects of devices at startup: database-revision of devices read concurrently, objects of unchanged devices
+    # are taken from object_cache (default object_cache.json next to address_cache) without server requests
+    "startup": {
+        "concurrency": 16,
+        "server_concurrency": 8,
+        "timeout": 3
+    },
+    # backfill of values missed while device or gateway was down from trend-logs of device (ReadRange),
+    # rate - max ReadRange requests per sec, windows longer than max_window sec are backfilled partially,
+    # failed window is repeated retries times after retry_interval sec doubled each time
+    "backfill": {
+        "enabled": False,
+        "rate": 2,
+        "page_size": 200,
+        "min_window": 120,
+        "max_window": 86400,
+        "put_size": 1000,
+        "heartbeat_interval": 60,
+        "retries": 3,
+        "retry_interval": 30
+    },
+    # adaptive read timeout and circuit breaker of each device (max_timeout default read_timeout)
+    "health": {
+        "min_timeout": 0.5,
+        "failure_threshold": 1,
+        "backoff_initial": 10,
+        "backoff_max": 300
+    },
+    # COV subscriptions by in process BACnet/IP client instead of polling (lifetime default of device
+    # cov-resubscription-interval, objects refusing subscription are polled)
+    "cov": {
+        "enabled": False,
+        "process_id": 1,
+        "lifetime": 300,
+        "renew_margin": 30,
+        "confirmed": False,
+        "retry_interval": 600
+    },
+    # additional read backends (read key of device configuration files): name -> "module:ClassName"
+    "read_backends": {},
+    # persistent worker processes serving bacrp / bacrpm reads (size 0 - spawn read app per read)
+    "pool": {
+        "size": 0,
+        # worker command line, None - python bacnet.worker served by in process BACnet/IP client
+        "command": None,
+        "health_check_interval": 30,
+        "hang_margin": 1
+    }
 }
 
 notifier = {
@@ -6,6 +6,9 @@ import config.logging
 from visiobas.gate_client import VisiobasGateClient
 import config.visiobas
 from bacnet.bacnet import ObjectProperty
+from bacnet.capability import shared_cache
+from bacnet.discovery import BACnetDiscovery, MAX_DEVICE_ID
+from bacnet.native import shared_client
 from bacnet.writer import BACnetWriter
 from visiobas.object.bacnet_object import Device
 
@@ -15,6 +18,77 @@ def print_help():
     print("create_address_cache.py --devices <list of devices>")
     print("example of request from server devices 200,300 and 400 and create address_cache file")
     print("python create_address_cache.py --devices 200,300,400")
+    print("example of Who-Is discovery of devices 200-300 compared with server devices")
+    print("python create_address_cache.py --discover 1 --ranges 200-300 --verify_server 1")
+
+
+def parse_ranges(text: str):
+    """
+    :param text: device id ranges separated by comma (200-300,400)
+    :return: list of (low, high)
+    """
+    ranges = []
+    for item in text.split(","):
+        bounds = item.strip().split("-")
+        ranges.append((int(bounds[0]), int(bounds[-1])))
+    return ranges
+
+
+def request_server_devices(devices=None):
+    server = config.visiobas.visiobas_server
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("using visiobas server {}:{}".format(server['host'], server['port']))
+    client = VisiobasGateClient(server['host'], server['port'], server['ssl_verify'])
+    client.rq_login(server['auth']['user'], server['auth']['pwd'])
+    try:
+        server_devices = client.rq_devices()
+        if devices is not None:
+            server_devices = list(
+                filter(lambda o: o[ObjectProperty.OBJECT_IDENTIFIER.id()] in devices, server_devices))
+        return [Device(o) for o in server_devices]
+    finally:
+        client.rq_logout()
+
+
+def verify_server_devices(discovered: list, server_devices: list):
+    """
+    Log server devices not answered Who-Is or having address not equal to I-Am source
+    """
+    discovered = {d['id']: d for d in discovered}
+    for device in server_devices:
+        found = discovered.get(device.get_id())
+        if found is None:
+            logger.warning("Server device not discovered: {}".format(device.get_id()))
+        elif not found['host'] == device.get_host() or not found['port'] == device.get_port():
+            logger.warning("Server device {} address ({}:{}) not equal with discovered address ({}:{})".format(
+                device.get_id(), device.get_host(), device.get_port(), found['host'], found['port']))
+    server_device_ids = set([device.get_id() for device in server_devices])
+    for device_id in discovered:
+        if device_id not in server_device_ids:
+            logger.warning("Discovered device not found on server side: {}".format(discovered[device_id]))
+
+
+def discover(args):
+    slicer_config = config.visiobas.visiobas_slicer
+    devices = [int(x) for x in args.devices.split(",")] if not args.devices == "" else None
+    if not args.ranges == "":
+        ranges = parse_ranges(args.ranges)
+    elif devices is not None:
+        ranges = BACnetDiscovery.contiguous(devices)
+    else:
+        ranges = [(0, MAX_DEVICE_ID)]
+    server_devices = request_server_devices(devices) if args.verify_server == 1 else []
+    expected = [device.get_id() for device in server_devices] if len(server_devices) > 0 else devices
+
+    discovery = BACnetDiscovery(shared_client(slicer_config), slicer_config, shared_cache(slicer_config))
+    discovered = discovery.discover(ranges, expected)
+    if devices is not None:
+        discovered = list(filter(lambda d: d['id'] in devices, discovered))
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Discovered {} devices".format(len(discovered)))
+    if args.verify_server == 1:
+        verify_server_devices(discovered, server_devices)
+    discovery.write(discovered, args.output)
 
 
 if __name__ == "__main__":
@@ -22,7 +96,17 @@ if __name__ == "__main__":
     logger = logging.getLogger(__name__)
     parser = argparse.ArgumentParser(description="create address_cache file with table of BACnet devices using data from remote server")
     parser.add_argument('--devices', type=str, default="", help="list of devices id separated by comma")
+    parser.add_argument('--discover', type=int, default=0,
+                        help="1 - discover devices by Who-Is broadcast instead of server data")
+    parser.add_argument('--ranges', type=str, default="",
+                        help="Who-Is device id ranges separated by comma (200-300,400), default all devices")
+    parser.add_argument('--verify_server', type=int, default=0,
+                        help="1 - compare discovered devices with server devices")
+    parser.add_argument('--output', type=str, default="address_cache", help="path of address_cache file")
     args = parser.parse_args()
+    if args.discover == 1:
+        discover(args)
+        exit(0)
     if args.devices == "":
         logger.error("--devices request list of devices separated by comma ','")
         parser.print_help()
@@ -31,28 +115,17 @@ if __name__ == "__main__":
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug("create address cache for devices: {}".format(devices))
 
-    server = config.visiobas.visiobas_server
-    if logger.isEnabledFor(logging.DEBUG):
-        logger.debug("using visiobas server {}:{}".format(server['host'], server['port']))
-
-    client = VisiobasGateClient(server['host'], server['port'], server['ssl_verify'])
-    client.rq_login(server['auth']['user'], server['auth']['pwd'])
     try:
-        server_devices = client.rq_devices()
-        server_devices = list(filter(lambda o: o[ObjectProperty.OBJECT_IDENTIFIER.id()] in devices, server_devices))
         bacwi_devices = []
-        for o in server_devices:
-            device = Device(o)
+        for device in request_server_devices(devices):
             bacwi_devices.append({
                 'id': device.get_id(),
                 'host': device.get_host(),
                 'port': device.get_port(),
                 'apdu': device.get_apdu()
             })
-        BACnetWriter.write_bacwi(bacwi_devices, 'address_cache')
-        client.rq_logout()
+        BACnetWriter.write_bacwi(bacwi_devices, args.output)
     except BaseException as e:
-        client.rq_logout()
         logger.error("Failed create bacwi table: {}".format(e))
         logger.error(traceback.format_exc())
         raise e
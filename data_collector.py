@@ -5,16 +5,29 @@ import traceback
 import os
 from pathlib import Path
 from subprocess import TimeoutExpired
-from threading import Thread
+from threading import Thread, Lock
+from werkzeug.serving import run_simple
 from random import randint, shuffle
 import argparse
 import queue
 
 import config.visiobas
-from bacnet.bacnet import ObjectProperty, StatusFlags, StatusFlag, ObjectType
-from bacnet.parser import BACnetParser
+from bacnet.bacnet import ObjectProperty, StatusFlags, StatusFlag, ObjectType, Reliability
+from bacnet.address_cache import BACnetAddressCacheWatcher
+from bacnet.backend import read_backends
+from bacnet.backfill import BACnetBackfill
+from bacnet.capability import shared_cache
+from bacnet.health import DeviceHealthRegistry
+from bacnet.native import shared_client
+from bacnet.parser import BACnetParser, BACnetTypedValues
+from bacnet.scheduler import BACnetReadScheduler
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer, BACnetFarmGateClient
 from bacnet.slicer import BACnetSlicer
+from bacnet.snapshot import BACnetSnapshot, BACnetSnapshotWriter
+from bacnet.startup import BACnetStartupPlanner
+from bacnet.writer import BACnetWriter
 from visiobas.gate_client import VisiobasGateClient
+from visiobas.gateway_server import VisiobasGatewayServer, get_write_pipeline
 from visiobas.object.bacnet_object import BACnetObject, Device, NotificationClass, Transition
 from visiobas import visiodesk
 from bacnet.network import BACnetNetwork
@@ -22,6 +35,7 @@ import config.logging
 from visiobas.visiodesk import TopicType
 
 bacnet_network = BACnetNetwork()
+device_health = DeviceHealthRegistry(config.visiobas.visiobas_slicer)
 
 
 class Statistic(Thread):
@@ -580,17 +594,11 @@ class VisiobasDataVerifier(Thread):
 
     def verify_object_out_of_limit(self, bacnet_object: BACnetObject, data: dict):
         object_type_code = bacnet_object.get_object_type_code()
-        if object_type_code == ObjectType.ANALOG_INPUT.code() or \
-                object_type_code == ObjectType.ANALOG_OUTPUT.code() or \
-                object_type_code == ObjectType.ANALOG_VALUE:
+        if object_type_code in BACnetTypedValues.analog_object_types:
             return self.verify_analog_object_out_of_limit(bacnet_object, data)
-        elif object_type_code == ObjectType.BINARY_INPUT.code() or \
-                object_type_code == ObjectType.BINARY_OUTPUT.code() or \
-                object_type == ObjectType.BINARY_VALUE.code():
+        elif object_type_code in BACnetTypedValues.binary_object_types:
             return self.verify_binary_out_of_limit(bacnet_object, data)
-        elif object_type_code == ObjectType.MULTI_STATE_INPUT.code() or \
-                object_type_code == ObjectType.MULTI_STATE_OUTPUT.code() or \
-                object_type_code == ObjectType.MULTI_STATE_VALUE.code():
+        elif object_type_code in BACnetTypedValues.multistate_object_types:
             return self.verify_multistate_out_of_limit(bacnet_object, data)
 
     def verify_to_fault_transition(self, bacnet_object: BACnetObject, data: dict):
@@ -599,8 +607,7 @@ class VisiobasDataVerifier(Thread):
         return new status of FAULT flag required to save into BACnetObject
         and notifier transition if necessary or None
         """
-        data_reliability = data[ObjectProperty.RELIABILITY.id()] \
-            if ObjectProperty.RELIABILITY.id() in data else "no-fault-detected"
+        data_reliability = data.get(ObjectProperty.RELIABILITY.id(), Reliability.NO_FAULT_DETECTED)
         data_flags = StatusFlags(data[ObjectProperty.STATUS_FLAGS.id()]
                                  if ObjectProperty.STATUS_FLAGS.id() in data else None)
 
@@ -615,7 +622,7 @@ class VisiobasDataVerifier(Thread):
                 transition = Transition.TO_FAULT
         else:
             # verification FAULT flag after object data collection
-            if data_flags.get_fault() or not data_reliability == "no-fault-detected":
+            if data_flags.get_fault() or data_reliability != Reliability.NO_FAULT_DETECTED:
                 if not fault_flag:
                     fault_flag = True
                     transition = Transition.TO_FAULT
@@ -705,24 +712,8 @@ class VisiobasDataVerifier(Thread):
                                 if is_data_fault:
                                     # present value can be invalid when data is fault
                                     continue
-                                object_type_code = bacnet_object.get_object_type_code()
-                                if object_type_code == ObjectType.ANALOG_INPUT.code() or \
-                                        object_type_code == ObjectType.ANALOG_OUTPUT.code() or \
-                                        object_type_code == ObjectType.ANALOG_VALUE.code():
-                                    bacnet_object.set_present_value(float(data[property_code]))
-                                elif object_type_code == ObjectType.MULTI_STATE_INPUT.code() or \
-                                        object_type_code == ObjectType.MULTI_STATE_OUTPUT.code() or \
-                                        object_type_code == ObjectType.MULTI_STATE_VALUE.code():
-                                    bacnet_object.set_present_value(int(float(data[property_code])))
-                                elif object_type_code == ObjectType.BINARY_INPUT.code() or \
-                                        object_type_code == ObjectType.BINARY_OUTPUT.code() or \
-                                        object_type_code == ObjectType.BINARY_VALUE.code():
-                                    v = data[property_code]
-                                    if type(v) == bool:
-                                        v = "active" if v else "inactive"
-                                    bacnet_object.set_present_value(v)
-                                else:
-                                    bacnet_object.set_present_value(data[property_code])
+                                # collected data is typed by object type (see BACnetTypedValues)
+                                bacnet_object.set_present_value(data[property_code])
                             else:
                                 bacnet_object.set(property_code, data[property_code])
 
@@ -751,9 +742,18 @@ class VisiobasThreadDataCollector(Thread):
                  verifier: VisiobasDataVerifier,
                  bacnet_network: BACnetNetwork,
                  period: float = 0.01):
+        """
+        :param period: shortest sleep of collector, data points due within it are read together
+        """
         super().__init__()
         self.thread_idx = thread_idx
         self.data_pooling = {}
+        # guards devices of data_pooling attached and detached while collector runs
+        self.lock = Lock()
+        # data points of data_pooling by time of next read
+        self.scheduler = BACnetReadScheduler()
+        # (device id, data point) removed from data_pooling, COV subscriptions are cancelled by collector thread
+        self.removed = []
         self.verifier = verifier
         self.bacnet_network = bacnet_network
         # self.transmitter = transmitter
@@ -784,19 +784,202 @@ class VisiobasThreadDataCollector(Thread):
         if read_app is None:
             logger.warning("BACnet device does not have read app: {}".format(device))
             return
+        read_app = read_backends.select(read_app, config.visiobas.visiobas_slicer)
+        if read_app is None:
+            logger.warning("BACnet device read app is not registered read backend: {}".format(device))
+            return
+
+        with self.lock:
+            if device_id not in self.data_pooling:
+                self.data_pooling[device_id] = []
+
+            pooling = {
+                "update_interval": bacnet_object.get_update_interval(),
+                "original_update_interval": bacnet_object.get_update_interval(),
+                "time_last_success_pooling": 0,
+                # special delay for make uniform distribute of sensors pooling
+                "update_delay": -1,
+                "bacnet_object": bacnet_object,
+                "read_app": read_app
+            }
+            self.data_pooling[device_id].append(pooling)
+        self.scheduler.schedule(device_id, pooling, 0)
+
+    def remove_device(self, device_id: int):
+        """
+        Stop collecting objects of device
+        :return: True if device was collected by collector
+        """
+        with self.lock:
+            data_points = self.data_pooling.pop(device_id, None)
+            for pooling in data_points or []:
+                self.removed.append((device_id, pooling))
+        for pooling in data_points or []:
+            self.scheduler.remove(pooling)
+        return data_points is not None
+
+    def remove_object(self, bacnet_object: BACnetObject):
+        device_id = bacnet_object.get_device_id()
+        with self.lock:
+            data_points = self.data_pooling.get(device_id)
+            if data_points is None:
+                return
+            for pooling in data_points:
+                if pooling["bacnet_object"] is bacnet_object:
+                    self.scheduler.remove(pooling)
+                    self.removed.append((device_id, pooling))
+            data_points = [p for p in data_points if p["bacnet_object"] is not bacnet_object]
+            if len(data_points) > 0:
+                self.data_pooling[device_id] = data_points
+            else:
+                del self.data_pooling[device_id]
+
+    def get_pooling_fields(self, object_type_code):
+        return self.analog_pooling_fields \
+            if object_type_code == ObjectType.ANALOG_INPUT.code() or \
+               object_type_code == ObjectType.MULTI_STATE_INPUT.code() or \
+               object_type_code == ObjectType.BINARY_INPUT.code() \
+            else self.pooling_fields
+
+    def read_device(self, slicer: BACnetSlicer, device_id: int, data_points: list):
+        """
+        Read data points of device by batches sized to device APDU (see BACnetSlicer.execute_batch)
+        read timeout adapts to device round trip time, device not responding is read once per backoff
+        by one probe object (see DeviceHealth)
+        :param data_points: list of pooling entries ready to read
+        :return: True if device does not respond
+        """
+        health = device_health.get(device_id)
+        if not health.allow_request():
+            return True
+        if health.is_probe():
+            data_points = data_points[:1]
+        read_app = data_points[0]["read_app"]
+        objects = []
+        poolings = {}
+        for pooling in data_points:
+            bacnet_object = pooling["bacnet_object"]
+            key = (bacnet_object.get_object_type_code(), bacnet_object.get_id())
+            objects.append((key[0], key[1], self.get_pooling_fields(key[0])))
+            poolings[key] = pooling
+
+        batch_size = slicer.get_backend(read_app).batch_size
+        for batch in slicer.split_batch(objects, slicer.get_apdu(device_id), batch_size):
+            self.heart_beat = time.time()
+            read_timeout = health.timeout()
+            # objects pushed into verifier as soon as they are read
+            pushed = set()
+
+            def push_object(key, data):
+                pushed.add(key)
+                pooling = poolings[key]
+                pooling["time_last_success_pooling"] = time.time()
+                self.verifier.push_collected_data(pooling["bacnet_object"], data)
+
+            _t = time.time()
+            try:
+                result = slicer.execute_batch(read_app, device_id, batch, read_timeout, on_object=push_object)
+            except TimeoutExpired:
+                result = {}
+            except:
+                logger.exception("Failed execute slice")
+                if health.is_probe():
+                    health.record_failure()
+                continue
+            _dt = time.time() - _t
+            self.last_data_collect = time.time()
+
+            failed = 0
+            for object_type_code, object_id, fields in batch:
+                if (object_type_code, object_id) in pushed:
+                    continue
+                pooling = poolings[(object_type_code, object_id)]
+                bacnet_object = pooling["bacnet_object"]
+                data = result.get((object_type_code, object_id), {})
+                if len(data) == 0:
+                    logger.error("Failed collect device: {} data of: {} dt: {:.2f}".format(
+                        device_id, bacnet_object.get_object_reference(), _dt))
+                    data["fault"] = True
+                    failed += 1
+
+                # TODO if data pooling failed? reset last success pooling ?
+                pooling["time_last_success_pooling"] = time.time()
+                self.verifier.push_collected_data(bacnet_object, data)
+
+            if statistic.enabled():
+                statistic.update_read_object_statistic(len(batch), time.time() - _t)
+
+            if failed < len(batch):
+                health.record_success(_dt)
+            elif _dt >= read_timeout or health.is_probe():
+                # whole batch failed by timeout or probe read failed
+                health.record_failure()
+                if not health.allow_request():
+                    return True
+        return not health.is_responding()
+
+    def update_subscriptions(self, slicer: BACnetSlicer, device_id: int, data_points: list):
+        """
+        Subscribe COV notifications of data points not subscribed yet and renew expiring subscriptions,
+        data points refusing subscription or failed renewal are read by polling and subscribed again
+        after retry_interval, values of COV notifications are pushed into verifier
+        """
+        subscriber = slicer.get_cov_subscriber(device_id)
+        if not subscriber.is_cov_supported(device_id):
+            return
+        retry_interval = config.visiobas.visiobas_slicer.get("cov", {}).get("retry_interval", 600)
+        now = time.time()
+        poolings = {}
+        for pooling in data_points:
+            bacnet_object = pooling["bacnet_object"]
+            poolings[(bacnet_object.get_object_type_code(), bacnet_object.get_id())] = pooling
+
+        for _, object_type_code, object_id in subscriber.renew([device_id]):
+            pooling = poolings.get((object_type_code, object_id))
+            if pooling is not None:
+                pooling["cov"] = False
+                pooling["cov_retry"] = now + retry_interval
+                pooling["time_last_success_pooling"] = 0
+                self.scheduler.schedule(device_id, pooling, 0)
+
+        pending = [key for key, pooling in poolings.items()
+                   if not pooling.get("cov", False) and now >= pooling.get("cov_retry", 0)]
+        if len(pending) == 0 or not device_health.get(device_id).is_responding():
+            return
 
-        if device_id not in self.data_pooling:
-            self.data_pooling[device_id] = []
+        def push_notification(object_type_code, object_id, data):
+            notified = poolings.get((object_type_code, object_id))
+            if notified is None:
+                return
+            notified["time_last_success_pooling"] = time.time()
+            self.verifier.push_collected_data(notified["bacnet_object"],
+                                              BACnetTypedValues.typed(object_type_code, data))
 
-        self.data_pooling[device_id].append({
-            "update_interval": bacnet_object.get_update_interval(),
-            "original_update_interval": bacnet_object.get_update_interval(),
-            "time_last_success_pooling": 0,
-            # special delay for make uniform distribute of sensors pooling
-            "update_delay": -1,
-            "bacnet_object": bacnet_object,
-            "read_app": read_app
-        })
+        device = self.bacnet_network.find_by_type(ObjectType.DEVICE, device_id)
+        lifetime = device.get(ObjectProperty.COV_RESUBSCRIPTION_INTERVAL) if device else None
+        lifetime = int(float(lifetime)) if lifetime else None
+        subscribed = subscriber.subscribe_many(device_id, pending, push_notification, lifetime)
+        for key, success in zip(pending, subscribed):
+            poolings[key]["cov"] = success
+            if not success:
+                poolings[key]["cov_retry"] = now + retry_interval
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Device: {} COV subscribed {} of {} objects".format(
+                device_id, subscribed.count(True), len(pending)))
+
+    def cancel_subscriptions(self, slicer: BACnetSlicer):
+        """
+        Cancel COV subscriptions of removed data points, subscription made while data point was being removed
+        is cancelled too as collector thread subscribes data points
+        """
+        with self.lock:
+            removed, self.removed = self.removed, []
+        for device_id, pooling in removed:
+            if pooling.get("cov", False):
+                bacnet_object = pooling["bacnet_object"]
+                slicer.get_cov_subscriber(device_id).unsubscribe(device_id, bacnet_object.get_object_type_code(),
+                                                                 bacnet_object.get_id())
+                pooling["cov"] = False
 
     def run(self):
         if self.logger.isEnabledFor(logging.INFO):
@@ -805,86 +988,332 @@ class VisiobasThreadDataCollector(Thread):
                 count += len(self.data_pooling[device_id])
             self.logger.info("Collector# {} count of observable objects: {}".format(self.thread_idx, count))
 
-        # skip pooling device if it not respond (once fault object response)
-        shuffle_data_points_of_device_id = -1
-        enable_skip_device = len(self.data_pooling) > 1
+        slicer = BACnetSlicer(config.visiobas.visiobas_slicer)
+        cov_enabled = config.visiobas.visiobas_slicer.get("cov", {}).get("enabled", False)
+        last_subscriptions_update = 0
 
         while True:
             try:
-                slicer = BACnetSlicer(config.visiobas.visiobas_slicer)
-                for device_id in self.data_pooling:
-                    data_points = self.data_pooling[device_id]
-                    for pooling in data_points:
-                        self.heart_beat = time.time()
-                        time_last_success_pooling = pooling["time_last_success_pooling"]
-                        update_delay = pooling["update_delay"]
-                        update_interval = pooling["update_interval"]
-                        if time.time() - time_last_success_pooling > update_interval:
-                            t0 = time.time()
-                            try:
-                                # make sensor pooling distributed more uniformed
-                                pooling["update_delay"] = randint(1, max(int(update_interval), 1)) \
-                                    if update_delay == -1 else 0
-                                pooling["update_interval"] = pooling["update_delay"] \
-                                    if pooling["update_delay"] > 0 else pooling["original_update_interval"]
-
-                                bacnet_object = pooling["bacnet_object"]
-
-                                object_type_code = bacnet_object.get_object_type_code()
-                                object_id = bacnet_object.get_id()
-                                read_app = pooling["read_app"]
-
-                                # execute BAC0 or other app
-                                _t = time.time()
-                                pooling_fields = self.analog_pooling_fields \
-                                    if object_type_code == ObjectType.ANALOG_INPUT.code() or \
-                                       object_type_code == ObjectType.MULTI_STATE_INPUT.code() or \
-                                       object_type_code == ObjectType.BINARY_INPUT.code() \
-                                    else self.pooling_fields
-                                _dt = 0
-                                try:
-                                    data = slicer.execute(read_app,
-                                                          device_id=device_id,
-                                                          object_type=object_type_code,
-                                                          object_id=object_id,
-                                                          fields=pooling_fields,
-                                                          timeout=config.visiobas.visiobas_slicer["read_timeout"])
-                                    _dt = time.time() - _t
-                                except TimeoutExpired:
-                                    _dt = time.time() - _t
-                                    data = {}
-                                self.last_data_collect = time.time()
-                                if len(data) == 0:
-                                    logger.error("Failed collect device: {} data of: {} dt: {:.2f}".format(
-                                        device_id, bacnet_object.get_object_reference(), _dt))
-                                    data["fault"] = True
-
-                                # TODO if data pooling failed? reset last success pooling ?
-                                pooling["time_last_success_pooling"] = time.time()
-
-                                self.verifier.push_collected_data(bacnet_object, data)
-
-                                # skip pooling current device and shuffle data points if necessary
-                                if "fault" in data and enable_skip_device and \
-                                        _dt >= config.visiobas.visiobas_slicer["read_timeout"]:
-                                    shuffle_data_points_of_device_id = device_id
-                                    break
-                            except:
-                                logger.exception("Failed execute slice")
-                            if statistic.enabled():
-                                duration = time.time() - t0
-                                statistic.update_read_object_statistic(1, duration)
-                    if not shuffle_data_points_of_device_id == -1:
-                        statistic.add_not_responding_device(device_id)
-                        if logger.isEnabledFor(logging.INFO):
-                            logger.info("Device pooling skipped: {}".format(device_id))
-                        shuffle(data_points)
-                        shuffle_data_points_of_device_id = -1
-                    else:
-                        statistic.remove_not_responding_device(device_id)
+                # collector without devices (all of them removed from address_cache) is alive
+                self.heart_beat = time.time()
+                self.cancel_subscriptions(slicer)
+                if cov_enabled and time.time() - last_subscriptions_update >= 1:
+                    last_subscriptions_update = time.time()
+                    with self.lock:
+                        devices = list(self.data_pooling.items())
+                    for device_id, data_points in devices:
+                        if read_backends.get(data_points[0]["read_app"]).cov:
+                            self.update_subscriptions(slicer, device_id, data_points)
+                for device_id, data_points in self.scheduler.pop_due(time.time()).items():
+                    self.read_due(slicer, device_id, data_points)
             except:
                 self.logger.exception("Failed data collected")
-            time.sleep(self.period)
+            self.scheduler.wait(time.time(), self.period, 1)
+
+    def read_due(self, slicer: BACnetSlicer, device_id: int, data_points: list):
+        """
+        Read due data points of device and schedule them again: read data point by its update interval,
+        data point of skipped device when device can be read again
+        :param data_points: data points taken from scheduler
+        """
+        ready_data_points = []
+        for pooling in data_points:
+            if pooling.get("cov", False):
+                # data point is updated by COV notifications, it is scheduled again if subscription fails
+                continue
+            update_delay = pooling["update_delay"]
+            update_interval = pooling["update_interval"]
+            # make sensor pooling distributed more uniformed
+            pooling["update_delay"] = randint(1, max(int(update_interval), 1)) \
+                if update_delay == -1 else 0
+            pooling["update_interval"] = pooling["update_delay"] \
+                if pooling["update_delay"] > 0 else pooling["original_update_interval"]
+            ready_data_points.append(pooling)
+        if len(ready_data_points) == 0:
+            return
+
+        t0 = time.time()
+        try:
+            if self.read_device(slicer, device_id, ready_data_points):
+                statistic.add_not_responding_device(device_id)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Device pooling skipped: {}".format(device_id))
+                # other data point is probe of next read
+                shuffle(ready_data_points)
+            else:
+                statistic.remove_not_responding_device(device_id)
+        except:
+            self.logger.exception("Failed collect device: {}".format(device_id))
+
+        # data points taken from scheduler are scheduled again whatever read result is
+        retry = max(device_health.get(device_id).next_request(), time.time())
+        for pooling in ready_data_points:
+            time_last_success_pooling = pooling["time_last_success_pooling"]
+            if time_last_success_pooling >= t0:
+                self.scheduler.schedule(device_id, pooling, time_last_success_pooling + pooling["update_interval"])
+            else:
+                # device is skipped or only probe data point is read
+                self.scheduler.schedule(device_id, pooling, retry)
+
+
+def create_bacnet_object(o, notify_fault: bool = False):
+    """
+    Create collected object linked with its notification class
+    :param o: server object or BACnetObject (loaded from snapshot) which is linked only
+    :param notify_fault: notify fault of object by default notification class of config
+    """
+    bacnet_object = o if isinstance(o, BACnetObject) else BACnetObject(o)
+    notification_class_id = bacnet_object.get_notification_class()
+    if not notification_class_id == 0:
+        notification_class = bacnet_network.find_by_type(ObjectType.NOTIFICATION_CLASS, notification_class_id)
+        if notification_class:
+            assert (type(notification_class) == NotificationClass)
+            bacnet_object.set_notification_object(notification_class)
+    if notify_fault:
+        notification_class = bacnet_object.get_notification_object()
+        if notification_class is None:
+            notification_class = NotificationClass({
+                ObjectProperty.DEVICE_ID.id(): 1,
+                ObjectProperty.OBJECT_IDENTIFIER.id(): 55000,
+                ObjectProperty.OBJECT_TYPE.id(): ObjectType.NOTIFICATION_CLASS.name(),
+                ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): "Site:VisioBAS.Notification",
+                ObjectProperty.DESCRIPTION.id(): "Default VisioBAS Notification",
+                ObjectProperty.PRIORITY.id(): [2, 2, 2],
+                ObjectProperty.RECIPIENT_LIST.id(): config.visiobas.notifier["recipient_list"]
+            })
+            bacnet_object.set_notification_object(notification_class)
+        else:
+            recipient_list = notification_class.get_recipient_list()
+            # notification class loaded from snapshot has recipients of config already
+            recipient_list += [r for r in config.visiobas.notifier["recipient_list"] if r not in recipient_list]
+            notification_class.set_recipient_list(recipient_list)
+        event_messages = config.visiobas.notifier["event_messages"]
+        for i in range(0, len(event_messages)):
+            message = event_messages[i]
+            if bacnet_object.get_event_message_text(i) == "":
+                bacnet_object.set_event_message_text(i, message)
+            bacnet_object.set_event_detection_enabled(True)
+            bacnet_object.set_event_enable([True, True, True])
+    return bacnet_object
+
+
+class VisiobasDeviceReloader:
+    """
+    Apply changes of address_cache to running collectors (listener of BACnetAddressCacheWatcher):
+    objects of added device are taken from server and attached to collector of device port,
+    removed device is detached from its collector and removed from network with its objects,
+    host and port of changed device are updated in place so pooling state of its objects is kept
+    """
+
+    def __init__(self, client, planner: BACnetStartupPlanner, verifier: VisiobasDataVerifier, object_types: list,
+                 collectors: dict, args, backfill: BACnetBackfill = None):
+        """
+        :param client: gate client serving devices and objects
+        :param collectors: dict of port -> VisiobasThreadDataCollector, collector of new port is added into it
+        :param args: command line arguments of data_collector
+        """
+        self.client = client
+        self.planner = planner
+        self.verifier = verifier
+        self.object_types = object_types
+        self.collectors = collectors
+        self.args = args
+        self.backfill = backfill
+        self.logger = logging.getLogger('visiobas.data_collector.reloader')
+
+    def __call__(self, added: list, removed: list, changed: list):
+        if self.args.device is not None:
+            added = [d for d in added if d["id"] == self.args.device]
+            removed = [d for d in removed if d["id"] == self.args.device]
+            changed = [d for d in changed if d["id"] == self.args.device]
+        for address_cache_device in removed:
+            self.remove_device(address_cache_device["id"])
+        for address_cache_device in changed:
+            self.update_device(address_cache_device)
+        if len(added) > 0:
+            self.add_devices(added)
+
+    def reconcile(self, address_cache_devices: list):
+        """
+        Reconcile network loaded from snapshot with server: configuration of notification classes, devices
+        and objects is updated keeping runtime state, objects added or removed on server are attached to or
+        detached from collectors, devices missing in snapshot are added
+        :param address_cache_devices: bacwi table devices collected by data collector
+        """
+        t0 = time.time()
+        notification_classes = []
+        updated = []
+        for o in self.client.rq_device_object(1, ObjectType.NOTIFICATION_CLASS):
+            notification_class = bacnet_network.find_by_type(ObjectType.NOTIFICATION_CLASS,
+                                                             o[ObjectProperty.OBJECT_IDENTIFIER.id()])
+            if notification_class is None:
+                notification_classes.append(NotificationClass(o))
+            else:
+                updated.append((notification_class, o))
+        bacnet_network.update_many(updated)
+        bacnet_network.append_many(notification_classes)
+
+        device_ids = [d["id"] for d in address_cache_devices]
+        server_devices = {x[ObjectProperty.OBJECT_IDENTIFIER.id()]: x for x in self.client.rq_devices()
+                          if x[ObjectProperty.OBJECT_IDENTIFIER.id()] in device_ids}
+        added = []
+        known = []
+        devices = []
+        for address_cache_device in address_cache_devices:
+            device_id = address_cache_device["id"]
+            device = bacnet_network.find_by_type(ObjectType.DEVICE, device_id)
+            if device_id not in server_devices:
+                if device is not None:
+                    self.logger.warning("Device not found on server side: {}".format(address_cache_device))
+                    self.remove_device(device_id)
+                continue
+            if device is None:
+                added.append(address_cache_device)
+                continue
+            devices.append((device, address_cache_device))
+        bacnet_network.update_many([(device, server_devices[address_cache_device["id"]])
+                                    for device, address_cache_device in devices])
+        for device, address_cache_device in devices:
+            self.set_write_app(device)
+            if self.args.read_app is not None:
+                device.set_read_app(self.args.read_app)
+            device.set_host(address_cache_device["host"])
+            device.set_port(address_cache_device["port"])
+            if device.get_read_app() is not None:
+                known.append(address_cache_device)
+
+        device_objects = self.planner.plan(known, self.object_types)
+        type_codes = set(t.code() for t in self.object_types)
+        for address_cache_device in known:
+            device_id = address_cache_device["id"]
+            collector = self.get_collector(address_cache_device["port"])
+            current = {o.get_object_reference(): o for o in bacnet_network.find_by_device(device_id)
+                       if o.get_object_type_code() in type_codes}
+            server = {o[ObjectProperty.OBJECT_PROPERTY_REFERENCE.id()]: o
+                      for objects in device_objects[device_id].values() for o in objects
+                      if self.args.object is None or o[ObjectProperty.OBJECT_IDENTIFIER.id()] == self.args.object}
+            removed = [bacnet_object for reference, bacnet_object in current.items() if reference not in server]
+            for bacnet_object in removed:
+                collector.remove_object(bacnet_object)
+            bacnet_network.remove_many(removed)
+            appended = []
+            updated = []
+            for reference, o in server.items():
+                bacnet_object = current.get(reference)
+                if bacnet_object is None:
+                    appended.append(create_bacnet_object(o, self.args.notify_fault == 1))
+                else:
+                    updated.append((bacnet_object, o))
+            # objects are indexed again by device and notification class of server configuration
+            bacnet_network.update_many(updated)
+            for bacnet_object, o in updated:
+                # notification class of object may be changed on server, fault notification of config
+                # is applied to server configuration again
+                create_bacnet_object(bacnet_object, self.args.notify_fault == 1)
+            bacnet_network.append_many(appended)
+            for bacnet_object in appended:
+                collector.add_object(bacnet_object)
+        if len(added) > 0:
+            self.add_devices(added)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Snapshot reconciled with server devices: {} added: {} duration: {:.2f} sec".format(
+                len(known), len(added), time.time() - t0))
+
+    def get_collector(self, port: int):
+        if self.args.single_thread == 1:
+            port = 47808
+        collector = self.collectors.get(port)
+        if collector is None:
+            collector = VisiobasThreadDataCollector(len(self.collectors) + 1, self.verifier, bacnet_network)
+            collector.setDaemon(True)
+            collector.start()
+            self.collectors[port] = collector
+        return collector
+
+    def remove_device(self, device_id: int):
+        for collector in list(self.collectors.values()):
+            collector.remove_device(device_id)
+        device = bacnet_network.find_by_type(ObjectType.DEVICE, device_id)
+        bacnet_network.remove_many(bacnet_network.find_by_device(device_id) + ([device] if device is not None else []))
+        if self.backfill is not None:
+            self.backfill.remove_device(device_id)
+        statistic.remove_not_responding_device(device_id)
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Device: {} removed from collecting".format(device_id))
+
+    def update_device(self, address_cache_device: dict):
+        device_id = address_cache_device["id"]
+        device = bacnet_network.find_by_type(ObjectType.DEVICE, device_id)
+        if device is None:
+            return
+        device.set_host(address_cache_device["host"])
+        device.set_port(address_cache_device["port"])
+        native_client = shared_client(config.visiobas.visiobas_slicer)
+        if native_client.get_device_address(device_id) is not None:
+            native_client.set_device_address(device_id, address_cache_device["host"], address_cache_device["port"])
+        if self.backfill is not None and device_id in self.backfill.devices:
+            self.backfill.devices[device_id] = address_cache_device["apdu"]
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Device: {} address updated: {}:{}".format(
+                device_id, address_cache_device["host"], address_cache_device["port"]))
+
+    def set_write_app(self, device: Device):
+        """
+        Register write app of device in write pipeline of gateway server as startup does
+        """
+        if self.args.gateway_port is not None:
+            get_write_pipeline().set_write_app(device.get_id(), device.get_write_app())
+
+    def add_devices(self, address_cache_devices: list):
+        device_ids = [d["id"] for d in address_cache_devices]
+        server_devices = {x[ObjectProperty.OBJECT_IDENTIFIER.id()]: x for x in self.client.rq_devices()
+                          if x[ObjectProperty.OBJECT_IDENTIFIER.id()] in device_ids}
+        collected = []
+        devices = []
+        for address_cache_device in address_cache_devices:
+            device_id = address_cache_device["id"]
+            if device_id not in server_devices:
+                self.logger.warning("Device not found on server side: {}".format(address_cache_device))
+                continue
+            if bacnet_network.find_by_type(ObjectType.DEVICE, device_id) is not None:
+                self.remove_device(device_id)
+            device = Device(server_devices[device_id])
+            if self.args.read_app is not None:
+                device.set_read_app(self.args.read_app)
+            device.set_host(address_cache_device["host"])
+            device.set_port(address_cache_device["port"])
+            devices.append(device)
+            self.set_write_app(device)
+            if device.get_read_app() is None:
+                self.logger.error("Device: {} read app not specified, ignore collecting data from device".format(
+                    device_id))
+                continue
+            collected.append(address_cache_device)
+        bacnet_network.append_many(devices)
+
+        device_objects = self.planner.plan(collected, self.object_types)
+        added_objects = {}
+        for address_cache_device in collected:
+            device_id = address_cache_device["id"]
+            bacnet_objects = added_objects[device_id] = []
+            for object_type in self.object_types:
+                for o in device_objects[device_id][object_type]:
+                    if self.args.object is None or o[ObjectProperty.OBJECT_IDENTIFIER.id()] == self.args.object:
+                        bacnet_objects.append(create_bacnet_object(o, self.args.notify_fault == 1))
+        # objects of all added devices are published by one version of network indexes
+        bacnet_network.append_many([o for bacnet_objects in added_objects.values() for o in bacnet_objects])
+        for address_cache_device in collected:
+            device_id = address_cache_device["id"]
+            collector = self.get_collector(address_cache_device["port"])
+            bacnet_objects = added_objects[device_id]
+            for bacnet_object in bacnet_objects:
+                collector.add_object(bacnet_object)
+            if self.backfill is not None:
+                self.backfill.add_device(device_id, address_cache_device["host"], address_cache_device["port"],
+                                         address_cache_device["apdu"])
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Collector# {} device: {} added objects: {}".format(
+                    collector.thread_idx, device_id, len(bacnet_objects)))
 
 
 # entry point of data_collector
@@ -911,9 +1340,30 @@ if __name__ == '__main__':
                            help="shutdown timeout (sec)")
     argparser.add_argument("--write_put_requests", type=int, default=0,
                            help="write update data (put request) 1 - enable, 0 - disable")
+    argparser.add_argument("--pool_size", type=int,
+                           help="count of persistent read worker processes per collector (0 - spawn read app per read)")
+    argparser.add_argument("--simulator", type=str,
+                           help="farm spec JSON file, collect data of simulated devices instead of server and network")
+    argparser.add_argument("--gateway_port", type=int,
+                           help="serve gateway JSON-RPC (set point writes) on port by collector process")
     args = argparser.parse_args()
 
+    read_backends.load(config.visiobas.visiobas_slicer)
+    if args.pool_size is not None:
+        config.visiobas.visiobas_slicer.setdefault("pool", {})["size"] = args.pool_size
+
     address_cache_path = config.visiobas.address_cache_path
+    farm = None
+    if args.simulator is not None:
+        farm = BACnetDeviceFarm.load(args.simulator)
+        address_cache_path = Path(args.simulator).with_name(Path(args.simulator).stem + "_address_cache")
+        BACnetWriter.write_bacwi(farm.devices(), str(address_cache_path))
+        config.visiobas.visiobas_slicer["address_cache"] = address_cache_path.absolute()
+        config.visiobas.visiobas_slicer["capability_cache"] = address_cache_path.with_name(
+            Path(args.simulator).stem + "_capability_cache.json").absolute()
+        config.visiobas.visiobas_slicer.setdefault("startup", {})["object_cache"] = address_cache_path.with_name(
+            Path(args.simulator).stem + "_object_cache.json").absolute()
+        BACnetFarmServer(farm).start()
     if not Path(address_cache_path).is_file():
         logger.error("File 'address_cache' not found: {}".format(address_cache_path))
         exit(0)
@@ -929,43 +1379,76 @@ if __name__ == '__main__':
         # key - object id, value - BACnetObject
         # bacnet_objects = {}
 
-        client = VisiobasGateClient(
-            config.visiobas.visiobas_server['host'],
-            config.visiobas.visiobas_server['port'],
-            config.visiobas.visiobas_server['ssl_verify'],
-            login=config.visiobas.visiobas_server['auth']['user'],
-            md5_pwd=config.visiobas.visiobas_server['auth']['pwd'],
-            write_put_requests=args.write_put_requests)
+        if farm is not None:
+            client = BACnetFarmGateClient(farm, args.read_app if args.read_app is not None else "native")
+        else:
+            client = VisiobasGateClient(
+                config.visiobas.visiobas_server['host'],
+                config.visiobas.visiobas_server['port'],
+                config.visiobas.visiobas_server['ssl_verify'],
+                login=config.visiobas.visiobas_server['auth']['user'],
+                md5_pwd=config.visiobas.visiobas_server['auth']['pwd'],
+                write_put_requests=args.write_put_requests)
 
         try:
             # how often need to perform login ?
             client.rq_login(config.visiobas.visiobas_server['auth']['user'],
                             config.visiobas.visiobas_server['auth']['pwd'])
 
-            # get notification class objects
-            notification_class = client.rq_device_object(1, ObjectType.NOTIFICATION_CLASS)
-            for o in notification_class:
-                bacnet_network.append(NotificationClass(o))
-                # bacnet_objects[o[ObjectProperty.OBJECT_IDENTIFIER.id()]] = NotificationClass(o)
-
-            server_devices = client.rq_devices()
-            server_devices = list(
-                filter(lambda x: x[ObjectProperty.OBJECT_IDENTIFIER.id()] in device_ids, server_devices))
+            # warm start: notification classes, devices and objects with status flags of previous run are loaded
+            # from snapshot, server is reconciled with after collectors start
+            slicer_config = config.visiobas.visiobas_slicer
+            snapshot = None
+            snapshot_objects = None
+            if slicer_config.get("snapshot", {}).get("enabled", False):
+                snapshot_path = slicer_config["snapshot"].get("path")
+                if snapshot_path is None:
+                    snapshot_path = Path(address_cache_path).with_name("network_snapshot.bin")
+                snapshot = BACnetSnapshot(snapshot_path)
+                snapshot_objects = snapshot.load(bacnet_network)
+
+            if snapshot_objects is None:
+                # get notification class objects
+                notification_class = client.rq_device_object(1, ObjectType.NOTIFICATION_CLASS)
+                bacnet_network.append_many([NotificationClass(o) for o in notification_class])
+
+                server_devices = client.rq_devices()
+                server_devices = list(
+                    filter(lambda x: x[ObjectProperty.OBJECT_IDENTIFIER.id()] in device_ids, server_devices))
+            else:
+                server_devices = [o.get_data() for o in snapshot_objects
+                                  if type(o) == Device and o.get_id() in device_ids]
             if args.device is not None:
                 server_devices = list(
                     filter(lambda x: x[ObjectProperty.OBJECT_IDENTIFIER.id()] == args.device, server_devices))
+            devices = []
             for o in server_devices:
-                device = Device(o)
+                device = bacnet_network.find_by_type(ObjectType.DEVICE, o[ObjectProperty.OBJECT_IDENTIFIER.id()]) \
+                    if snapshot_objects is not None else None
+                if device is None:
+                    device = Device(o)
+                    devices.append(device)
                 if args.read_app is not None:
                     device.set_read_app(args.read_app)
-                bacnet_network.append(device)
+            bacnet_network.append_many(devices)
+
+            if args.gateway_port is not None:
+                # writes are served by own threads of write pipeline, not queued behind collector reads
+                write_pipeline = get_write_pipeline()
+                for o in server_devices:
+                    device = bacnet_network.find_by_type(ObjectType.DEVICE, o[ObjectProperty.OBJECT_IDENTIFIER.id()])
+                    write_pipeline.set_write_app(device.get_id(), device.get_write_app())
+                gateway_thread = Thread(target=run_simple, args=("localhost", args.gateway_port,
+                                                                 VisiobasGatewayServer()),
+                                        name="gateway-server", daemon=True)
+                gateway_thread.start()
 
             if not len(device_ids) == len(server_devices):
                 logger.warning("Not all bacwi table devices exist on server")
                 for address_cache_device in address_cache_devices:
                     device_id = address_cache_device['id']
                     found = next((x for x in server_devices
-                                  if lambda d: d[ObjectProperty.OBJECT_IDENTIFIER.id()] == device_id), None)
+                                  if x[ObjectProperty.OBJECT_IDENTIFIER.id()] == device_id), None)
                     if found is None:
                         logger.warning("Device not found on server side: {}".format(address_cache_device))
 
@@ -1023,6 +1506,19 @@ if __name__ == '__main__':
             verifier.setDaemon(True)
             verifier.start()
 
+            backfill = None
+            if config.visiobas.visiobas_slicer.get("backfill", {}).get("enabled", False):
+                # values missed by not responding devices are read from trend-logs when device responds again
+                slicer_config = config.visiobas.visiobas_slicer
+                backfill = BACnetBackfill(shared_client(slicer_config), client, slicer_config,
+                                          shared_cache(slicer_config))
+                for address_cache_device in address_cache_devices:
+                    if bacnet_network.find_by_type(ObjectType.DEVICE, address_cache_device["id"]):
+                        backfill.add_device(address_cache_device["id"], address_cache_device["host"],
+                                            address_cache_device["port"], address_cache_device["apdu"])
+                device_health.add_recovery_listener(backfill.schedule)
+                backfill.start()
+
             # list of object types for collect
             object_types = [
                 ObjectType.ANALOG_INPUT,
@@ -1036,7 +1532,23 @@ if __name__ == '__main__':
                 ObjectType.MULTI_STATE_VALUE
             ]
 
-            collectors = []
+            # objects of devices with unchanged database-revision are taken from object cache,
+            # only object types present in object-list of other devices are requested from server
+            planner = BACnetStartupPlanner(shared_client(slicer_config), client, slicer_config)
+            collected_ids = set(x.get_id() for _devices in port_devices.values() for x in _devices
+                                if x.get_read_app() is not None)
+            if snapshot_objects is None:
+                device_objects = planner.plan([d for d in address_cache_devices if d["id"] in collected_ids],
+                                              object_types)
+            else:
+                device_objects = {}
+                for device_id in collected_ids:
+                    objects = bacnet_network.find_by_device(device_id)
+                    device_objects[device_id] = {t: [o for o in objects if o.get_object_type_code() == t.code()]
+                                                 for t in object_types}
+
+            # key - port of devices, value - collector
+            collectors = {}
             thread_idx = 1
             for port in port_devices:
                 _devices = port_devices[port]
@@ -1050,9 +1562,10 @@ if __name__ == '__main__':
                         continue
 
                     for object_type in object_types:
-                        objects = client.rq_device_object(device.get_id(), object_type)
+                        objects = device_objects[device.get_id()][object_type]
                         if logger.isEnabledFor(logging.INFO):
-                            object_ids = [x[ObjectProperty.OBJECT_IDENTIFIER.id()] for x in objects]
+                            object_ids = [x.get_id() if isinstance(x, BACnetObject) else
+                                          x[ObjectProperty.OBJECT_IDENTIFIER.id()] for x in objects]
                             logger.info(
                                 "Collector# {} device: {} type: {} objects: {}".format(thread_idx,
                                                                                        device.get_id(),
@@ -1061,46 +1574,16 @@ if __name__ == '__main__':
 
                         if 'object' in args and args.object is not None:
                             objects = list(filter(
-                                lambda x: x[ObjectProperty.OBJECT_IDENTIFIER.id()] == args.object, objects))
+                                lambda x: (x.get_id() if isinstance(x, BACnetObject) else
+                                           x[ObjectProperty.OBJECT_IDENTIFIER.id()]) == args.object, objects))
 
                         # collect map of bacnet object and link reference with notification class object
                         for o in objects:
-                            bacnet_object = BACnetObject(o)
-                            notification_class_id = bacnet_object.get_notification_class()
-                            if not notification_class_id == 0:
-                                # TODO time duration of find_by_type ?
-                                notification_class = bacnet_network.find_by_type(ObjectType.NOTIFICATION_CLASS,
-                                                                                 notification_class_id)
-                                if notification_class:
-                                    assert (type(notification_class) == NotificationClass)
-                                    bacnet_object.set_notification_object(notification_class)
-                            if args.notify_fault == 1:
-                                notification_class = bacnet_object.get_notification_object()
-                                if notification_class is None:
-                                    notification_class = NotificationClass({
-                                        ObjectProperty.DEVICE_ID.id(): 1,
-                                        ObjectProperty.OBJECT_IDENTIFIER.id(): 55000,
-                                        ObjectProperty.OBJECT_TYPE.id(): ObjectType.NOTIFICATION_CLASS.name(),
-                                        ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): "Site:VisioBAS.Notification",
-                                        ObjectProperty.DESCRIPTION.id(): "Default VisioBAS Notification",
-                                        ObjectProperty.PRIORITY.id(): [2, 2, 2],
-                                        ObjectProperty.RECIPIENT_LIST.id(): config.visiobas.notifier["recipient_list"]
-                                    })
-                                    bacnet_object.set_notification_object(notification_class)
-                                else:
-                                    recipient_list = notification_class.get_recipient_list()
-                                    recipient_list += config.visiobas.notifier["recipient_list"]
-                                    notification_class.set_recipient_list(recipient_list)
-                                event_messages = config.visiobas.notifier["event_messages"]
-                                for i in range(0, len(event_messages)):
-                                    message = event_messages[i]
-                                    if bacnet_object.get_event_message_text(i) == "":
-                                        bacnet_object.set_event_message_text(i, message)
-                                    bacnet_object.set_event_detection_enabled(True)
-                                    bacnet_object.set_event_enable([True, True, True])
-                            bacnet_network.append(bacnet_object)
-                            data_collector_objects.append(bacnet_object)
+                            data_collector_objects.append(create_bacnet_object(o, args.notify_fault == 1))
 
+                # objects loaded from snapshot are in network already
+                bacnet_network.append_many([o for o in data_collector_objects
+                                            if bacnet_network.find(o.get_object_reference()) is not o])
                 collector = VisiobasThreadDataCollector(thread_idx, verifier, bacnet_network)
                 collector.setDaemon(True)
                 if logger.isEnabledFor(logging.INFO):
@@ -1109,9 +1592,22 @@ if __name__ == '__main__':
                 for bacnet_object in data_collector_objects:
                     collector.add_object(bacnet_object)
                 collector.start()
-                collectors.append(collector)
+                collectors[port] = collector
                 thread_idx += 1
 
+            reloader = VisiobasDeviceReloader(client, planner, verifier, object_types, collectors, args, backfill)
+            if slicer_config.get("address_cache_watch", {}).get("enabled", False):
+                # devices changed in address_cache are applied to running collectors without restart
+                watcher = BACnetAddressCacheWatcher(dict(slicer_config, address_cache=address_cache_path))
+                watcher.add_listener(reloader)
+                watcher.start()
+            if snapshot_objects is not None:
+                Thread(target=reloader.reconcile, args=(address_cache_devices,), name="snapshot-reconcile",
+                       daemon=True).start()
+            if snapshot is not None:
+                BACnetSnapshotWriter(bacnet_network, snapshot,
+                                     slicer_config["snapshot"].get("interval", 60)).start()
+
             if logger.isEnabledFor(logging.INFO):
                 if not os.path.exists("logs"):
                     os.mkdir("logs")
@@ -1127,7 +1623,7 @@ if __name__ == '__main__':
                     logger.error("Close app because of shutdown timeout")
                     exit(0)
 
-                for collector in collectors:
+                for collector in list(collectors.values()):
                     if abs(time_stamp - collector.heart_beat) > max_heart_beat_timeout:
                         logger.error("Close app because of collector seems not alive any more")
                         exit(0)
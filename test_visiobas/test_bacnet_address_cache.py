@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from bacnet.address_cache import BACnetAddressCache, BACnetAddressCacheWatcher
+from bacnet.native import BACnetNativeClient
+from bacnet.slicer import BACnetSlicer
+from bacnet.worker import BACnetWorker
+from bacnet.writer import BACnetWriter
+
+DEVICES = [
+    {"id": 100, "host": "10.0.0.1", "port": 47808, "apdu": 480},
+    {"id": 101, "host": "10.0.0.2", "port": 47808, "apdu": 1476},
+    {"id": 102, "host": "10.0.0.3", "port": 47809, "apdu": 480}
+]
+
+
+class BACnetAddressCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "address_cache"
+        self.write(DEVICES)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, devices: list):
+        BACnetWriter.write_bacwi(devices, str(self.path))
+        # the same size file written within one tick of file system clock is changed file too
+        stat = os.stat(str(self.path))
+        os.utime(str(self.path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    def test_diff(self):
+        previous = {d["id"]: d for d in DEVICES}
+        current = {d["id"]: d for d in DEVICES[1:]}
+        current[101] = dict(DEVICES[1], port=47810)
+        current[103] = {"id": 103, "host": "10.0.0.4", "port": 47808, "apdu": 480}
+        added, removed, changed = BACnetAddressCache.diff(previous, current)
+        self.assertEqual([d["id"] for d in added], [103])
+        self.assertEqual([d["id"] for d in removed], [100])
+        self.assertEqual(changed, [current[101]])
+
+    def test_watcher(self):
+        watcher = BACnetAddressCacheWatcher({"address_cache": str(self.path)})
+        notifications = []
+        watcher.add_listener(lambda added, removed, changed: notifications.append((added, removed, changed)))
+        self.assertEqual(sorted(watcher.get_devices()), [100, 101, 102])
+        self.assertIsNone(watcher.check())
+
+        devices = [DEVICES[0], dict(DEVICES[1], host="10.0.1.2"), {"id": 103, "host": "10.0.0.4", "port": 47808,
+                                                                  "apdu": 480}]
+        self.write(devices)
+        added, removed, changed = watcher.check()
+        self.assertEqual([d["id"] for d in added], [103])
+        self.assertEqual([d["id"] for d in removed], [102])
+        self.assertEqual([(d["id"], d["host"]) for d in changed], [(101, "10.0.1.2")])
+        self.assertEqual(len(notifications), 1)
+
+        # broken or removed file keeps devices
+        self.path.write_text("garbage")
+        self.assertIsNone(watcher.check())
+        self.path.unlink()
+        self.assertIsNone(watcher.check())
+        self.assertEqual(sorted(watcher.get_devices()), [100, 101, 103])
+
+    def test_read_apps_take_changed_address(self):
+        slicer = BACnetSlicer({"address_cache": str(self.path), "address_cache_watch": {"interval": 0}})
+        self.assertEqual(slicer.get_apdu(101), 1476)
+        client = BACnetNativeClient()
+        worker = BACnetWorker(client, 1, BACnetAddressCache(self.path))
+        self.assertEqual(client.get_device_address(101), ("10.0.0.2", 47808))
+
+        self.write([dict(DEVICES[1], host="10.0.1.2", port=47810, apdu=480)])
+        self.assertEqual(slicer.get_apdu(101), 480)
+        self.assertIsNone(slicer.get_address_cache_device(100))
+        worker.update_addresses()
+        self.assertEqual(client.get_device_address(101), ("10.0.1.2", 47810))
+
+
+if __name__ == '__main__':
+    unittest.main()
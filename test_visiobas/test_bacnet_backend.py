@@ -0,0 +1,59 @@
+import threading
+import unittest
+
+from bacnet.backend import ReadBackend, read_backends
+from bacnet.bacnet import ObjectProperty
+from bacnet.slicer import BACnetSlicer
+
+
+class CountingBackend(ReadBackend):
+    batch_size = 2
+    concurrency = 2
+    cost = 0.5
+
+    def __init__(self):
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def read(self, slicer, device_id: int, object_type: int, object_id: int, fields: list, timeout):
+        return self.read_batch(slicer, device_id, [(object_type, object_id, fields)], timeout)[(object_type, object_id)]
+
+    def read_batch(self, slicer, device_id: int, objects: list, timeout):
+        with self.lock:
+            self.batches.append(objects)
+        return {(o[0], o[1]): {ObjectProperty.PRESENT_VALUE.id(): str(float(o[1]))} for o in objects}
+
+
+class ReadBackendTest(unittest.TestCase):
+    def setUp(self):
+        read_backends.load({"read_backends": {"counting": "test_visiobas.test_bacnet_backend:CountingBackend"}})
+
+    def tearDown(self):
+        read_backends.unregister("counting")
+
+    def test_registered_backend_batches(self):
+        slicer = BACnetSlicer({})
+        fields = [ObjectProperty.PRESENT_VALUE.id()]
+        objects = [(0, i, fields) for i in range(5)]
+        result = slicer.execute_batch("counting", 200, objects, 1)
+        self.assertEqual(len(result), 5)
+        # batch values are typed by object type
+        self.assertEqual(result[(0, 3)][ObjectProperty.PRESENT_VALUE.id()], 3.0)
+        self.assertEqual(sorted([len(batch) for batch in read_backends.get("counting").batches]), [1, 2, 2])
+
+        data = slicer.execute("counting", device_id=200, object_type=0, object_id=7, fields=fields, timeout=1)
+        self.assertEqual(data, {ObjectProperty.PRESENT_VALUE.id(): "7.0"})
+        slicer.close()
+
+    def test_select_cheapest_backend(self):
+        self.assertEqual(read_backends.select("native", {}), "native")
+        self.assertEqual(read_backends.select("bacrpm, native, counting", {}), "counting")
+        # bacrpm application is not installed
+        self.assertEqual(read_backends.select("bacrpm,native", {}), "native")
+        self.assertIsNone(read_backends.select("unknown", {}))
+        with self.assertRaises(Exception):
+            BACnetSlicer({}).execute("unknown", device_id=200, object_type=0, object_id=1, fields=[], timeout=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
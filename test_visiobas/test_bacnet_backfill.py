@@ -0,0 +1,178 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, BitString, Enumerated, LOG_DATUM_REAL, LOG_DATUM_ENUMERATED
+from bacnet.backfill import BACnetBackfill, RateLimiter, TIMESTAMP
+from bacnet.bacnet import ObjectType, ObjectProperty
+from bacnet.capability import BACnetCapabilityCache
+from bacnet.health import DeviceHealthRegistry
+from bacnet.native import BACnetNativeClient
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer
+
+SPEC = {
+    "devices": 2,
+    "first_device_id": 6000,
+    "base_port": 49300,
+    "max_apdu": 480,
+    "log_interval": 10,
+    "log_buffer_size": 500,
+    "objects": {"analog-input": 3, "binary-input": 2, "trend-log": 4}
+}
+
+
+class HistoryClient:
+    def __init__(self):
+        self.history = []
+
+    def rq_put_history(self, device_id, data):
+        self.history.append((device_id, data))
+        return []
+
+
+class BACnetBackfillTest(unittest.TestCase):
+    def setUp(self):
+        self.farm = BACnetDeviceFarm(SPEC)
+        self.server = BACnetFarmServer(self.farm).start()
+        self.client = BACnetNativeClient(local_host="127.0.0.1").start()
+        self.gate_client = HistoryClient()
+
+    def tearDown(self):
+        self.client.stop()
+        self.server.stop()
+
+    def create_backfill(self, settings: dict, capabilities=None):
+        backfill = BACnetBackfill(self.client, self.gate_client, {"backfill": settings}, capabilities)
+        for device in self.farm.devices():
+            backfill.add_device(device["id"], device["host"], device["port"], device["apdu"])
+        return backfill
+
+    def test_encode_decode_read_range(self):
+        payload = BACnetEncoder.read_range(ObjectType.TREND_LOG, 1, ObjectProperty.LOG_BUFFER.id(), 1700000000.5,
+                                           -50, by_time=True)
+        self.assertEqual(BACnetDecoder.read_range_request(payload)[2:], (1700000000.5, -50, True))
+        payload = BACnetEncoder.read_range_ack(ObjectType.TREND_LOG, 1, ObjectProperty.LOG_BUFFER.id(),
+                                               BitString([True, False, True]),
+                                               [(1700000000, 21.5, BitString([False] * 4)),
+                                                (1700000010, Enumerated(1), None)], 7)
+        _, _, result_flags, records, first_sequence = BACnetDecoder.read_range_ack(payload)
+        self.assertEqual(result_flags, [True, False, True])
+        self.assertEqual(first_sequence, 7)
+        self.assertEqual([(r.timestamp, r.datum, r.value) for r in records],
+                         [(1700000000, LOG_DATUM_REAL, 21.5), (1700000010, LOG_DATUM_ENUMERATED, 1)])
+        self.assertEqual(records[0].status_flags, [False] * 4)
+        self.assertIsNone(records[1].status_flags)
+
+    def test_backfill_window(self):
+        capabilities = BACnetCapabilityCache()
+        backfill = self.create_backfill({"rate": 1000, "burst": 10, "page_size": 100, "put_size": 50},
+                                        capabilities)
+        end = time.time()
+        start = end - 1000
+        count = backfill.backfill(6001, start, end)
+
+        # 4 trend-logs of analog-input 1..3 and binary-input 1, record every 10 sec
+        self.assertGreaterEqual(count, 4 * 99)
+        self.assertLessEqual(count, 4 * 100)
+        self.assertEqual(sum(len(data) for _, data in self.gate_client.history), count)
+        self.assertTrue(all(len(data) <= 50 for _, data in self.gate_client.history))
+        # pages are sized to APDU of device (480) without segmentation
+        self.assertGreater(backfill.statistic["requests"], 4 * 100 // backfill.get_page_size(6001))
+
+        samples = [s for _, data in self.gate_client.history for s in data
+                   if s[ObjectProperty.OBJECT_TYPE.id()] == "analog-input" and
+                   s[ObjectProperty.OBJECT_IDENTIFIER.id()] == 2]
+        timestamps = [s[TIMESTAMP] for s in samples]
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+        sample = samples[0]
+        self.assertAlmostEqual(sample[ObjectProperty.PRESENT_VALUE.id()],
+                               self.farm.sampled_value(6001, ObjectType.ANALOG_INPUT.code(), 2,
+                                                       (int(start // 10) + 1) * 10), places=3)
+        binary = next(s for _, data in self.gate_client.history for s in data
+                      if s[ObjectProperty.OBJECT_TYPE.id()] == "binary-input")
+        self.assertIn(binary[ObjectProperty.PRESENT_VALUE.id()], ["active", "inactive"])
+
+    def test_rate_limit(self):
+        limiter = RateLimiter(20, 1)
+        start = time.monotonic()
+        for i in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.24)
+
+    def test_recovery_and_gateway_outage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state = Path(directory) / "backfill_state.json"
+            state.write_text(json.dumps({"heartbeat": time.time() - 100}))
+            backfill = self.create_backfill({"rate": 1000, "burst": 10, "state": str(state)})
+            backfill.start()
+            try:
+                # gateway outage since saved heartbeat is backfilled for every device
+                self.assertTrue(backfill.join(20))
+                self.assertEqual(sorted(set(device_id for device_id, _ in self.gate_client.history)),
+                                 self.farm.device_ids())
+                self.assertGreater(json.loads(state.read_text())["heartbeat"], time.time() - 10)
+
+                registry = DeviceHealthRegistry({"health": {"failure_threshold": 1, "backoff_initial": 0}})
+                registry.add_recovery_listener(backfill.schedule)
+                health = registry.get(6000)
+                health.record_success(0.1)
+                health.last_success -= 200
+                health.record_failure()
+                self.gate_client.history = []
+                health.record_success(0.1)
+                self.assertTrue(backfill.join(20))
+                self.assertEqual(set(device_id for device_id, _ in self.gate_client.history), {6000})
+                self.assertGreaterEqual(sum(len(data) for _, data in self.gate_client.history), 4 * 19)
+            finally:
+                backfill.stop()
+
+    def test_failed_window_is_repeated(self):
+        backfill = self.create_backfill({"rate": 1000, "burst": 10, "retries": 2, "retry_interval": 0.1})
+        read_window = backfill.read_window
+        reads = []
+
+        def fail_third_trend_log(device_id, log_id, *args):
+            reads.append(log_id)
+            if len(reads) == 3:
+                raise TimeoutError()
+            return read_window(device_id, log_id, *args)
+
+        backfill.read_window = fail_third_trend_log
+        backfill.start()
+        try:
+            end = time.time()
+            backfill.schedule(6001, end - 200, end)
+            self.assertTrue(backfill.join(20))
+        finally:
+            backfill.stop()
+        # samples of trend-logs read before failure are pushed, only the rest is read again
+        self.assertEqual(len(reads), 5)
+        self.assertEqual(len(set(reads)), 4)
+        self.assertEqual(backfill.statistic["failed"], 1)
+        samples = [(s[ObjectProperty.OBJECT_TYPE.id()], s[ObjectProperty.OBJECT_IDENTIFIER.id()], s[TIMESTAMP])
+                   for _, data in self.gate_client.history for s in data]
+        self.assertEqual(len(samples), len(set(samples)))
+        self.assertEqual(len(set(s[:2] for s in samples)), 4)
+
+    def test_failed_window_is_dropped_after_retries(self):
+        backfill = self.create_backfill({"rate": 1000, "burst": 10, "retries": 2, "retry_interval": 0.1})
+
+        def fail(device_id, samples):
+            raise ConnectionError("server is down")
+
+        self.gate_client.rq_put_history = fail
+        backfill.start()
+        try:
+            end = time.time()
+            backfill.schedule(6001, end - 200, end)
+            self.assertTrue(backfill.join(20))
+        finally:
+            backfill.stop()
+        self.assertEqual(backfill.statistic["failed"], 3)
+        self.assertEqual(backfill.failed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
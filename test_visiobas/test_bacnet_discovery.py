@@ -0,0 +1,96 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, SEGMENTATION_NONE
+from bacnet.capability import BACnetCapabilityCache
+from bacnet.discovery import BACnetDiscovery
+from bacnet.native import BACnetNativeClient
+from bacnet.parser import BACnetParser
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer
+
+SPEC = {
+    "devices": 500,
+    "first_device_id": 10000,
+    "base_port": 48200,
+    "who_is_port": 48199,
+    "max_apdu": 1476,
+    "jitter": 0.02,
+    "objects": {}
+}
+
+
+class BACnetDiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.client = BACnetNativeClient(local_host="127.0.0.1").start()
+
+    def tearDown(self):
+        self.client.stop()
+
+    def test_encode_decode(self):
+        self.assertEqual(BACnetDecoder.who_is_request(BACnetEncoder.who_is(10, 4194303)), (10, 4194303))
+        self.assertEqual(BACnetDecoder.who_is_request(BACnetEncoder.who_is()), (None, None))
+        device_identifier, max_apdu, segmentation, vendor_id = BACnetDecoder.i_am(BACnetEncoder.i_am(200, 480))
+        self.assertEqual((device_identifier.type, device_identifier.instance), (8, 200))
+        self.assertEqual((max_apdu, segmentation, vendor_id), (480, SEGMENTATION_NONE, 0))
+
+    def test_ranges(self):
+        discovery = BACnetDiscovery(self.client, {"discovery": {"range_size": 100}})
+        self.assertEqual(discovery.split([(0, 249)]), [(0, 99), (100, 199), (200, 249)])
+        self.assertEqual(BACnetDiscovery.contiguous([5, 1, 2, 3, 7]), [(1, 3), (5, 5), (7, 7)])
+
+    def test_discover_farm(self):
+        farm = BACnetDeviceFarm(SPEC)
+        server = BACnetFarmServer(farm).start()
+        try:
+            capabilities = BACnetCapabilityCache()
+            discovery = BACnetDiscovery(self.client, {"discovery": {
+                "host": "127.0.0.1", "port": farm.who_is_port, "range_size": 100, "quiet": 0.5}}, capabilities)
+            start = time.time()
+            devices = discovery.discover([(10000, 10499), (20000, 20010)])
+            self.assertLess(time.time() - start, 5)
+            self.assertEqual([d["id"] for d in devices], farm.device_ids())
+            self.assertEqual(devices[7]["port"], farm.get_port(10007))
+            self.assertEqual(devices[7]["apdu"], 1476)
+            self.assertFalse(capabilities.get(10007, "segmentation"))
+            self.assertEqual(self.client.get_device_address(10007), ("127.0.0.1", farm.get_port(10007)))
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / "address_cache"
+                discovery.write(devices, path)
+                parsed = BACnetParser.parse_bacwi(path.read_text())
+                self.assertEqual([(d["id"], d["port"]) for d in parsed],
+                                 [(d["id"], d["port"]) for d in devices])
+        finally:
+            server.stop()
+
+    def test_repeat_who_is_of_expected_devices(self):
+        farm = BACnetDeviceFarm(dict(SPEC, devices=100, drop_rate=0.1))
+        server = BACnetFarmServer(farm).start()
+        try:
+            discovery = BACnetDiscovery(self.client, {"discovery": {
+                "host": "127.0.0.1", "port": farm.who_is_port, "quiet": 0.3, "retries": 4}})
+            devices = discovery.discover([(10000, 10099)], expected=farm.device_ids())
+            self.assertEqual([d["id"] for d in devices], farm.device_ids())
+        finally:
+            server.stop()
+
+    def test_discover_keeps_no_devices_of_previous_call(self):
+        farm = BACnetDeviceFarm(SPEC)
+        server = BACnetFarmServer(farm).start()
+        handlers = len(self.client.request_handlers)
+        discovery = BACnetDiscovery(self.client, {"discovery": {
+            "host": "127.0.0.1", "port": farm.who_is_port, "quiet": 0.3, "timeout": 1}})
+        try:
+            self.assertEqual([d["id"] for d in discovery.discover([(10000, 10499)])], farm.device_ids())
+        finally:
+            server.stop()
+        self.assertEqual(len(self.client.request_handlers), handlers)
+        # devices not answering any more are not discovered again
+        self.assertEqual(discovery.discover([(10000, 10499)]), [])
+        self.assertEqual(len(self.client.request_handlers), handlers)
+
+
+if __name__ == '__main__':
+    unittest.main()
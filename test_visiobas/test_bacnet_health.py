@@ -0,0 +1,61 @@
+import time
+import unittest
+
+from bacnet.health import DeviceHealthRegistry, CLOSED, OPEN, HALF_OPEN
+
+
+class DeviceHealthTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = DeviceHealthRegistry({"read_timeout": 5, "health": {
+            "min_timeout": 0.5, "failure_threshold": 2, "backoff_initial": 0.1, "backoff_max": 0.3}})
+
+    def test_timeout_adapts_to_round_trip_time(self):
+        health = self.registry.get(200)
+        self.assertEqual(health.timeout(), 5)
+        for i in range(20):
+            health.record_success(0.2)
+        self.assertAlmostEqual(health.timeout(), 0.5, places=1)
+        for i in range(20):
+            health.record_success(1.0)
+        self.assertGreater(health.timeout(), 1.0)
+        self.assertLessEqual(health.timeout(), 5)
+        for i in range(20):
+            health.record_success(30)
+        self.assertEqual(health.timeout(), 5)
+
+    def test_circuit_breaker(self):
+        health = self.registry.get(200)
+        health.record_failure()
+        self.assertEqual(health.state, CLOSED)
+        health.record_failure()
+        self.assertEqual(health.state, OPEN)
+        self.assertFalse(health.allow_request())
+        self.assertEqual(self.registry.not_responding_devices(), {200})
+
+        time.sleep(0.15)
+        self.assertTrue(health.allow_request())
+        self.assertEqual(health.state, HALF_OPEN)
+        self.assertFalse(health.allow_request())
+
+        # failed probe doubles backoff
+        health.record_failure()
+        self.assertEqual(health.state, OPEN)
+        self.assertAlmostEqual(health.backoff, 0.2)
+        time.sleep(0.1)
+        self.assertFalse(health.allow_request())
+        time.sleep(0.15)
+        self.assertTrue(health.allow_request())
+        health.record_failure()
+        health.allow_request()
+        self.assertAlmostEqual(health.backoff, 0.3)
+
+        time.sleep(0.35)
+        self.assertTrue(health.allow_request())
+        health.record_success(0.1)
+        self.assertEqual(health.state, CLOSED)
+        self.assertAlmostEqual(health.backoff, 0.1)
+        self.assertEqual(self.registry.not_responding_devices(), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
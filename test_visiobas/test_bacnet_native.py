@@ -0,0 +1,401 @@
+import asyncio
+import io
+import json
+import logging
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from bacnet.capability import BACnetCapabilityCache
+from bacnet.cov import BACnetCOVSubscriber
+from bacnet.apdu import BACnetEncoder, BACnetDecoder, BACnetError, ConfirmedService, UnconfirmedService, PduType, \
+    Enumerated, \
+    BitString, ObjectIdentifier, REJECT_UNRECOGNIZED_SERVICE
+from bacnet.bacnet import ObjectProperty, ObjectType, BinaryPV
+from bacnet.native import BACnetNativeClient, BACnetValueFormatter, shared_client
+from bacnet.parser import BACnetParser
+from bacnet.pool import BACnetCoprocessPool
+from bacnet.slicer import BACnetSlicer
+from bacnet.worker import BACnetWorker, END_OF_OUTPUT
+from bacnet.writer import BACnetWriter
+
+
+class StandInDevice(threading.Thread):
+    """
+    Local UDP stand-in of BACnet device answering ReadProperty and ReadPropertyMultiple requests
+    """
+
+    def __init__(self, objects: dict, support_rpm=True, drop_first=0, support_cov=True, device_id=200):
+        """
+        :param objects: key - (object type code, object id), value - dict of property id -> value
+        :param support_rpm: reject ReadPropertyMultiple as unrecognized service if False
+        :param drop_first: count of first requests to ignore (emulate lost datagrams)
+        :param support_cov: reject SubscribeCOV as unrecognized service if False
+        """
+        super().__init__(daemon=True)
+        self.objects = objects
+        self.support_rpm = support_rpm
+        self.support_cov = support_cov
+        self.device_id = device_id
+        self.drop_first = drop_first
+        self.requests = 0
+        # key - (object type code, object id), value - (subscriber address, process id)
+        self.subscriptions = {}
+        self.notified = set()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+
+    def stop(self):
+        self.socket.close()
+
+    def __property(self, object_identifier, property_id):
+        properties = self.objects.get((object_identifier.type, object_identifier.instance))
+        if properties is None:
+            return BACnetError(PduType.ERROR, 1, 31)
+        if property_id == int(ObjectProperty.OBJECT_IDENTIFIER.id()):
+            return object_identifier
+        if property_id not in properties:
+            return BACnetError(PduType.ERROR, 2, 32)
+        return properties[property_id]
+
+    def notify(self, key):
+        address, process_id = self.subscriptions[key]
+        values = [(PV, self.objects[key][PV]), (SF, self.objects[key][SF])]
+        payload = BACnetEncoder.cov_notification(process_id, self.device_id, key[0], key[1], 300, values)
+        self.socket.sendto(BACnetEncoder.unconfirmed_request(UnconfirmedService.UNCONFIRMED_COV_NOTIFICATION,
+                                                             payload), address)
+
+    def handle(self, data, address=None):
+        _, apdu = BACnetDecoder.frame(data, None)
+        if apdu.service == ConfirmedService.SUBSCRIBE_COV.id() and self.support_cov:
+            process_id, object_identifier, _, lifetime = BACnetDecoder.subscribe_cov_request(apdu.payload)
+            key = (object_identifier.type, object_identifier.instance)
+            if key not in self.objects:
+                return BACnetEncoder.error(apdu.invoke_id, ConfirmedService.SUBSCRIBE_COV, 1, 31)
+            if lifetime is None:
+                self.subscriptions.pop(key, None)
+            else:
+                self.subscriptions[key] = (address, process_id)
+            return BACnetEncoder.simple_ack(apdu.invoke_id, ConfirmedService.SUBSCRIBE_COV)
+        if apdu.service == ConfirmedService.READ_PROPERTY.id():
+            object_identifier, property_id, _ = BACnetDecoder.read_property_request(apdu.payload)
+            value = self.__property(object_identifier, property_id)
+            if isinstance(value, BACnetError):
+                return BACnetEncoder.error(apdu.invoke_id, ConfirmedService.READ_PROPERTY,
+                                           value.error_class, value.error_code)
+            payload = BACnetEncoder.read_property_ack(object_identifier.type, object_identifier.instance,
+                                                      property_id, value)
+            return BACnetEncoder.complex_ack(apdu.invoke_id, ConfirmedService.READ_PROPERTY, payload)
+        if apdu.service == ConfirmedService.READ_PROPERTY_MULTIPLE.id() and self.support_rpm:
+            results = []
+            for object_identifier, properties in BACnetDecoder.read_property_multiple_request(apdu.payload):
+                results.append((object_identifier.type, object_identifier.instance,
+                                [(p, self.__property(object_identifier, p)) for p, _ in properties]))
+            payload = BACnetEncoder.read_property_multiple_ack(results)
+            return BACnetEncoder.complex_ack(apdu.invoke_id, ConfirmedService.READ_PROPERTY_MULTIPLE, payload)
+        return BACnetEncoder.reject(apdu.invoke_id, REJECT_UNRECOGNIZED_SERVICE)
+
+    def run(self):
+        while True:
+            try:
+                data, address = self.socket.recvfrom(2048)
+            except OSError:
+                return
+            self.requests += 1
+            if self.requests <= self.drop_first:
+                continue
+            self.socket.sendto(self.handle(data, address), address)
+            for key in list(self.subscriptions.keys()):
+                if self.subscriptions[key][0] == address and key not in self.notified:
+                    # initial notification of new subscription
+                    self.notified.add(key)
+                    self.notify(key)
+
+
+PV = int(ObjectProperty.PRESENT_VALUE.id())
+SF = int(ObjectProperty.STATUS_FLAGS.id())
+OOS = int(ObjectProperty.OUT_OF_SERVICE.id())
+REL = int(ObjectProperty.RELIABILITY.id())
+PA = int(ObjectProperty.PRIORITY_ARRAY.id())
+DESCRIPTION = int(ObjectProperty.DESCRIPTION.id())
+
+OBJECTS = {
+    (ObjectType.ANALOG_INPUT.code(), 3000022): {
+        PV: 55.5,
+        SF: BitString([False, False, False, False]),
+        OOS: False,
+        REL: Enumerated(0),
+        DESCRIPTION: "ANALOG VALUE 1"
+    },
+    (ObjectType.BINARY_OUTPUT.code(), 5): {
+        PV: Enumerated(1),
+        SF: BitString([False, True, False, False]),
+        OOS: True,
+        REL: Enumerated(0),
+        PA: [None] * 7 + [Enumerated(1)] + [None] * 8
+    }
+}
+
+BACRPM_OUTPUT = """analog-input #3000022
+{
+    out-of-service: FALSE
+    present-value: 55.500000
+    reliability: no-fault-detected
+    status-flags: {false,false,false,false}
+    description: "ANALOG VALUE 1"
+}
+"""
+
+
+class BACnetNativeTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.device = StandInDevice(OBJECTS)
+        self.device.start()
+        self.client = BACnetNativeClient(local_host="127.0.0.1", retries=2).start()
+        self.client.set_device_address(200, "127.0.0.1", self.device.port)
+
+    def tearDown(self):
+        self.client.stop()
+        self.device.stop()
+
+    def test_encode_decode_values(self):
+        values = [None, True, False, 7, -7, 1.5, "text", BitString([True, False, True]), Enumerated(3),
+                  ObjectIdentifier(0, 3000022), [None, 1.0, None]]
+        for value in values:
+            data = BACnetEncoder.property_value(value)
+            decoded, _ = BACnetDecoder.values(data, 0)
+            self.assertEqual(value, BACnetDecoder.property_value(decoded))
+
+    def test_read_property_multiple_same_as_bacrpm(self):
+        fields = [ObjectProperty.OUT_OF_SERVICE.id(), ObjectProperty.PRESENT_VALUE.id(),
+                  ObjectProperty.RELIABILITY.id(), ObjectProperty.STATUS_FLAGS.id(), ObjectProperty.DESCRIPTION.id()]
+        results = self.client.read_property_multiple(200, [(0, 3000022, fields)], 2)
+        self.assertEqual(len(results), 1)
+        data = BACnetValueFormatter.format(0, results[0][1])
+        self.assertEqual(data, BACnetParser().parse_bacrpm(BACRPM_OUTPUT))
+
+    def test_binary_object_and_property_errors(self):
+        fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id(),
+                  ObjectProperty.PRIORITY_ARRAY.id(), ObjectProperty.HIGH_LIMIT.id()]
+        results = self.client.read_property_multiple(200, [(ObjectType.BINARY_OUTPUT, 5, fields)], 2)
+        data = BACnetValueFormatter.format(ObjectType.BINARY_OUTPUT.code(), results[0][1])
+        self.assertEqual(data[ObjectProperty.PRESENT_VALUE.id()], "active")
+        self.assertEqual(data[ObjectProperty.STATUS_FLAGS.id()], [False, True, False, False])
+        self.assertEqual(data[ObjectProperty.PRIORITY_ARRAY.id()][7], "active")
+        self.assertEqual(len(data[ObjectProperty.PRIORITY_ARRAY.id()]), 16)
+        self.assertNotIn(ObjectProperty.HIGH_LIMIT.id(), data)
+
+    def test_concurrent_requests_multiplexed(self):
+        async def read_all():
+            requests = [self.client.read_property_async(200, 0, 3000022, PV, 2) for _ in range(50)]
+            return await asyncio.gather(*requests)
+        values = self.client.run(read_all())
+        self.assertEqual(len(values), 50)
+        for value in values:
+            self.assertAlmostEqual(value, 55.5, places=4)
+
+    def test_retry_on_lost_datagram(self):
+        device = StandInDevice(OBJECTS, drop_first=1)
+        device.start()
+        try:
+            self.client.set_device_address(300, "127.0.0.1", device.port)
+            value = self.client.read_property(300, 0, 3000022, PV, 1.5)
+            self.assertAlmostEqual(value, 55.5, places=4)
+            self.assertEqual(device.requests, 2)
+        finally:
+            device.stop()
+
+    def test_error_response(self):
+        with self.assertRaises(BACnetError) as context:
+            self.client.read_property(200, 0, 1, PV, 1)
+        self.assertEqual(context.exception.pdu_type, PduType.ERROR)
+        self.assertEqual(context.exception.error_code, 31)
+
+    def test_slicer_native_batch(self):
+        slicer = BACnetSlicer({"native": {"local_host": "127.0.0.1"}})
+        shared_client(slicer.config).set_device_address(500, "127.0.0.1", self.device.port)
+        fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id()]
+        objects = [(ObjectType.ANALOG_INPUT, 3000022, fields), (ObjectType.BINARY_OUTPUT, 5, fields)]
+        result = slicer.execute_batch("native", 500, objects, 2)
+        # batch values are typed by object type
+        self.assertEqual(result[(ObjectType.ANALOG_INPUT.code(), 3000022)][ObjectProperty.PRESENT_VALUE.id()], 55.5)
+        self.assertIs(result[(ObjectType.BINARY_OUTPUT.code(), 5)][ObjectProperty.PRESENT_VALUE.id()], BinaryPV.ACTIVE)
+
+        result = slicer.execute_batch("native", 500, objects + [(ObjectType.ANALOG_VALUE, 1, fields)], 2, apdu=50)
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[(ObjectType.ANALOG_VALUE.code(), 1)], {})
+        self.assertEqual(result[(ObjectType.BINARY_OUTPUT.code(), 5)][ObjectProperty.PRESENT_VALUE.id()], "active")
+
+    def test_slicer_native_fallback_to_read_property(self):
+        device = StandInDevice(OBJECTS, support_rpm=False)
+        device.start()
+        try:
+            slicer = BACnetSlicer({"native": {"local_host": "127.0.0.1"}})
+            shared_client(slicer.config).set_device_address(400, "127.0.0.1", device.port)
+            data = slicer.execute("native", device_id=400, object_type=ObjectType.ANALOG_INPUT.code(),
+                                  object_id=3000022,
+                                  fields=[ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id()],
+                                  timeout=2)
+            self.assertEqual(data, {
+                ObjectProperty.PRESENT_VALUE.id(): "55.5",
+                ObjectProperty.STATUS_FLAGS.id(): [False, False, False, False]
+            })
+        finally:
+            device.stop()
+
+    def test_capability_cache_skips_rejected_rpm(self):
+        device = StandInDevice(OBJECTS, support_rpm=False)
+        device.start()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / "capability_cache.json"
+                slicer = BACnetSlicer({"native": {"local_host": "127.0.0.1"}, "capability_cache": path})
+                shared_client(slicer.config).set_device_address(600, "127.0.0.1", device.port)
+                fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id()]
+                objects = [(ObjectType.ANALOG_INPUT, 3000022, fields), (ObjectType.BINARY_OUTPUT, 5, fields)]
+                result = slicer.execute_batch("native", 600, objects, 2)
+                self.assertEqual(result[(ObjectType.BINARY_OUTPUT.code(), 5)][ObjectProperty.PRESENT_VALUE.id()],
+                                 "active")
+                # rejected RPM and RP per property
+                self.assertEqual(device.requests, 5)
+                result = slicer.execute_batch("native", 600, objects, 2)
+                self.assertEqual(len(result[(ObjectType.ANALOG_INPUT.code(), 3000022)]), 2)
+                self.assertEqual(device.requests, 9)
+
+                # learned capabilities are loaded after restart
+                capabilities = BACnetCapabilityCache(path)
+                self.assertFalse(capabilities.is_rpm_supported(600))
+                capabilities.reduce_max_apdu(600, 206)
+                capabilities.reduce_max_apdu(600, 300)
+                self.assertEqual(BACnetCapabilityCache(path).get_max_apdu(600), 206)
+                slicer.capabilities = capabilities
+                self.assertEqual(slicer.get_apdu(600), 206)
+        finally:
+            device.stop()
+
+    def test_cov_subscription_notifications(self):
+        notifications = []
+        notified = threading.Event()
+
+        def callback(object_type_code, object_id, data):
+            notifications.append((object_type_code, object_id, data))
+            notified.set()
+
+        capabilities = BACnetCapabilityCache()
+        subscriber = BACnetCOVSubscriber(self.client, {"read_timeout": 2, "cov": {"renew_margin": 0}}, capabilities)
+        subscribed = subscriber.subscribe_many(200, [(ObjectType.ANALOG_INPUT.code(), 3000022),
+                                                     (ObjectType.ANALOG_VALUE.code(), 1)], callback, 60)
+        self.assertEqual(subscribed, [True, False])
+        self.assertTrue(notified.wait(2))
+        self.assertEqual(notifications[0], (ObjectType.ANALOG_INPUT.code(), 3000022, {
+            ObjectProperty.PRESENT_VALUE.id(): "55.5",
+            ObjectProperty.STATUS_FLAGS.id(): [False, False, False, False]
+        }))
+        self.assertEqual(subscriber.renew(), [])
+        subscriber.renew_margin = 60
+        self.assertEqual(subscriber.renew([300]), [])
+        self.assertEqual(subscriber.renew(), [])
+        self.assertEqual(self.device.requests, 3)
+
+        subscriber.unsubscribe(200, ObjectType.ANALOG_INPUT.code(), 3000022)
+        self.assertFalse(subscriber.is_subscribed(200, ObjectType.ANALOG_INPUT.code(), 3000022))
+        self.assertEqual(self.device.subscriptions, {})
+
+        device = StandInDevice(OBJECTS, support_cov=False)
+        device.start()
+        try:
+            self.client.set_device_address(700, "127.0.0.1", device.port)
+            self.assertFalse(subscriber.subscribe(700, ObjectType.ANALOG_INPUT.code(), 3000022, callback))
+            self.assertFalse(subscriber.is_cov_supported(700))
+            self.assertTrue(subscriber.is_cov_supported(200))
+        finally:
+            device.stop()
+
+    def test_worker_output_same_as_bacrpm(self):
+        worker = BACnetWorker(self.client, 2)
+        fields = "out-of-service,present-value,reliability,status-flags,description"
+        commands = [{"app": "bacrpm", "args": ["200", "0", "3000022", fields]},
+                    {"app": "bacrp", "args": ["200", "0", "3000022", "85"]},
+                    {"app": "bacrp", "args": ["200", "0", "1", "85"]}]
+        stdout = io.StringIO()
+        worker.serve(io.StringIO("\n".join([json.dumps(c) for c in commands]) + "\n"), stdout)
+        outputs = stdout.getvalue().split(END_OF_OUTPUT + "\n")
+        self.assertEqual(len(outputs), 4)
+        parser = BACnetParser()
+        self.assertEqual(parser.parse_bacrpm(outputs[0]), parser.parse_bacrpm(BACRPM_OUTPUT))
+        self.assertEqual(outputs[1].strip(), "55.500000")
+        self.assertTrue(outputs[2].startswith("BACnet Error"))
+
+    def test_pool_reads_by_persistent_worker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            address_cache = Path(directory) / "address_cache"
+            BACnetWriter.write_bacwi([{"id": 200, "host": "127.0.0.1", "port": self.device.port, "apdu": 480}],
+                                     str(address_cache))
+            slicer = BACnetSlicer({"bacrpm": Path("bacrpm"), "read_timeout": 2, "address_cache": address_cache,
+                                   "pool": {"size": 1}})
+            try:
+                fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id()]
+                for i in range(3):
+                    data = slicer.execute("bacrpm", device_id=200, object_type=ObjectType.ANALOG_INPUT.code(),
+                                          object_id=3000022, fields=fields, timeout=2)
+                    # pooling fields are extracted as typed values
+                    self.assertEqual(data, {
+                        ObjectProperty.PRESENT_VALUE.id(): 55.5,
+                        ObjectProperty.STATUS_FLAGS.id(): (False, False, False, False)
+                    })
+                self.assertEqual(len(slicer.get_pool().workers), 1)
+                pid = slicer.get_pool().workers[0].process.pid
+                self.assertEqual(self.device.requests, 3)
+                self.assertEqual(slicer.get_pool().workers[0].process.pid, pid)
+            finally:
+                slicer.close()
+
+    def test_pool_restarts_hang_worker(self):
+        hang = "import sys, time\nfor line in sys.stdin:\n    time.sleep(60)\n"
+        pool = BACnetCoprocessPool({"pool": {"size": 1, "hang_margin": 0.2,
+                                             "command": [sys.executable, "-c", hang]}})
+        try:
+            pid = pool.workers[0].process.pid
+            with self.assertRaises(subprocess.TimeoutExpired):
+                pool.execute("bacrp", ["200", "0", "1", "85"], 0.3)
+            self.assertTrue(pool.workers[0].is_alive())
+            self.assertNotEqual(pool.workers[0].process.pid, pid)
+        finally:
+            pool.stop()
+
+    def test_pool_streams_batch_objects(self):
+        stream = "import sys, time\n" \
+                 "for line in sys.stdin:\n" \
+                 "    print('analog-input #1\\n{\\n    present-value: 21.500000\\n}', flush=True)\n" \
+                 "    time.sleep(0.5)\n" \
+                 "    print('analog-input #2\\n{\\n    present-value: 22.500000\\n}')\n" \
+                 "    print('" + END_OF_OUTPUT + "', flush=True)\n"
+        slicer = BACnetSlicer({"bacrpm": Path("bacrpm"),
+                               "pool": {"size": 1, "command": [sys.executable, "-c", stream]}})
+        try:
+            pid = slicer.get_pool().workers[0].process.pid
+            fields = [ObjectProperty.PRESENT_VALUE.id()]
+            objects = [(ObjectType.ANALOG_INPUT.code(), 1, fields), (ObjectType.ANALOG_INPUT.code(), 2, fields)]
+            for i in range(2):
+                handed = []
+                result = slicer.execute_bacrpm_batch(200, objects, 2, lambda key, data: handed.append(
+                    (key, data, time.time())))
+                # first object is handed on before bacrpm writes second one
+                self.assertEqual([key for key, _, _ in handed], [(0, 1), (0, 2)])
+                self.assertGreaterEqual(handed[1][2] - handed[0][2], 0.4)
+                self.assertEqual(result[(0, 2)], {ObjectProperty.PRESENT_VALUE.id(): 22.5})
+            # worker read to end of output is not restarted
+            self.assertEqual(slicer.get_pool().workers[0].process.pid, pid)
+        finally:
+            slicer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
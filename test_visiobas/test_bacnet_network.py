@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+import unittest
+from unittest import mock
+
+from bacnet.bacnet import ObjectProperty, ObjectType
+from bacnet.network import BACnetNetwork
+from visiobas.object.bacnet_object import BACnetObject, Device, NotificationClass
+
+
+def create_object(device_id: int, object_type: ObjectType, object_id: int, notification_class: int = None):
+    o = {
+        ObjectProperty.DEVICE_ID.id(): device_id,
+        ObjectProperty.OBJECT_TYPE.id(): object_type.name(),
+        ObjectProperty.OBJECT_IDENTIFIER.id(): object_id,
+        ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): "Site:{}/{}.{}".format(device_id, object_type.name(), object_id)
+    }
+    if notification_class is not None:
+        o[ObjectProperty.NOTIFICATION_CLASS.id()] = notification_class
+    return o
+
+
+class BACnetNetworkTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+
+    def test_indexes(self):
+        network = BACnetNetwork()
+        network.append(NotificationClass(create_object(1, ObjectType.NOTIFICATION_CLASS, 7)))
+        network.append(Device(create_object(100, ObjectType.DEVICE, 100)))
+        count = network.append_many([create_object(100, ObjectType.ANALOG_INPUT, i, 7) for i in range(1, 4)] +
+                                    [create_object(101, ObjectType.ANALOG_INPUT, 1)])
+        self.assertEqual(count, 4)
+
+        self.assertEqual(network.find_by_type(ObjectType.DEVICE, 100).get_id(), 100)
+        self.assertEqual(network.find_by_type(ObjectType.NOTIFICATION_CLASS, 7).get_id(), 7)
+        # the same (type, id) of several devices is found in append order
+        self.assertEqual(network.find_by_type(ObjectType.ANALOG_INPUT, 1).get_device_id(), 100)
+        self.assertIsNone(network.find_by_type(ObjectType.ANALOG_INPUT, 4))
+        self.assertEqual(sorted(o.get_id() for o in network.find_by_device(100)), [1, 2, 3])
+        self.assertEqual(len(network.find_by_notification_class(7)), 3)
+
+        # replaced object leaves no stale index entry
+        network.append(create_object(100, ObjectType.ANALOG_INPUT, 3))
+        self.assertEqual(len(network.find_by_notification_class(7)), 2)
+        self.assertEqual(len(network.find_by_device(100)), 3)
+
+        removed = network.remove(network.find_by_type(ObjectType.ANALOG_INPUT, 1))
+        self.assertEqual(removed.get_device_id(), 100)
+        self.assertEqual(network.find_by_type(ObjectType.ANALOG_INPUT, 1).get_device_id(), 101)
+        self.assertEqual(sorted(o.get_id() for o in network.find_by_device(100)), [2, 3])
+        self.assertEqual(len(network.find_by_notification_class(7)), 1)
+
+        network.remove("Site:100/device.100")
+        self.assertIsNone(network.find_by_type(ObjectType.DEVICE, 100))
+        self.assertIsNone(network.remove("Site:100/device.100"))
+        for o in network.find_by_device(100) + network.find_by_device(101):
+            network.remove(o)
+        self.assertEqual(list(network.devices), [1])
+        self.assertEqual(list(network.objects), ["Site:1/notification-class.7"])
+
+    def test_update_reindexes(self):
+        # reload moves object to notification class of server configuration
+        network = BACnetNetwork()
+        network.append_many([create_object(100, ObjectType.ANALOG_INPUT, 1, 7),
+                             create_object(101, ObjectType.ANALOG_INPUT, 1, 7)])
+        o = network.find_by_type(ObjectType.ANALOG_INPUT, 1)
+        o.set_present_value(1.5)
+
+        count = network.update_many([(o, create_object(100, ObjectType.ANALOG_INPUT, 1, 8))])
+        self.assertEqual(count, 1)
+        self.assertEqual(len(network.find_by_notification_class(7)), 1)
+        self.assertEqual(network.find_by_notification_class(8), [o])
+        self.assertEqual(network.find_by_device(100), [o])
+        # the same (type, id) of several devices is still found in append order
+        self.assertIs(network.find_by_type(ObjectType.ANALOG_INPUT, 1), o)
+        self.assertEqual(o.get_present_value(), 1.5)
+
+        network.remove(o)
+        self.assertEqual(network.find_by_notification_class(8), [])
+        self.assertEqual(len(network.find_by_notification_class(7)), 1)
+        self.assertEqual(network.find_by_device(100), [])
+
+    def test_startup_lookups(self):
+        # startup resolves notification class of each object, lookups do not scan network
+        network = BACnetNetwork()
+        network.append_many([create_object(1, ObjectType.NOTIFICATION_CLASS, i) for i in range(1, 101)])
+        objects = [BACnetObject(create_object(1000 + i // 500, ObjectType.ANALOG_VALUE, i % 500, i % 100 + 1))
+                   for i in range(50000)]
+        t0 = time.perf_counter()
+        network.append_many(objects)
+        keys = [(o.get_notification_class(), o.get_id()) for o in objects]
+        # lookup reads indexes only, properties of no object are read
+        with mock.patch.object(BACnetObject, "get", autospec=True) as get:
+            for notification_class_id, object_id in keys:
+                self.assertIsNotNone(network.find_by_type(ObjectType.NOTIFICATION_CLASS, notification_class_id))
+                self.assertIsNotNone(network.find_by_type(ObjectType.ANALOG_VALUE, object_id))
+        self.assertEqual(get.call_count, 0)
+        self.logger.info("50k objects appended and looked up: {:.3f} sec".format(time.perf_counter() - t0))
+        self.assertEqual(len(network.find_by_device(1001)), 500)
+
+    def test_concurrent_lookups(self):
+        # readers look objects up while writer replaces devices by bulk updates, every update is seen whole
+        network = BACnetNetwork()
+        network.append_many([create_object(1, ObjectType.NOTIFICATION_CLASS, i) for i in range(1, 11)])
+        device_ids = list(range(1000, 1020))
+        for device_id in device_ids:
+            network.append(Device(create_object(device_id, ObjectType.DEVICE, device_id)))
+            network.append_many([create_object(device_id, ObjectType.ANALOG_INPUT, i, i % 10 + 1)
+                                 for i in range(500)])
+        stop_event = threading.Event()
+        errors = []
+        lookups = []
+
+        def lookup(device_id: int):
+            objects = network.find_by_device(device_id)
+            if len(objects) not in (0, 500):
+                errors.append("device: {} objects: {}".format(device_id, len(objects)))
+            if network.find_by_type(ObjectType.DEVICE, device_id) is None:
+                errors.append("device: {} not found".format(device_id))
+            for o in network.find_by_notification_class(device_id % 10 + 1):
+                if o.get_notification_class() != device_id % 10 + 1:
+                    errors.append("notification class of: {}".format(o.get_object_reference()))
+            network.find_by_type(ObjectType.ANALOG_INPUT, device_id % 500)
+            network.find("Site:{}/analog-input.1".format(device_id))
+
+        def read():
+            count = 0
+            try:
+                while not stop_event.is_set():
+                    for device_id in device_ids:
+                        lookup(device_id)
+                        count += 5
+            except Exception as e:
+                errors.append(repr(e))
+            lookups.append(count)
+
+        def measure(duration: float, write: bool):
+            del lookups[:]
+            stop_event.clear()
+            readers = [threading.Thread(target=read) for _ in range(3)]
+            for reader in readers:
+                reader.start()
+            updates = 0
+            t0 = time.perf_counter()
+            while time.perf_counter() - t0 < duration:
+                if write:
+                    device_id = device_ids[updates % len(device_ids)]
+                    network.remove_many(network.find_by_device(device_id))
+                    network.append_many([create_object(device_id, ObjectType.ANALOG_INPUT, i, i % 10 + 1)
+                                         for i in range(500)])
+                    updates += 1
+                else:
+                    time.sleep(0.01)
+            stop_event.set()
+            for reader in readers:
+                reader.join()
+            return sum(lookups) / (time.perf_counter() - t0), updates
+
+        idle, _ = measure(1, False)
+        busy, updates = measure(1, True)
+        # throughput depends on host load, it is reported only
+        self.logger.info("Lookups per sec idle: {:.0f} during {} bulk updates: {:.0f}".format(idle, updates, busy))
+        self.assertEqual(errors, [])
+        self.assertGreater(updates, 0)
+        self.assertGreater(busy, 0)
+        self.assertEqual(len(network.objects), 10 + 20 + 20 * 500)
+        self.assertEqual(len(network.store), len(network.objects))
+
+        # readers do not wait for writer holding lock of network
+        with network.lock:
+            reader = threading.Thread(target=lookup, args=(device_ids[0],))
+            reader.start()
+            reader.join(10)
+            self.assertFalse(reader.is_alive())
+        self.assertEqual(errors, [])
+
+    def test_append_cost(self):
+        # append copies buckets and groups it changes, not whole indexes of network
+        network = BACnetNetwork()
+        network.append_many([create_object(1000 + i // 500, ObjectType.ANALOG_INPUT, i % 500, i % 10 + 1)
+                             for i in range(50000)])
+        before = network.index
+        network.append(create_object(1000, ObjectType.ANALOG_INPUT, 1000, 1))
+        after = network.index
+
+        def copied(old, new):
+            return sum(1 for old_bucket, new_bucket in zip(old.buckets, new.buckets) if old_bucket is not new_bucket)
+
+        for name in ["objects", "types", "devices", "notification_classes"]:
+            self.assertEqual(copied(getattr(before, name), getattr(after, name)), 1, name)
+        self.assertEqual([device_id for device_id in before.devices
+                          if after.devices[device_id] is not before.devices[device_id]], [1000])
+        self.assertEqual([notification_class_id for notification_class_id in before.notification_classes
+                          if after.notification_classes[notification_class_id] is not
+                          before.notification_classes[notification_class_id]], [1])
+        self.assertEqual(copied(before.notification_classes[1], after.notification_classes[1]), 1)
+        self.assertEqual(len(after.notification_classes[1]), len(before.notification_classes[1]) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,21 @@
 import logging
 import os
+import stat
+import sys
+import tempfile
+import time
 import unittest
+from pathlib import Path
+from subprocess import TimeoutExpired
+from unittest import mock
 
 import config.logging
 
 import config.visiobas
-from bacnet.bacnet import ObjectProperty
+from bacnet.bacnet import ObjectProperty, BinaryPV, Reliability
 from bacnet.bacnet import ObjectType
-from bacnet.parser import BACnetParser
+from bacnet.parser import BACnetParser, BACnetFieldsExtractor, BACnetTypedValues, CharReader, FastTokensExtractor, \
+    TokensExtractor
 from bacnet.slicer import BACnetSlicer
 from bacnet.writer import BACnetWriter
 
@@ -39,6 +47,43 @@ class BACnetParserTest(unittest.TestCase):
         self.assertIn(ObjectProperty.STATUS_FLAGS.id(), data)
         self.assertEqual(data[ObjectProperty.OBJECT_IDENTIFIER.id()], 23003)
 
+    @staticmethod
+    def create_fake_bacrp(directory: str, delay: float):
+        """
+        Fake bacrp writes start and end time of its run into file "run.<field>" next to it
+        """
+        path = Path(directory) / "bacrp"
+        path.write_text("#!{}\nimport sys, time\nstart = time.time()\ntime.sleep({})\n"
+                        "open('{}/run.' + sys.argv[4], 'w').write('{{}} {{}}'.format(start, time.time()))\n"
+                        "print('55.500000')\n".format(sys.executable, delay, directory))
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        return path
+
+    def test_bacrp_fields_read_concurrently(self):
+        with tempfile.TemporaryDirectory() as directory:
+            slicer = BACnetSlicer({"bacrp": self.create_fake_bacrp(directory, 1), "bacrp_concurrency": 5})
+            fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.HIGH_LIMIT.id(),
+                      ObjectProperty.LOW_LIMIT.id(), ObjectProperty.DEADBAND.id(), ObjectProperty.COV_INCREMENT.id()]
+            data = slicer.execute_barp(200, ObjectType.ANALOG_INPUT, 1, fields, 5)
+            self.assertEqual(len(data), 5)
+            self.assertEqual(data[ObjectProperty.PRESENT_VALUE.id()], 55.5)
+            slicer.close()
+            # every field is read while all other fields are read
+            runs = [[float(x) for x in path.read_text().split()] for path in Path(directory).glob("run.*")]
+            self.assertEqual(len(runs), 5)
+            self.assertLess(max(start for start, _ in runs), min(end for _, end in runs))
+
+    def test_bacrp_fields_overall_deadline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            slicer = BACnetSlicer({"bacrp": self.create_fake_bacrp(directory, 10), "bacrp_concurrency": 2})
+            fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id(),
+                      ObjectProperty.OUT_OF_SERVICE.id(), ObjectProperty.RELIABILITY.id()]
+            t = time.time()
+            with self.assertRaises(TimeoutExpired):
+                slicer.execute_barp(200, ObjectType.ANALOG_INPUT, 1, fields, 1)
+            self.logger.info("4 fields of 2 concurrent reads timed out in: {:.2f} sec".format(time.time() - t))
+            slicer.close()
+
     def test_bacrp_parser(self):
         parser = BACnetParser()
         object = {}
@@ -105,6 +150,145 @@ class BACnetParserTest(unittest.TestCase):
             self.assertTrue(object[ObjectProperty.OBJECT_TYPE.id()], "analog-input")
             self.assertTrue(object[ObjectProperty.RELIABILITY.id()], "no-fault-detected")
 
+    def test_bacrpm_multiple_objects_parser(self):
+        path = "{}/resource/bacrpm-multiple-objects.txt".format(os.path.dirname(os.path.abspath(__file__)))
+        with open(path, "r") as file:
+            objects = BACnetParser().parse_bacrpm_objects(file.read())
+        self.assertEqual(len(objects), 3)
+        self.assertEqual(objects[(ObjectType.ANALOG_INPUT.code(), 1)][ObjectProperty.PRESENT_VALUE.id()], "21.5")
+        self.assertEqual(objects[(ObjectType.BINARY_VALUE.code(), 2)][ObjectProperty.STATUS_FLAGS.id()],
+                         [False, True, False, False])
+        self.assertEqual(len(objects[(ObjectType.BINARY_VALUE.code(), 2)][ObjectProperty.PRIORITY_ARRAY.id()]), 16)
+        self.assertEqual(objects[(ObjectType.ANALOG_VALUE.code(), 3)], {})
+
+    @staticmethod
+    def read_resources():
+        directory = Path(os.path.dirname(os.path.abspath(__file__))) / "resource"
+        return [path.read_bytes() for path in sorted(directory.glob("bacrp*.txt"))]
+
+    def test_fast_tokenizer(self):
+        parser = BACnetParser()
+        for output in self.read_resources():
+            text = output.decode('ascii')
+            expected = [(t.type, t.value) for t in TokensExtractor(CharReader(text)).extract_tokens()]
+            self.assertEqual([(t.type, t.value) for t in FastTokensExtractor(output).extract_tokens()], expected)
+            self.assertEqual([(t.type, t.value) for t in FastTokensExtractor(text).extract_tokens()], expected)
+
+            fast = (parser.parse_bacrpm(output), parser.parse_bacrp(output, ObjectProperty.PRESENT_VALUE))
+            with mock.patch("bacnet.parser.FastTokensExtractor", lambda t: TokensExtractor(CharReader(t))):
+                reference = (parser.parse_bacrpm(text), parser.parse_bacrp(text, ObjectProperty.PRESENT_VALUE))
+            self.assertEqual(fast, reference)
+
+        # non ASCII text, trailing hash and not printable characters
+        for text in ["name: \"\u0432\u0445\u043e\u0434 1\"\n", "a #", "#12 {x}\n", "\x00 {"]:
+            self.assertEqual([(t.type, t.value) for t in FastTokensExtractor(text).extract_tokens()],
+                             [(t.type, t.value) for t in TokensExtractor(CharReader(text)).extract_tokens()])
+
+    def test_bacrpm_objects_streaming(self):
+        path = "{}/resource/bacrpm-multiple-objects.txt".format(os.path.dirname(os.path.abspath(__file__)))
+        with open(path, "rb") as file:
+            lines = file.read().splitlines(True)
+        consumed = []
+
+        def read_lines():
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+        objects = BACnetParser().iter_bacrpm_objects(read_lines())
+        object_type, object_id, data = next(objects)
+        # first object is parsed once its block is read
+        self.assertEqual((object_type, object_id), (ObjectType.ANALOG_INPUT.code(), 1))
+        self.assertEqual(len(consumed), 7)
+        self.assertEqual(data[ObjectProperty.PRESENT_VALUE.id()], "21.5")
+        rest = list(objects)
+        self.assertEqual([(t, i) for t, i, _ in rest],
+                         [(ObjectType.BINARY_VALUE.code(), 2), (ObjectType.ANALOG_VALUE.code(), 3)])
+        self.assertEqual(rest[1][2], {})
+        with open(path, "r") as file:
+            self.assertEqual(BACnetParser().parse_bacrpm_objects(file.read()),
+                             {(t, i): d for t, i, d in [(object_type, object_id, data)] + rest})
+
+    def test_fields_extractor(self):
+        fields = [ObjectProperty.OUT_OF_SERVICE.id(), ObjectProperty.PRESENT_VALUE.id(),
+                  ObjectProperty.RELIABILITY.id(), ObjectProperty.STATUS_FLAGS.id(),
+                  ObjectProperty.PRIORITY_ARRAY.id()]
+        text = "binary-output #4\r\n{\r\n    out-of-service: FALSE\r\n    present-value: active\r\n" \
+               "    reliability: no-fault-detected\r\n    status-flags: {false,true,false,false}\r\n" \
+               "    priority-array: {Null,Null,Null,Null,Null,Null,Null,active,\r\n" \
+               "        Null,Null,Null,Null,Null,Null,Null,inactive}\r\n}\r\n"
+        data = BACnetFieldsExtractor.compile(fields).extract(text.encode('ascii'))
+        self.assertEqual(data, {
+            ObjectProperty.OUT_OF_SERVICE.id(): False,
+            ObjectProperty.PRESENT_VALUE.id(): "active",
+            ObjectProperty.RELIABILITY.id(): "no-fault-detected",
+            ObjectProperty.STATUS_FLAGS.id(): (False, True, False, False),
+            ObjectProperty.PRIORITY_ARRAY.id(): [None] * 7 + ["active"] + [None] * 7 + ["inactive"]
+        })
+        generic = BACnetParser().parse_bacrpm(text)
+        self.assertEqual(generic[ObjectProperty.PRIORITY_ARRAY.id()], data[ObjectProperty.PRIORITY_ARRAY.id()])
+        self.assertEqual(generic[ObjectProperty.STATUS_FLAGS.id()], list(data[ObjectProperty.STATUS_FLAGS.id()]))
+
+        path = "{}/resource/bacrpm-multiple-objects.txt".format(os.path.dirname(os.path.abspath(__file__)))
+        with open(path, "r") as file:
+            objects = BACnetParser().parse_bacrpm_objects(file.read(), fields)
+        self.assertEqual(objects[(ObjectType.ANALOG_INPUT.code(), 1)][ObjectProperty.PRESENT_VALUE.id()], 21.5)
+        self.assertEqual(objects[(ObjectType.BINARY_VALUE.code(), 2)][ObjectProperty.STATUS_FLAGS.id()],
+                         (False, True, False, False))
+        self.assertEqual(objects[(ObjectType.ANALOG_VALUE.code(), 3)], {})
+
+        # output with lines extractor does not know is parsed by generic parser
+        path = "{}/resource/bacrpm.txt".format(os.path.dirname(os.path.abspath(__file__)))
+        with open(path, "r") as file:
+            text = file.read()
+        self.assertIsNone(BACnetFieldsExtractor.compile(fields).extract(text))
+        self.assertEqual(BACnetParser().parse_bacrpm_fields(text, fields), BACnetParser().parse_bacrpm(text))
+        self.assertIsNone(BACnetFieldsExtractor.compile([ObjectProperty.DESCRIPTION.id()]))
+
+    def test_typed_values(self):
+        fields = [ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.RELIABILITY.id(),
+                  ObjectProperty.STATUS_FLAGS.id(), ObjectProperty.PRIORITY_ARRAY.id()]
+        path = "{}/resource/bacrpm-multiple-objects.txt".format(os.path.dirname(os.path.abspath(__file__)))
+        with open(path, "r") as file:
+            text = file.read()
+        typed = BACnetParser().parse_bacrpm_objects(text, fields)
+        analog = typed[(ObjectType.ANALOG_INPUT.code(), 1)]
+        self.assertEqual(analog[ObjectProperty.PRESENT_VALUE.id()], 21.5)
+        self.assertIs(analog[ObjectProperty.RELIABILITY.id()], Reliability.NO_FAULT_DETECTED)
+        binary = typed[(ObjectType.BINARY_VALUE.code(), 2)]
+        self.assertIs(binary[ObjectProperty.PRESENT_VALUE.id()], BinaryPV.ACTIVE)
+        self.assertEqual(binary[ObjectProperty.PRESENT_VALUE.id()], "active")
+        self.assertEqual(binary[ObjectProperty.PRIORITY_ARRAY.id()][7], BinaryPV.ACTIVE)
+
+        # generic parser output typed by model is the same as extracted typed values
+        for key, data in BACnetParser().parse_bacrpm_objects(text).items():
+            self.assertEqual(BACnetTypedValues.typed(key[0], data), typed[key])
+
+        multistate = BACnetTypedValues.typed(ObjectType.MULTI_STATE_VALUE.code(), {
+            ObjectProperty.PRESENT_VALUE.id(): "3.0",
+            ObjectProperty.RELIABILITY.id(): "multi-state-fault",
+            ObjectProperty.OUT_OF_SERVICE.id(): "False"
+        })
+        self.assertEqual(multistate, {
+            ObjectProperty.PRESENT_VALUE.id(): 3,
+            ObjectProperty.RELIABILITY.id(): Reliability.MULTI_STATE_FAULT,
+            ObjectProperty.OUT_OF_SERVICE.id(): False
+        })
+        # value which does not fit object type is dropped
+        self.assertEqual(BACnetTypedValues.typed(ObjectType.ANALOG_VALUE.code(), {
+            ObjectProperty.PRESENT_VALUE.id(): "BACnetError:object:unknown-object"}), {})
+
+    def test_split_batch(self):
+        fields = [ObjectProperty.OUT_OF_SERVICE.id(), ObjectProperty.PRESENT_VALUE.id(),
+                  ObjectProperty.RELIABILITY.id(), ObjectProperty.STATUS_FLAGS.id()]
+        objects = [(ObjectType.ANALOG_INPUT.code(), i, fields) for i in range(100)]
+        batches = BACnetSlicer.split_batch(objects, 480)
+        self.assertTrue(len(batches) > 1)
+        self.assertEqual(sum([len(batch) for batch in batches]), 100)
+        self.assertEqual(len(BACnetSlicer.split_batch(objects, 1476)), (len(batches) + 2) // 3)
+        # object always goes into batch even if it does not fit device APDU
+        self.assertEqual(len(BACnetSlicer.split_batch(objects[:2], 10)), 2)
+
     def test_bacwi_mria_parser(self):
         path = "{}/resource/address_cache_mria".format(os.path.dirname(os.path.abspath(__file__)))
         self.logger.debug("reading test file: {}".format(path))
@@ -0,0 +1,177 @@
+import json
+import logging
+import os
+import random
+import time
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from bacnet.bacnet import ObjectProperty, ObjectType
+from bacnet.parser import BACnetParser, BACnetTypedValues, CharReader, FastTokensExtractor, TokensExtractor
+
+CORPUS = Path(os.path.dirname(os.path.abspath(__file__))) / "resource" / "corpus"
+
+POOLING_FIELDS = [ObjectProperty.OUT_OF_SERVICE.id(), ObjectProperty.PRESENT_VALUE.id(),
+                  ObjectProperty.RELIABILITY.id(), ObjectProperty.STATUS_FLAGS.id(),
+                  ObjectProperty.PRIORITY_ARRAY.id()]
+
+# characters and fragments mutations insert into recorded outputs
+FRAGMENTS = list(' \t\r\n{}[](),:#"\\-.0123456789aeflnrstuNT*_/') + \
+            ["Null", "TRUE", "false", "inf", "-inf", "#12", "1e5", "BACnet Error:", "present-value: ",
+             "priority-array: {", "proprietary 900: ", "analog-input #1\n{\n", "\n}\n"]
+
+
+class ReferenceParser(BACnetParser):
+    """
+    Parser tokenizing output by chain of char by char token parsers, reference of differential fuzzing
+    """
+
+    def tokenize(self, text):
+        if type(text) != str:
+            text = bytes(text).decode('ascii')
+        return TokensExtractor(CharReader(text)).extract_tokens()
+
+
+def read_corpus(prefix: str):
+    return [(path.name, path.read_text()) for path in sorted(CORPUS.glob(prefix + "*.txt"))]
+
+
+def mutate(rnd: random.Random, text: str):
+    """
+    :return: text changed by 1..4 random edits (insert, delete, replace, duplicate or drop line, truncate)
+    """
+    for i in range(rnd.randint(1, 4)):
+        pos = rnd.randint(0, len(text))
+        operation = rnd.randrange(6)
+        if operation == 0:
+            text = text[:pos] + rnd.choice(FRAGMENTS) + text[pos:]
+        elif operation == 1:
+            text = text[:pos] + text[pos + rnd.randint(1, 8):]
+        elif operation == 2:
+            text = text[:pos] + rnd.choice(FRAGMENTS) + text[pos + 1:]
+        elif operation == 3 or operation == 4:
+            lines = text.splitlines(True)
+            if len(lines) > 0:
+                idx = rnd.randrange(len(lines))
+                lines[idx:idx + 1] = [lines[idx]] * 2 if operation == 3 else []
+                text = "".join(lines)
+        else:
+            text = text[:pos]
+    return text
+
+
+def outcome(parse, text):
+    try:
+        return parse(text)
+    except Exception as e:
+        return type(e).__name__
+
+
+def differential_fuzz(reference, candidate, corpus: list, iterations: int, seed: int = 0):
+    """
+    Compare candidate parse function with reference one on mutated outputs of corpus
+    :return: list of (input, reference outcome, candidate outcome) which differ
+    """
+    rnd = random.Random(seed)
+    mismatches = []
+    for i in range(iterations):
+        _, text = corpus[i % len(corpus)]
+        text = mutate(rnd, text)
+        expected = outcome(reference, text)
+        actual = outcome(candidate, text)
+        if expected != actual:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+
+def benchmark(parse, texts: list, duration: float = 0.2):
+    """
+    :return: parses per second and max peak of bytes allocated by one parse
+    """
+    count = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < duration:
+        for text in texts:
+            parse(text)
+        count += len(texts)
+    rate = count / (time.perf_counter() - t0)
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for text in texts:
+            # clearing traces resets peak of traced memory
+            tracemalloc.clear_traces()
+            parse(text)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return rate, peak
+
+
+class BACnetParserCorpusTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+
+    def parse_corpus(self, parser: BACnetParser):
+        result = {}
+        for name, text in read_corpus("bacrp_"):
+            result[name] = outcome(lambda t: parser.parse_bacrp(t, ObjectProperty.PRESENT_VALUE), text)
+        for name, text in read_corpus("bacrpm_"):
+            objects = outcome(parser.parse_bacrpm_objects, text)
+            result[name] = {
+                "bacrpm": outcome(parser.parse_bacrpm, text),
+                "objects": {"{} {}".format(*k): v for k, v in objects.items()} if type(objects) == dict else objects
+            }
+        for name, text in read_corpus("bacwi_"):
+            result[name] = outcome(parser.parse_bacwi, text)
+        return json.loads(json.dumps(result))
+
+    def test_recorded_outputs(self):
+        expected = json.loads((CORPUS / "expected.json").read_text())
+        self.assertEqual(self.parse_corpus(BACnetParser()), expected)
+        self.assertEqual(self.parse_corpus(ReferenceParser()), expected)
+
+    def test_differential_fuzz(self):
+        parser = BACnetParser()
+        reference = ReferenceParser()
+        bacrp = read_corpus("bacrp")
+        mismatches = differential_fuzz(lambda t: reference.parse_bacrp(t, ObjectProperty.PRESENT_VALUE),
+                                       lambda t: parser.parse_bacrp(t, ObjectProperty.PRESENT_VALUE),
+                                       bacrp, 2000)
+        self.assertEqual(mismatches, [])
+        bacrpm = read_corpus("bacrpm_")
+        self.assertEqual(differential_fuzz(reference.parse_bacrpm, parser.parse_bacrpm, bacrpm, 2000, 1), [])
+        self.assertEqual(differential_fuzz(reference.parse_bacrpm_objects, parser.parse_bacrpm_objects,
+                                           bacrpm, 1000, 2), [])
+
+        # compiled fields extractor against generic parser output typed by model
+        object_type = ObjectType.ANALOG_OUTPUT.code()
+        self.assertEqual(differential_fuzz(
+            lambda t: BACnetTypedValues.typed(object_type, reference.parse_bacrpm(t)),
+            lambda t: parser.parse_bacrpm_fields(t, POOLING_FIELDS, object_type),
+            read_corpus("bacrpm_priority_array") + read_corpus("bacrpm_errors"), 2000, 3), [])
+
+    def test_benchmark(self):
+        parser = BACnetParser()
+        reference = ReferenceParser()
+        bacrp = [text for _, text in read_corpus("bacrp_")]
+        bacrpm = [text for _, text in read_corpus("bacrpm_")]
+        bacwi = [text for _, text in read_corpus("bacwi_")]
+        for name, parse, texts in [
+            ("parse_bacrp", lambda t: parser.parse_bacrp(t, ObjectProperty.PRESENT_VALUE), bacrp),
+            ("parse_bacrp (reference)", lambda t: reference.parse_bacrp(t, ObjectProperty.PRESENT_VALUE), bacrp),
+            ("parse_bacrpm", parser.parse_bacrpm, bacrpm),
+            ("parse_bacrpm (reference)", reference.parse_bacrpm, bacrpm),
+            ("parse_bacwi", parser.parse_bacwi, bacwi),
+            ("tokens", lambda t: FastTokensExtractor(t).extract_tokens(), bacrp + bacrpm),
+            ("tokens (reference)", lambda t: TokensExtractor(CharReader(t)).extract_tokens(), bacrp + bacrpm)
+        ]:
+            rate, peak = benchmark(parse, texts)
+            self.logger.info("{:<26} {:>10.0f} parses/sec {:>8} peak bytes per parse".format(name, rate, peak))
+            self.assertGreater(rate, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
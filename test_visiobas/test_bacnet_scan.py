@@ -0,0 +1,100 @@
+import json
+import time
+import unittest
+
+from bacnet.bacnet import ObjectProperty
+from bacnet.native import BACnetNativeClient
+from bacnet.scan import BACnetScanner, shared_scanner, DONE, CANCELLED
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer
+
+SPEC = {
+    "devices": 20,
+    "first_device_id": 3000,
+    "base_port": 48800,
+    "who_is_port": 48799,
+    "max_apdu": 128,
+    "objects": {"analog-input": 30, "binary-value": 10}
+}
+
+
+class BACnetScanTest(unittest.TestCase):
+    def setUp(self):
+        self.farm = BACnetDeviceFarm(SPEC)
+        self.server = BACnetFarmServer(self.farm).start()
+        self.client = BACnetNativeClient(local_host="127.0.0.1").start()
+        self.config = {"discovery": {"host": "127.0.0.1", "port": self.farm.who_is_port, "quiet": 0.3},
+                       "scan": {"concurrency": 4, "timeout": 2}}
+
+    def tearDown(self):
+        self.client.stop()
+        self.server.stop()
+
+    def wait(self, job, timeout=20):
+        start = time.time()
+        while job.finished is None and time.time() - start < timeout:
+            time.sleep(0.05)
+
+    def test_scan_object_list_by_index(self):
+        scanner = BACnetScanner(self.client, self.config)
+        job = scanner.start()
+        self.wait(job)
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.devices_total, 20)
+        # device object and 40 objects of each device
+        self.assertEqual(len(job.data), 20 * 41)
+
+        pages = []
+        offset = 0
+        while True:
+            page = job.page(offset, 100)
+            if len(page["data"]) == 0:
+                break
+            pages += page["data"]
+            offset = page["next_offset"]
+        self.assertEqual(pages, job.data)
+
+        found = next(d for d in job.data if d[ObjectProperty.DEVICE_ID.id()] == 3005 and
+                     d[ObjectProperty.OBJECT_TYPE.id()] == "binary-value" and
+                     d[ObjectProperty.OBJECT_IDENTIFIER.id()] == 10)
+        self.assertEqual(found[ObjectProperty.OBJECT_PROPERTY_REFERENCE.id()], self.farm.reference(3005, 5, 10))
+        self.assertEqual(found[ObjectProperty.DESCRIPTION.id()], "binary-value 10 of device 3005")
+
+    def test_cancel(self):
+        self.server.stop()
+        self.farm = BACnetDeviceFarm(dict(SPEC, latency=0.1))
+        self.server = BACnetFarmServer(self.farm).start()
+        scanner = BACnetScanner(self.client, dict(self.config, scan={"concurrency": 1, "timeout": 2}))
+        job = scanner.start(device_ids=[3001, 3002, 3003, 3004])
+        while job.devices_scanned == 0 and job.finished is None:
+            time.sleep(0.05)
+        scanner.cancel(job.job_id)
+        self.wait(job)
+        self.assertEqual(job.status, CANCELLED)
+        self.assertLess(job.devices_scanned, 4)
+
+    def test_json_rpc(self):
+        from jsonrpc import JSONRPCResponseManager, dispatcher
+        import visiobas.gateway_server
+
+        shared_scanner(self.client, self.config)
+
+        def call(method, params):
+            request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+            return json.loads(JSONRPCResponseManager.handle(request, dispatcher).json)
+
+        job_id = call("scan_bacnet_network", {"device_id": 3007})["result"]["result"]["job_id"]
+        start = time.time()
+        while time.time() - start < 20:
+            result = call("scan_bacnet_network_progress", {"job_id": job_id, "limit": 10})["result"]["result"]
+            if not result["status"] == "running":
+                break
+            time.sleep(0.05)
+        self.assertEqual(result["status"], DONE)
+        self.assertEqual(result["objects_found"], 41)
+        self.assertEqual(len(result["data"]), 10)
+        self.assertEqual(result["next_offset"], 10)
+        self.assertIn("error", call("scan_bacnet_network_progress", {"job_id": "unknown"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import time
+import unittest
+
+from bacnet.scheduler import BACnetReadScheduler
+
+
+class BACnetReadSchedulerTest(unittest.TestCase):
+    def test_pop_due(self):
+        scheduler = BACnetReadScheduler()
+        points = [{"id": i} for i in range(6)]
+        for i, pooling in enumerate(points):
+            scheduler.schedule(100 + i % 2, pooling, 10 - i)
+        due_points = scheduler.pop_due(8)
+        # data points due before now grouped by device in order of due time
+        self.assertEqual({device_id: [p["id"] for p in data_points] for device_id, data_points in due_points.items()},
+                         {100: [4], 101: [5, 3]})
+        self.assertEqual(scheduler.next_due(), 8)
+        self.assertEqual(scheduler.pop_due(8), {})
+        # taken data point is not scheduled until it is scheduled again
+        self.assertIsNone(points[5]["due"])
+        scheduler.schedule(101, points[5], 9)
+        self.assertEqual(sorted(p["id"] for p in scheduler.pop_due(100)[101]), [1, 5])
+
+    def test_reschedule_and_remove(self):
+        scheduler = BACnetReadScheduler()
+        moved = {"id": 1}
+        removed = {"id": 2}
+        scheduler.schedule(100, moved, 1)
+        scheduler.schedule(100, removed, 2)
+        scheduler.schedule(100, moved, 5)
+        scheduler.remove(removed)
+        self.assertEqual(scheduler.next_due(), 5)
+        self.assertEqual(scheduler.pop_due(3), {})
+        # removed data point read by collector is not scheduled again
+        scheduler.schedule(100, removed, 0)
+        self.assertEqual(scheduler.pop_due(10), {100: [moved]})
+        self.assertIsNone(scheduler.next_due())
+        self.assertEqual(len(scheduler), 0)
+
+    def test_wait(self):
+        scheduler = BACnetReadScheduler()
+        scheduler.schedule(100, {"id": 1}, time.time() + 60)
+        timer = threading.Timer(0.1, lambda: scheduler.schedule(100, {"id": 2}, 0))
+        timer.start()
+        t0 = time.time()
+        # earlier data point wakes collector up
+        scheduler.wait(t0, 0.01, 5)
+        self.assertLess(time.time() - t0, 2)
+        self.assertEqual([p["id"] for p in scheduler.pop_due(time.time())[100]], [2])
+        t0 = time.time()
+        scheduler.wait(t0, 0.01, 0.2)
+        self.assertGreaterEqual(time.time() - t0, 0.15)
+        timer.join()
+
+    def test_scale(self):
+        # 30k data points of 300 devices read every 1..60 sec, cost of pass is cost of due data points
+        scheduler = BACnetReadScheduler()
+        points = [{"interval": i % 60 + 1} for i in range(30000)]
+        for i, pooling in enumerate(points):
+            scheduler.schedule(i % 300, pooling, pooling["interval"] * i / 30000)
+        reads = 0
+        t0 = time.perf_counter()
+        for second in range(1, 121):
+            for device_id, data_points in scheduler.pop_due(second).items():
+                for pooling in data_points:
+                    scheduler.schedule(device_id, pooling, second + pooling["interval"])
+                reads += len(data_points)
+        duration = time.perf_counter() - t0
+        self.assertGreater(reads, 30000 * 2)
+        self.assertLess(duration / reads, 0.0001)
+        self.assertEqual(len(scheduler), 30000)
+
+        # nothing due costs nothing
+        t0 = time.perf_counter()
+        for _ in range(10000):
+            scheduler.pop_due(120)
+        self.assertLess(time.perf_counter() - t0, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
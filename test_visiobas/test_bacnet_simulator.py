@@ -0,0 +1,116 @@
+import json
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+
+from bacnet.apdu import BACnetError, PduType, ABORT_SEGMENTATION_NOT_SUPPORTED, REJECT_UNRECOGNIZED_SERVICE
+from bacnet.bacnet import ObjectProperty, ObjectType
+from bacnet.native import BACnetNativeClient, BACnetValueFormatter
+from bacnet.parser import BACnetParser
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer, BACnetFarmGateClient, install
+from bacnet.slicer import BACnetSlicer
+from visiobas.object.bacnet_object import Device
+
+SPEC = {
+    "seed": 7,
+    "devices": 3,
+    "first_device_id": 1000,
+    "base_port": 47950,
+    "objects": {"analog-input": 5, "binary-output": 2},
+    "waveform": "constant",
+    "fault_ratio": 0.5
+}
+
+PV = int(ObjectProperty.PRESENT_VALUE.id())
+SF = int(ObjectProperty.STATUS_FLAGS.id())
+
+
+class BACnetSimulatorTest(unittest.TestCase):
+    def test_values_deterministic(self):
+        farm = BACnetDeviceFarm(SPEC)
+        other = BACnetDeviceFarm(SPEC)
+        for device_id in farm.device_ids():
+            for object_type, object_id in farm.objects(device_id):
+                self.assertEqual(farm.value(device_id, object_type, object_id, PV, 100),
+                                 other.value(device_id, object_type, object_id, PV, 100))
+        sine = BACnetDeviceFarm(dict(SPEC, waveform="sine", period=60))
+        values = {sine.value(1000, 0, 1, PV, t) for t in range(0, 60, 5)}
+        self.assertGreater(len(values), 1)
+        self.assertTrue(all(0 <= v <= 100 for v in values))
+        self.assertIsInstance(farm.value(1000, 0, 6, PV), BACnetError)
+
+    def test_udp_endpoints(self):
+        farm = BACnetDeviceFarm(dict(SPEC, rpm_ratio=0.5))
+        server = BACnetFarmServer(farm).start()
+        client = BACnetNativeClient(local_host="127.0.0.1", retries=1).start()
+        try:
+            for device in farm.devices():
+                client.set_device_address(device["id"], device["host"], device["port"])
+            for device_id in farm.device_ids():
+                objects = [(0, i, [PV, SF]) for i in range(1, 6)]
+                if farm.supports_rpm(device_id):
+                    results = client.read_property_multiple(device_id, objects, 2)
+                    self.assertEqual(len(results), 5)
+                    data = BACnetValueFormatter.format(0, results[2][1])
+                    self.assertAlmostEqual(float(data[ObjectProperty.PRESENT_VALUE.id()]),
+                                           farm.value(device_id, 0, 3, PV), places=4)
+                    self.assertEqual(data[ObjectProperty.STATUS_FLAGS.id()][1], farm.is_fault(device_id, 0, 3))
+                else:
+                    with self.assertRaises(BACnetError) as context:
+                        client.read_property_multiple(device_id, objects, 2)
+                    self.assertEqual(context.exception.reason, REJECT_UNRECOGNIZED_SERVICE)
+                self.assertEqual(client.read_property(device_id, ObjectType.BINARY_OUTPUT.code(), 2, PV, 2),
+                                 farm.value(device_id, ObjectType.BINARY_OUTPUT.code(), 2, PV))
+
+            small = BACnetDeviceFarm(dict(SPEC, base_port=47960, max_apdu=50))
+            small_server = BACnetFarmServer(small).start()
+            try:
+                client.set_device_address(1000, "127.0.0.1", 47960)
+                with self.assertRaises(BACnetError) as context:
+                    client.read_property_multiple(1000, [(0, i, [PV, SF]) for i in range(1, 6)], 2)
+                self.assertEqual(context.exception.pdu_type, PduType.ABORT)
+                self.assertEqual(context.exception.reason, ABORT_SEGMENTATION_NOT_SUPPORTED)
+            finally:
+                small_server.stop()
+        finally:
+            client.stop()
+            server.stop()
+
+    def test_fake_bacrpm_executables(self):
+        with tempfile.TemporaryDirectory() as directory:
+            farm_path = Path(directory) / "farm.json"
+            farm_path.write_text(json.dumps(SPEC))
+            install(farm_path, Path(directory))
+            farm = BACnetDeviceFarm(SPEC)
+
+            output = subprocess.check_output([str(Path(directory) / "bacrpm"), "1001", "0", "4",
+                                              "present-value,status-flags"]).decode()
+            data = BACnetParser().parse_bacrpm(output)
+            self.assertEqual(float(data[ObjectProperty.PRESENT_VALUE.id()]), farm.value(1001, 0, 4, PV))
+
+            slicer = BACnetSlicer({"bacrp": Path(directory) / "bacrp", "bacrpm": Path(directory) / "bacrpm",
+                                   "address_cache": Path(directory) / "address_cache", "read_timeout": 5})
+            data = slicer.execute("bacrp", device_id=1002, object_type=0, object_id=1,
+                                  fields=[ObjectProperty.PRESENT_VALUE.id()], timeout=5)
+            self.assertEqual(float(data[ObjectProperty.PRESENT_VALUE.id()]), farm.value(1002, 0, 1, PV))
+            self.assertEqual([d["id"] for d in
+                              BACnetParser.parse_bacwi((Path(directory) / "address_cache").read_text())],
+                             farm.device_ids())
+            slicer.close()
+
+    def test_gate_client(self):
+        farm = BACnetDeviceFarm(SPEC)
+        client = BACnetFarmGateClient(farm, "bacrpm")
+        devices = [Device(o) for o in client.rq_devices()]
+        self.assertEqual([d.get_id() for d in devices], farm.device_ids())
+        self.assertEqual(devices[1].get_port(), 47951)
+        self.assertEqual(devices[1].get_read_app(), "bacrpm")
+        self.assertEqual(len(client.rq_device_object(1000, ObjectType.ANALOG_INPUT)), 5)
+        self.assertEqual(client.rq_device_object(1, ObjectType.NOTIFICATION_CLASS), [])
+        self.assertEqual(client.rq_put(1000, [{}, {}]), [])
+        self.assertEqual(client.put_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import logging
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from bacnet.bacnet import BinaryPV, ObjectProperty, ObjectType
+from bacnet.network import BACnetNetwork
+from bacnet.snapshot import BACnetSnapshot, HEADER
+from visiobas.object.bacnet_object import BACnetObject, Device, NotificationClass
+
+PRESENT_VALUE = ObjectProperty.PRESENT_VALUE.id()
+
+
+def create_object(device_id: int, object_type: ObjectType, object_id: int):
+    return {
+        ObjectProperty.DEVICE_ID.id(): device_id,
+        ObjectProperty.OBJECT_TYPE.id(): object_type.name(),
+        ObjectProperty.OBJECT_IDENTIFIER.id(): object_id,
+        ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): "Site:{}/{}.{}".format(device_id, object_type.name(), object_id)
+    }
+
+
+class BACnetSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name) / "network_snapshot.bin"
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_network(self):
+        network = BACnetNetwork()
+        network.append(NotificationClass(create_object(1, ObjectType.NOTIFICATION_CLASS, 7)))
+        network.append(Device(create_object(100, ObjectType.DEVICE, 100)))
+        network.append_many([BACnetObject(create_object(100, ObjectType.ANALOG_OUTPUT, i)) for i in range(1, 5)])
+        for i, o in enumerate(network.find_by_device(100)):
+            o.set_present_value(i + 0.5)
+            o.set(ObjectProperty.STATUS_FLAGS, [False, i % 2 == 0, False, False])
+        network.find_by_type(ObjectType.ANALOG_OUTPUT, 2).set(ObjectProperty.PRIORITY_ARRAY,
+                                                              [None] * 15 + [BinaryPV.ACTIVE])
+        network.find_by_type(ObjectType.ANALOG_OUTPUT, 3).set(ObjectProperty.STATUS_FLAGS, "BACnetError")
+        # released slot is a hole of snapshot
+        network.remove(network.find_by_type(ObjectType.ANALOG_OUTPUT, 4))
+        network.find_by_type(ObjectType.DEVICE, 100).configuration_files = {"bacrpm_template": "template"}
+        return network
+
+    def test_round_trip(self):
+        network = self.create_network()
+        self.assertEqual(BACnetSnapshot(self.path).save(network), 5)
+        self.assertFalse(self.path.with_name(self.path.name + ".tmp").exists())
+
+        loaded = BACnetNetwork()
+        objects = BACnetSnapshot(self.path).load(loaded)
+        self.assertEqual(len(objects), 5)
+        self.assertEqual(sorted(loaded.objects), sorted(network.objects))
+        for reference, o in network.objects.items():
+            loaded_object = loaded.find(reference)
+            self.assertIs(type(loaded_object), type(o))
+            self.assertEqual(loaded_object.get_data(), o.get_data())
+            self.assertEqual(loaded_object.get_timestamp(), o.get_timestamp())
+        self.assertEqual(loaded.find_by_type(ObjectType.DEVICE, 100).configuration_files,
+                         {"bacrpm_template": "template"})
+        self.assertEqual(loaded.find_by_type(ObjectType.ANALOG_OUTPUT, 3).get(ObjectProperty.STATUS_FLAGS),
+                         "BACnetError")
+        self.assertEqual(loaded.find_by_type(ObjectType.ANALOG_OUTPUT, 2).get(ObjectProperty.PRIORITY_ARRAY)[15],
+                         BinaryPV.ACTIVE)
+
+        # free slot of snapshot is reused, new object starts clean
+        o = BACnetObject(create_object(100, ObjectType.ANALOG_OUTPUT, 5))
+        loaded.append(o)
+        self.assertEqual(len(loaded.store), 6)
+        self.assertIsNone(o.get_present_value())
+        self.assertEqual(len(loaded.store.flags), len(network.store.flags))
+
+        with self.assertRaises(ValueError):
+            BACnetSnapshot(self.path).load(loaded)
+
+    def test_incompatible(self):
+        snapshot = BACnetSnapshot(self.path)
+        self.assertIsNone(snapshot.load(BACnetNetwork()))
+        snapshot.save(self.create_network())
+        data = bytearray(self.path.read_bytes())
+        magic, version, byte_order, slots = HEADER.unpack_from(data, 0)
+        HEADER.pack_into(data, 0, magic, version + 1, byte_order, slots)
+        self.path.write_bytes(bytes(data))
+        self.assertIsNone(snapshot.load(BACnetNetwork()))
+
+        # truncated snapshot is not loaded
+        snapshot.save(self.create_network())
+        self.path.write_bytes(self.path.read_bytes()[:-10])
+        network = BACnetNetwork()
+        self.assertIsNone(snapshot.load(network))
+        self.assertEqual(len(network.objects), 0)
+
+    def test_update_keeps_state(self):
+        network = self.create_network()
+        BACnetSnapshot(self.path).save(network)
+        loaded = BACnetNetwork()
+        BACnetSnapshot(self.path).load(loaded)
+        o = loaded.find_by_type(ObjectType.ANALOG_OUTPUT, 1)
+        timestamp = o.get_timestamp()
+        data = create_object(100, ObjectType.ANALOG_OUTPUT, 1)
+        data[ObjectProperty.NOTIFICATION_CLASS.id()] = 7
+        data[ObjectProperty.HIGH_LIMIT.id()] = 90.5
+        notification_object = NotificationClass({ObjectProperty.OBJECT_IDENTIFIER.id(): 7})
+        o.set_notification_object(notification_object)
+        location, reference = o._location, o.get_object_reference()
+        del data[ObjectProperty.OBJECT_PROPERTY_REFERENCE.id()]
+        o.update(data)
+        # configuration is replaced in place, object stays in its slot and keeps its notification object
+        self.assertIs(o._location, location)
+        self.assertIs(o.get_notification_object(), notification_object)
+        self.assertIsNotNone(reference)
+        self.assertIsNone(o.get_object_reference())
+        self.assertEqual(o.get_notification_class(), 7)
+        self.assertEqual(o.get_present_value(), 0.5)
+        self.assertEqual(o.get_status_flags(), [False, True, False, False])
+        self.assertEqual(o.get_high_limit(), 90.5)
+        self.assertNotIn(PRESENT_VALUE, o._data)
+        self.assertGreaterEqual(o.get_timestamp(), timestamp)
+
+    def test_load_time(self):
+        network = BACnetNetwork()
+        network.append_many([BACnetObject(create_object(1000 + i // 500, ObjectType.ANALOG_VALUE, i % 500))
+                             for i in range(20000)])
+        for o in network.objects.values():
+            o.set_present_value(1.5)
+        BACnetSnapshot(self.path).save(network)
+        t0 = time.perf_counter()
+        loaded = BACnetNetwork()
+        self.assertEqual(len(BACnetSnapshot(self.path).load(loaded)), 20000)
+        duration = time.perf_counter() - t0
+        logging.getLogger(__name__).info("20k objects loaded from snapshot: {:.3f} sec".format(duration))
+        self.assertLess(duration, 5)
+        self.assertEqual(len(loaded.find_by_device(1001)), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from bacnet.bacnet import ObjectType, ObjectProperty
+from bacnet.native import BACnetNativeClient
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer, BACnetFarmGateClient
+from bacnet.startup import BACnetStartupPlanner
+
+SPEC = {
+    "devices": 20,
+    "first_device_id": 7000,
+    "base_port": 49500,
+    "objects": {"analog-input": 5, "binary-value": 3}
+}
+
+OBJECT_TYPES = [ObjectType.ANALOG_INPUT, ObjectType.ANALOG_OUTPUT, ObjectType.ANALOG_VALUE,
+                ObjectType.BINARY_INPUT, ObjectType.BINARY_OUTPUT, ObjectType.BINARY_VALUE,
+                ObjectType.MULTI_STATE_INPUT, ObjectType.MULTI_STATE_OUTPUT, ObjectType.MULTI_STATE_VALUE]
+
+
+class BACnetStartupPlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.client = BACnetNativeClient(local_host="127.0.0.1").start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = {"startup": {"object_cache": str(Path(self.directory.name) / "object_cache.json"),
+                                   "timeout": 1}}
+
+    def tearDown(self):
+        self.client.stop()
+        self.directory.cleanup()
+
+    def plan(self, farm: BACnetDeviceFarm):
+        gate_client = BACnetFarmGateClient(farm)
+        planner = BACnetStartupPlanner(self.client, gate_client, self.config)
+        return planner.plan(farm.devices(), OBJECT_TYPES), gate_client
+
+    def test_object_cache_by_database_revision(self):
+        farm = BACnetDeviceFarm(SPEC)
+        server = BACnetFarmServer(farm).start()
+        try:
+            plan, gate_client = self.plan(farm)
+            # only object types present in object-list are requested
+            self.assertEqual(gate_client.object_request_count, 20 * 2)
+            self.assertEqual(len(plan[7003][ObjectType.ANALOG_INPUT]), 5)
+            self.assertEqual(plan[7003][ObjectType.MULTI_STATE_VALUE], [])
+            self.assertEqual(plan[7003][ObjectType.BINARY_VALUE][0][ObjectProperty.OBJECT_PROPERTY_REFERENCE.id()],
+                             farm.reference(7003, ObjectType.BINARY_VALUE.code(), 1))
+
+            # unchanged devices cost no server request
+            cached, gate_client = self.plan(farm)
+            self.assertEqual(gate_client.object_request_count, 0)
+            self.assertEqual(cached, plan)
+        finally:
+            server.stop()
+
+        farm = BACnetDeviceFarm(dict(SPEC, database_revision=2, objects={"analog-input": 6}))
+        server = BACnetFarmServer(farm).start()
+        try:
+            plan, gate_client = self.plan(farm)
+            self.assertEqual(gate_client.object_request_count, 20)
+            self.assertEqual(len(plan[7000][ObjectType.ANALOG_INPUT]), 6)
+            self.assertEqual(plan[7000][ObjectType.BINARY_VALUE], [])
+        finally:
+            server.stop()
+
+    def test_not_responding_devices_requested_from_server(self):
+        farm = BACnetDeviceFarm(dict(SPEC, devices=3))
+        plan, gate_client = self.plan(farm)
+        self.assertEqual(gate_client.object_request_count, 3 * len(OBJECT_TYPES))
+        self.assertEqual(len(plan[7001][ObjectType.ANALOG_INPUT]), 5)
+        self.assertFalse(Path(self.config["startup"]["object_cache"]).exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import gc
+import logging
+import sys
+import threading
+import tracemalloc
+import unittest
+
+from bacnet.bacnet import BinaryPV, ObjectProperty, ObjectType, StatusFlag
+from bacnet.network import BACnetNetwork
+from bacnet.store import BACnetValueStore, PRIORITIES
+from visiobas.object.bacnet_object import BACnetObject
+
+PRESENT_VALUE = ObjectProperty.PRESENT_VALUE.id()
+STATUS_FLAGS = ObjectProperty.STATUS_FLAGS.id()
+PRIORITY_ARRAY = ObjectProperty.PRIORITY_ARRAY.id()
+
+
+def create_object(object_id: int, runtime: bool = True):
+    o = {
+        ObjectProperty.DEVICE_ID.id(): 100,
+        ObjectProperty.OBJECT_TYPE.id(): ObjectType.ANALOG_OUTPUT.name(),
+        ObjectProperty.OBJECT_IDENTIFIER.id(): object_id,
+        ObjectProperty.OBJECT_PROPERTY_REFERENCE.id(): "Site:100/AO.{}".format(object_id)
+    }
+    if runtime:
+        o.update({
+            PRESENT_VALUE: object_id + 0.5,
+            STATUS_FLAGS: [False, object_id % 2 == 0, False, False],
+            PRIORITY_ARRAY: [None] * 7 + [object_id + 0.25] + [None] * 7 + [20.5],
+            ObjectProperty.LOW_LIMIT.id(): 10.5,
+            ObjectProperty.HIGH_LIMIT.id(): 90.5
+        })
+    return o
+
+
+class BACnetValueStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+
+    def test_values(self):
+        store = BACnetValueStore()
+        slot = store.allocate()
+        for value in [21.5, 3, BinaryPV.ACTIVE, BinaryPV.INACTIVE, "proprietary-4096", 2 ** 60, True, None]:
+            store.set(slot, PRESENT_VALUE, value)
+            self.assertEqual(store.get(slot, PRESENT_VALUE), value)
+            self.assertIs(type(store.get(slot, PRESENT_VALUE)), type(value))
+        self.assertIsNotNone(store.get_timestamp(slot))
+
+        self.assertIsNone(store.get(slot, STATUS_FLAGS))
+        store.set(slot, STATUS_FLAGS, (False, True, False, True))
+        self.assertEqual(store.get(slot, STATUS_FLAGS), [False, True, False, True])
+        store.set(slot, STATUS_FLAGS, "BACnetError")
+        self.assertEqual(store.get(slot, STATUS_FLAGS), "BACnetError")
+
+        priority_array = [None] * 15 + [BinaryPV.ACTIVE]
+        store.set(slot, PRIORITY_ARRAY, priority_array)
+        self.assertEqual(store.get(slot, PRIORITY_ARRAY), priority_array)
+        store.set(slot, PRIORITY_ARRAY, [1, 2])
+        self.assertEqual(store.get(slot, PRIORITY_ARRAY), [1, 2])
+        self.assertEqual(store.free_blocks, [0])
+
+        # released slot keeps values for threads still reading it and is not reused until release delay passes
+        store.release(slot)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.get(slot, STATUS_FLAGS), "BACnetError")
+        other = store.allocate()
+        self.assertNotEqual(other, slot)
+        store.release_delay = 0
+        self.assertEqual(store.allocate(), slot)
+        # released slot is reused clean
+        self.assertEqual([store.get(slot, code) for code in BACnetValueStore.codes], [None] * 5)
+        self.assertEqual(store.objects, {})
+
+    def test_object_view(self):
+        bacnet_object = BACnetObject(create_object(2))
+        network = BACnetNetwork()
+        network.append(bacnet_object)
+        self.assertNotIn(PRESENT_VALUE, bacnet_object._data)
+        self.assertEqual(bacnet_object.get_present_value(), 2.5)
+        self.assertEqual(bacnet_object.get_low_limit(), 10.5)
+        self.assertTrue(bacnet_object.get_status_flag(StatusFlag.FAULT))
+        bacnet_object.set_status_flag(StatusFlag.IN_ALARM, True)
+        self.assertEqual(bacnet_object.get_status_flags(), [True, True, False, False])
+        bacnet_object.set_present_value(30.0)
+        self.assertEqual(bacnet_object.get(ObjectProperty.PRIORITY_ARRAY)[7], 2.25)
+        self.assertEqual(bacnet_object.get_data()[PRESENT_VALUE], 30.0)
+        self.assertIsNotNone(bacnet_object.get_timestamp())
+
+        # removed object keeps its state
+        location = bacnet_object._location
+        network.remove(bacnet_object)
+        self.assertEqual(bacnet_object.get_present_value(), 30.0)
+        self.assertEqual(bacnet_object.get_status_flags(), [True, True, False, False])
+        self.assertEqual(len(network.store), 0)
+
+        # thread which read location before object was removed does not set value of other object
+        other = BACnetObject(create_object(3))
+        network.append(other)
+        location.store.set(location, PRESENT_VALUE, 99.0)
+        self.assertNotEqual(int(other._location), int(location))
+        self.assertEqual(other.get_present_value(), 3.5)
+
+    def test_concurrent_writers(self):
+        # collector threads set and reset values of the same slots, every block of priority array has one owner
+        store = BACnetValueStore()
+        slots = [store.allocate() for _ in range(100)]
+        errors = []
+
+        def write(value: float):
+            try:
+                for i in range(20):
+                    for slot in slots:
+                        store.set(slot, PRIORITY_ARRAY, [None] * (PRIORITIES - 1) + [value])
+                        store.set(slot, PRESENT_VALUE, "inactive")
+                        store.set(slot, PRESENT_VALUE, None)
+                        if i % 2 == 1:
+                            store.set(slot, PRIORITY_ARRAY, None)
+            except Exception as e:
+                errors.append(repr(e))
+
+        interval = sys.getswitchinterval()
+        # switch threads as often as possible
+        sys.setswitchinterval(1e-6)
+        try:
+            writers = [threading.Thread(target=write, args=(float(i),)) for i in range(4)]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+        blocks = [store.priority_blocks[slot] for slot in slots if store.priority_blocks[slot] != -1]
+        self.assertEqual(len(set(blocks)), len(blocks))
+        self.assertEqual(len(set(store.free_blocks)), len(store.free_blocks))
+        self.assertEqual(sorted(blocks + store.free_blocks), list(range(len(store.priorities) // PRIORITIES)))
+
+    def test_memory(self):
+        count = 20000
+        gc.collect()
+        tracemalloc.start()
+        try:
+            objects = [BACnetObject(create_object(i, False)) for i in range(count)]
+            configuration = tracemalloc.get_traced_memory()[0]
+            del objects
+            gc.collect()
+            base = tracemalloc.get_traced_memory()[0]
+            objects = [BACnetObject(create_object(i)) for i in range(count)]
+            dicts = tracemalloc.get_traced_memory()[0] - base
+            network = BACnetNetwork()
+            network.append_many(objects)
+            del network.index
+            gc.collect()
+            columns = tracemalloc.get_traced_memory()[0] - base
+        finally:
+            tracemalloc.stop()
+        configuration -= base
+        self.logger.info("Runtime state bytes per object, dict: {:.0f} columnar store: {:.0f}".format(
+            (dicts - configuration) / count, (columns - configuration) / count))
+        self.assertLess(columns - configuration, (dicts - configuration) * 0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import json
+import unittest
+
+from bacnet.apdu import Enumerated
+from bacnet.bacnet import ObjectType
+from bacnet.capability import BACnetCapabilityCache
+from bacnet.native import BACnetNativeClient
+from bacnet.simulator import BACnetDeviceFarm, BACnetFarmServer
+from bacnet.write import BACnetWriteCommand, BACnetWritePipeline, shared_pipeline
+
+SPEC = {
+    "devices": 4,
+    "first_device_id": 5000,
+    "base_port": 49100,
+    "objects": {"analog-input": 2, "analog-value": 10, "binary-output": 4}
+}
+
+ANALOG_VALUE = ObjectType.ANALOG_VALUE.code()
+BINARY_OUTPUT = ObjectType.BINARY_OUTPUT.code()
+ANALOG_INPUT = ObjectType.ANALOG_INPUT.code()
+
+
+class BACnetWriteTest(unittest.TestCase):
+    def setUp(self):
+        self.farm = BACnetDeviceFarm(SPEC)
+        self.server = BACnetFarmServer(self.farm).start()
+        self.client = BACnetNativeClient(local_host="127.0.0.1").start()
+        for device in self.farm.devices():
+            self.client.set_device_address(device["id"], device["host"], device["port"])
+        self.results = []
+
+    def tearDown(self):
+        self.client.stop()
+        self.server.stop()
+
+    def callback(self, command, confirmed, error):
+        self.results.append((command.object_type, command.object_id, command.value, confirmed))
+
+    def test_write_multiple_and_confirm(self):
+        capabilities = BACnetCapabilityCache()
+        pipeline = BACnetWritePipeline(self.client, {"write": {"timeout": 2}}, capabilities)
+        device_id = next(d for d in self.farm.device_ids() if self.farm.supports_rpm(d))
+        for object_id in range(1, 11):
+            pipeline.submit(BACnetWriteCommand(device_id, ANALOG_VALUE, object_id, object_id * 1.5, 8,
+                                               callback=self.callback))
+        pipeline.submit(BACnetWriteCommand(device_id, BINARY_OUTPUT, 2, "active", callback=self.callback))
+        self.assertTrue(pipeline.join(10))
+        self.assertEqual(len(self.results), 11)
+        self.assertTrue(all(confirmed for _, _, _, confirmed in self.results))
+        self.assertEqual(self.farm.commands[(device_id, ANALOG_VALUE, 3)][7], 4.5)
+        self.assertEqual(self.farm.present_value(device_id, BINARY_OUTPUT, 2, 0), Enumerated(1))
+        self.assertIsNot(capabilities.get(device_id, "wpm"), False)
+
+        # relinquish command of priority
+        pipeline.submit(BACnetWriteCommand(device_id, ANALOG_VALUE, 3, None, 8, callback=self.callback))
+        self.assertTrue(pipeline.join(10))
+        self.assertTrue(self.results[-1][3])
+        self.assertIsNone(self.farm.commands[(device_id, ANALOG_VALUE, 3)][7])
+
+    def test_fallback_to_write_property(self):
+        self.server.stop()
+        self.farm = BACnetDeviceFarm(dict(SPEC, rpm_ratio=0))
+        self.server = BACnetFarmServer(self.farm).start()
+        capabilities = BACnetCapabilityCache()
+        pipeline = BACnetWritePipeline(self.client, {"write": {"timeout": 2}}, capabilities)
+        for object_id in range(1, 5):
+            pipeline.submit(BACnetWriteCommand(5001, ANALOG_VALUE, object_id, 20.0, callback=self.callback))
+        self.assertTrue(pipeline.join(10))
+        self.assertEqual([confirmed for _, _, _, confirmed in self.results], [True] * 4)
+        self.assertIs(capabilities.get(5001, "wpm"), False)
+        self.assertEqual(self.farm.present_value(5001, ANALOG_VALUE, 4, 0), 20.0)
+
+    def test_coalesce_and_reject(self):
+        pipeline = BACnetWritePipeline(self.client, {"write": {"max_pending": 2, "timeout": 2}})
+        # keep dispatcher from taking commands while queue is filled
+        pipeline.in_flight.add(5002)
+        self.assertTrue(pipeline.submit(BACnetWriteCommand(5002, ANALOG_VALUE, 1, 10.0, callback=self.callback)))
+        self.assertTrue(pipeline.submit(BACnetWriteCommand(5002, ANALOG_VALUE, 1, 11.0, callback=self.callback)))
+        self.assertTrue(pipeline.submit(BACnetWriteCommand(5002, ANALOG_VALUE, 1, 12.0, 5, callback=self.callback)))
+        self.assertFalse(pipeline.submit(BACnetWriteCommand(5002, ANALOG_VALUE, 2, 13.0)))
+        self.assertEqual(pipeline.statistic["coalesced"], 1)
+        self.assertEqual(pipeline.statistic["rejected"], 1)
+        with pipeline.condition:
+            pipeline.in_flight.discard(5002)
+            pipeline.condition.notify_all()
+        self.assertTrue(pipeline.join(10))
+        # present value written without priority is overridden by command of priority 5
+        self.assertEqual(sorted(self.results), [(ANALOG_VALUE, 1, 11.0, False), (ANALOG_VALUE, 1, 12.0, True)])
+        # binary value out of active / inactive is not written as inactive
+        self.assertFalse(pipeline.submit(BACnetWriteCommand(5002, BINARY_OUTPUT, 1, "on")))
+        self.assertEqual(pipeline.statistic["rejected"], 2)
+
+        pipeline.set_write_app(5002, "bacwp")
+        self.assertFalse(pipeline.submit(BACnetWriteCommand(5002, ANALOG_VALUE, 1, 10.0)))
+
+    def test_write_access_denied(self):
+        pipeline = BACnetWritePipeline(self.client, {"write": {"timeout": 2}})
+        pipeline.submit(BACnetWriteCommand(5003, ANALOG_INPUT, 1, 10.0, callback=self.callback))
+        self.assertTrue(pipeline.join(10))
+        self.assertEqual(self.results, [(ANALOG_INPUT, 1, 10.0, False)])
+
+    def test_json_rpc(self):
+        from jsonrpc import JSONRPCResponseManager, dispatcher
+        import visiobas.gateway_server
+
+        pipeline = shared_pipeline(self.client, {"write": {"timeout": 2}})
+
+        def call(method, params):
+            request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": params})
+            return json.loads(JSONRPCResponseManager.handle(request, dispatcher).json)
+
+        result = call("write_set_point", {"device_id": 5000, "object_type": "analog-value", "object_id": 7,
+                                          "value": 21.5, "priority": 10})
+        self.assertTrue(result["result"]["result"]["success"])
+        self.assertTrue(pipeline.join(10))
+        self.assertEqual(self.farm.commands[(5000, ANALOG_VALUE, 7)][9], 21.5)
+        call("reset_set_point", {"device_id": 5000, "object_type": "analog-value", "object_id": 7, "priority": 10})
+        self.assertTrue(pipeline.join(10))
+        self.assertIsNone(self.farm.commands[(5000, ANALOG_VALUE, 7)][9])
+        self.assertIn("error", call("write_set_point", {"device_id": 5000, "object_type": "unknown",
+                                                        "object_id": 7, "value": 1}))
+        for priority in [0, 17]:
+            result = call("write_set_point", {"device_id": 5000, "object_type": "analog-value", "object_id": 7,
+                                              "value": 1, "priority": priority})
+            self.assertEqual(result["error"]["code"], -32602)
+        # invalid value is rejected, not written as inactive or failed later by write worker
+        for object_type, value in [("binary-output", "ACTIVE"), ("binary-output", "on"), ("binary-output", 2),
+                                   ("binary-value", "true"), ("analog-value", "warm"), ("multi-state-value", 1.5)]:
+            result = call("write_set_point", {"device_id": 5000, "object_type": object_type, "object_id": 7,
+                                              "value": value})
+            self.assertEqual(result["error"]["code"], -32602)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -71,6 +71,18 @@ class VisiobasGateClient(VisiobasClient):
                 f.write("{}\n".format(js))
         return self.post(url, js, headers=headers)
 
+    def rq_put_history(self, device_id, data):
+        """
+        :param device_id: device identifier
+        :param data: list of historic object data (with "timestamp" of sample) to put on server
+        :return: list of rejected data
+        """
+        url = "{}/vbas/gate/putHistory/{}".format(self.get_addr(), device_id)
+        headers = {
+            "Content-type": "application/json;charset=UTF-8"
+        }
+        return self.post(url, json.dumps(data), headers=headers)
+
     def rq_vdesk_get_status_list(self) -> list:
         url = "{}/vdesk/arm/getStatusList".format(self.get_addr())
         return self.get_json(url)
@@ -3,6 +3,48 @@ from jsonrpc.exceptions import JSONRPCDispatchException
 from werkzeug.serving import run_simple
 from werkzeug.wrappers import Request, Response
 
+import config.visiobas
+from bacnet.bacnet import ObjectType
+from bacnet.capability import shared_cache
+from bacnet.native import shared_client
+from bacnet.scan import shared_scanner
+from bacnet.write import BACnetWriteCommand, shared_pipeline
+
+
+def get_scanner():
+    slicer_config = config.visiobas.visiobas_slicer
+    return shared_scanner(shared_client(slicer_config), slicer_config, shared_cache(slicer_config))
+
+
+def get_write_pipeline():
+    slicer_config = config.visiobas.visiobas_slicer
+    return shared_pipeline(shared_client(slicer_config), slicer_config, shared_cache(slicer_config))
+
+
+def create_write_command(device_id, object_type, object_id, value, priority):
+    """
+    :param object_type: object type name or code
+    """
+    object_type_code = ObjectType.name_to_code(object_type) if isinstance(object_type, str) else object_type
+    if object_type_code is None:
+        raise JSONRPCDispatchException(code=-32602, message="Unknown object type: {}".format(object_type))
+    if priority is not None:
+        priority = int(priority)
+        if not 1 <= priority <= 16:
+            raise JSONRPCDispatchException(code=-32602, message="Priority is out of 1..16: {}".format(priority))
+    command = BACnetWriteCommand(int(device_id), int(object_type_code), int(object_id), value, priority)
+    error = command.validate()
+    if error is not None:
+        raise JSONRPCDispatchException(code=-32602, message=error)
+    return command
+
+
+def get_scan_job(job_id):
+    job = get_scanner().get(job_id)
+    if job is None:
+        raise JSONRPCDispatchException(code=-32602, message="Unknown scan job: {}".format(job_id))
+    return job
+
 
 class VisiobasGatewayServer:
     def __init__(self):
@@ -15,9 +57,68 @@ class VisiobasGatewayServer:
 
     @dispatcher.add_method
     def scan_bacnet_network(**kwargs):
+        """
+        Start background scan of BACnet network, progress and found objects are polled
+        by scan_bacnet_network_progress with returned job_id
+        :param device_id: device id or list of device ids to scan (default all devices)
+        :param ranges: device id ranges "200-300,400" (default all devices)
+        """
+        device_ids = kwargs.get("device_id")
+        if device_ids is not None and not isinstance(device_ids, list):
+            device_ids = [device_ids]
+        ranges = None
+        if kwargs.get("ranges"):
+            ranges = [(int(r.split("-")[0]), int(r.split("-")[-1])) for r in str(kwargs["ranges"]).split(",")]
+        job = get_scanner().start([int(x) for x in device_ids] if device_ids else None, ranges)
+        return {
+            "result": {
+                "job_id": job.job_id,
+                "success": True
+            }
+        }
+
+    @dispatcher.add_method
+    def scan_bacnet_network_progress(job_id, offset=0, limit=1000):
+        """
+        :return: status of scan job and page of found objects starting from offset
+        """
+        result = get_scan_job(job_id).page(int(offset), int(limit))
+        result["success"] = True
+        return {
+            "result": result
+        }
+
+    @dispatcher.add_method
+    def scan_bacnet_network_cancel(job_id):
+        get_scanner().cancel(get_scan_job(job_id).job_id)
         return {
             "result": {
-                "data": [],
+                "job_id": job_id,
                 "success": True
             }
         }
+
+    @dispatcher.add_method
+    def write_set_point(device_id, object_type, object_id, value, priority=None):
+        """
+        Queue write of present value, pending write of the same object and priority is replaced,
+        write is confirmed by read back asynchronously
+        """
+        command = create_write_command(device_id, object_type, object_id, value, priority)
+        return {
+            "result": {
+                "success": get_write_pipeline().submit(command)
+            }
+        }
+
+    @dispatcher.add_method
+    def reset_set_point(device_id, object_type, object_id, priority=None):
+        """
+        Queue relinquish of present value command of priority
+        """
+        command = create_write_command(device_id, object_type, object_id, None, priority)
+        return {
+            "result": {
+                "success": get_write_pipeline().submit(command)
+            }
+        }
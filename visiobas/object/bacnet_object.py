@@ -16,22 +16,34 @@ class Transition(enum.Enum):
 
 
 class BACnetObject:
+    # runtime state of object kept on update of configuration
+    state_codes = (ObjectProperty.PRESENT_VALUE.id(), ObjectProperty.STATUS_FLAGS.id(),
+                   ObjectProperty.PRIORITY_ARRAY.id())
+
     def __init__(self, data):
         self._data = data
+        # runtime state of object appended into BACnetNetwork is kept by columnar store of network,
+        # slot carries its store (see BACnetSlot) so other thread reads store and slot of the same attach
+        self._location = None
         self.configuration_files = None
         self._default_update_interval = 1
         self.property_list = None
         self.notification_object = None
+        self._prepare(self._data)
 
+    def _prepare(self, data: dict):
+        """
+        Complete configuration of server object
+        """
         # copy TO_NORMAL message into transitions RESOLVE_OFFNORMAL & RESOLVE_FAULT
-        if ObjectProperty.EVENT_MESSAGE_TEXTS.id() in self._data:
-            texts = self._data[ObjectProperty.EVENT_MESSAGE_TEXTS.id()]
+        if ObjectProperty.EVENT_MESSAGE_TEXTS.id() in data:
+            texts = data[ObjectProperty.EVENT_MESSAGE_TEXTS.id()]
             if texts is not None and len(texts) == 3:
                 text_to_normal = texts[2]
                 texts += [text_to_normal, text_to_normal]
 
-        if ObjectProperty.EVENT_ENABLE.id() in self._data:
-            self.set_event_enable(self._data[ObjectProperty.EVENT_ENABLE.id()])
+        if ObjectProperty.EVENT_ENABLE.id() in data:
+            self.set_event_enable(data[ObjectProperty.EVENT_ENABLE.id()])
 
     def __str__(self) -> str:
         id = self.get_id()
@@ -42,6 +54,11 @@ class BACnetObject:
 
     def get(self, object_property, default=None):
         property_code = object_property.id() if type(object_property) == ObjectProperty else object_property
+        # location is read once, object may be detached by other thread
+        location = self._location
+        if location is not None and property_code in location.store.codes:
+            value = location.store.get(location, property_code)
+            return value if value is not None else default
         try:
             value = self._data[property_code]
             return value if value is not None else default
@@ -50,7 +67,82 @@ class BACnetObject:
 
     def set(self, object_property, value):
         property_code = object_property.id() if type(object_property) == ObjectProperty else object_property
-        self._data[property_code] = value
+        location = self._location
+        if location is not None and property_code in location.store.codes:
+            location.store.set(location, property_code, value)
+        else:
+            self._data[property_code] = value
+
+    def attach(self, store, slot: int):
+        """
+        Move runtime state of object into slot of store (see BACnetValueStore), state already kept by slot
+        is not changed by properties object does not have
+        """
+        if self._location is not None:
+            self.detach()
+        for code in store.codes:
+            if code in self._data:
+                store.set(slot, code, self._data[code])
+        # dict does not shrink on delete, copy of it does
+        self._data = {k: v for k, v in self._data.items() if k not in store.codes}
+        self._location = store.location(slot)
+
+    def detach(self):
+        """
+        Move runtime state of object back from store and release slot of object, store does not reuse
+        released slot while other thread may still use it (see BACnetValueStore.release)
+        """
+        location = self._location
+        if location is None:
+            return
+        store = location.store
+        for code in store.codes:
+            value = store.get(location, code)
+            if value is not None:
+                self._data[code] = value
+        self._location = None
+        store.release(int(location))
+
+    def is_attached(self, store):
+        """
+        :return: True if runtime state of object is kept by store
+        """
+        location = self._location
+        return location is not None and location.store is store
+
+    def update(self, data: dict):
+        """
+        Replace configuration of object by server object in place, runtime state (present value, status flags,
+        priority array) is kept, server value is taken only if object has no value yet.
+        Object stays attached to store and linked with its notification object
+        """
+        self._prepare(data)
+        location = self._location
+        store = location.store if location is not None else None
+        configuration = {}
+        for code, value in data.items():
+            if code in self.state_codes:
+                if self.get(code) is None and value is not None:
+                    self.set(code, value)
+            elif store is None or code not in store.codes:
+                configuration[code] = value
+        if store is not None:
+            for code in store.codes:
+                if code not in self.state_codes:
+                    store.set(location, code, data.get(code))
+        # keys of both configurations are present while configuration is replaced
+        self._data.update(configuration)
+        for code in [code for code in self._data if code not in configuration and code not in self.state_codes]:
+            del self._data[code]
+        self.configuration_files = None
+        self.property_list = None
+
+    def get_timestamp(self):
+        """
+        :return: time of last present value update of object appended into network or None
+        """
+        location = self._location
+        return location.store.get_timestamp(location) if location is not None else None
 
     def get_property_list(self):
         if self.property_list is not None:
@@ -144,7 +236,16 @@ class BACnetObject:
         return self.get(ObjectProperty.DESCRIPTION, "")
 
     def get_data(self):
-        return self._data
+        location = self._location
+        if location is None:
+            return self._data
+        store = location.store
+        data = dict(self._data)
+        for code in store.codes:
+            value = store.get(location, code)
+            if value is not None:
+                data[code] = value
+        return data
 
     def set_status_flag(self, status_flag: StatusFlag, value: bool):
         status_flags = self.get_status_flags()
@@ -274,12 +375,12 @@ class Device(BACnetObject):
 
 
 class NotificationClass(BACnetObject):
-    def __init__(self, data):
-        super().__init__(data)
+    def _prepare(self, data: dict):
+        super()._prepare(data)
 
         # append recipient transitions
-        recipients = self.get_recipient_list()
-        for recipient in recipients:
+        recipients = data.get(ObjectProperty.RECIPIENT_LIST.id())
+        for recipient in recipients if type(recipients) is list else []:
             if "transitions" in recipient:
                 transitions = recipient["transitions"]
                 if len(transitions) == 3: